@@ -1,5 +1,6 @@
 #!/bin/sh
-# Container entrypoint: optionally start TFTP (dnsmasq) when env is set, then run the Flask app with gunicorn.
+# Container entrypoint: optionally start TFTP (dnsmasq or the built-in server) when env is set, then run the app with gunicorn (WSGI)
+# or uvicorn (ASGI) depending on SERVER_MODE.
 # TFTP is for routers that only offer "TFTP server + filename": we serve the iPXE binaries and two generated
 # scripts - boot.ipxe (chained by embed.ipxe via ${next-server}) and autoexec.ipxe (iPXE's built-in fallback
 # when the embedded script fails, e.g. when the router doesn't populate ${next-server}/siaddr). Both scripts
@@ -12,27 +13,68 @@ missing=""
 [ -z "$PXE_BASE_URL" ] && missing="${missing} PXE_BASE_URL"
 [ -z "$PXE_UBUNTU_KERNEL_URL" ] && missing="${missing} PXE_UBUNTU_KERNEL_URL"
 [ -z "$PXE_UBUNTU_INITRD_URL" ] && missing="${missing} PXE_UBUNTU_INITRD_URL"
-[ -z "$PXE_AUTOINSTALL_URL" ] && missing="${missing} PXE_AUTOINSTALL_URL"
+[ -z "$PXE_AUTOINSTALL_URL" ] && [ -z "$NOCLOUD_DIR" ] && missing="${missing} PXE_AUTOINSTALL_URL"
 if [ -n "$missing" ]; then
   echo "Fatal: required env vars are not set:${missing}. See https://github.com/aayusharyan/pxe-pilot/blob/main/README.md" >&2
   exit 1
 fi
 
-# If TFTP is enabled, run the two-stage TFTP setup before starting the app.
+# Per-worker metrics snapshots are merged by GET /metrics. Start each container from zero so stale files
+# from a previous run (with different pids) are never summed in.
+export METRICS_DIR="${METRICS_DIR:-/tmp/pxe-pilot-metrics}"
+mkdir -p "$METRICS_DIR"
+rm -f "$METRICS_DIR"/*.json "$METRICS_DIR"/*.tmp
+
+# If TFTP is enabled, start a TFTP server in the background before the app. PXE_TFTP_SERVER picks it:
+#   dnsmasq (default) - serves /tftpboot with boot.ipxe and autoexec.ipxe written below.
+#   builtin           - python -m app.tftp: blksize/windowsize/tsize negotiation, memory-mapped binaries,
+#                       per-transfer throughput logs and pxe_tftp_* metrics. It generates both scripts itself.
 if [ -n "$PXE_TFTP_ENABLED" ]; then
   mkdir -p /tftpboot
-  # Strip trailing slash so the chain URL is clean (e.g. http://pxe-pilot/chain).
-  base="${PXE_BASE_URL%/}"
-  # boot.ipxe is chain-loaded by embed.ipxe via tftp://${next-server}/boot.ipxe and redirects to HTTP.
-  printf '#!ipxe\nchain %s/chain\n' "$base" > /tftpboot/boot.ipxe
-  # autoexec.ipxe is iPXE's built-in fallback: when the embedded script can't resolve ${next-server}
-  # (e.g. the router sets option 66 but not siaddr), iPXE requests this file via TFTP automatically.
-  printf '#!ipxe\nchain %s/chain\n' "$base" > /tftpboot/autoexec.ipxe
-  # Run dnsmasq as TFTP server: no DHCP (-p 0), TFTP on default port, serve files from /tftpboot. Run in background so gunicorn can start.
-  dnsmasq --no-daemon -p 0 --enable-tftp --tftp-root=/tftpboot --user=root &
+  case "${PXE_TFTP_SERVER:-dnsmasq}" in
+    builtin)
+      python -m app.tftp &
+      ;;
+    dnsmasq)
+      # Strip trailing slash so the chain URL is clean (e.g. http://pxe-pilot/chain).
+      base="${PXE_BASE_URL%/}"
+      # boot.ipxe is chain-loaded by embed.ipxe via tftp://${next-server}/boot.ipxe and redirects to HTTP.
+      printf '#!ipxe\nchain %s/chain\n' "$base" > /tftpboot/boot.ipxe
+      # autoexec.ipxe is iPXE's built-in fallback: when the embedded script can't resolve ${next-server}
+      # (e.g. the router sets option 66 but not siaddr), iPXE requests this file via TFTP automatically.
+      printf '#!ipxe\nchain %s/chain\n' "$base" > /tftpboot/autoexec.ipxe
+      # Run dnsmasq as TFTP server: no DHCP (-p 0), TFTP on default port, serve files from /tftpboot. Run in background so gunicorn can start.
+      dnsmasq --no-daemon -p 0 --enable-tftp --tftp-root=/tftpboot --user=root &
+      ;;
+    *)
+      echo "Fatal: PXE_TFTP_SERVER must be dnsmasq or builtin (got ${PXE_TFTP_SERVER})." >&2
+      exit 1
+      ;;
+  esac
 fi
 
-# Start the Flask app. Single worker is enough for typical homelab use; app:app is the WSGI callable.
-# --access-logfile - writes HTTP request logs to stdout so docker logs captures them.
-# PORT is optional (default 8000); see README Environment variables.
-exec gunicorn -b "0.0.0.0:${PORT:-8000}" -w 1 --access-logfile - app:app
+# Start the app. SERVER_MODE picks the server:
+#   wsgi (default) - gunicorn gthread workers running the Flask app (app:app), WEB_THREADS requests at a time per
+#                    worker (default 32), so requests waiting on the database are visible to admission control.
+#                    --preload builds the app once in the master; workers fork from it ready to serve, so a
+#                    restart does not repeat imports, DB preparation or the boot cache warm-up per worker.
+#   asgi           - uvicorn running app.asgi:app. /chain, /boot and /health run on an asyncio event loop so
+#                    hundreds of iPXE clients can be in flight per worker without head-of-line blocking; the
+#                    admin API still runs through Flask on a thread pool (ASGI_DB_THREADS / ASGI_ADMIN_THREADS).
+# WEB_WORKERS is the number of worker processes in either mode (default 1; every worker shares the SQLite DB).
+# Access logs go to stdout so docker logs captures them. PORT is optional (default 8000); see README.
+# PXE_STARTED_AT lets the startup report include interpreter start and imports.
+export PXE_STARTED_AT="$(date +%s.%N)"
+case "${SERVER_MODE:-wsgi}" in
+  asgi)
+    exec uvicorn --host 0.0.0.0 --port "${PORT:-8000}" --workers "${WEB_WORKERS:-1}" app.asgi:app
+    ;;
+  wsgi)
+    exec gunicorn -b "0.0.0.0:${PORT:-8000}" -w "${WEB_WORKERS:-1}" --worker-class gthread \
+      --threads "${WEB_THREADS:-32}" --preload --access-logfile - app:app
+    ;;
+  *)
+    echo "Fatal: SERVER_MODE must be wsgi or asgi (got ${SERVER_MODE})." >&2
+    exit 1
+    ;;
+esac
@@ -4,36 +4,75 @@ Application factory for the Flask web app.
 This module creates the Flask instance, ensures the database schema exists,
 and registers all HTTP routes (/boot, /nodes, /health, /chain). Entry points:
 run.py for development, or gunicorn with wsgi:app / app:create_app().
+
+gunicorn runs with --preload (docker/entrypoint.sh): the module-level app
+(app.app) is built once in the master and workers fork from it, so imports,
+database preparation and the boot cache warm-up are not repeated per worker.
+app.app is created on first access rather than at import, so processes that
+only need a submodule (e.g. python -m app.tftp) never build the Flask app.
 """
 
 import logging
+import threading
 
 from flask import Flask
 
-from app.config import ADMIN_API_KEY
-from app.db import init_db, migrate_db
+from app.boot_cache import boot_cache
+from app.config import ADMIN_API_KEY, STARTUP_STARTED_AT
+from app.db import describe_db_profile
+from app.metrics import install_flask_hooks
 from app.routes import register_routes
-from app.seed import seed_db
+from app.startup import StartupTimer, prepare_database
 
 logger = logging.getLogger(__name__)
 
 
 def create_app() -> Flask:
     """
-    Build and return the Flask app. Sets JSON key order, creates DB tables,
-    and mounts routes. Logs a security warning if ADMIN_API_KEY is unset.
+    Build and return the Flask app. Sets JSON key order, prepares the
+    database (schema, migrations and seed, once per deployment - see
+    app.startup), logs the effective SQLite profile, warms the /boot decision
+    cache, installs the request metrics hooks, and mounts routes. Logs a
+    security warning if ADMIN_API_KEY is unset, and one line with the time
+    each startup phase took (imports included when the entrypoint exported
+    PXE_STARTED_AT).
     """
+    timer = StartupTimer()
+    if STARTUP_STARTED_AT:
+        # From the entrypoint's exec: interpreter, server and module imports.
+        timer.since("imports", STARTUP_STARTED_AT)
     app = Flask(__name__)
     app.json.sort_keys = False
     if not ADMIN_API_KEY:
         logger.warning(
             "ADMIN_API_KEY is not set; admin endpoints (/nodes, .../reinstall) are unprotected. This is less secure."
         )
-    init_db()
-    migrate_db()
-    seed_db()
-    register_routes(app)
+    with timer.phase("database"):
+        timer.notes["database"] = "applied" if prepare_database() else "up to date"
+    logger.info(
+        "database: %s",
+        " ".join(f"{key}={value}" for key, value in describe_db_profile().items()),
+    )
+    with timer.phase("boot_cache"):
+        boot_cache.warm()
+    with timer.phase("routes"):
+        install_flask_hooks(app)
+        register_routes(app)
+    app.config["STARTUP_TIMINGS"] = dict(timer.phases)
+    logger.info("startup: %s", timer.report())
     return app
 
 
-app = create_app()
+_app: Flask | None = None
+_app_lock = threading.Lock()
+
+
+def __getattr__(name: str) -> Flask:
+    """Module attribute app: the process-wide Flask app (gunicorn app:app, app.asgi), built once on first use."""
+    global _app
+    if name != "app":
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    with _app_lock:
+        if _app is None:
+            _app = create_app()
+    return _app
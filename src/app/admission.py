@@ -0,0 +1,143 @@
+"""
+Admission control for the iPXE-facing routes, /chain and /boot.
+
+When a rack powers on at once, every client asks for its script within the
+same second. Rather than queue them until iPXE's own HTTP timeout gives up
+(and the firmware falls through to the next boot device), requests over
+either limit are answered at once with a retry script (routes/chain.py) that
+sleeps for a jittered, growing back-off and chains /boot again:
+
+- ADMISSION_MAX_INFLIGHT: requests being served at once in this process, i.e.
+  the handlers waiting on the database pool. Under SERVER_MODE=asgi these are
+  event-loop tasks. Under SERVER_MODE=wsgi each one holds a gunicorn thread,
+  and a request waiting for a thread is out of the app's sight, so the limit
+  is capped at WEB_THREADS - 1: one thread stays free to answer the shed ones.
+- ADMISSION_MAC_RATE / ADMISSION_MAC_BURST: a token bucket per MAC, so one
+  client stuck in a boot loop cannot take the capacity meant for the rest.
+
+Both are per process (per worker). Shed requests are counted in
+pxe_admission_shed_total by route and reason.
+"""
+
+import math
+import random
+import threading
+import time
+
+from app.config import (
+    ADMISSION_MAC_BURST,
+    ADMISSION_MAC_RATE,
+    ADMISSION_MAX_INFLIGHT,
+    ADMISSION_RETRY_BASE_SECONDS,
+    ADMISSION_RETRY_MAX_SECONDS,
+    SERVER_MODE,
+    WEB_THREADS,
+)
+from app.metrics import ADMISSION_SHED
+
+# Buckets kept before idle (full) ones are dropped; bounds memory under spoofed MACs.
+_MAX_BUCKETS = 50_000
+
+# The retry= attempt is capped here; the back-off stops growing well before.
+MAX_ATTEMPT = 16
+
+
+def inflight_limit(limit: int, server_mode: str, threads: int) -> int:
+    """The in-flight limit to enforce for ADMISSION_MAX_INFLIGHT = limit (0: none) in this serving mode."""
+    if server_mode == "WSGI" and limit:
+        return min(limit, max(threads - 1, 1))
+    return limit
+
+
+def retry_attempt(raw: str | None) -> int:
+    """Attempt number from a retry= query value; anything unusable counts as 0."""
+    try:
+        attempt = int(raw) if raw else 0
+    except ValueError:
+        return 0
+    return min(max(attempt, 0), MAX_ATTEMPT)
+
+
+class Admission:
+    """
+    In-flight counter and per-MAC token buckets for one process. admit()
+    either takes a slot (release() it when the response is built) or
+    returns False, in which case nothing is held and the request is counted
+    as shed. A limit of 0 disables that check.
+    """
+
+    def __init__(
+        self, max_inflight: int, mac_rate: float, mac_burst: float, retry_base: float, retry_max: float
+    ) -> None:
+        self._max_inflight = max_inflight
+        self._mac_rate = mac_rate
+        self._mac_burst = max(mac_burst, 1.0)
+        self._retry_base = retry_base
+        self._retry_max = retry_max
+        self._inflight = 0
+        self._buckets: dict[str, tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def inflight(self) -> int:
+        return self._inflight
+
+    def admit(self, route: str, mac: str | None) -> bool:
+        """Take an in-flight slot and, when mac is given, a token from its bucket."""
+        with self._lock:
+            if self._max_inflight and self._inflight >= self._max_inflight:
+                reason = "inflight"
+            elif mac is not None and self._mac_rate > 0 and not self._take_token(mac):
+                reason = "mac_rate"
+            else:
+                self._inflight += 1
+                return True
+        ADMISSION_SHED.inc(route, reason)
+        return False
+
+    def release(self) -> None:
+        with self._lock:
+            self._inflight -= 1
+
+    def _take_token(self, mac: str) -> bool:
+        now = time.monotonic()
+        tokens, stamp = self._buckets.get(mac, (self._mac_burst, now))
+        tokens = min(self._mac_burst, tokens + (now - stamp) * self._mac_rate)
+        if tokens < 1.0:
+            self._buckets[mac] = (tokens, now)
+            return False
+        if mac not in self._buckets and len(self._buckets) >= _MAX_BUCKETS:
+            self._drop_idle(now)
+        self._buckets[mac] = (tokens - 1.0, now)
+        return True
+
+    def _drop_idle(self, now: float) -> None:
+        """Forget buckets that have refilled (they would start full anyway); all of them if none have."""
+        refill = self._mac_burst / self._mac_rate
+        self._buckets = {mac: entry for mac, entry in self._buckets.items() if now - entry[1] < refill}
+        if len(self._buckets) >= _MAX_BUCKETS:
+            self._buckets.clear()
+
+    def backoff(self, attempt: int) -> int:
+        """
+        Whole seconds to sleep before retry number attempt + 1: the cap doubles
+        per attempt from ADMISSION_RETRY_BASE_SECONDS up to
+        ADMISSION_RETRY_MAX_SECONDS, and the delay is drawn from its upper
+        half so clients shed together do not come back together.
+        """
+        cap = min(self._retry_max, self._retry_base * 2 ** min(attempt, MAX_ATTEMPT))
+        return max(1, math.ceil(random.uniform(cap / 2, cap)))
+
+    def reset(self) -> None:
+        with self._lock:
+            self._inflight = 0
+            self._buckets.clear()
+
+
+admission = Admission(
+    inflight_limit(ADMISSION_MAX_INFLIGHT, SERVER_MODE, WEB_THREADS),
+    ADMISSION_MAC_RATE,
+    ADMISSION_MAC_BURST,
+    ADMISSION_RETRY_BASE_SECONDS,
+    ADMISSION_RETRY_MAX_SECONDS,
+)
@@ -0,0 +1,458 @@
+"""
+ASGI (asyncio) entry point: app.asgi:app, served by uvicorn when
+SERVER_MODE=asgi (see docker/entrypoint.sh).
+
+The PXE-facing endpoints /chain, /boot, /health, /ready and /files/<name> are handled
+natively on the event loop using the same builders as the Flask routes, so hundreds of
+iPXE clients can be in flight per process and one slow client never blocks the
+rest. A /boot cache hit never leaves the loop; a miss (the one DB round-trip),
+the occasional boot cache poll and recompiling boot profiles after a change
+run on a dedicated thread pool
+(ASGI_DB_THREADS). Admission control (app.admission) caps the /chain and /boot
+handlers in flight, so a boot storm gets retry scripts instead of a queue in
+front of that pool. /files bodies are read on a small pool of their own and
+streamed with the server's flow control, so a slow download only holds its own
+connection. The /nodes/changes stream and long poll wait on the event loop
+too, woken by the process's single change feed poller, so open subscriptions
+cost no threads. Every other path (/nodes and the rest of the admin API) is
+passed to the Flask app through a small WSGI bridge on its own pool
+(ASGI_ADMIN_THREADS), with request bodies fed to it as they arrive and
+responses streamed chunk by chunk.
+"""
+
+import asyncio
+import contextvars
+import io
+import json
+import logging
+import os
+import queue
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from urllib.parse import parse_qs
+
+from app import app as flask_app
+from app.admission import admission
+from app.boot_cache import boot_cache
+from app.boot_journal import boot_journal
+from app.boot_profiles import boot_profiles
+from app.change_feed import KEEPALIVE_SECONDS, change_feed, reset_event
+from app.config import (
+    ASGI_ADMIN_THREADS,
+    ASGI_DB_THREADS,
+    CHANGE_FEED_MAX_SECONDS,
+    PXE_BASE_URL,
+    READINESS_TIMEOUT_SECONDS,
+)
+from app.files import CHUNK_SIZE, open_file
+from app.last_seen import last_seen_buffer
+from app.metrics import HTTP_LATENCY, HTTP_REQUESTS
+from app.readiness import readiness
+from app.rollout import rollout
+from app.routes.boot import admit_reinstall, client_ip_from, ipxe_script_for, load_boot_decision
+from app.routes.chain import ipxe_script_chain_with_fallback, ipxe_script_retry
+from app.routes.changes import (
+    CHANGES_ROUTE,
+    SSE_HEADERS,
+    SSE_KEEPALIVE,
+    SSE_PREAMBLE,
+    parse_after,
+    parse_timeout,
+    poll_body,
+    wants_sse,
+)
+from app.routes.common import BadQuery, admin_auth_error, normalize_mac
+
+logger = logging.getLogger(__name__)
+
+_db_pool = ThreadPoolExecutor(max_workers=ASGI_DB_THREADS, thread_name_prefix="asgi-db")
+_admin_pool = ThreadPoolExecutor(max_workers=ASGI_ADMIN_THREADS, thread_name_prefix="asgi-admin")
+# /files reads: page-cache hits taking microseconds, so a few threads suffice.
+_file_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="asgi-files")
+
+_FILES_PREFIX = "/files/"
+_FILES_ROUTE = "/files/<path:name>"  # metrics label, same as the Flask rule
+
+_TEXT = [(b"content-type", b"text/plain; charset=utf-8")]
+_JSON = [(b"content-type", b"application/json")]
+
+# Request body chunks received ahead of what the Flask app has read.
+_BODY_AHEAD = 16
+_EOF = object()
+
+
+async def _respond(send, status: int, headers: list, body: bytes) -> int:
+    """Send a complete, non-streamed response; returns status for the metrics."""
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": headers + [(b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
+    return status
+
+
+def _header(scope, name: bytes) -> str | None:
+    """First value of a request header, decoded as latin-1."""
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+async def _health(scope, send) -> int:
+    return await _respond(send, 200, _JSON, json.dumps({"status": "OK"}).encode() + b"\n")
+
+
+async def _ready(scope, send) -> int:
+    if readiness.has_result:
+        status, body = readiness.report()
+    else:  # first call in this process: wait for the prober off the loop
+        status, body = await asyncio.get_running_loop().run_in_executor(
+            _db_pool, readiness.report, READINESS_TIMEOUT_SECONDS
+        )
+    return await _respond(send, status, _JSON, json.dumps(body).encode() + b"\n")
+
+
+async def _chain(scope, send) -> int:
+    if not admission.admit("/chain", None):
+        return await _respond(send, 200, _TEXT, ipxe_script_retry(_query_value(scope, "retry")).encode())
+    try:
+        body = ipxe_script_chain_with_fallback(PXE_BASE_URL.rstrip("/"))
+    finally:
+        admission.release()
+    return await _respond(send, 200, _TEXT, body.encode())
+
+
+def _query_value(scope, name: str) -> str | None:
+    return parse_qs(scope["query_string"].decode("latin-1")).get(name, [None])[0]
+
+
+async def _boot(scope, send) -> int:
+    """Same behaviour as the Flask /boot route, without blocking the loop."""
+    query = parse_qs(scope["query_string"].decode("latin-1"))
+    raw_mac = query.get("mac", [None])[0]
+    mac = normalize_mac(raw_mac) if raw_mac else None
+    if not mac:
+        logger.warning("boot called with missing or invalid mac: %s", raw_mac)
+        return await _respond(send, 400, _TEXT, b"Invalid or missing mac\n")
+    if not admission.admit("/boot", mac):
+        # Shed before any executor work: the retry script costs no database time.
+        return await _respond(send, 200, _TEXT, ipxe_script_retry(query.get("retry", [None])[0]).encode())
+    try:
+        return await _serve_boot(scope, send, mac)
+    finally:
+        admission.release()
+
+
+async def _serve_boot(scope, send, mac: str) -> int:
+    loop = asyncio.get_running_loop()
+    if boot_cache.poll_due():
+        decision = await loop.run_in_executor(_db_pool, boot_cache.get, mac)
+    else:
+        decision = boot_cache.get(mac)
+    now = datetime.now(timezone.utc)
+    if decision is None:
+        decision = await loop.run_in_executor(_db_pool, load_boot_decision, mac, now)
+    elif last_seen_buffer.write_through:  # commits: keep it off the loop
+        await loop.run_in_executor(_db_pool, last_seen_buffer.record, mac, now)
+    else:
+        last_seen_buffer.record(mac, now)
+    if decision[0] and rollout.enabled:
+        decision = await loop.run_in_executor(_db_pool, admit_reinstall, mac, decision, now)
+    if decision[0] and decision[2] is not None and boot_profiles.stale:
+        # Profiles changed since they were last compiled; reload off the loop.
+        await loop.run_in_executor(_db_pool, boot_profiles.load)
+    client = scope.get("client")
+    client_ip = client_ip_from(_header(scope, b"x-forwarded-for"), client[0] if client else None)
+    if boot_journal.write_through:
+        script = await loop.run_in_executor(_db_pool, ipxe_script_for, mac, decision, client_ip)
+    else:
+        script = ipxe_script_for(mac, decision, client_ip)
+    return await _respond(send, 200, _TEXT, script.encode())
+
+
+async def _files(scope, send) -> int:
+    """Same behaviour as the Flask /files route; the body is read off the loop."""
+    loop = asyncio.get_running_loop()
+    served = await loop.run_in_executor(
+        _file_pool, open_file, scope["path"][len(_FILES_PREFIX):], lambda name: _header(scope, name.lower().encode())
+    )
+    headers = [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in served.headers]
+    if served.file is None:
+        body = served.body if scope["method"] == "GET" else b""
+        await send({"type": "http.response.start", "status": served.status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+        return served.status
+    try:
+        await send({"type": "http.response.start", "status": served.status, "headers": headers})
+        offset, remaining = served.offset, served.length if scope["method"] == "GET" else 0
+        fd = served.file.fileno()
+        while remaining > 0:
+            chunk = await loop.run_in_executor(_file_pool, os.pread, fd, min(CHUNK_SIZE, remaining), offset)
+            if not chunk:
+                break
+            offset += len(chunk)
+            remaining -= len(chunk)
+            await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+    finally:
+        served.file.close()
+    return served.status
+
+
+async def _disconnected(receive) -> None:
+    """Return once the client has gone away."""
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+async def _changes(scope, receive, send) -> int:
+    """Same behaviour as the Flask /nodes/changes route; waiting happens on the loop."""
+    err = admin_auth_error(_header(scope, b"authorization"))
+    if err is not None:
+        return await _respond(send, err[1], _JSON, json.dumps(err[0]).encode() + b"\n")
+    query = parse_qs(scope["query_string"].decode("latin-1"))
+    try:
+        after = parse_after(_header(scope, b"last-event-id") or query.get("after", [None])[0])
+        timeout = parse_timeout(query.get("timeout", [None])[0])
+    except BadQuery as exc:
+        return await _respond(send, 400, _JSON, json.dumps({"error": str(exc)}).encode() + b"\n")
+    sse = wants_sse(_header(scope, b"accept"), query.get("format", [None])[0])
+
+    loop = asyncio.get_running_loop()
+    wakeup = asyncio.Event()
+
+    def notify():
+        loop.call_soon_threadsafe(wakeup.set)
+
+    gone = asyncio.ensure_future(_disconnected(receive))
+    await loop.run_in_executor(_db_pool, change_feed.subscribe, notify)
+    try:
+        if after is None:
+            after = change_feed.last_id
+            if not sse:
+                return await _respond(send, 200, _JSON, json.dumps(poll_body([], after)).encode() + b"\n")
+        deadline = time.monotonic() + (CHANGE_FEED_MAX_SECONDS if sse else timeout)
+        if sse:
+            headers = [(b"content-type", b"text/event-stream")]
+            headers += [(k.lower().encode(), v.encode()) for k, v in SSE_HEADERS.items()]
+            await send({"type": "http.response.start", "status": 200, "headers": headers})
+            await send({"type": "http.response.body", "body": SSE_PREAMBLE, "more_body": True})
+        changes = await loop.run_in_executor(_db_pool, change_feed.catch_up, after)
+        while True:
+            if not sse and changes != []:
+                break
+            if changes is None:
+                reset = reset_event(change_feed.last_id)
+                await send({"type": "http.response.body", "body": reset.sse, "more_body": True})
+                after, changes = reset.id, []
+            if changes:
+                await send({"type": "http.response.body", "body": b"".join(c.sse for c in changes), "more_body": True})
+                after = changes[-1].id
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            wakeup.clear()
+            changes = change_feed.since(after)
+            if changes == []:
+                waiter = asyncio.ensure_future(wakeup.wait())
+                await asyncio.wait({waiter, gone}, timeout=min(KEEPALIVE_SECONDS, remaining),
+                                   return_when=asyncio.FIRST_COMPLETED)
+                waiter.cancel()
+                if gone.done():
+                    return 200
+                changes = change_feed.since(after)
+                if changes == [] and sse and time.monotonic() < deadline:
+                    await send({"type": "http.response.body", "body": SSE_KEEPALIVE, "more_body": True})
+            if changes is None:
+                changes = await loop.run_in_executor(_db_pool, change_feed.catch_up, after)
+        if sse:
+            await send({"type": "http.response.body", "body": b""})
+            return 200
+        return await _respond(send, 200, _JSON, json.dumps(poll_body(changes, after)).encode() + b"\n")
+    finally:
+        gone.cancel()
+        change_feed.unsubscribe(notify)
+
+
+_NATIVE = {"/health": _health, "/ready": _ready, "/chain": _chain, "/boot": _boot}
+
+
+def _wsgi_environ(scope, body) -> dict:
+    """Translate an ASGI HTTP scope into a WSGI environ (PEP 3333)."""
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client")
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope["query_string"].decode("latin-1"),
+        "SERVER_NAME": str(server[0]),
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0] if client else "",
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": body,
+        # The body ends where the client's does, so Flask may read to EOF even
+        # when the client sent no Content-Length (chunked uploads).
+        "wsgi.input_terminated": True,
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for raw_key, raw_value in scope["headers"]:
+        key = raw_key.decode("latin-1").upper().replace("-", "_")
+        value = raw_value.decode("latin-1")
+        if key in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            environ[key] = value
+            continue
+        key = f"HTTP_{key}"
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+class _RequestBody(io.RawIOBase):
+    """
+    wsgi.input fed from ASGI receive() while the Flask app runs, so a streamed
+    upload (POST /nodes/bulk, POST /restore) is applied as it arrives. pump()
+    runs on the loop and stays at most _BODY_AHEAD chunks ahead of the app's
+    reads, which block in the admin pool thread on a queue. A client that
+    disconnects ends the body early.
+    """
+
+    def __init__(self, loop) -> None:
+        self._loop = loop
+        self._chunks: queue.Queue = queue.Queue()
+        self._credit = asyncio.Semaphore(_BODY_AHEAD)
+        self._buffer = b""
+        self._done = False
+
+    async def pump(self, receive) -> None:
+        try:
+            more = True
+            while more:
+                await self._credit.acquire()
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    return
+                if message.get("body"):
+                    self._chunks.put(message["body"])
+                else:
+                    self._credit.release()
+                more = message.get("more_body", False)
+        finally:
+            self._chunks.put(_EOF)
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        if not self._buffer and not self._done:
+            chunk = self._chunks.get()
+            if chunk is _EOF:
+                self._done = True
+            else:
+                self._buffer = chunk
+                self._loop.call_soon_threadsafe(self._credit.release)
+        n = min(len(buffer), len(self._buffer))
+        buffer[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        return n
+
+
+async def _wsgi(scope, receive, send) -> None:
+    """
+    Run the Flask app for this request on the admin pool, feeding it the
+    request body as it arrives and streaming its output.
+    """
+    loop = asyncio.get_running_loop()
+    raw = _RequestBody(loop)
+    pump = asyncio.ensure_future(raw.pump(receive))
+    body = io.BufferedReader(raw)
+
+    started = {}
+    written = []  # write() output, sent ahead of the iterable's chunks
+
+    def write(data):
+        if data:
+            written.append(bytes(data))
+
+    def start_response(status, headers, exc_info=None):
+        started["status"] = int(status.split(" ", 1)[0])
+        started["headers"] = [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers]
+        return write
+
+    async def send_written():
+        while written:
+            await send({"type": "http.response.body", "body": written.pop(0), "more_body": True})
+
+    done = object()
+    # One context for the whole response: the pool may run each next() on a
+    # different thread, and stream_with_context() pops in the context it pushed.
+    context = contextvars.copy_context()
+    try:
+        result = await loop.run_in_executor(
+            _admin_pool, context.run, flask_app, _wsgi_environ(scope, body), start_response
+        )
+        try:
+            iterator = iter(result)
+            chunk = await loop.run_in_executor(_admin_pool, context.run, next, iterator, done)
+            await send({"type": "http.response.start", "status": started["status"], "headers": started["headers"]})
+            while chunk is not done:
+                await send_written()
+                if chunk:
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+                chunk = await loop.run_in_executor(_admin_pool, context.run, next, iterator, done)
+            await send_written()
+            await send({"type": "http.response.body", "body": b""})
+        finally:
+            close = getattr(result, "close", None)
+            if close is not None:
+                await loop.run_in_executor(_admin_pool, context.run, close)
+    finally:
+        pump.cancel()
+
+
+async def _lifespan(receive, send) -> None:
+    """Flush buffered last_seen and boot journal writes when the server shuts down."""
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await asyncio.get_running_loop().run_in_executor(_db_pool, last_seen_buffer.flush)
+            await asyncio.get_running_loop().run_in_executor(_db_pool, boot_journal.flush)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send) -> None:
+    """ASGI application callable."""
+    if scope["type"] == "lifespan":
+        await _lifespan(receive, send)
+        return
+    if scope["type"] != "http":
+        return
+    if scope["method"] == "GET" and scope["path"] == CHANGES_ROUTE:
+        # Counted but not timed: a stream's duration is not a latency.
+        status = await _changes(scope, receive, send)
+        HTTP_REQUESTS.inc(CHANGES_ROUTE, "GET", str(status))
+        return
+    route = handler = None
+    if scope["method"] == "GET":
+        route, handler = scope["path"], _NATIVE.get(scope["path"])
+    if scope["method"] in ("GET", "HEAD") and scope["path"].startswith(_FILES_PREFIX):
+        route, handler = _FILES_ROUTE, _files
+    if handler is not None:
+        # Bridged requests are timed by the Flask hooks; native ones here.
+        started = time.perf_counter()
+        status = await handler(scope, send)
+        HTTP_LATENCY.observe(time.perf_counter() - started, route)
+        HTTP_REQUESTS.inc(route, scope["method"], str(status))
+    else:
+        await _wsgi(scope, receive, send)
@@ -0,0 +1,442 @@
+"""
+Backup, export and restore of the node database: GET /backup, GET /export and
+POST /restore (routes/backup.py), and the same from the command line:
+
+    python -m app.backup backup /data/pxe-backup.db
+    python -m app.backup export /data/pxe-export.ndjson.gz   (or .csv / .csv.gz)
+    python -m app.backup restore /data/pxe-export.ndjson.gz
+
+backup_sqlite() copies the live SQLite file with SQLite's online backup API,
+BACKUP_STEP_PAGES pages per step with BACKUP_STEP_PAUSE_SECONDS between steps,
+so the copy never holds a lock for long and /boot writers get in between. The
+result is a consistent snapshot: when another connection writes mid-copy,
+SQLite restarts the copy, and after a few restarts it is finished in one step.
+
+export_chunks() streams app_config, boot_profiles and nodes (in that order, so
+a restore sees profiles before the nodes using them) as NDJSON or CSV, read
+from one snapshot through a server-side cursor and optionally gzipped on the
+fly, so memory stays bounded whatever the fleet size. restore() reads the same
+formats (gzip is detected) as a stream and upserts RESTORE_CHUNK rows per
+transaction, like POST /nodes/bulk: restored nodes bump the boot generation and
+nodes version and appear on the change feed. Nodes missing from the export are
+left alone. app_config counters that describe the live database (versions,
+generations, the init fingerprint) are never overwritten.
+"""
+
+import argparse
+import csv
+import io
+import json
+import logging
+import os
+import sqlite3
+import sys
+import time
+import zlib
+from datetime import datetime, timezone
+
+from sqlalchemy import bindparam, select
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.boot_cache import BOOT_GENERATION_KEY, boot_cache
+from app.boot_profiles import PROFILE_FIELDS, PROFILE_NAME_PATTERN, boot_profiles, validate_profile_field
+from app.change_feed import record_changes
+from app.config import BACKUP_STEP_PAGES, BACKUP_STEP_PAUSE_SECONDS
+from app.db import IS_SQLITE, NODES_VERSION_KEY, bump_counter, dialect_insert, engine
+from app.models import AppConfig, BootProfile, Node
+from app.rollout import ADMISSIONS_KEY, GROUP_NAME_PATTERN
+from app.routes.boot import validate_local_boot_script
+from app.routes.common import normalize_mac
+from app.startup import INIT_FINGERPRINT_KEY, prepare_database
+
+logger = logging.getLogger(__name__)
+
+# Exported tables in restore order, with their columns and key.
+TABLES = {
+    "app_config": (AppConfig, ("key", "value")),
+    "boot_profiles": (BootProfile, ("name", *PROFILE_FIELDS, "updated_at")),
+    "nodes": (
+        Node,
+        (
+            "mac", "reinstall", "local_boot_script", "boot_profile", "install_group", "install_started_at",
+            "last_seen", "created_at",
+        ),
+    ),
+}
+# One CSV layout for every table: a row fills the columns of its table.
+CSV_COLUMNS = ("table", *dict.fromkeys(column for _, columns in TABLES.values() for column in columns))
+
+# app_config rows that describe the live database rather than its contents.
+_LOCAL_KEYS = frozenset({NODES_VERSION_KEY, BOOT_GENERATION_KEY, ADMISSIONS_KEY, INIT_FINGERPRINT_KEY})
+_TRUE = {"1", "true", "yes"}
+_FALSE = {"0", "false", "no"}
+
+# Copy restarts (another connection wrote mid-copy) before the rest is copied in one step.
+_MAX_RESTARTS = 3
+# Rows per server-side cursor batch (export) and per transaction (restore).
+EXPORT_BATCH = 1000
+RESTORE_CHUNK = 1000
+_READ_SIZE = 64 * 1024
+_MAX_LINE = 64 * 1024
+
+
+class BackupError(Exception):
+    """The requested backup cannot be taken (e.g. not a SQLite database)."""
+
+
+class _Restarted(Exception):
+    """Raised from the backup progress callback when SQLite restarted the copy."""
+
+
+def backup_sqlite(dest: str, pages: int = BACKUP_STEP_PAGES, pause: float = BACKUP_STEP_PAUSE_SECONDS) -> dict:
+    """
+    Copy the live SQLite database to dest (written as dest.partial, then
+    renamed). Returns {"pages", "restarts", "seconds"}. Blocking; raises
+    BackupError on PostgreSQL, where pg_dump is the tool for this.
+    """
+    if not IS_SQLITE:
+        raise BackupError("online backup is for SQLite; use pg_dump on PostgreSQL (GET /export works on both)")
+    started = time.perf_counter()
+    partial = f"{dest}.partial"
+    step, restarts, total = max(pages, 1), 0, 0
+    try:
+        with engine.connect() as conn:
+            source = conn.connection.driver_connection
+            while True:
+                copied = 0
+
+                def progress(status, remaining, count):
+                    nonlocal copied, total
+                    total = count
+                    if count - remaining <= copied:  # no headway: the copy started over
+                        raise _Restarted
+                    copied = count - remaining
+                    if pause > 0 and remaining:
+                        time.sleep(pause)
+
+                target = sqlite3.connect(partial)
+                try:
+                    source.backup(target, pages=step, progress=progress)
+                except _Restarted:
+                    restarts += 1
+                    if restarts >= _MAX_RESTARTS:
+                        step = -1
+                    continue
+                finally:
+                    target.close()
+                break
+        os.replace(partial, dest)
+    except BaseException:
+        if os.path.exists(partial):
+            os.unlink(partial)
+        raise
+    seconds = time.perf_counter() - started
+    logger.info("backup: copied %d pages to %s in %.2fs (%d restarts)", total, dest, seconds, restarts)
+    return {"pages": total, "restarts": restarts, "seconds": round(seconds, 3)}
+
+
+def _json_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _rows(fmt: str):
+    """Yield text chunks of every exported row, read from one snapshot, EXPORT_BATCH rows at a time."""
+    conn = engine.connect()
+    try:
+        if IS_SQLITE:
+            # pysqlite would run each SELECT in its own implicit snapshot.
+            conn.exec_driver_sql("BEGIN")
+        else:
+            conn = conn.execution_options(isolation_level="REPEATABLE READ")
+            conn.begin()
+        if fmt == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer, lineterminator="\n")
+            writer.writerow(CSV_COLUMNS)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        for table, (model, columns) in TABLES.items():
+            stmt = select(*(getattr(model, column) for column in columns)).order_by(getattr(model, columns[0]))
+            result = conn.execution_options(yield_per=EXPORT_BATCH).execute(stmt)
+            for batch in result.partitions():
+                if fmt == "csv":
+                    for row in batch:
+                        fields = dict(zip(columns, row))
+                        writer.writerow([table, *(_csv_value(fields.get(column)) for column in CSV_COLUMNS[1:])])
+                    yield buffer.getvalue()
+                    buffer.seek(0)
+                    buffer.truncate()
+                else:
+                    yield "".join(
+                        json.dumps({"table": table, **{c: _json_value(v) for c, v in zip(columns, row)}}) + "\n"
+                        for row in batch
+                    )
+    finally:
+        conn.close()
+
+
+def _csv_value(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return _json_value(value)
+
+
+def export_chunks(fmt: str = "ndjson", compress: bool = True):
+    """Yield the export as bytes: NDJSON or CSV (fmt), gzipped when compress."""
+    if not compress:
+        for text in _rows(fmt):
+            yield text.encode("utf-8")
+        return
+    gzip = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for text in _rows(fmt):
+        data = gzip.compress(text.encode("utf-8"))
+        if data:
+            yield data
+    yield gzip.flush()
+
+
+def iter_lines(read):
+    """
+    Yield the lines (with their newline) of a byte stream given by read(n),
+    gunzipping it when it starts with the gzip magic. Output is inflated in
+    bounded pieces, so a small compressed body cannot balloon in memory.
+    """
+    chunk = read(_READ_SIZE)
+    inflate = zlib.decompressobj(31) if chunk[:2] == b"\x1f\x8b" else None
+    pending = b""
+    while chunk:
+        while chunk:
+            if inflate is None:
+                data, chunk = chunk, b""
+            else:
+                data = inflate.decompress(chunk, _READ_SIZE)
+                chunk = inflate.unconsumed_tail
+            pending += data
+            *lines, pending = pending.split(b"\n")
+            for line in lines:
+                yield line + b"\n"
+            if len(pending) > _MAX_LINE:
+                raise ValueError(f"line longer than {_MAX_LINE} bytes")
+        chunk = read(_READ_SIZE)
+    if pending:
+        yield pending
+
+
+def _ndjson_records(lines):
+    """(line_number, record) per non-blank line; record is an error string when unparsable."""
+    for number, raw in enumerate(lines, 1):
+        if not raw.strip():
+            continue
+        try:
+            record = json.loads(raw)
+        except ValueError:
+            yield number, "line is not valid JSON"
+            continue
+        yield number, record if isinstance(record, dict) else "line must be a JSON object"
+
+
+def _csv_records(lines):
+    """(line_number, record) per CSV row; empty cells are null."""
+    reader = csv.DictReader(raw.decode("utf-8", errors="replace") for raw in lines)
+    if reader.fieldnames is None or "table" not in reader.fieldnames:
+        yield 1, "CSV header must include a 'table' column"
+        return
+    for row in reader:
+        yield reader.line_num, {key: (value if value != "" else None) for key, value in row.items() if key}
+
+
+class _BadRecord(ValueError):
+    """One restore line failed validation; the message goes into its result."""
+
+
+def _datetime(column: str, value) -> datetime | None:
+    if value is None:
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        raise _BadRecord(f"'{column}' must be an ISO-8601 timestamp") from None
+    if parsed.tzinfo is None:
+        raise _BadRecord(f"'{column}' must include a UTC offset")
+    return parsed
+
+
+def _bool(column: str, value) -> bool:
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.strip().lower() in _TRUE | _FALSE:
+        return value.strip().lower() in _TRUE
+    raise _BadRecord(f"'{column}' must be true or false")
+
+
+def _params(table: str, record: dict, profiles: set[str]) -> dict:
+    """Validate one record with the same rules as the API and return its statement parameters."""
+    if table == "app_config":
+        key, value = record.get("key"), record.get("value")
+        if not isinstance(key, str) or not 0 < len(key) <= 64 or not isinstance(value, str) or len(value) > 256:
+            raise _BadRecord("app_config needs a string key (at most 64) and value (at most 256)")
+        return {"b_key": key, "b_value": value}
+    if table == "boot_profiles":
+        name = record.get("name")
+        if not isinstance(name, str) or not PROFILE_NAME_PATTERN.match(name):
+            raise _BadRecord("invalid profile name")
+        params = {"b_name": name}
+        for field in PROFILE_FIELDS:
+            problem = validate_profile_field(field, record.get(field))
+            if problem:
+                raise _BadRecord(problem)
+            params[f"b_{field}"] = record.get(field)
+        params["b_updated_at"] = _datetime("updated_at", record.get("updated_at")) or datetime.now(timezone.utc)
+        return params
+    mac = normalize_mac(record.get("mac"))
+    if not mac:
+        raise _BadRecord("invalid or missing mac")
+    script, profile, group = record.get("local_boot_script"), record.get("boot_profile"), record.get("install_group")
+    if script is not None and (not isinstance(script, str) or not validate_local_boot_script(script.strip())):
+        raise _BadRecord("invalid local boot script")
+    if profile is not None and profile not in profiles:
+        raise _BadRecord(f"unknown profile {profile!r}")
+    if group is not None and (not isinstance(group, str) or not GROUP_NAME_PATTERN.match(group)):
+        raise _BadRecord("invalid install group")
+    return {
+        "b_mac": mac,
+        "b_reinstall": _bool("reinstall", record.get("reinstall", False)),
+        "b_local_boot_script": script.strip() if script is not None else None,
+        "b_boot_profile": profile,
+        "b_install_group": group,
+        "b_install_started_at": _datetime("install_started_at", record.get("install_started_at")),
+        "b_last_seen": _datetime("last_seen", record.get("last_seen")),
+        "b_created_at": _datetime("created_at", record.get("created_at")) or datetime.now(timezone.utc),
+    }
+
+
+def _upsert(model, columns):
+    """INSERT ... ON CONFLICT DO UPDATE of every column, with b_<column> parameters; built once at import."""
+    stmt = dialect_insert(model).values({column: bindparam(f"b_{column}") for column in columns})
+    return stmt.on_conflict_do_update(
+        index_elements=[columns[0]], set_={column: stmt.excluded[column] for column in columns[1:]}
+    )
+
+
+_UPSERTS = {table: _upsert(model, columns) for table, (model, columns) in TABLES.items()}
+
+
+def _apply(table: str, params: list[dict]) -> None:
+    """Upsert one chunk of one table in a single transaction, with the bumps and changes its table needs."""
+    now = datetime.now(timezone.utc)
+    with engine.begin() as conn:
+        conn.execute(_UPSERTS[table], params)
+        if table == "boot_profiles":
+            bump_counter(conn, BOOT_GENERATION_KEY)
+        elif table == "nodes":
+            bump_counter(conn, BOOT_GENERATION_KEY)
+            bump_counter(conn, NODES_VERSION_KEY)
+            changes = [
+                ("updated", p["b_mac"], {c: p[f"b_{c}"] for c in TABLES["nodes"][1][1:]}) for p in params
+            ]
+            record_changes(conn, changes, now)
+    if table == "boot_profiles":
+        boot_profiles.invalidate()
+    elif table == "nodes":
+        boot_cache.invalidate_many(p["b_mac"] for p in params)
+
+
+def restore(lines, fmt: str = "ndjson"):
+    """
+    Apply an export read from lines (bytes, see iter_lines()). Yields a
+    {"line", "ok": false, "error"} dict per rejected line and finally
+    {"summary": {...}} with the rows restored per table, skipped and failed.
+    """
+    with engine.connect() as conn:
+        profiles = set(conn.scalars(select(BootProfile.name)))
+    counts = dict.fromkeys(TABLES, 0)
+    skipped = failed = 0
+    chunk_table, chunk = None, []
+
+    def flush():
+        nonlocal failed
+        if not chunk:
+            return None
+        try:
+            _apply(chunk_table, [params for _, params in chunk])
+        except SQLAlchemyError as exc:
+            logger.warning("restore: chunk of %d %s rows failed: %s", len(chunk), chunk_table, exc)
+            failed += len(chunk)
+            return [{"line": number, "ok": False, "error": "database error; chunk rolled back"} for number, _ in chunk]
+        counts[chunk_table] += len(chunk)
+        if chunk_table == "boot_profiles":
+            profiles.update(params["b_name"] for _, params in chunk)
+        return None
+
+    records = _csv_records(lines) if fmt == "csv" else _ndjson_records(lines)
+    for number, record in records:
+        try:
+            if isinstance(record, str):
+                raise _BadRecord(record)
+            table = record.get("table")
+            if table not in TABLES:
+                raise _BadRecord(f"unknown table {table!r}; expected one of {', '.join(TABLES)}")
+            if table != chunk_table or len(chunk) >= RESTORE_CHUNK:
+                yield from flush() or ()
+                chunk_table, chunk = table, []
+            if table == "app_config" and record.get("key") in _LOCAL_KEYS:
+                skipped += 1
+                continue
+            chunk.append((number, _params(table, record, profiles)))
+        except _BadRecord as exc:
+            failed += 1
+            yield {"line": number, "ok": False, "error": str(exc)}
+    yield from flush() or ()
+    logger.info("restore: %s restored, %d skipped, %d failed", counts, skipped, failed)
+    yield {"summary": {**counts, "skipped": skipped, "failed": failed}}
+
+
+def _format_of(path: str, fmt: str | None) -> str:
+    return fmt or ("csv" if ".csv" in os.path.basename(path) else "ndjson")
+
+
+def main(argv=None) -> int:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    parser = argparse.ArgumentParser(prog="python -m app.backup", description=__doc__.split("\n\n")[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("backup", help="online copy of the SQLite database").add_argument("dest")
+    for name, target in (("export", "dest"), ("restore", "source")):
+        sub = commands.add_parser(name, help=f"{name} nodes, profiles and app_config (NDJSON or CSV, .gz gzipped)")
+        sub.add_argument(target, help="file path, or - for stdout/stdin")
+        sub.add_argument("--format", choices=("ndjson", "csv"), help="default: from the file name")
+    args = parser.parse_args(argv)
+
+    if args.command == "backup":
+        try:
+            print(json.dumps(backup_sqlite(args.dest)))
+        except BackupError as exc:
+            print(f"Fatal: {exc}", file=sys.stderr)
+            return 1
+        return 0
+    prepare_database()
+    if args.command == "export":
+        fmt = _format_of(args.dest, args.format)
+        out = sys.stdout.buffer if args.dest == "-" else open(args.dest, "wb")
+        try:
+            for data in export_chunks(fmt, compress=args.dest.endswith(".gz")):
+                out.write(data)
+        finally:
+            if out is not sys.stdout.buffer:
+                out.close()
+        return 0
+    fmt = _format_of(args.source, args.format)
+    source = sys.stdin.buffer if args.source == "-" else open(args.source, "rb")
+    try:
+        for result in restore(iter_lines(source.read), fmt):
+            print(json.dumps(result))
+    finally:
+        if source is not sys.stdin.buffer:
+            source.close()
+    return 0 if result["summary"]["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
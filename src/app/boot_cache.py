@@ -0,0 +1,196 @@
+"""
+In-process read-through cache of boot decisions for /boot.
+
+Maps a normalized MAC to the (reinstall, local_boot_script, boot_profile)
+triple /boot needs to pick a script, so a boot storm is served from memory instead of one SELECT
+per request. The cache is warmed at startup and filled on misses.
+
+Invalidation has two layers:
+
+- Local: write paths in this process (nodes routes, seed) call invalidate()
+  or clear() right after they commit, so their own changes are visible at once.
+- Cross-process: every write that changes a boot decision also bumps the
+  "boot_generation" counter in app_config (see db.bump_counter) in the same
+  transaction. At most every BOOT_CACHE_POLL_SECONDS the cache asks a dedicated
+  SQLite connection for PRAGMA data_version, which only changes when another
+  connection committed. Only then is the generation row read; if it moved, the
+  whole cache is dropped. Other gunicorn workers and a second container on the
+  same DB file therefore converge within one poll interval. PostgreSQL has no
+  data_version, so there the poll reads the generation row (a primary-key
+  lookup) through the pool every interval.
+
+Other per-process caches that depend on the same data (app.boot_profiles)
+register with add_reset_listener() and are told whenever the whole cache is
+dropped, so they ride on the same invalidation signal.
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.config import BOOT_CACHE_POLL_SECONDS, DATABASE_PATH
+from app.db import IS_SQLITE, SessionLocal, apply_sqlite_profile, engine, read_counter
+from app.models import Node
+
+logger = logging.getLogger(__name__)
+
+# app_config key bumped by every write that changes a boot decision or a boot profile.
+BOOT_GENERATION_KEY = "boot_generation"
+
+BootDecision = tuple[bool, str | None, str | None]
+
+
+class BootCache:
+    """
+    Thread-safe MAC -> BootDecision map with generation-based invalidation.
+    Dict reads are atomic under the GIL, so get() only takes the lock when a
+    poll is due.
+
+    epoch increments on every invalidation. A reader that misses records it
+    before going to the database and passes it back to put(); if anything was
+    invalidated in between, the possibly stale row is not cached.
+    """
+
+    def __init__(self, poll_seconds: float) -> None:
+        self._entries: dict[str, BootDecision] = {}
+        self.epoch = 0
+        self._lock = threading.Lock()
+        self._poll_seconds = poll_seconds
+        self._next_poll = 0.0
+        self._generation: int | None = None
+        self._data_version: int | None = None
+        self._conn: sqlite3.Connection | None = None
+        self._conn_pid: int | None = None
+        self._reset_listeners: list[Callable[[], None]] = []
+
+    def add_reset_listener(self, listener: Callable[[], None]) -> None:
+        """
+        Call listener (with the lock held; keep it trivial) whenever every
+        entry is dropped: clear(), warm(), or a generation change seen by a poll.
+        """
+        self._reset_listeners.append(listener)
+
+    def _reset(self) -> None:
+        """Drop every entry and notify listeners. Caller holds the lock."""
+        self.epoch += 1
+        self._entries.clear()
+        for listener in self._reset_listeners:
+            listener()
+
+    def get(self, mac: str) -> BootDecision | None:
+        """Return the cached decision for mac, or None on a miss."""
+        if time.monotonic() >= self._next_poll:
+            self._poll()
+        return self._entries.get(mac)
+
+    def poll_due(self) -> bool:
+        """True when the next get() will poll the database (the ASGI mode then calls it off the event loop)."""
+        return time.monotonic() >= self._next_poll
+
+    def put(self, mac: str, decision: BootDecision, epoch: int) -> None:
+        """
+        Store the decision read from the database, unless an invalidation
+        happened since the caller sampled epoch.
+        """
+        with self._lock:
+            if epoch == self.epoch:
+                self._entries[mac] = decision
+
+    def invalidate(self, mac: str) -> None:
+        """Drop one MAC after a local write; the next /boot re-reads it."""
+        with self._lock:
+            self.epoch += 1
+            self._entries.pop(mac, None)
+
+    def invalidate_many(self, macs) -> None:
+        """Drop several MACs after one bulk write, under one lock and one epoch bump."""
+        with self._lock:
+            self.epoch += 1
+            for mac in macs:
+                self._entries.pop(mac, None)
+
+    def clear(self) -> None:
+        """Drop every entry (bulk writes, seed, tests)."""
+        with self._lock:
+            self._reset()
+            self._generation = None
+            self._data_version = None
+            self._next_poll = 0.0
+
+    def warm(self) -> None:
+        """
+        Load every node's decision in one query so the first wave of boots
+        after startup is already served from memory. Records the generation
+        the snapshot corresponds to.
+        """
+        db = SessionLocal()
+        try:
+            generation = read_counter(db, BOOT_GENERATION_KEY)
+            rows = db.query(Node.mac, Node.reinstall, Node.local_boot_script, Node.boot_profile).all()
+        finally:
+            db.close()
+        with self._lock:
+            self._reset()
+            self._entries = {mac: (reinstall, script, profile) for mac, reinstall, script, profile in rows}
+            self._generation = generation
+            self._data_version = None
+            self._next_poll = 0.0
+        logger.info("boot cache: warmed with %d nodes", len(rows))
+
+    def _connection(self) -> sqlite3.Connection:
+        """
+        Dedicated connection for data_version polling. data_version is per
+        connection, so it cannot come from the pool. Reopened after fork so a
+        gunicorn worker never shares its parent's handle.
+        """
+        pid = os.getpid()
+        if self._conn is None or self._conn_pid != pid:
+            self._conn = sqlite3.connect(DATABASE_PATH, check_same_thread=False)
+            apply_sqlite_profile(self._conn)
+            self._conn_pid = pid
+        return self._conn
+
+    def _poll(self) -> None:
+        """
+        Check whether another connection committed a boot-decision change
+        since the last poll; drop the cache if so. Any error (e.g. tables
+        recreated underneath us) also drops it, which is always safe.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if now < self._next_poll:
+                return
+            self._next_poll = now + self._poll_seconds
+            try:
+                if IS_SQLITE:
+                    conn = self._connection()
+                    data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+                    if data_version == self._data_version:
+                        return
+                    self._data_version = data_version
+                    row = conn.execute(
+                        "SELECT value FROM app_config WHERE key = ?", (BOOT_GENERATION_KEY,)
+                    ).fetchone()
+                    generation = int(row[0]) if row else 0
+                else:
+                    with engine.connect() as conn:
+                        generation = read_counter(conn, BOOT_GENERATION_KEY)
+            except (sqlite3.Error, SQLAlchemyError, ValueError) as exc:
+                logger.warning("boot cache: poll failed, dropping cache: %s", exc)
+                self._reset()
+                self._generation = None
+                self._data_version = None
+                return
+            if generation != self._generation:
+                if self._generation is not None:
+                    logger.debug("boot cache: generation %s -> %s; dropping", self._generation, generation)
+                self._reset()
+                self._generation = generation
+
+
+boot_cache = BootCache(BOOT_CACHE_POLL_SECONDS)
@@ -0,0 +1,224 @@
+"""
+Boot event journal: an append-only record of every script /boot serves.
+
+Node.last_seen keeps only the latest boot. The journal answers "how often does
+this node PXE boot" and "how many installers did we serve yesterday". /boot
+appends (mac, client ip, kind, time) to an in-memory list; a daemon thread
+writes the batch every BOOT_JOURNAL_FLUSH_SECONDS (sooner once
+BOOT_JOURNAL_FLUSH_MAX events are pending) in one transaction:
+
+- the raw rows go to boot_events (one multi-row INSERT), and
+- per (hour/day, node, kind) counts are added to boot_rollups with one upsert
+  per distinct bucket in the batch, so a boot storm of N events costs a
+  handful of rollup writes, not N.
+
+History endpoints (routes/history.py) read only boot_rollups, so their cost
+depends on the number of buckets asked for, not on the size of the journal.
+
+Retention: the same thread deletes raw events older than
+BOOT_EVENTS_RETENTION_DAYS and hourly rollups older than
+BOOT_HOURLY_ROLLUP_RETENTION_DAYS about once an hour, PRUNE_CHUNK rows per
+transaction with a short pause between chunks, so pruning millions of rows
+never holds the write lock long enough to stall /boot. Daily rollups are kept.
+
+Like the last_seen buffer, a failed flush puts the batch back and retries;
+the backlog is capped so a long outage cannot exhaust memory.
+"""
+
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import bindparam, insert
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.config import (
+    BOOT_EVENTS_RETENTION_DAYS,
+    BOOT_HOURLY_ROLLUP_RETENTION_DAYS,
+    BOOT_JOURNAL_FLUSH_MAX,
+    BOOT_JOURNAL_FLUSH_SECONDS,
+)
+from app.db import delete_in_chunks, dialect_insert, engine
+from app.models import BootEvent, BootRollup
+
+logger = logging.getLogger(__name__)
+
+PERIOD_SECONDS = {"hour": 3600, "day": 86400}
+
+# Rows deleted per pruning transaction, and the pause between transactions.
+PRUNE_CHUNK = 5000
+_PRUNE_PAUSE = 0.05
+_PRUNE_EVERY = 3600.0
+
+# Pending events kept while the database is unavailable, in multiples of the flush size.
+_BACKLOG_FACTOR = 20
+
+_INSERT_EVENTS = insert(BootEvent)
+
+_insert_rollup = dialect_insert(BootRollup).values(
+    period=bindparam("b_period"),
+    bucket=bindparam("b_bucket"),
+    mac=bindparam("b_mac"),
+    kind=bindparam("b_kind"),
+    count=bindparam("b_count"),
+)
+_UPSERT_ROLLUP = _insert_rollup.on_conflict_do_update(
+    index_elements=[BootRollup.period, BootRollup.bucket, BootRollup.mac, BootRollup.kind],
+    set_={"count": BootRollup.count + _insert_rollup.excluded.count},
+)
+
+
+def bucket_start(timestamp: float, period: str) -> datetime:
+    """UTC start of the hour or day containing the POSIX timestamp."""
+    seconds = PERIOD_SECONDS[period]
+    return datetime.fromtimestamp(int(timestamp) // seconds * seconds, timezone.utc)
+
+
+class BootJournal:
+    """
+    Pending (mac, client_ip, kind, timestamp) tuples, flushed in batches by a
+    daemon thread that is started lazily (and restarted after fork) on the
+    first record().
+    """
+
+    def __init__(self, interval: float, max_size: int, events_days: float, hourly_days: float) -> None:
+        self._interval = interval
+        self._max_size = max_size
+        self._events_days = events_days
+        self._hourly_days = hourly_days
+        self._pending: list[tuple[str, str | None, str, float]] = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread_pid: int | None = None
+        self._next_prune = 0.0
+
+    def record(self, mac: str, client_ip: str | None, kind: str) -> None:
+        """
+        Append one served script. With a non-positive interval the write
+        happens synchronously instead.
+        """
+        with self._lock:
+            self._pending.append((mac, client_ip or None, kind, time.time()))
+            pending = len(self._pending)
+        if self._interval <= 0:
+            self.flush()
+            return
+        if self._thread_pid != os.getpid():
+            self._start()
+        if pending >= self._max_size:
+            self._wake.set()
+
+    @property
+    def write_through(self) -> bool:
+        """True when record() writes synchronously (a non-positive interval)."""
+        return self._interval <= 0
+
+    def pending(self) -> int:
+        """Number of events waiting to be written."""
+        return len(self._pending)
+
+    def discard(self) -> None:
+        """Drop everything pending without writing it (tests)."""
+        with self._lock:
+            self._pending.clear()
+
+    def flush(self) -> int:
+        """
+        Write all pending events and their rollup increments in one
+        transaction. Returns the number of events written (0 when nothing was
+        pending or the write failed).
+        """
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return 0
+                batch, self._pending = self._pending, []
+            events = []
+            counts: Counter[tuple[str, float, str, str]] = Counter()
+            for mac, client_ip, kind, timestamp in batch:
+                events.append({
+                    "mac": mac,
+                    "client_ip": client_ip,
+                    "kind": kind,
+                    "booted_at": datetime.fromtimestamp(timestamp, timezone.utc),
+                })
+                for period, seconds in PERIOD_SECONDS.items():
+                    counts[(period, int(timestamp) // seconds * seconds, mac, kind)] += 1
+            rollups = [
+                {
+                    "b_period": period,
+                    "b_bucket": datetime.fromtimestamp(start, timezone.utc),
+                    "b_mac": mac,
+                    "b_kind": kind,
+                    "b_count": count,
+                }
+                for (period, start, mac, kind), count in counts.items()
+            ]
+            try:
+                with engine.begin() as conn:
+                    conn.execute(_INSERT_EVENTS, events)
+                    conn.execute(_UPSERT_ROLLUP, rollups)
+            except SQLAlchemyError as exc:
+                logger.warning("boot journal: flush of %d events failed, will retry: %s", len(batch), exc)
+                with self._lock:
+                    self._pending = batch + self._pending
+                    overflow = len(self._pending) - self._max_size * _BACKLOG_FACTOR
+                    if overflow > 0:
+                        del self._pending[:overflow]
+                        logger.warning("boot journal: backlog full, dropped the %d oldest events", overflow)
+                return 0
+            return len(batch)
+
+    def prune(self, now: datetime | None = None) -> int:
+        """Apply the retention windows; returns the number of rows deleted."""
+        now = now or datetime.now(timezone.utc)
+        deleted = 0
+        if self._events_days > 0:
+            cutoff = now - timedelta(days=self._events_days)
+            deleted += delete_in_chunks(BootEvent, BootEvent.booted_at < cutoff, chunk=PRUNE_CHUNK, pause=_PRUNE_PAUSE)
+        if self._hourly_days > 0:
+            cutoff = now - timedelta(days=self._hourly_days)
+            deleted += delete_in_chunks(
+                BootRollup, BootRollup.period == "hour", BootRollup.bucket < cutoff, chunk=PRUNE_CHUNK, pause=_PRUNE_PAUSE
+            )
+        if deleted:
+            logger.info("boot journal: pruned %d rows past retention", deleted)
+        return deleted
+
+    def _start(self) -> None:
+        """Start the flusher thread for this process (again after a fork)."""
+        with self._lock:
+            pid = os.getpid()
+            if self._thread_pid == pid:
+                return
+            self._thread_pid = pid
+            self._wake = threading.Event()
+            thread = threading.Thread(target=self._run, name="boot-journal", daemon=True)
+            thread.start()
+
+    def _run(self) -> None:
+        """Flush every interval or when signalled; prune about once an hour."""
+        while True:
+            self._wake.wait(self._interval)
+            self._wake.clear()
+            try:
+                self.flush()
+                if time.monotonic() >= self._next_prune:
+                    self._next_prune = time.monotonic() + _PRUNE_EVERY
+                    self.prune()
+            except Exception:  # never let the flusher die
+                logger.exception("boot journal: unexpected error")
+
+
+boot_journal = BootJournal(
+    BOOT_JOURNAL_FLUSH_SECONDS,
+    BOOT_JOURNAL_FLUSH_MAX,
+    BOOT_EVENTS_RETENTION_DAYS,
+    BOOT_HOURLY_ROLLUP_RETENTION_DAYS,
+)
+atexit.register(boot_journal.flush)
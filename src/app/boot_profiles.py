@@ -0,0 +1,145 @@
+"""
+Compiled boot profiles for the /boot installer script.
+
+A BootProfile row (app.models) holds ${...} templates for the UKI URL, ISO URL,
+autoinstall seed URL and extra kernel cmdline. This module keeps every profile
+in memory already compiled (app.templating), so rendering the installer script
+on the hot path is only slot filling; nothing is parsed or read from config
+per request. The env-configured PXE_* URLs form the default profile, used for
+nodes without a profile and for any field a profile leaves null.
+
+The registry is loaded lazily and reloaded after any change: profile writes in
+this process call invalidate() directly, and writes from other workers or
+containers bump the boot generation, which makes the boot cache drop itself
+and, through its reset listener, marks this registry stale as well.
+"""
+
+import logging
+import re
+import threading
+from dataclasses import dataclass
+
+from app.boot_cache import boot_cache
+from app.config import PXE_AUTOINSTALL_URL, PXE_UBUNTU_ISO_URL, PXE_UKI_URL
+from app.db import SessionLocal
+from app.models import BootProfile
+from app.templating import CompiledTemplate, compile_template
+
+logger = logging.getLogger(__name__)
+
+PROFILE_NAME_PATTERN = re.compile(r"^[A-Za-z0-9][A-Za-z0-9._-]{0,63}$")
+
+# Fields a profile may set; each is a template and null inherits the default.
+PROFILE_FIELDS = ("uki_url", "iso_url", "autoinstall_url", "extra_cmdline")
+_MAX_FIELD_LENGTH = 512
+# iPXE splits the chain line on whitespace and treats these words as operators.
+_IPXE_OPERATORS = {"||", "&&"}
+
+
+@dataclass(frozen=True)
+class CompiledProfile:
+    """One profile with every field compiled and defaults already applied."""
+
+    name: str | None
+    uki_url: CompiledTemplate
+    iso_url: CompiledTemplate
+    autoinstall_url: CompiledTemplate
+    extra_cmdline: CompiledTemplate
+
+
+DEFAULT_PROFILE = CompiledProfile(
+    name=None,
+    uki_url=compile_template(PXE_UKI_URL),
+    iso_url=compile_template(PXE_UBUNTU_ISO_URL or ""),
+    autoinstall_url=compile_template(PXE_AUTOINSTALL_URL),
+    extra_cmdline=compile_template(""),
+)
+
+
+def compile_profile(row: BootProfile) -> CompiledProfile:
+    """Compile a BootProfile row, filling null fields from DEFAULT_PROFILE."""
+    compiled = {}
+    for field in PROFILE_FIELDS:
+        value = getattr(row, field)
+        compiled[field] = compile_template(value) if value is not None else getattr(DEFAULT_PROFILE, field)
+    return CompiledProfile(name=row.name, **compiled)
+
+
+def validate_profile_field(field: str, value) -> str | None:
+    """
+    Return an error message when value is not acceptable for field, else None.
+    Values are written verbatim into the iPXE script, so URLs may not contain
+    whitespace and nothing may contain control characters (a newline would
+    start a new iPXE command) or bare iPXE operators.
+    """
+    if value is None:
+        return None
+    if not isinstance(value, str):
+        return f"'{field}' must be a string or null"
+    if len(value) > _MAX_FIELD_LENGTH:
+        return f"'{field}' must be at most {_MAX_FIELD_LENGTH} characters"
+    if any(ord(ch) < 0x20 or ord(ch) == 0x7F for ch in value):
+        return f"'{field}' must not contain control characters"
+    if field == "extra_cmdline":
+        if _IPXE_OPERATORS.intersection(value.split()):
+            return "'extra_cmdline' must not contain iPXE operators (|| or &&)"
+    elif not value or any(ch.isspace() for ch in value):
+        return f"'{field}' must be a non-empty URL without whitespace"
+    return None
+
+
+class ProfileRegistry:
+    """
+    Process-wide name -> CompiledProfile map, rebuilt from the database on
+    first use after invalidate(). Lookups of a stale registry block on one
+    SELECT; the ASGI mode checks stale and loads off the event loop.
+    """
+
+    def __init__(self) -> None:
+        self._profiles: dict[str, CompiledProfile] | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def stale(self) -> bool:
+        """True when the next get() will read the database."""
+        return self._profiles is None
+
+    def invalidate(self) -> None:
+        """Forget every compiled profile; the next lookup reloads them all."""
+        self._profiles = None
+
+    def load(self) -> dict[str, CompiledProfile]:
+        """Read and compile every profile unless another thread already did."""
+        with self._lock:
+            profiles = self._profiles
+            if profiles is not None:
+                return profiles
+            db = SessionLocal()
+            try:
+                rows = db.query(BootProfile).all()
+                profiles = {row.name: compile_profile(row) for row in rows}
+            finally:
+                db.close()
+            self._profiles = profiles
+            logger.debug("boot profiles: compiled %d profiles", len(profiles))
+            return profiles
+
+    def get(self, name: str | None) -> CompiledProfile:
+        """
+        Compiled profile for name; DEFAULT_PROFILE for None or a name that no
+        longer exists (deleting a profile detaches its nodes anyway).
+        """
+        if name is None:
+            return DEFAULT_PROFILE
+        profiles = self._profiles
+        if profiles is None:
+            profiles = self.load()
+        profile = profiles.get(name)
+        if profile is None:
+            logger.warning("boot profile %r not found; using default", name)
+            return DEFAULT_PROFILE
+        return profile
+
+
+boot_profiles = ProfileRegistry()
+boot_cache.add_reset_listener(boot_profiles.invalidate)
@@ -0,0 +1,297 @@
+"""
+Node change feed behind GET /nodes/changes (routes/changes.py and the native
+ASGI handler).
+
+Writers append NodeChange rows with record_changes() in the same transaction
+as the node write they describe: /boot (node created, or last_seen stamped on
+a cache miss), the last_seen flusher, the nodes routes (reinstall, local boot
+script, boot profile, bulk operations), profile deletion (nodes detached) and
+the seed. The row id is the event id. Call record_changes() after
+bump_counter(NODES_VERSION_KEY): on PostgreSQL that row lock serialises node
+writers, so ids are handed out in commit order and a reader that has seen id N
+has seen every change below it (SQLite serialises writers anyway).
+
+Each process runs one reader, ChangeFeed. While it has subscribers it reads
+the rows after the last id it saw every CHANGE_FEED_POLL_SECONDS (one indexed
+range query, however many clients are connected), keeps the last
+CHANGE_FEED_BACKLOG changes in memory with their SSE frames already encoded,
+and wakes every subscriber. Changes made by other workers and containers
+therefore arrive the same way as this process's own. A client resuming from
+an id older than the in-memory backlog is served from the table once; when
+that id has been pruned (CHANGE_FEED_RETENTION_HOURS) or is unknown (database
+restored) it gets a "reset" event and should re-read GET /nodes.
+"""
+
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.config import (
+    CHANGE_FEED_BACKLOG,
+    CHANGE_FEED_POLL_SECONDS,
+    CHANGE_FEED_RETENTION_HOURS,
+    TIMEZONE,
+)
+from app.db import delete_in_chunks, engine
+from app.models import NodeChange
+
+logger = logging.getLogger(__name__)
+
+# Seconds between SSE comment lines on an idle stream, so proxies keep it open.
+KEEPALIVE_SECONDS = 15.0
+
+# Rows per query when catching up, and the pruning cadence (as in app.boot_journal).
+_READ_BATCH = 1000
+PRUNE_CHUNK = 5000
+_PRUNE_PAUSE = 0.05
+_PRUNE_EVERY = 3600.0
+
+_INSERT_CHANGE = insert(NodeChange)
+_COLUMNS = (NodeChange.id, NodeChange.kind, NodeChange.mac, NodeChange.data, NodeChange.changed_at)
+
+
+def _iso(value: datetime) -> str:
+    return value.astimezone(TIMEZONE).isoformat()
+
+
+def record_changes(conn, changes, now: datetime | None = None) -> None:
+    """
+    Append (kind, mac, fields) changes in the caller's transaction; conn is a
+    Connection or Session. kind is "created", "seen", "updated" or "deleted";
+    fields is a dict of the changed columns or None. Datetimes in fields are
+    written like the API renders them (ISO-8601 in TIMEZONE).
+    """
+    now = now or datetime.now(timezone.utc)
+    rows = [
+        {"kind": kind, "mac": mac, "data": json.dumps(fields, default=_iso) if fields else None, "changed_at": now}
+        for kind, mac, fields in changes
+    ]
+    if rows:
+        conn.execute(_INSERT_CHANGE, rows)
+        change_feed.start()
+
+
+@dataclass(frozen=True)
+class Change:
+    """One change as sent to clients: the JSON object and its SSE frame, encoded once."""
+
+    id: int
+    event: dict
+    sse: bytes
+
+
+def _change(row) -> Change:
+    event = {
+        "id": row.id,
+        "type": row.kind,
+        "mac": row.mac,
+        "at": _iso(row.changed_at),
+        "fields": json.loads(row.data) if row.data else {},
+    }
+    return Change(row.id, event, f"id: {row.id}\nevent: {row.kind}\ndata: {json.dumps(event)}\n\n".encode())
+
+
+def reset_event(last_id: int) -> Change:
+    """Tell a client it missed changes; it should re-read GET /nodes and continue from last_id."""
+    event = {"id": last_id, "type": "reset"}
+    return Change(last_id, event, f"id: {last_id}\nevent: reset\ndata: {json.dumps(event)}\n\n".encode())
+
+
+class ChangeFeed:
+    """
+    Per-process fan-out of node_changes. The ring holds every change with an
+    id in (floor, last_id]; Flask handlers block in wait(), asyncio handlers
+    register a listener that is called after each poll that found changes.
+    A daemon thread (started lazily, again after fork) polls while there are
+    subscribers and prunes old rows about once an hour.
+    """
+
+    def __init__(self, interval: float, backlog: int, retention_hours: float) -> None:
+        self._interval = interval
+        self._backlog = backlog
+        self._retention_hours = retention_hours
+        self._changes: list[Change] = []
+        self._ids: list[int] = []
+        self._floor = 0
+        self._last_id: int | None = None
+        self._cond = threading.Condition()
+        self._poll_lock = threading.Lock()
+        self._listeners: set = set()
+        self._subscribers = 0
+        self._wake = threading.Event()
+        self._thread_pid: int | None = None
+        self._next_prune = 0.0
+
+    @property
+    def last_id(self) -> int:
+        """Id of the newest change this process has read (0 before the first poll)."""
+        return self._last_id or 0
+
+    def subscribe(self, listener=None) -> None:
+        """
+        Count a subscriber (and register listener, if given). The first
+        subscriber of an idle process polls synchronously, so the ring is
+        current before it is read; later ones share the running poller.
+        """
+        self.start()
+        with self._cond:
+            idle = self._subscribers == 0
+            self._subscribers += 1
+            if listener is not None:
+                self._listeners.add(listener)
+        if idle:
+            self.poll()
+
+    def unsubscribe(self, listener=None) -> None:
+        with self._cond:
+            self._subscribers -= 1
+            self._listeners.discard(listener)
+
+    def since(self, after: int) -> list[Change] | None:
+        """
+        Changes after the given id from memory, or None when the ring cannot
+        answer: after is older than the ring or newer than anything read.
+        """
+        with self._cond:
+            return self._since(after)
+
+    def _since(self, after: int) -> list[Change] | None:
+        if self._last_id is None or after < self._floor or after > self._last_id:
+            return None
+        return self._changes[bisect.bisect_right(self._ids, after):]
+
+    def wait(self, after: int, timeout: float) -> list[Change] | None:
+        """
+        Block until there are changes after the given id or timeout passes
+        ([] then). None as in since(). Caller must be subscribed.
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                changes = self._since(after)
+                if changes is None or changes:
+                    return changes
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return []
+                self._cond.wait(remaining)
+
+    def catch_up(self, after: int) -> list[Change] | None:
+        """
+        Changes after the given id, reading the table when the ring cannot
+        answer (blocking; the ASGI handler runs it off the loop). None means
+        the client must be sent a reset: the id was pruned or never existed.
+        """
+        changes = self.since(after)
+        if changes is not None:
+            return changes
+        if after > self.last_id:
+            self.poll()
+            return self.since(after)
+        with engine.connect() as conn:
+            oldest = conn.execute(select(func.min(NodeChange.id))).scalar()
+            rows = conn.execute(
+                select(*_COLUMNS).where(NodeChange.id > after).order_by(NodeChange.id).limit(_READ_BATCH)
+            ).all()
+        if oldest is None or oldest > after + 1:
+            return None
+        return [_change(row) for row in rows]
+
+    def poll(self) -> int:
+        """Read the rows added since the last poll into the ring and wake subscribers; returns how many."""
+        with self._poll_lock:
+            try:
+                with engine.connect() as conn:
+                    if self._last_id is None:
+                        newest = conn.execute(select(func.max(NodeChange.id))).scalar() or 0
+                        with self._cond:
+                            self._floor = self._last_id = newest
+                        return 0
+                    rows = []
+                    while True:
+                        batch = conn.execute(
+                            select(*_COLUMNS)
+                            .where(NodeChange.id > (rows[-1].id if rows else self._last_id))
+                            .order_by(NodeChange.id)
+                            .limit(_READ_BATCH)
+                        ).all()
+                        rows += batch
+                        if len(batch) < _READ_BATCH:
+                            break
+            except SQLAlchemyError as exc:
+                logger.warning("change feed: poll failed: %s", exc)
+                return 0
+            if not rows:
+                return 0
+            changes = [_change(row) for row in rows]
+            with self._cond:
+                self._changes += changes
+                self._ids += [change.id for change in changes]
+                excess = len(self._changes) - self._backlog
+                if excess > 0:
+                    del self._changes[:excess]
+                    del self._ids[:excess]
+                    self._floor = self._ids[0] - 1 if self._ids else changes[-1].id
+                self._last_id = changes[-1].id
+                self._cond.notify_all()
+                listeners = list(self._listeners)
+        for listener in listeners:
+            listener()
+        return len(changes)
+
+    def prune(self, now: datetime | None = None) -> int:
+        """Delete changes older than the retention window; returns the number of rows deleted."""
+        if self._retention_hours <= 0:
+            return 0
+        cutoff = (now or datetime.now(timezone.utc)) - timedelta(hours=self._retention_hours)
+        deleted = delete_in_chunks(
+            NodeChange, NodeChange.changed_at < cutoff, chunk=PRUNE_CHUNK, pause=_PRUNE_PAUSE
+        )
+        if deleted:
+            logger.info("change feed: pruned %d rows past retention", deleted)
+        return deleted
+
+    def reset(self) -> None:
+        """Forget everything read so far (tables recreated: tests, restore); the next poll starts afresh."""
+        with self._cond:
+            self._changes, self._ids = [], []
+            self._floor = 0
+            self._last_id = None
+
+    def start(self) -> None:
+        """Start the poller thread for this process (again after a fork)."""
+        if self._thread_pid == os.getpid():
+            return
+        with self._cond:
+            pid = os.getpid()
+            if self._thread_pid == pid:
+                return
+            self._thread_pid = pid
+            self._wake = threading.Event()
+            thread = threading.Thread(target=self._run, name="change-feed", daemon=True)
+            thread.start()
+
+    def _run(self) -> None:
+        """Poll every interval while anyone is subscribed; prune about once an hour."""
+        while True:
+            self._wake.wait(self._interval)
+            self._wake.clear()
+            try:
+                if self._subscribers:
+                    self.poll()
+                if time.monotonic() >= self._next_prune:
+                    self._next_prune = time.monotonic() + _PRUNE_EVERY
+                    self.prune()
+            except Exception:  # never let the poller die
+                logger.exception("change feed: unexpected error")
+
+
+change_feed = ChangeFeed(CHANGE_FEED_POLL_SECONDS, CHANGE_FEED_BACKLOG, CHANGE_FEED_RETENTION_HOURS)
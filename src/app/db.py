@@ -1,24 +1,177 @@
 """
 Database connection and session management.
 
-Provides a SQLite engine and a session factory (SessionLocal). init_db() creates
+Provides the engine and a session factory (SessionLocal). The backend is
+SQLite at DATABASE_PATH, or PostgreSQL when DATABASE_URL is set (IS_SQLITE
+tells callers which). Every new SQLite DB-API connection gets the configured
+performance profile (WAL, synchronous, busy_timeout, mmap, cache, temp_store)
+via apply_sqlite_profile(); PostgreSQL gets a tuned QueuePool (overflow,
+timeout, recycle, pre-ping). The pool class is chosen explicitly from DB_POOL.
+dialect_insert() returns the backend's INSERT construct, so upserts use native
+ON CONFLICT on both. init_db() creates
 all ORM-defined tables on first run. migrate_db() applies schema changes to an
-existing database (ALTER TABLE for new columns). get_db() is a generator used
+existing database (ALTER TABLE for new columns, and the one-off conversion of
+nodes.mac from text to an integer). get_db() is a generator used
 per request; callers should consume one session per request and not reuse across.
+bump_counter() / read_counter() maintain integer counters in app_config that
+other processes sharing the database poll to notice changes. Engine events feed
+statement counts, durations and lock failures into app.metrics.
 """
 
-from sqlalchemy import create_engine, text
+import logging
+import os
+import time
+
+from sqlalchemy import (
+    Integer,
+    MetaData,
+    String,
+    bindparam,
+    cast,
+    create_engine,
+    delete,
+    event,
+    inspect,
+    make_url,
+    select,
+    text,
+)
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import NullPool, QueuePool
+from sqlalchemy.schema import CreateTable
 
-from app.config import DATABASE_PATH
-from app.models import Base
+from app.config import (
+    DATABASE_PATH,
+    DATABASE_URL,
+    DB_MAX_OVERFLOW,
+    DB_POOL,
+    DB_POOL_PRE_PING,
+    DB_POOL_RECYCLE_SECONDS,
+    DB_POOL_SIZE,
+    DB_POOL_TIMEOUT_SECONDS,
+    SQLITE_BUSY_TIMEOUT_MS,
+    SQLITE_CACHE_SIZE,
+    SQLITE_JOURNAL_MODE,
+    SQLITE_MMAP_SIZE,
+    SQLITE_SYNCHRONOUS,
+    SQLITE_TEMP_STORE,
+)
+from app.macs import parse_mac
+from app.metrics import DB_LOCKED, DB_QUERIES
+from app.models import AppConfig, Base, Node
 
-# Single engine for the process; check_same_thread=False allows use from
-# multiple threads (e.g. Flask request handlers).
-engine = create_engine(
-    f"sqlite:///{DATABASE_PATH}",
-    connect_args={"check_same_thread": False},
+logger = logging.getLogger(__name__)
+
+# Applied in this order on every new connection. busy_timeout comes first so
+# the journal_mode switch itself waits for a lock held by another container.
+_SQLITE_PRAGMAS = (
+    ("busy_timeout", SQLITE_BUSY_TIMEOUT_MS),
+    ("journal_mode", SQLITE_JOURNAL_MODE),
+    ("synchronous", SQLITE_SYNCHRONOUS),
+    ("mmap_size", SQLITE_MMAP_SIZE),
+    ("cache_size", SQLITE_CACHE_SIZE),
+    ("temp_store", SQLITE_TEMP_STORE),
 )
+
+
+def apply_sqlite_profile(dbapi_conn) -> None:
+    """
+    Apply the configured PRAGMAs to a raw sqlite3 connection. Used by the
+    engine's connect hook and by modules that hold a dedicated connection
+    (e.g. the boot cache poller) so they wait on locks the same way.
+    """
+    cursor = dbapi_conn.cursor()
+    try:
+        for name, value in _SQLITE_PRAGMAS:
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+
+def database_url():
+    """SQLAlchemy URL of the configured database; postgres:// URLs get the psycopg (v3) driver."""
+    if not DATABASE_URL:
+        return make_url(f"sqlite:///{DATABASE_PATH}")
+    url = make_url(DATABASE_URL)
+    if url.drivername in ("postgres", "postgresql"):
+        url = url.set(drivername="postgresql+psycopg")
+    return url
+
+
+_url = database_url()
+IS_SQLITE = _url.get_backend_name() == "sqlite"
+
+if DB_POOL == "NULL":
+    _pool_args = {"poolclass": NullPool}
+elif IS_SQLITE:
+    _pool_args = {"poolclass": QueuePool, "pool_size": DB_POOL_SIZE}
+else:
+    _pool_args = {
+        "poolclass": QueuePool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT_SECONDS,
+        "pool_recycle": DB_POOL_RECYCLE_SECONDS,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+# Single engine for the process. SQLite: check_same_thread=False allows use
+# from multiple threads (e.g. Flask request handlers) and timeout mirrors
+# busy_timeout for the driver's own lock wait.
+if IS_SQLITE:
+    engine = create_engine(
+        _url,
+        connect_args={"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
+        **_pool_args,
+    )
+    event.listen(engine, "connect", lambda dbapi_conn, _record: apply_sqlite_profile(dbapi_conn))
+else:
+    engine = create_engine(_url, **_pool_args)
+# Workers fork from a preloaded master (gunicorn --preload). A DB-API handle
+# must never be used on both sides of a fork, so the child forgets the pooled
+# connections it inherited (without closing them under the parent) and opens
+# its own.
+os.register_at_fork(after_in_child=lambda: engine.dispose(close=False))
+
+
+def dialect_insert(model):
+    """
+    INSERT construct of the configured backend for model, supporting
+    on_conflict_do_update() / excluded (native ON CONFLICT on SQLite and
+    PostgreSQL alike). Build statements once at import, like plain inserts.
+    """
+    return (sqlite_insert if IS_SQLITE else pg_insert)(model)
+
+
+# PostgreSQL lock_not_available (lock_timeout) and deadlock_detected.
+_PG_LOCK_STATES = ("55P03", "40P01")
+
+
+@event.listens_for(engine, "before_cursor_execute")
+def _statement_started(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("statement_started", []).append(time.perf_counter())
+
+
+@event.listens_for(engine, "after_cursor_execute")
+def _statement_finished(conn, cursor, statement, parameters, context, executemany):
+    """Time every statement (an executemany counts once) labelled by its leading keyword."""
+    elapsed = time.perf_counter() - conn.info["statement_started"].pop()
+    DB_QUERIES.observe(elapsed, statement.lstrip()[:6].upper())
+
+
+@event.listens_for(engine, "handle_error")
+def _statement_failed(context):
+    """Drop the timing of a failed statement and count lock timeouts."""
+    started = context.connection.info.get("statement_started") if context.connection is not None else None
+    if started:
+        started.pop()
+    original = context.original_exception
+    if "database is locked" in str(original) or getattr(original, "sqlstate", None) in _PG_LOCK_STATES:
+        DB_LOCKED.inc()
+
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
@@ -30,26 +183,218 @@ def init_db() -> None:
     Base.metadata.create_all(bind=engine)
 
 
+def describe_db_profile() -> dict:
+    """
+    Read back the effective SQLite settings (or the PostgreSQL server and
+    pool limits) from a pooled connection, plus the pool class. Logged at
+    startup so operators can confirm what a deployment is actually running with.
+    """
+    profile = {"backend": engine.dialect.name, "pool": type(engine.pool).__name__}
+    with engine.connect() as conn:
+        if IS_SQLITE:
+            for name, _ in _SQLITE_PRAGMAS:
+                profile[name] = conn.exec_driver_sql(f"PRAGMA {name}").scalar()
+        else:
+            profile["server"] = conn.exec_driver_sql("SHOW server_version").scalar()
+            profile["host"] = engine.url.host
+            for name in ("pool_size", "max_overflow", "pool_timeout", "pool_recycle", "pool_pre_ping"):
+                if name in _pool_args:
+                    profile[name] = _pool_args[name]
+    return profile
+
+
 def migrate_db() -> None:
     """
-    Apply incremental schema changes to an existing database. Uses PRAGMA
-    table_info to detect missing columns; ALTER TABLE to add them. Safe to
+    Apply incremental schema changes to an existing database. Uses the
+    SQLAlchemy inspector (PRAGMA table_info on SQLite, information_schema on
+    PostgreSQL) to detect missing columns; ALTER TABLE to add them; new indexes
+    use CREATE INDEX IF NOT EXISTS (supported by both). Safe to
     call at startup after init_db() - the check is idempotent and a no-op
     when the schema is already current.
 
-    Must be extended whenever a new column is added to an ORM model so that
+    Must be extended whenever a new column or index is added to an ORM model so that
     existing deployments pick up the change on the next container start
     without a full DB wipe.
     """
     with engine.connect() as conn:
-        result = conn.execute(text("PRAGMA table_info(nodes)"))
-        existing_columns = {row[1] for row in result}
+        columns = {column["name"]: column for column in inspect(conn).get_columns("nodes")}
+        existing_columns = set(columns)
 
         # local_boot_script: per-node iPXE command used for local disk boot
         if "local_boot_script" not in existing_columns:
             conn.execute(text("ALTER TABLE nodes ADD COLUMN local_boot_script TEXT"))
             conn.commit()
 
+        # boot_profile: name of the BootProfile used for the installer script
+        if "boot_profile" not in existing_columns:
+            conn.execute(text("ALTER TABLE nodes ADD COLUMN boot_profile VARCHAR(64)"))
+            conn.commit()
+
+        # install_group / install_started_at: rolling reinstall state (app.rollout)
+        if "install_group" not in existing_columns:
+            conn.execute(text("ALTER TABLE nodes ADD COLUMN install_group VARCHAR(64)"))
+            conn.commit()
+        if "install_started_at" not in existing_columns:
+            column_type = "DATETIME" if IS_SQLITE else "TIMESTAMP WITH TIME ZONE"
+            conn.execute(text(f"ALTER TABLE nodes ADD COLUMN install_started_at {column_type}"))
+            conn.commit()
+
+        # mac: 17-character text before MACs were stored as integers (models.MacAddress)
+        if not isinstance(columns["mac"]["type"], Integer):
+            _migrate_mac_to_integer(conn)
+
+        # ix_nodes_last_seen: backs the seen_since/seen_before filters on GET /nodes
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_nodes_last_seen ON nodes (last_seen)"))
+        # ix_nodes_install_state / ix_nodes_install_group: admission counts in app.rollout
+        conn.execute(
+            text("CREATE INDEX IF NOT EXISTS ix_nodes_install_state ON nodes (reinstall, install_started_at)")
+        )
+        conn.execute(
+            text("CREATE INDEX IF NOT EXISTS ix_nodes_install_group ON nodes (install_group, install_started_at)")
+        )
+        conn.commit()
+
+
+# nodes.mac text -> integer migration: shadow table, log of ids written during
+# the copy, and the batch size / pause between batches.
+_MAC_SHADOW = "nodes_mac_int"
+_MAC_DIRTY = "nodes_mac_dirty"
+_MAC_MIGRATE_CHUNK = 1000
+_MAC_MIGRATE_PAUSE = 0.01
+# app.macs.parse_mac() in SQL: NULL for anything that is not a MAC.
+_PG_MAC_TO_INT = (
+    "CASE WHEN btrim(mac) ~ '^[0-9A-Fa-f]{2}([-:]?[0-9A-Fa-f]{2}){5}$'"
+    " THEN ('x' || lpad(translate(btrim(mac), ':-', ''), 16, '0'))::bit(64)::bigint END"
+)
+_SQLITE_MAC_TO_INT = "pxe_parse_mac(mac)"
+
+
+def _mac_triggers() -> list[str]:
+    """DDL logging the id of every row written to nodes into the dirty table."""
+    if IS_SQLITE:
+        return [
+            f"CREATE TRIGGER {_MAC_DIRTY}_{event} AFTER {event} ON nodes"
+            f" BEGIN INSERT OR IGNORE INTO {_MAC_DIRTY} (id) VALUES ({row}.id); END"
+            for event, row in (("insert", "NEW"), ("update", "NEW"), ("delete", "OLD"))
+        ]
+    return [
+        f"CREATE FUNCTION {_MAC_DIRTY}() RETURNS trigger LANGUAGE plpgsql AS $$ BEGIN"
+        f" INSERT INTO {_MAC_DIRTY} (id) VALUES (CASE WHEN TG_OP = 'DELETE' THEN OLD.id ELSE NEW.id END)"
+        " ON CONFLICT DO NOTHING; RETURN NULL; END $$",
+        f"CREATE TRIGGER {_MAC_DIRTY} AFTER INSERT OR UPDATE OR DELETE ON nodes"
+        f" FOR EACH ROW EXECUTE FUNCTION {_MAC_DIRTY}()",
+    ]
+
+
+def _drop_mac_migration(conn) -> None:
+    """Remove what an interrupted migration left behind; the copy then starts over."""
+    if IS_SQLITE:
+        for event in ("insert", "update", "delete"):
+            conn.execute(text(f"DROP TRIGGER IF EXISTS {_MAC_DIRTY}_{event}"))
+    else:
+        conn.execute(text(f"DROP TRIGGER IF EXISTS {_MAC_DIRTY} ON nodes"))
+        conn.execute(text(f"DROP FUNCTION IF EXISTS {_MAC_DIRTY}()"))
+    conn.execute(text(f"DROP TABLE IF EXISTS {_MAC_DIRTY}"))
+    conn.execute(text(f"DROP TABLE IF EXISTS {_MAC_SHADOW}"))
+    conn.commit()
+
+
+def _migrate_mac_to_integer(conn) -> None:
+    """
+    Convert nodes.mac from text to its integer value while other processes
+    (containers not yet upgraded) keep reading and writing nodes.
+
+    The rows are copied into a shadow table with the model's schema in keyset
+    batches of INSERT ... SELECT, each its own short transaction, with the MAC
+    converted in SQL (parse_mac() registered as a function on SQLite). Triggers
+    log the id of every row written meanwhile; those rows are copied again.
+    Only the final swap - the last logged rows, the table rename and the
+    model's indexes - runs with writers blocked. Rows whose mac is not a MAC
+    could never be addressed and are dropped with a warning, on both backends.
+    """
+    started = time.perf_counter()
+    if IS_SQLITE:
+        conn.connection.driver_connection.create_function("pxe_parse_mac", 1, parse_mac, deterministic=True)
+        to_int = _SQLITE_MAC_TO_INT
+    else:
+        to_int = _PG_MAC_TO_INT
+    others = ", ".join(column.name for column in Node.__table__.columns if column.name != "mac")
+    copy = f"INSERT INTO {_MAC_SHADOW} (mac, {others}) SELECT {to_int}, {others} FROM nodes WHERE {to_int} IS NOT NULL"
+    copy_range = text(f"{copy} AND id > :low AND id <= :high")
+    copy_ids = text(f"{copy} AND id IN :ids").bindparams(bindparam("ids", expanding=True))
+    next_high = text("SELECT max(id) FROM (SELECT id FROM nodes WHERE id > :low ORDER BY id LIMIT :n) AS batch")
+    take_dirty = text(
+        f"DELETE FROM {_MAC_DIRTY} WHERE id IN (SELECT id FROM {_MAC_DIRTY} LIMIT :n) RETURNING id"
+    )
+    forget = text(f"DELETE FROM {_MAC_SHADOW} WHERE id IN :ids").bindparams(bindparam("ids", expanding=True))
+
+    def recopy_dirty() -> int:
+        # Taken off the log before copying: a write after this is logged again.
+        ids = conn.execute(take_dirty, {"n": _MAC_MIGRATE_CHUNK}).scalars().all()
+        if ids:
+            conn.execute(forget, {"ids": ids})
+            conn.execute(copy_ids, {"ids": ids})
+        return len(ids)
+
+    _drop_mac_migration(conn)
+    conn.execute(CreateTable(Node.__table__.to_metadata(MetaData(), name=_MAC_SHADOW)))  # indexes at the swap
+    conn.execute(text(f"CREATE TABLE {_MAC_DIRTY} (id INTEGER PRIMARY KEY)"))
+    for statement in _mac_triggers():
+        conn.execute(text(statement))
+    conn.commit()
+
+    low = 0
+    while (high := conn.execute(next_high, {"low": low, "n": _MAC_MIGRATE_CHUNK}).scalar()) is not None:
+        conn.execute(copy_range, {"low": low, "high": high})
+        conn.commit()
+        low = high
+        time.sleep(_MAC_MIGRATE_PAUSE)
+    while recopy_dirty() == _MAC_MIGRATE_CHUNK:
+        conn.commit()
+        time.sleep(_MAC_MIGRATE_PAUSE)
+    conn.commit()
+
+    if IS_SQLITE:
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+    else:
+        conn.execute(text("LOCK TABLE nodes IN EXCLUSIVE MODE"))  # readers still go through
+    while recopy_dirty():
+        pass
+    dropped = conn.execute(text(f"SELECT mac FROM nodes WHERE {to_int} IS NULL")).scalars().all()
+    copied = conn.execute(text(f"SELECT count(*) FROM {_MAC_SHADOW}")).scalar()
+    conn.execute(text("DROP TABLE nodes"))  # its indexes and triggers go with it
+    conn.execute(text(f"DROP TABLE {_MAC_DIRTY}"))
+    conn.execute(text(f"ALTER TABLE {_MAC_SHADOW} RENAME TO nodes"))
+    for index in Node.__table__.indexes:
+        index.create(conn)
+    if not IS_SQLITE:
+        conn.execute(text(f"DROP FUNCTION {_MAC_DIRTY}()"))
+        conn.execute(text(
+            "SELECT setval(pg_get_serial_sequence('nodes', 'id'), coalesce(max(id), 0) + 1, false) FROM nodes"
+        ))
+    conn.commit()
+    if dropped:
+        logger.warning("migrate: dropped %d nodes with an invalid mac: %s", len(dropped), dropped[:10])
+    logger.info("migrate: nodes.mac converted to integers (%d rows) in %.2fs", copied, time.perf_counter() - started)
+
+
+def delete_in_chunks(model, *where, chunk: int, pause: float) -> int:
+    """
+    Delete the model's rows matching where, chunk rows per transaction with
+    pause seconds between transactions, so a large retention sweep never holds
+    the write lock long enough to stall /boot. Returns the number deleted.
+    """
+    batch = select(model.id).where(*where).limit(chunk).scalar_subquery()
+    stmt = delete(model).where(model.id.in_(batch))
+    total = 0
+    while True:
+        with engine.begin() as conn:
+            deleted = conn.execute(stmt).rowcount
+        total += deleted
+        if deleted < chunk:
+            return total
+        time.sleep(pause)
+
 
 def get_db() -> Session:
     """
@@ -61,3 +406,33 @@ def get_db() -> Session:
         yield db
     finally:
         db.close()
+
+
+# app_config key bumped by every write to the nodes table, including /boot
+# inserts and last_seen flushes; GET /nodes uses it as its ETag.
+NODES_VERSION_KEY = "nodes_version"
+
+
+def bump_counter(db, key: str) -> None:
+    """
+    Increment the integer counter stored under key in app_config, creating it
+    at 1 when absent. db is a Session or Connection; the increment joins the
+    caller's transaction so it commits (or rolls back) with the change it
+    describes. A single upsert statement, so concurrent writers never race on
+    the insert.
+    """
+    stmt = dialect_insert(AppConfig).values(key=key, value="1")
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[AppConfig.key],
+        set_={"value": cast(cast(AppConfig.value, Integer) + 1, String)},
+    )
+    db.execute(stmt)
+
+
+def read_counter(db, key: str) -> int:
+    """
+    Return the integer counter stored under key in app_config, or 0 when it
+    has never been bumped.
+    """
+    value = db.execute(select(AppConfig.value).where(AppConfig.key == key)).scalar()
+    return int(value) if value is not None else 0
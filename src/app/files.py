@@ -0,0 +1,148 @@
+"""
+HTTP delivery of the files under TFTP_ROOT (iPXE binaries, uki.efi) at
+GET/HEAD /files/<name>, shared by the Flask route (routes/files.py) and the
+native ASGI handler (asgi.py).
+
+iPXE's HTTP stack fetches a large UKI an order of magnitude faster than TFTP
+(see PXE_UKI_HTTP in config). Responses carry a strong ETag and Last-Modified
+from the file's size and mtime, honour If-None-Match / If-Modified-Since (304)
+and a single byte Range, guarded by If-Range (206, or 416 when unsatisfiable).
+Multi-range requests get the whole file, as RFC 9110 allows.
+
+The file is opened before it is inspected, so the headers always describe
+the bytes that are sent even when the file is replaced mid-request. Under
+gunicorn the body goes through wsgi.file_wrapper, i.e. zero-copy sendfile(2)
+bounded by Content-Length; under uvicorn it is streamed with pread() off the
+event loop.
+"""
+
+import os
+import stat
+from dataclasses import dataclass, field
+
+from werkzeug.http import http_date, parse_date, parse_etags, parse_range_header, quote_etag
+from werkzeug.security import safe_join
+
+from app.config import TFTP_ROOT
+
+# Bytes per read when the body cannot be handed to sendfile.
+CHUNK_SIZE = 256 * 1024
+
+
+@dataclass
+class FileResponse:
+    """
+    Status and headers for one request, plus the open file and the byte range
+    to send when there is a body (200/206). body is the complete payload of
+    any other response.
+    """
+
+    status: int
+    headers: list[tuple[str, str]] = field(default_factory=list)
+    file: object = None
+    offset: int = 0
+    length: int = 0
+    size: int = 0
+    body: bytes = b""
+
+
+def _text(status: int, message: str, headers=()) -> FileResponse:
+    body = f"{message}\n".encode()
+    return FileResponse(
+        status,
+        [*headers, ("Content-Type", "text/plain; charset=utf-8"), ("Content-Length", str(len(body)))],
+        body=body,
+    )
+
+
+def open_file(name: str, header) -> FileResponse:
+    """
+    Resolve name under TFTP_ROOT and evaluate the conditional and Range request
+    headers (header(name) returns a request header or None). The caller owns
+    the returned file and must close it.
+    """
+    path = safe_join(TFTP_ROOT, name)
+    if path is None:
+        return _text(404, "File not found")
+    try:
+        fh = open(path, "rb")
+    except (FileNotFoundError, IsADirectoryError, NotADirectoryError, PermissionError):
+        return _text(404, "File not found")
+    info = os.fstat(fh.fileno())
+    if not stat.S_ISREG(info.st_mode):
+        fh.close()
+        return _text(404, "File not found")
+    size = info.st_size
+    etag = f"{size:x}-{info.st_mtime_ns:x}"
+    last_modified = http_date(info.st_mtime)
+    headers = [
+        ("ETag", quote_etag(etag)),
+        ("Last-Modified", last_modified),
+        ("Accept-Ranges", "bytes"),
+        # Revalidate every time: the files are replaced in place on upgrades.
+        ("Cache-Control", "no-cache"),
+    ]
+
+    if_none_match = header("If-None-Match")
+    if if_none_match is not None:
+        not_modified = parse_etags(if_none_match).contains_weak(etag)
+    else:
+        since = parse_date(header("If-Modified-Since"))
+        not_modified = since is not None and int(info.st_mtime) <= since.timestamp()
+    if not_modified:
+        fh.close()
+        return FileResponse(304, headers)
+
+    offset, length, status = 0, size, 200
+    requested = parse_range_header(header("Range"))
+    if (
+        requested is not None
+        and requested.units == "bytes"
+        and len(requested.ranges) == 1
+        and _if_range_matches(header("If-Range"), etag, last_modified)
+    ):
+        bounds = requested.range_for_length(size)
+        if bounds is None:
+            fh.close()
+            return _text(416, "Range not satisfiable", [*headers, ("Content-Range", f"bytes */{size}")])
+        offset, length, status = bounds[0], bounds[1] - bounds[0], 206
+        headers.append(("Content-Range", f"bytes {bounds[0]}-{bounds[1] - 1}/{size}"))
+    headers += [("Content-Type", "application/octet-stream"), ("Content-Length", str(length))]
+    return FileResponse(status, headers, fh, offset, length, size)
+
+
+def _if_range_matches(value: str | None, etag: str, last_modified: str) -> bool:
+    """True when there is no If-Range or it still names this version of the file."""
+    if value is None:
+        return True
+    value = value.strip()
+    if value.startswith(('"', "W/")):
+        return value == quote_etag(etag)  # weak validators never match (RFC 9110 13.1.5)
+    return value == last_modified
+
+
+def iter_range(fh, offset: int, length: int):
+    """Yield length bytes of fh from offset, CHUNK_SIZE at a time, then close it."""
+    try:
+        while length > 0:
+            chunk = os.pread(fh.fileno(), min(CHUNK_SIZE, length), offset)
+            if not chunk:  # truncated underneath us; Content-Length is already sent
+                return
+            offset += len(chunk)
+            length -= len(chunk)
+            yield chunk
+    finally:
+        fh.close()
+
+
+def wsgi_body(environ, response: FileResponse):
+    """
+    Response iterable for a 200/206. The server's file wrapper (sendfile under
+    gunicorn) sends from the current position to EOF, or up to Content-Length,
+    so it is used whenever the range runs to the end of the file.
+    """
+    wrapper = environ.get("wsgi.file_wrapper")
+    if wrapper is not None and response.offset + response.length == response.size:
+        response.file.seek(response.offset)
+        return wrapper(response.file, CHUNK_SIZE)
+    return iter_range(response.file, response.offset, response.length)
@@ -0,0 +1,146 @@
+"""
+Write-behind buffer for Node.last_seen.
+
+/boot records "this MAC booted at T" in memory instead of committing an UPDATE
+per request. A background thread flushes the latest timestamp per MAC in one
+transaction every LAST_SEEN_FLUSH_SECONDS, or sooner once
+LAST_SEEN_FLUSH_MAX distinct MACs are pending. Repeated boots of the same MAC
+between flushes coalesce into one row update (and one "seen" entry in the
+change feed, written only for rows the update actually changed). The buffer is also flushed at
+interpreter exit (gunicorn graceful shutdown). GET /nodes does not flush (a
+poll must stay a read), so its last_seen lags by up to one interval.
+
+A failed flush puts the batch back (keeping any newer timestamp recorded in
+the meantime) and is retried on the next tick. last_seen is informational, so
+at worst a hard kill loses one interval of timestamps.
+"""
+
+import atexit
+import logging
+import os
+import threading
+from datetime import datetime
+
+from sqlalchemy import bindparam, or_, select, update
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.change_feed import record_changes
+from app.config import LAST_SEEN_FLUSH_MAX, LAST_SEEN_FLUSH_SECONDS
+from app.db import NODES_VERSION_KEY, bump_counter, engine
+from app.models import Node
+
+logger = logging.getLogger(__name__)
+
+# Never move last_seen backwards: a cache-miss boot may already have written a
+# newer value directly while an older one was still sitting in the buffer.
+_UPDATE_LAST_SEEN = (
+    update(Node)
+    .where(Node.mac == bindparam("b_mac"))
+    .where(or_(Node.last_seen.is_(None), Node.last_seen < bindparam("b_last_seen")))
+    .values(last_seen=bindparam("b_last_seen"))
+)
+
+
+class LastSeenBuffer:
+    """
+    MAC -> latest boot timestamp, flushed in batches by a daemon thread that is
+    started lazily (and restarted after fork) on the first record().
+    """
+
+    def __init__(self, interval: float, max_size: int) -> None:
+        self._interval = interval
+        self._max_size = max_size
+        self._pending: dict[str, datetime] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread_pid: int | None = None
+
+    def record(self, mac: str, seen: datetime) -> None:
+        """
+        Remember that mac booted at seen. With a non-positive interval the
+        write happens synchronously (write-through) instead.
+        """
+        with self._lock:
+            self._pending[mac] = seen
+            pending = len(self._pending)
+        if self._interval <= 0:
+            self.flush()
+            return
+        if self._thread_pid != os.getpid():
+            self._start()
+        if pending >= self._max_size:
+            self._wake.set()
+
+    @property
+    def write_through(self) -> bool:
+        """True when record() writes synchronously (a non-positive interval)."""
+        return self._interval <= 0
+
+    def pending(self) -> int:
+        """Number of MACs waiting to be flushed."""
+        return len(self._pending)
+
+    def discard(self) -> None:
+        """Drop everything pending without writing it (tests)."""
+        with self._lock:
+            self._pending.clear()
+
+    def flush(self) -> int:
+        """
+        Write all pending timestamps in one transaction. Returns the number of
+        rows updated (0 when nothing was pending, nothing was newer, or the
+        write failed).
+        """
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return 0
+                batch, self._pending = self._pending, {}
+            try:
+                with engine.begin() as conn:
+                    # The guard skips a row with a newer last_seen or a node
+                    # deleted meanwhile; one read finds the rows it will not
+                    # skip, so only those are written and go in the change feed.
+                    current = conn.execute(
+                        select(Node.mac, Node.last_seen).where(Node.mac.in_(list(batch)))
+                    ).all()
+                    updated = [(mac, batch[mac]) for mac, seen in current if seen is None or seen < batch[mac]]
+                    if updated:
+                        conn.execute(_UPDATE_LAST_SEEN, [{"b_mac": mac, "b_last_seen": seen} for mac, seen in updated])
+                        bump_counter(conn, NODES_VERSION_KEY)
+                        record_changes(conn, [("seen", mac, {"last_seen": seen}) for mac, seen in updated])
+            except SQLAlchemyError as exc:
+                logger.warning("last_seen: flush of %d rows failed, will retry: %s", len(batch), exc)
+                with self._lock:
+                    for mac, seen in batch.items():
+                        newer = self._pending.get(mac)
+                        if newer is None or newer < seen:
+                            self._pending[mac] = seen
+                return 0
+            return len(updated)
+
+    def _start(self) -> None:
+        """Start the flusher thread for this process (again after a fork)."""
+        with self._lock:
+            pid = os.getpid()
+            if self._thread_pid == pid:
+                return
+            self._thread_pid = pid
+            self._wake = threading.Event()
+            thread = threading.Thread(target=self._run, name="last-seen-flusher", daemon=True)
+            thread.start()
+
+    def _run(self) -> None:
+        """Flush every interval, or as soon as record() signals a full buffer."""
+        while True:
+            self._wake.wait(self._interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:  # never let the flusher die
+                logger.exception("last_seen: unexpected flush error")
+
+
+last_seen_buffer = LastSeenBuffer(LAST_SEEN_FLUSH_SECONDS, LAST_SEEN_FLUSH_MAX)
+atexit.register(last_seen_buffer.flush)
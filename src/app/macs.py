@@ -0,0 +1,55 @@
+"""
+MAC addresses as 48-bit integers.
+
+nodes.mac is stored as an integer (models.MacAddress): a smaller row and
+index than the 17-character text form, and a MAC prefix such as a vendor OUI
+becomes an integer range (prefix_range()). The rest of the app keeps using
+the canonical string (lowercase hex with colons) as its key; parse_mac() and
+format_mac() convert at the edges.
+"""
+
+import re
+
+# Six groups of two hex digits; optional colon or hyphen between groups.
+MAC_PATTERN = re.compile(
+    r"^([0-9a-fA-F]{2})[-:]?([0-9a-fA-F]{2})[-:]?([0-9a-fA-F]{2})[-:]?([0-9a-fA-F]{2})[-:]?([0-9a-fA-F]{2})[-:]?([0-9a-fA-F]{2})$"
+)
+
+_HEX_DIGITS = frozenset("0123456789abcdefABCDEF")
+
+
+def parse_mac(raw: str) -> int | None:
+    """
+    Integer value of a MAC written with colons, hyphens or no separators;
+    None if raw is not a valid 6-octet MAC. The usual spellings skip the regex.
+    """
+    if not raw or not isinstance(raw, str):
+        return None
+    raw = raw.strip()
+    if len(raw) == 17 and raw[2::3] in (":::::", "-----"):
+        digits = raw.replace(raw[2], "")
+        if len(digits) != 12 or not _HEX_DIGITS.issuperset(digits):
+            return None
+    elif len(raw) == 12:
+        if not _HEX_DIGITS.issuperset(raw):
+            return None
+        digits = raw
+    else:
+        m = MAC_PATTERN.match(raw)  # mixed or partly omitted separators
+        if not m:
+            return None
+        digits = "".join(m.groups())
+    return int(digits, 16)
+
+
+def format_mac(value: int) -> str:
+    """Canonical form of an integer MAC: lowercase hex with colons."""
+    h = f"{value:012x}"
+    return f"{h[0:2]}:{h[2:4]}:{h[4:6]}:{h[6:8]}:{h[8:10]}:{h[10:12]}"
+
+
+def prefix_range(hex_digits: str) -> tuple[int, int]:
+    """[low, high) of the MACs whose hex form starts with hex_digits (1-12 digits, no separators)."""
+    shift = 4 * (12 - len(hex_digits))
+    low = int(hex_digits, 16) << shift
+    return low, low + (1 << shift)
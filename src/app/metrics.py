@@ -0,0 +1,326 @@
+"""
+Prometheus metrics: a small in-process registry plus the multi-worker merge.
+
+Counters and histograms live in one dict per process guarded by one lock, so
+recording is a perf_counter pair, a bisect and a dict update - cheap enough to
+stay on during boot storms. GET /metrics renders the text exposition format.
+
+Multiple gunicorn/uvicorn workers: when METRICS_DIR is set, every process
+writes a JSON snapshot of its values to METRICS_DIR/<pid>.json every
+_WRITE_SECONDS (atomically, via rename) and at exit. /metrics sums its own
+live values with every other worker's snapshot, so any worker can answer a
+scrape for the whole container. Counters and histograms of workers that have
+exited stay in the sum (their files are kept) so totals never go backwards;
+gauges such as RSS are reported per live pid only. The entrypoint empties
+METRICS_DIR at container start. Without METRICS_DIR each process reports only
+itself.
+"""
+
+import atexit
+import json
+import logging
+import os
+import resource
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable
+
+from app.config import METRICS_DIR
+
+logger = logging.getLogger(__name__)
+
+# How often each process publishes its snapshot for the other workers.
+_WRITE_SECONDS = 5.0
+
+HTTP_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+TFTP_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+DB_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+
+
+class Registry:
+    """
+    Holds metric definitions and this process's values. Keys are
+    (metric name, label values); counter values are floats, histogram values
+    are [count per bucket..., count above last bucket, sum].
+    """
+
+    def __init__(self, directory: str) -> None:
+        self._metrics: dict[str, "_Metric"] = {}
+        self._values: dict[tuple[str, tuple[str, ...]], float | list[float]] = {}
+        self._lock = threading.Lock()
+        self._directory = directory
+        self._writer_started = False
+
+    def register(self, metric: "_Metric") -> None:
+        self._metrics[metric.name] = metric
+
+    def _add(self, key: tuple[str, tuple[str, ...]], amount: float) -> None:
+        if not self._writer_started:
+            self._start_writer()
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def _observe(self, key: tuple[str, tuple[str, ...]], index: int, size: int, value: float) -> None:
+        if not self._writer_started:
+            self._start_writer()
+        with self._lock:
+            slot = self._values.get(key)
+            if slot is None:
+                slot = self._values[key] = [0.0] * (size + 1)
+            slot[index] += 1
+            slot[-1] += value
+
+    def reset(self) -> None:
+        """Forget every recorded value (after fork, and in tests)."""
+        with self._lock:
+            self._values = {}
+
+    def _after_fork(self) -> None:
+        """A forked child starts from zero; its parent's values are in the parent's file."""
+        self._lock = threading.Lock()
+        self._values = {}
+        self._writer_started = False
+
+    def snapshot(self) -> dict:
+        """This process's values plus gauges, in the JSON shape written to METRICS_DIR."""
+        with self._lock:
+            values = [[name, list(labels), value] for (name, labels), value in self._values.items()]
+        gauges = [[metric.name, metric.read()] for metric in self._metrics.values() if isinstance(metric, Gauge)]
+        return {"pid": os.getpid(), "values": values, "gauges": gauges}
+
+    def _start_writer(self) -> None:
+        """Start this process's snapshot writer (once per process; again after a fork)."""
+        with self._lock:
+            if self._writer_started:
+                return
+            self._writer_started = True
+        if not self._directory:
+            return
+        thread = threading.Thread(target=self._run_writer, name="metrics-writer", daemon=True)
+        thread.start()
+
+    def _run_writer(self) -> None:
+        while True:
+            time.sleep(_WRITE_SECONDS)
+            self.write_snapshot()
+
+    def write_snapshot(self) -> None:
+        """Publish this process's snapshot atomically; errors are logged, never raised."""
+        if not self._directory:
+            return
+        try:
+            os.makedirs(self._directory, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self._directory, suffix=".tmp")
+            with os.fdopen(fd, "w") as fh:
+                json.dump(self.snapshot(), fh)
+            os.replace(tmp, os.path.join(self._directory, f"{os.getpid()}.json"))
+        except OSError as exc:
+            logger.warning("metrics: could not write snapshot to %s: %s", self._directory, exc)
+
+    def _snapshots(self) -> list[dict]:
+        """This process's live snapshot plus every other worker's last published one."""
+        snapshots = [self.snapshot()]
+        if not self._directory or not os.path.isdir(self._directory):
+            return snapshots
+        own = f"{os.getpid()}.json"
+        for name in os.listdir(self._directory):
+            if not name.endswith(".json") or name == own:
+                continue
+            try:
+                with open(os.path.join(self._directory, name)) as fh:
+                    snapshots.append(json.load(fh))
+            except (OSError, ValueError):
+                continue  # half-written by an older version or removed under us
+        return snapshots
+
+    def render(self) -> str:
+        """Merge every snapshot and render the Prometheus text exposition format (0.0.4)."""
+        merged: dict[str, dict[tuple[str, ...], float | list[float]]] = {}
+        gauges: dict[str, list[tuple[int, float]]] = {}
+        for snap in self._snapshots():
+            for name, labels, value in snap["values"]:
+                series = merged.setdefault(name, {})
+                key = tuple(labels)
+                current = series.get(key)
+                if isinstance(value, list):
+                    series[key] = value if current is None else [a + b for a, b in zip(current, value)]
+                else:
+                    series[key] = value + (current or 0.0)
+            if _alive(snap["pid"]):
+                for name, value in snap["gauges"]:
+                    gauges.setdefault(name, []).append((snap["pid"], value))
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            if isinstance(metric, Gauge):
+                for pid, value in sorted(gauges.get(metric.name, [])):
+                    lines.append(f'{metric.name}{{pid="{pid}"}} {_number(value)}')
+                continue
+            for labels, value in sorted(merged.get(metric.name, {}).items()):
+                metric.render(lines, dict(zip(metric.labelnames, labels)), value)
+        return "\n".join(lines) + "\n"
+
+
+def _alive(pid: int) -> bool:
+    """True when pid is a running process (gauges of exited workers are dropped)."""
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def _escape(value: str) -> str:
+    """Escape a label value per the exposition format: backslash, quote, newline."""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(str(v))}"' for k, v in labels.items()) + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, registry: Registry, name: str, help: str, labelnames: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._registry = registry
+        registry.register(self)
+
+
+class Counter(_Metric):
+    """Monotonic counter; label values are passed positionally in labelnames order."""
+
+    kind = "counter"
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        self._registry._add((self.name, labels), amount)
+
+    def render(self, lines: list[str], labels: dict, value: float) -> None:
+        lines.append(f"{self.name}_total{_labels(labels)} {_number(value)}")
+
+
+class Histogram(_Metric):
+    """Fixed-bucket histogram; observe() costs one bisect and one dict update."""
+
+    kind = "histogram"
+
+    def __init__(self, registry: Registry, name: str, help: str, labelnames: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = HTTP_BUCKETS) -> None:
+        super().__init__(registry, name, help, labelnames)
+        self.buckets = buckets
+
+    def observe(self, value: float, *labels: str) -> None:
+        self._registry._observe((self.name, labels), bisect_left(self.buckets, value), len(self.buckets) + 1, value)
+
+    def render(self, lines: list[str], labels: dict, value: list[float]) -> None:
+        cumulative = 0.0
+        for bound, count in zip((*self.buckets, float("inf")), value[:-1]):
+            cumulative += count
+            lines.append(f"{self.name}_bucket{_labels({**labels, 'le': _number(bound)})} {_number(cumulative)}")
+        lines.append(f"{self.name}_sum{_labels(labels)} {value[-1]!r}")
+        lines.append(f"{self.name}_count{_labels(labels)} {_number(cumulative)}")
+
+
+class Gauge(_Metric):
+    """Value read from a callback when a snapshot is taken; reported per live pid."""
+
+    kind = "gauge"
+
+    def __init__(self, registry: Registry, name: str, help: str, read: Callable[[], float]) -> None:
+        super().__init__(registry, name, help)
+        self.read = read
+
+
+def resident_memory_bytes() -> float:
+    """Current RSS from /proc (Linux); peak RSS from getrusage elsewhere."""
+    try:
+        with open("/proc/self/statm") as fh:
+            return float(int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE"))
+    except (OSError, ValueError, IndexError):
+        return float(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024)
+
+
+registry = Registry(METRICS_DIR)
+os.register_at_fork(after_in_child=registry._after_fork)
+atexit.register(registry.write_snapshot)
+
+HTTP_REQUESTS = Counter(
+    registry, "pxe_http_requests", "HTTP requests by route template, method and status.", ("route", "method", "status")
+)
+HTTP_LATENCY = Histogram(
+    registry, "pxe_http_request_duration_seconds", "Time to produce the response, by route template.", ("route",)
+)
+BOOT_SCRIPTS = Counter(registry, "pxe_boot_scripts", "Scripts served by /boot, by kind.", ("kind",))
+BOOT_CACHE_MISSES = Counter(registry, "pxe_boot_cache_misses", "/boot requests that read the database.")
+NODES_CREATED = Counter(registry, "pxe_nodes_created", "Nodes created automatically on first /boot.")
+DB_QUERIES = Histogram(
+    registry, "pxe_db_query_duration_seconds", "SQLite statements by kind and their duration.", ("statement",),
+    buckets=DB_BUCKETS,
+)
+DB_LOCKED = Counter(
+    registry, "pxe_db_locked", "Statements that failed on a lock: 'database is locked' (SQLite) or a lock timeout/deadlock (PostgreSQL)."
+)
+TFTP_TRANSFERS = Counter(
+    registry, "pxe_tftp_transfers", "Built-in TFTP server read requests by file and result.", ("file", "result")
+)
+TFTP_BYTES = Counter(registry, "pxe_tftp_sent_bytes", "File bytes sent by the built-in TFTP server.", ("file",))
+TFTP_SECONDS = Histogram(
+    registry, "pxe_tftp_transfer_duration_seconds", "Duration of completed TFTP transfers.", ("file",),
+    buckets=TFTP_BUCKETS,
+)
+ADMISSION_SHED = Counter(
+    registry, "pxe_admission_shed", "Requests answered with a retry script instead of being served, by route and reason.",
+    ("route", "reason"),
+)
+REINSTALL_ADMISSIONS = Counter(
+    registry, "pxe_reinstall_admissions", "Boots of nodes flagged for reinstall, by rollout decision.", ("result",)
+)
+MIRROR_SELECTIONS = Counter(
+    registry, "pxe_mirror_selections", "Installer scripts sent to each mirror, by artifact and mirror host.",
+    ("artifact", "mirror"),
+)
+MIRROR_PROBE_FAILURES = Counter(
+    registry, "pxe_mirror_probe_failures", "Failed mirror health probes, by artifact and mirror host.",
+    ("artifact", "mirror"),
+)
+NOCLOUD_DOCUMENTS = Counter(
+    registry, "pxe_nocloud_documents", "NoCloud documents served, by document and result (hit, miss, not_modified).",
+    ("document", "result"),
+)
+PROCESS_RSS = Gauge(registry, "process_resident_memory_bytes", "Resident memory per worker.", resident_memory_bytes)
+
+
+def install_flask_hooks(app) -> None:
+    """Count and time every Flask request by its URL rule (bounded label set)."""
+    from flask import g, request
+
+    @app.before_request
+    def _metrics_start():
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def _metrics_observe(response):
+        started = g.pop("metrics_started", None)
+        if started is not None:
+            route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+            HTTP_LATENCY.observe(time.perf_counter() - started, route)
+            HTTP_REQUESTS.inc(route, request.method, str(response.status_code))
+        return response
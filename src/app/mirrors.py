@@ -0,0 +1,246 @@
+"""
+Mirror selection for the installer's ISO and autoinstall seed URLs.
+
+PXE_UBUNTU_ISO_URL and PXE_AUTOINSTALL_URL may each be backed by mirrors
+(PXE_UBUNTU_ISO_MIRRORS, PXE_AUTOINSTALL_MIRRORS). ipxe_script_reinstall()
+asks choose() for the URL template to render on every boot, so the choice
+must not block: everything it reads is in memory.
+
+A daemon thread per process (started lazily, again after fork) probes every
+mirror each MIRROR_PROBE_SECONDS with an HTTP HEAD: the URL itself, or its
+origin when the path is a per-node template (then any answer below 500
+counts). It keeps a moving average of the latency and the run of consecutive
+failures; MIRROR_FAILURES_DOWN failures in a row take a mirror out of
+rotation until a probe succeeds again. Each choice is remembered as an
+install in flight on that mirror for MIRROR_INSTALL_SECONDS.
+
+choose() is weighted least-load: among the mirrors that are up, the lowest
+latency x (installs in flight + 1) wins, so a fast mirror takes more installs
+but not all of them. A mirror not probed yet counts as the slowest known one.
+When every mirror is down the primary URL is used. Profiles that set their own
+iso_url or autoinstall_url are rendered as they are.
+
+The load is what this process has handed out; with several workers each
+balances its own share.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from urllib.parse import urlsplit
+
+from app.boot_profiles import DEFAULT_PROFILE
+from app.config import (
+    MIRROR_FAILURES_DOWN,
+    MIRROR_INSTALL_SECONDS,
+    MIRROR_PROBE_SECONDS,
+    MIRROR_PROBE_TIMEOUT_SECONDS,
+    PXE_AUTOINSTALL_MIRRORS,
+    PXE_UBUNTU_ISO_MIRRORS,
+)
+from app.metrics import MIRROR_PROBE_FAILURES, MIRROR_SELECTIONS
+from app.templating import CompiledTemplate, compile_template
+
+logger = logging.getLogger(__name__)
+
+# Weight of the newest probe in the latency moving average.
+_LATENCY_ALPHA = 0.3
+
+
+@dataclass
+class Mirror:
+    """One candidate URL and what the prober and choose() know about it."""
+
+    template: CompiledTemplate
+    probe_url: str | None
+    # A templated path cannot be fetched as is, so only its origin is probed.
+    origin_only: bool
+    latency_ms: float | None = None
+    failures: int = 0
+    errors: int = 0
+    last_error: str | None = None
+    installs: deque = field(default_factory=deque)
+
+    @property
+    def url(self) -> str:
+        return self.template.source
+
+    @property
+    def label(self) -> str:
+        return urlsplit(self.url).netloc
+
+    def to_dict(self, up: bool) -> dict:
+        return {
+            "url": self.url,
+            "up": up,
+            "latency_ms": None if self.latency_ms is None else round(self.latency_ms, 3),
+            "consecutive_failures": self.failures,
+            "errors": self.errors,
+            "last_error": self.last_error,
+            "installs_in_flight": len(self.installs),
+        }
+
+
+def _mirror(template: CompiledTemplate) -> Mirror:
+    parts = urlsplit(template.source)
+    if parts.scheme not in ("http", "https") or not parts.netloc or "$" in parts.netloc:
+        return Mirror(template, None, False)  # e.g. tftp://${next-server}/: nothing to probe from here
+    if "$" in template.source:
+        return Mirror(template, f"{parts.scheme}://{parts.netloc}/", True)
+    return Mirror(template, template.source, False)
+
+
+class MirrorSet:
+    """The primary URL of one artifact plus its mirrors; choose() picks one per boot."""
+
+    def __init__(self, artifact: str, primary: CompiledTemplate, urls, failures_down: int,
+                 install_seconds: float) -> None:
+        self.artifact = artifact
+        self.primary = primary
+        self._failures_down = max(failures_down, 1)
+        self._install_seconds = install_seconds
+        sources = [primary.source] if primary.source else []
+        sources += [url for url in urls if url not in sources]
+        # compile_template() memoizes, so the primary's entry holds the primary itself.
+        self.mirrors = [_mirror(compile_template(source)) for source in sources]
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return len(self.mirrors) > 1
+
+    def _up(self, mirror: Mirror) -> bool:
+        return mirror.failures < self._failures_down
+
+    def choose(self, template: CompiledTemplate) -> CompiledTemplate:
+        """
+        The template to render for one installer script. Anything but the
+        primary (a profile's own URL) is returned unchanged; otherwise the
+        least loaded mirror that is up, which is charged one install.
+        """
+        if template is not self.primary or not self.enabled:
+            return template
+        now = time.monotonic()
+        with self._lock:
+            known = [m.latency_ms for m in self.mirrors if m.latency_ms is not None]
+            slowest = max(known) if known else 1.0
+            best = None
+            for mirror in self.mirrors:
+                while mirror.installs and mirror.installs[0] <= now:
+                    mirror.installs.popleft()
+                if not self._up(mirror):
+                    continue
+                latency = mirror.latency_ms if mirror.latency_ms is not None else slowest
+                score = max(latency, 0.001) * (len(mirror.installs) + 1)
+                if best is None or score < best[0]:
+                    best = (score, mirror)
+            mirror = best[1] if best is not None else self.mirrors[0]
+            mirror.installs.append(now + self._install_seconds)
+        MIRROR_SELECTIONS.inc(self.artifact, mirror.label)
+        return mirror.template
+
+    def record(self, mirror: Mirror, latency_ms: float | None, error: str | None) -> None:
+        """Fold one probe result into the mirror's state."""
+        with self._lock:
+            if error is None:
+                mirror.failures = 0
+                if mirror.latency_ms is None:
+                    mirror.latency_ms = latency_ms
+                else:
+                    mirror.latency_ms += _LATENCY_ALPHA * (latency_ms - mirror.latency_ms)
+                return
+            was_up = self._up(mirror)
+            mirror.failures += 1
+            mirror.errors += 1
+            mirror.last_error = error
+            down = not self._up(mirror)
+        MIRROR_PROBE_FAILURES.inc(self.artifact, mirror.label)
+        if was_up and down:
+            logger.warning("mirrors: %s %s is down: %s", self.artifact, mirror.url, error)
+
+    def status(self) -> list[dict]:
+        with self._lock:
+            return [mirror.to_dict(self._up(mirror)) for mirror in self.mirrors]
+
+
+def probe_url(url: str, origin_only: bool, timeout: float) -> tuple[float | None, str | None]:
+    """HEAD url; (latency in ms, None) when it answered acceptably, else (None, error)."""
+    # Imported here: only a process probing configured mirrors needs urllib.request.
+    import urllib.error
+    import urllib.request
+
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, method="HEAD"), timeout=timeout):
+            pass
+    except urllib.error.HTTPError as exc:
+        if not (origin_only and exc.code < 500):
+            return None, f"HTTP {exc.code}"
+    except (OSError, ValueError) as exc:
+        reason = getattr(exc, "reason", None) or exc
+        return None, str(reason) or type(exc).__name__
+    return (time.perf_counter() - started) * 1000, None
+
+
+class Mirrors:
+    """The ISO and autoinstall mirror sets and the prober thread shared by both."""
+
+    def __init__(self, sets: list[MirrorSet], interval: float, timeout: float) -> None:
+        self.sets = {mirror_set.artifact: mirror_set for mirror_set in sets}
+        self._interval = interval
+        self._timeout = timeout
+        self._thread_pid: int | None = None
+        self._lock = threading.Lock()
+
+    def choose(self, artifact: str, template: CompiledTemplate) -> CompiledTemplate:
+        """MirrorSet.choose() for artifact, starting the prober first when mirrors are in play."""
+        mirror_set = self.sets[artifact]
+        if mirror_set.enabled and self._thread_pid != os.getpid():
+            self.start()
+        return mirror_set.choose(template)
+
+    def probe(self) -> None:
+        """Probe every mirror of every enabled set once (blocking)."""
+        for mirror_set in self.sets.values():
+            if not mirror_set.enabled:
+                continue
+            for mirror in mirror_set.mirrors:
+                if mirror.probe_url is not None:
+                    mirror_set.record(mirror, *probe_url(mirror.probe_url, mirror.origin_only, self._timeout))
+
+    def status(self) -> dict:
+        return {artifact: mirror_set.status() for artifact, mirror_set in self.sets.items() if mirror_set.enabled}
+
+    def start(self) -> None:
+        """Start the prober for this process (again after fork), if any set has mirrors."""
+        if not any(mirror_set.enabled for mirror_set in self.sets.values()):
+            return
+        with self._lock:
+            if self._thread_pid == os.getpid():
+                return
+            self._thread_pid = os.getpid()
+        threading.Thread(target=self._run, name="mirror-prober", daemon=True).start()
+
+    def _run(self) -> None:
+        while True:
+            try:
+                self.probe()
+            except Exception:  # never let the prober die
+                logger.exception("mirrors: probe failed")
+            time.sleep(self._interval)
+
+
+mirrors = Mirrors(
+    [
+        MirrorSet("iso", DEFAULT_PROFILE.iso_url, PXE_UBUNTU_ISO_MIRRORS, MIRROR_FAILURES_DOWN, MIRROR_INSTALL_SECONDS),
+        MirrorSet(
+            "autoinstall", DEFAULT_PROFILE.autoinstall_url, PXE_AUTOINSTALL_MIRRORS, MIRROR_FAILURES_DOWN,
+            MIRROR_INSTALL_SECONDS,
+        ),
+    ],
+    MIRROR_PROBE_SECONDS,
+    MIRROR_PROBE_TIMEOUT_SECONDS,
+)
@@ -1,20 +1,25 @@
 """
 SQLAlchemy ORM models for the app.
 
-Defines Base (declarative base for all models) and Node. Each Node row is one
-machine identified by MAC; the reinstall flag tells /boot whether to serve the
-Ubuntu installer script or a local-disk boot script. local_boot_script stores
-an optional per-node iPXE command used when reinstall is false; when null, the
-default "exit" script is returned.
+Defines Base (declarative base for all models), Node, BootProfile, the boot
+history tables BootEvent and BootRollup, and the NodeChange feed. Each Node
+row is one machine identified by MAC (stored as an integer, see MacAddress);
+the reinstall flag tells /boot whether to serve the Ubuntu installer script or
+a local-disk boot script. local_boot_script
+stores an optional per-node iPXE command used when reinstall is false; when
+null, the default "exit" script is returned. boot_profile names the BootProfile
+used for the installer script; when null, the env-configured default is used.
+install_group and install_started_at are the rolling reinstall state (app.rollout).
 """
 
 from datetime import datetime, timezone
 from typing import Optional
 
-from sqlalchemy import Boolean, DateTime, Integer, String, TypeDecorator
+from sqlalchemy import BigInteger, Boolean, DateTime, Index, Integer, String, Text, TypeDecorator, UniqueConstraint
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 
 from app.config import TIMEZONE
+from app.macs import format_mac, parse_mac
 
 
 class Base(DeclarativeBase):
@@ -69,6 +74,41 @@ class UTCDateTime(TypeDecorator):
         return value.astimezone(timezone.utc)
 
 
+class MacAddress(TypeDecorator):
+    """
+    MAC address stored as a 48-bit integer (app.macs) and read back in
+    canonical string form, so callers keep comparing and binding
+    "aa:bb:cc:dd:ee:ff" while the column and its index hold 8-byte integers
+    (SQLite stores 6) instead of 17-character text. Integers bind as they
+    are, which is how prefix ranges are queried.
+    """
+
+    impl = BigInteger
+    cache_ok = True
+
+    def process_bind_param(self, value: str | int | None, dialect) -> int | None:
+        """Parse the MAC; reject anything that is not one (loudly, like UTCDateTime)."""
+        if value is None or isinstance(value, int):
+            return value
+        parsed = parse_mac(value)
+        if parsed is None:
+            raise ValueError(f"not a MAC address: {value!r}")
+        return parsed
+
+    def process_result_value(self, value: int | str | None, dialect) -> str | None:
+        """
+        Format the integer. A str is a MAC written as text by a process still
+        running the previous version during a rolling upgrade (SQLite keeps
+        it as text); it is normalized rather than failing the whole read.
+        """
+        if value is None:
+            return None
+        if isinstance(value, str):
+            parsed = parse_mac(value)
+            return value if parsed is None else format_mac(parsed)
+        return format_mac(value)
+
+
 def _iso(d: datetime | None) -> str | None:
     """
     Render a stored datetime as an ISO-8601 string with explicit offset.
@@ -100,23 +140,37 @@ class Node(Base):
     local_boot_script stores the per-node iPXE command used for local disk boot
     (e.g. "sanboot --no-describe --drive 0x80"); null means fall back to "exit".
 
+    install_group caps concurrent installs per group (e.g. a rack behind one
+    uplink); install_started_at is set when app.rollout admits a flagged node
+    to install and cleared whenever reinstall is written, so "reinstall and no
+    install_started_at" is the queue. Both indexes lead to a range scan over
+    the running installs only.
+
     Datetime columns use the UTCDateTime decorator so values are stored as UTC
     on every backend and read back tz-aware, regardless of whether the
     underlying dialect supports tz-aware columns natively.
     """
     __tablename__ = "nodes"
+    __table_args__ = (
+        Index("ix_nodes_install_state", "reinstall", "install_started_at"),
+        Index("ix_nodes_install_group", "install_group", "install_started_at"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-    mac: Mapped[str] = mapped_column(String(17), unique=True, nullable=False, index=True)
+    mac: Mapped[str] = mapped_column(MacAddress, unique=True, nullable=False, index=True)
     reinstall: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
     local_boot_script: Mapped[Optional[str]] = mapped_column(String(256), nullable=True, default=None)
-    last_seen: Mapped[datetime | None] = mapped_column(UTCDateTime, nullable=True)
+    boot_profile: Mapped[Optional[str]] = mapped_column(String(64), nullable=True, default=None)
+    last_seen: Mapped[datetime | None] = mapped_column(UTCDateTime, nullable=True, index=True)
     created_at: Mapped[datetime] = mapped_column(UTCDateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
+    install_group: Mapped[Optional[str]] = mapped_column(String(64), nullable=True, default=None)
+    install_started_at: Mapped[datetime | None] = mapped_column(UTCDateTime, nullable=True, default=None)
 
     def to_dict(self) -> dict:
         """
         Return a JSON-serializable dict of this node (mac, reinstall,
-        local_boot_script, last_seen, created_at). Datetimes are ISO 8601
+        local_boot_script, boot_profile, last_seen, created_at, install_group,
+        install_started_at). Datetimes are ISO 8601
         strings with an explicit offset (per TIMEZONE) so clients can parse
         them without guessing.
         """
@@ -124,6 +178,104 @@ class Node(Base):
             "mac": self.mac,
             "reinstall": self.reinstall,
             "local_boot_script": self.local_boot_script,
+            "boot_profile": self.boot_profile,
             "last_seen": _iso(self.last_seen),
             "created_at": _iso(self.created_at),
+            "install_group": self.install_group,
+            "install_started_at": _iso(self.install_started_at),
         }
+
+
+class BootProfile(Base):
+    """
+    Named installer configuration assignable to nodes (Node.boot_profile).
+    Each URL/cmdline field is a ${mac} / ${mac_hyphen} / ${ip} template; null
+    means "inherit the env-configured default" (PXE_UKI_URL,
+    PXE_UBUNTU_ISO_URL, PXE_AUTOINSTALL_URL, no extra cmdline), so a profile
+    only has to spell out what differs, e.g. the ISO for a 22.04 fleet.
+    Compiled forms are held in memory by app.boot_profiles.
+    """
+    __tablename__ = "boot_profiles"
+
+    name: Mapped[str] = mapped_column(String(64), primary_key=True, nullable=False)
+    uki_url: Mapped[Optional[str]] = mapped_column(String(512), nullable=True, default=None)
+    iso_url: Mapped[Optional[str]] = mapped_column(String(512), nullable=True, default=None)
+    autoinstall_url: Mapped[Optional[str]] = mapped_column(String(512), nullable=True, default=None)
+    extra_cmdline: Mapped[Optional[str]] = mapped_column(String(512), nullable=True, default=None)
+    updated_at: Mapped[datetime] = mapped_column(UTCDateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
+
+    def to_dict(self) -> dict:
+        """Return a JSON-serializable dict of this profile; null fields inherit the default."""
+        return {
+            "name": self.name,
+            "uki_url": self.uki_url,
+            "iso_url": self.iso_url,
+            "autoinstall_url": self.autoinstall_url,
+            "extra_cmdline": self.extra_cmdline,
+            "updated_at": _iso(self.updated_at),
+        }
+
+
+class BootEvent(Base):
+    """
+    One script served by /boot: raw journal row, append-only. Written in
+    batches by app.boot_journal and deleted once older than
+    BOOT_EVENTS_RETENTION_DAYS; history queries read BootRollup instead.
+    kind is "reinstall" or "local_disk". Not a foreign key to nodes: the
+    journal outlives node deletions.
+    """
+    __tablename__ = "boot_events"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    mac: Mapped[str] = mapped_column(String(17), nullable=False)
+    client_ip: Mapped[Optional[str]] = mapped_column(String(45), nullable=True, default=None)
+    kind: Mapped[str] = mapped_column(String(16), nullable=False)
+    booted_at: Mapped[datetime] = mapped_column(UTCDateTime, nullable=False, index=True)
+
+    def to_dict(self) -> dict:
+        """Return a JSON-serializable dict of this event."""
+        return {
+            "mac": self.mac,
+            "client_ip": self.client_ip,
+            "kind": self.kind,
+            "booted_at": _iso(self.booted_at),
+        }
+
+
+class BootRollup(Base):
+    """
+    Boot count per node, script kind and time bucket. period is "hour" or
+    "day"; bucket is the UTC start of the hour/day. Maintained by the journal
+    flush with one upsert per (period, bucket, mac, kind) in the batch.
+    """
+    __tablename__ = "boot_rollups"
+    __table_args__ = (
+        UniqueConstraint("period", "bucket", "mac", "kind", name="uq_boot_rollups_bucket"),
+        Index("ix_boot_rollups_mac", "mac", "period", "bucket"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    period: Mapped[str] = mapped_column(String(4), nullable=False)
+    bucket: Mapped[datetime] = mapped_column(UTCDateTime, nullable=False)
+    mac: Mapped[str] = mapped_column(String(17), nullable=False)
+    kind: Mapped[str] = mapped_column(String(16), nullable=False)
+    count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+
+class NodeChange(Base):
+    """
+    One change to a node, appended in the same transaction as the write it
+    describes and streamed by GET /nodes/changes (app.change_feed). id is the
+    event id clients resume from, so it must never be reused: SQLite gets
+    AUTOINCREMENT. kind is "created", "seen", "updated" or "deleted"; data is
+    a JSON object of the changed fields. Deleted after
+    CHANGE_FEED_RETENTION_HOURS.
+    """
+    __tablename__ = "node_changes"
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    kind: Mapped[str] = mapped_column(String(16), nullable=False)
+    mac: Mapped[str] = mapped_column(String(17), nullable=False)
+    data: Mapped[Optional[str]] = mapped_column(Text, nullable=True, default=None)
+    changed_at: Mapped[datetime] = mapped_column(UTCDateTime, nullable=False, index=True)
@@ -0,0 +1,162 @@
+"""
+In-app cloud-init NoCloud datasource for the installer (routes/nocloud.py).
+
+With NOCLOUD_DIR set, ds=nocloud-net;s= points at /nocloud/<mac>/ and the
+installer fetches its documents from this app instead of a separate image
+host. Each document is a ${name} template (app.templating) read from
+NOCLOUD_DIR/<document>, or NOCLOUD_DIR/<profile>/<document> for nodes with
+that boot profile. Templates are filled with node fields (node_values());
+other ${...} (shell variables in late-commands, say) are left as written.
+
+Templates are compiled once and re-read only when a file under NOCLOUD_DIR
+changes (checked by stat at most every NOCLOUD_RELOAD_SECONDS). Their version
+is a digest of every template, so each rendered document is cached under
+(template version, document, node fields): a node edit or a template change
+simply misses, with no invalidation to coordinate between workers. The ETag
+is a digest of the body, identical in every worker, so a re-fetch answers 304.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from app.boot_profiles import PROFILE_NAME_PATTERN
+from app.config import NOCLOUD_CACHE_SIZE, NOCLOUD_DIR, NOCLOUD_RELOAD_SECONDS
+from app.metrics import NOCLOUD_DOCUMENTS
+from app.templating import CompiledTemplate, compile_template
+
+logger = logging.getLogger(__name__)
+
+# Documents served, in the order cloud-init asks for them.
+DOCUMENTS = ("meta-data", "user-data", "vendor-data", "network-config")
+
+# Used when NOCLOUD_DIR has no file for the document; None means 404.
+_BUILTIN = {
+    "meta-data": "instance-id: pxe-${mac_hex}\n",
+    "vendor-data": "",
+}
+
+_MAX_TEMPLATE_BYTES = 1024 * 1024
+
+
+def node_values(mac: str, node_id: int, boot_profile: str | None, install_group: str | None) -> dict[str, str]:
+    """Slot values for NoCloud templates. Unlike url_values() nothing is URL-encoded."""
+    return {
+        "mac": mac,
+        "mac_hyphen": mac.replace(":", "-"),
+        "mac_hex": mac.replace(":", ""),
+        "node_id": str(node_id),
+        "boot_profile": boot_profile or "",
+        "install_group": install_group or "",
+    }
+
+
+class NoCloudTemplates:
+    """
+    The compiled templates of one NOCLOUD_DIR and an LRU of rendered documents.
+    render() only touches the disk when a reload check is due.
+    """
+
+    def __init__(self, root: str, reload_seconds: float, cache_size: int) -> None:
+        self.root = root
+        self._reload_seconds = reload_seconds
+        self._cache_size = max(cache_size, 0)
+        self._templates: dict[tuple[str | None, str], CompiledTemplate] = {}
+        self._signature: tuple | None = None
+        self._checked = float("-inf")
+        self.version = ""
+        self._cache: OrderedDict[tuple, tuple[bytes, str]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.root)
+
+    def _paths(self):
+        """(profile or None, document, path) for every template file present."""
+        for document in DOCUMENTS:
+            path = os.path.join(self.root, document)
+            if os.path.isfile(path):
+                yield None, document, path
+        with os.scandir(self.root) as entries:
+            for entry in sorted(entries, key=lambda e: e.name):
+                if entry.is_dir() and PROFILE_NAME_PATTERN.match(entry.name):
+                    for document in DOCUMENTS:
+                        path = os.path.join(entry.path, document)
+                        if os.path.isfile(path):
+                            yield entry.name, document, path
+
+    def _refresh(self) -> None:
+        """Reload every template if any file was added, removed or changed. Caller holds the lock."""
+        try:
+            paths = list(self._paths())
+            signature = tuple((path, (st := os.stat(path)).st_mtime_ns, st.st_size) for _, _, path in paths)
+        except OSError as exc:
+            logger.warning("nocloud: cannot read %s: %s", self.root, exc)
+            return  # keep serving what was loaded
+        if signature == self._signature:
+            return
+        templates, digest = {}, hashlib.sha256()
+        try:
+            for profile, document, path in paths:
+                with open(path, "rb") as fh:
+                    raw = fh.read(_MAX_TEMPLATE_BYTES + 1)
+                if len(raw) > _MAX_TEMPLATE_BYTES:
+                    logger.warning("nocloud: %s is larger than %d bytes; skipped", path, _MAX_TEMPLATE_BYTES)
+                    continue
+                templates[(profile, document)] = compile_template(raw.decode("utf-8"))
+                digest.update(f"{profile}/{document}\0".encode() + raw + b"\0")
+        except (OSError, UnicodeDecodeError) as exc:
+            logger.warning("nocloud: cannot load templates from %s: %s", self.root, exc)
+            return
+        self._templates, self._signature = templates, signature
+        self.version = digest.hexdigest()[:16]
+        self._cache.clear()
+        logger.info("nocloud: loaded %d templates from %s (version %s)", len(templates), self.root, self.version)
+
+    def _template(self, document: str, profile: str | None) -> CompiledTemplate | None:
+        template = self._templates.get((profile, document)) if profile else None
+        if template is None:
+            template = self._templates.get((None, document))
+        if template is None and document in _BUILTIN:
+            template = compile_template(_BUILTIN[document])
+        return template
+
+    def render(self, document: str, values: dict[str, str]) -> tuple[bytes, str] | None:
+        """(body, etag) of document for the node described by values; None when there is no template."""
+        with self._lock:
+            now = time.monotonic()
+            if now - self._checked >= self._reload_seconds:
+                self._checked = now
+                self._refresh()
+            key = (self.version, document, tuple(sorted(values.items())))
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                NOCLOUD_DOCUMENTS.inc(document, "hit")
+                return cached
+            template = self._template(document, values["boot_profile"])
+        if template is None:
+            return None
+        body = template.render(values).encode("utf-8")
+        rendered = (body, hashlib.sha256(body).hexdigest()[:32])
+        NOCLOUD_DOCUMENTS.inc(document, "miss")
+        if self._cache_size:
+            with self._lock:
+                self._cache[key] = rendered
+                if len(self._cache) > self._cache_size:
+                    self._cache.popitem(last=False)
+        return rendered
+
+    def reset(self) -> None:
+        """Forget the templates and rendered documents; the next render reloads."""
+        with self._lock:
+            self._templates, self._signature, self.version = {}, None, ""
+            self._checked = float("-inf")
+            self._cache.clear()
+
+
+nocloud = NoCloudTemplates(NOCLOUD_DIR, NOCLOUD_RELOAD_SECONDS, NOCLOUD_CACHE_SIZE)
@@ -0,0 +1,213 @@
+"""
+Live profiling tools behind the opt-in /debug routes (PROFILING_ENABLED).
+
+- StackSampler: a background thread that snapshots every thread's Python stack
+  (sys._current_frames) at a fixed rate for a bounded window and aggregates
+  them as collapsed stacks ("thread;outer;...;inner count"), the input format
+  of flamegraph.pl, speedscope and similar viewers. Nothing runs outside a
+  window; during one the cost is one stack walk per thread per tick.
+- RequestProfiles: the last few per-request cProfile captures, rendered as
+  pstats text or the marshal format pstats/snakeviz load.
+- tracemalloc helpers: start/stop tracing, top allocations of a snapshot, and
+  the difference between a baseline snapshot and now.
+
+All state is per process. With several workers each one profiles itself; the
+/debug responses carry the worker pid so results can be told apart.
+"""
+
+import cProfile
+import io
+import itertools
+import marshal
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, OrderedDict
+
+MAX_SAMPLER_SECONDS = 300.0
+MAX_SAMPLER_HZ = 1000.0
+
+
+class StackSampler:
+    """One sampling window at a time; the last finished window is kept for collection."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self._deadline = 0.0
+        self._counts: Counter[str] = Counter()
+        self._samples = 0
+        self._window: dict | None = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def remaining(self) -> float:
+        return max(0.0, self._deadline - time.monotonic()) if self.running else 0.0
+
+    def start(self, seconds: float, hz: float) -> bool:
+        """Start a window; False when one is already running."""
+        with self._lock:
+            if self.running:
+                return False
+            self._counts = Counter()
+            self._samples = 0
+            self._window = {"seconds": seconds, "hz": hz, "pid": os.getpid()}
+            self._deadline = time.monotonic() + seconds
+            self._thread = threading.Thread(
+                target=self._run, args=(self._deadline, 1.0 / hz), name="stack-sampler", daemon=True
+            )
+            self._thread.start()
+            return True
+
+    def _run(self, deadline: float, interval: float) -> None:
+        me = threading.get_ident()
+        labels: dict = {}  # code object -> "module:qualname", so each frame is formatted once
+        names: dict[int, str] = {}
+        next_names = 0.0
+        while (now := time.monotonic()) < deadline:
+            if now >= next_names:  # thread names change rarely; refresh once a second
+                names = {t.ident: t.name for t in threading.enumerate()}
+                next_names = now + 1.0
+            tick: Counter[str] = Counter()
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    label = labels.get(code)
+                    if label is None:
+                        label = labels[code] = f"{frame.f_globals.get('__name__', '?')}:{code.co_qualname}"
+                    stack.append(label)
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                tick[";".join(reversed(stack))] += 1
+            with self._lock:
+                self._counts.update(tick)
+                self._samples += 1
+            time.sleep(interval)
+
+    def collapsed(self) -> str:
+        """Collapsed stacks of the current or last window, heaviest first."""
+        with self._lock:
+            counts = self._counts.copy()
+        return "".join(f"{stack} {count}\n" for stack, count in counts.most_common())
+
+    @property
+    def samples(self) -> int:
+        return self._samples
+
+    @property
+    def window(self) -> dict | None:
+        return self._window
+
+
+class RequestProfiles:
+    """Bounded store of finished cProfile captures, keyed by "<pid>-<n>"."""
+
+    def __init__(self, keep: int = 32) -> None:
+        self._keep = keep
+        self._profiles: OrderedDict[str, tuple[str, cProfile.Profile]] = OrderedDict()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def add(self, description: str, profile: cProfile.Profile) -> str:
+        profile_id = f"{os.getpid()}-{next(self._ids)}"
+        with self._lock:
+            self._profiles[profile_id] = (description, profile)
+            while len(self._profiles) > self._keep:
+                self._profiles.popitem(last=False)
+        return profile_id
+
+    def list(self) -> list[dict]:
+        with self._lock:
+            return [{"id": pid, "request": desc} for pid, (desc, _) in reversed(self._profiles.items())]
+
+    def get(self, profile_id: str) -> tuple[str, cProfile.Profile] | None:
+        with self._lock:
+            return self._profiles.get(profile_id)
+
+
+def render_profile(profile: cProfile.Profile, sort: str, limit: int) -> str:
+    """pstats text report of one capture."""
+    out = io.StringIO()
+    pstats.Stats(profile, stream=out).strip_dirs().sort_stats(sort).print_stats(limit)
+    return out.getvalue()
+
+
+def dump_profile(profile: cProfile.Profile) -> bytes:
+    """The marshal format written by pstats.Stats.dump_stats(); loadable by pstats and snakeviz."""
+    profile.create_stats()
+    return marshal.dumps(profile.stats)
+
+
+# Allocations made by tracemalloc itself or the import machinery are noise here.
+_TRACEMALLOC_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+
+class MemorySnapshots:
+    """tracemalloc control plus one stored baseline snapshot for diffs."""
+
+    def __init__(self) -> None:
+        self.baseline: tracemalloc.Snapshot | None = None
+
+    @staticmethod
+    def start(frames: int) -> None:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+
+    def stop(self) -> None:
+        tracemalloc.stop()
+        self.baseline = None
+
+    @staticmethod
+    def take() -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces(_TRACEMALLOC_FILTERS)
+
+    @staticmethod
+    def status() -> dict:
+        current, peak = tracemalloc.get_traced_memory()
+        return {
+            "tracing": tracemalloc.is_tracing(),
+            "frames": tracemalloc.get_traceback_limit(),
+            "traced_bytes": current,
+            "peak_bytes": peak,
+            "pid": os.getpid(),
+        }
+
+
+def top_stats(snapshot: tracemalloc.Snapshot, key: str, limit: int) -> list[dict]:
+    """Largest allocation sites of a snapshot."""
+    return [
+        {"site": str(stat.traceback), "size_bytes": stat.size, "count": stat.count}
+        for stat in snapshot.statistics(key)[:limit]
+    ]
+
+
+def diff_stats(new: tracemalloc.Snapshot, old: tracemalloc.Snapshot, key: str, limit: int) -> list[dict]:
+    """Allocation sites that grew (or shrank) the most between two snapshots."""
+    return [
+        {
+            "site": str(stat.traceback),
+            "size_bytes": stat.size,
+            "size_diff_bytes": stat.size_diff,
+            "count": stat.count,
+            "count_diff": stat.count_diff,
+        }
+        for stat in new.compare_to(old, key)[:limit]
+    ]
+
+
+sampler = StackSampler()
+request_profiles = RequestProfiles()
+memory = MemorySnapshots()
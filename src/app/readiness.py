@@ -0,0 +1,315 @@
+"""
+Background readiness prober behind GET /ready.
+
+A daemon thread per process runs every check once per READINESS_TTL_SECONDS
+and keeps the last result; /ready only reads it, so however often a load
+balancer polls, the database sees one probe per TTL per worker. The probe uses
+its own sqlite3 connection (like the boot cache poller) rather than the pool,
+so it never competes with /boot for a pooled connection.
+
+Checks:
+- database: the DB file still exists at DATABASE_PATH (a vanished volume
+  leaves open handles working on the unlinked inode) and a one-row read's
+  round-trip latency.
+- write_lock: BEGIN IMMEDIATE + ROLLBACK, i.e. how long it takes to get the
+  write lock; fails when it is not granted within READINESS_TIMEOUT_SECONDS.
+- artifacts: READINESS_ARTIFACTS exist and are non-empty under TFTP_ROOT.
+- upstream: TCP connect to the hosts of PXE_UBUNTU_ISO_URL and
+  PXE_AUTOINSTALL_URL. Not critical: every instance shares the same mirror,
+  so taking this one out of rotation would not help; it reports "degraded".
+
+With DATABASE_URL (PostgreSQL) there is no file to check: database is the
+same read over a dedicated one-connection engine with statement_timeout, and
+write_lock fails while the server is a read-only standby (e.g. the old primary
+after a failover), since PostgreSQL has no database-wide write lock to time.
+
+A critical failure, or a result older than the prober should ever let it get
+(the prober itself is stuck, e.g. on a hung volume), makes /ready return 503.
+"""
+
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from urllib.parse import quote, urlsplit
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.config import (
+    DATABASE_PATH,
+    NOCLOUD_DIR,
+    PXE_AUTOINSTALL_URL,
+    PXE_UBUNTU_ISO_URL,
+    READINESS_ARTIFACTS,
+    READINESS_TIMEOUT_SECONDS,
+    READINESS_TTL_SECONDS,
+    TFTP_ROOT,
+)
+from app.db import IS_SQLITE, NODES_VERSION_KEY, apply_sqlite_profile, engine
+
+logger = logging.getLogger(__name__)
+
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def upstream_hosts(urls) -> list[tuple[str, int]]:
+    """
+    Distinct (host, port) pairs of the http(s) URLs. Hosts that are iPXE or
+    template variables (e.g. ${next-server}) are only known per client and are
+    skipped, as are tftp:// URLs.
+    """
+    hosts = []
+    for url in urls:
+        if not url:
+            continue
+        parts = urlsplit(url)
+        if parts.scheme not in _DEFAULT_PORTS or not parts.hostname or "$" in parts.netloc:
+            continue
+        try:
+            host = (parts.hostname, parts.port or _DEFAULT_PORTS[parts.scheme])
+        except ValueError:  # malformed port
+            continue
+        if host not in hosts:
+            hosts.append(host)
+    return hosts
+
+
+def _elapsed_ms(started: float) -> float:
+    return round((time.perf_counter() - started) * 1000, 3)
+
+
+class ReadinessProber:
+    """
+    Runs the checks on a daemon thread, started lazily on the first report()
+    in each process (and again after fork). probe() runs them synchronously.
+    """
+
+    def __init__(self, ttl: float, timeout: float, database_path: str, tftp_root: str,
+                 artifacts: tuple[str, ...], upstream: list[tuple[str, int]], database_url=None) -> None:
+        self._ttl = ttl
+        self._timeout = timeout
+        self._database_path = database_path
+        self._tftp_root = tftp_root
+        self._artifacts = artifacts
+        self._upstream = upstream
+        self._database_url = database_url
+        self._pg_engine = None
+        self._pg_pid: int | None = None
+        self._conn: sqlite3.Connection | None = None
+        self._conn_pid: int | None = None
+        self._lock = threading.Lock()
+        self._probe_lock = threading.Lock()  # one probe at a time on the shared connection
+        self._first = threading.Event()
+        self._thread_pid: int | None = None
+        self._result: dict | None = None
+        self._finished = 0.0
+
+    @property
+    def stale_after(self) -> float:
+        """Age past which a result means the prober is stuck: two intervals plus every check timing out."""
+        return 2 * self._ttl + self._timeout * (2 + len(self._upstream))
+
+    def _connection(self) -> sqlite3.Connection:
+        """Dedicated autocommit connection so the probe controls BEGIN/ROLLBACK itself."""
+        pid = os.getpid()
+        if self._conn is None or self._conn_pid != pid:
+            # mode=rw: never create an empty database where the real one vanished.
+            self._conn = sqlite3.connect(
+                f"file:{quote(self._database_path)}?mode=rw",
+                uri=True,
+                timeout=self._timeout,
+                isolation_level=None,
+                check_same_thread=False,
+            )
+            apply_sqlite_profile(self._conn)
+            self._conn.execute(f"PRAGMA busy_timeout={int(self._timeout * 1000)}")
+            self._conn_pid = pid
+        return self._conn
+
+    def _drop_connection(self) -> None:
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except sqlite3.Error:
+                pass
+        self._conn = None
+
+    def _check_database(self) -> dict:
+        if not os.path.exists(self._database_path):
+            return {"ok": False, "error": f"database file {self._database_path} is missing"}
+        started = time.perf_counter()
+        try:
+            self._connection().execute("SELECT value FROM app_config WHERE key = ?", (NODES_VERSION_KEY,)).fetchall()
+        except sqlite3.Error as exc:
+            self._drop_connection()
+            return {"ok": False, "error": str(exc), "latency_ms": _elapsed_ms(started)}
+        return {"ok": True, "latency_ms": _elapsed_ms(started)}
+
+    def _check_write_lock(self, database_ok: bool) -> dict:
+        if not database_ok:
+            return {"ok": False, "error": "skipped: database check failed"}
+        started = time.perf_counter()
+        try:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("ROLLBACK")
+        except sqlite3.Error as exc:
+            self._drop_connection()
+            return {"ok": False, "error": str(exc), "latency_ms": _elapsed_ms(started)}
+        return {"ok": True, "latency_ms": _elapsed_ms(started)}
+
+    def _pg(self):
+        """Dedicated one-connection engine (PostgreSQL), so the probe never waits on the app's pool."""
+        if self._pg_engine is None or self._pg_pid != os.getpid():
+            self._pg_pid = os.getpid()
+            self._pg_engine = create_engine(
+                self._database_url,
+                pool_size=1,
+                max_overflow=0,
+                pool_pre_ping=True,
+                pool_timeout=self._timeout,
+                connect_args={"connect_timeout": max(1, round(self._timeout))},
+            )
+        return self._pg_engine
+
+    def _check_database_pg(self) -> dict:
+        started = time.perf_counter()
+        try:
+            with self._pg().begin() as conn:
+                conn.execute(text(f"SET LOCAL statement_timeout = {int(self._timeout * 1000)}"))
+                conn.execute(text("SELECT value FROM app_config WHERE key = :key"), {"key": NODES_VERSION_KEY}).all()
+        except SQLAlchemyError as exc:
+            self._pg().dispose()
+            return {"ok": False, "error": str(exc.orig or exc), "latency_ms": _elapsed_ms(started)}
+        return {"ok": True, "latency_ms": _elapsed_ms(started)}
+
+    def _check_write_lock_pg(self, database_ok: bool) -> dict:
+        if not database_ok:
+            return {"ok": False, "error": "skipped: database check failed"}
+        started = time.perf_counter()
+        try:
+            with self._pg().connect() as conn:
+                read_only = conn.execute(
+                    text("SELECT pg_is_in_recovery() OR current_setting('transaction_read_only') = 'on'")
+                ).scalar()
+        except SQLAlchemyError as exc:
+            self._pg().dispose()
+            return {"ok": False, "error": str(exc.orig or exc), "latency_ms": _elapsed_ms(started)}
+        if read_only:
+            return {"ok": False, "error": "server is read-only (standby)", "latency_ms": _elapsed_ms(started)}
+        return {"ok": True, "latency_ms": _elapsed_ms(started)}
+
+    def _check_artifacts(self) -> dict:
+        missing = []
+        for name in self._artifacts:
+            try:
+                if os.stat(os.path.join(self._tftp_root, name)).st_size == 0:
+                    missing.append(name)
+            except OSError:
+                missing.append(name)
+        result = {"ok": not missing, "root": self._tftp_root, "files": list(self._artifacts)}
+        if missing:
+            result["missing"] = missing
+        return result
+
+    def _check_upstream(self) -> dict:
+        hosts = {}
+        for host, port in self._upstream:
+            started = time.perf_counter()
+            try:
+                socket.create_connection((host, port), timeout=self._timeout).close()
+            except OSError as exc:
+                hosts[f"{host}:{port}"] = {"ok": False, "error": str(exc) or type(exc).__name__}
+            else:
+                hosts[f"{host}:{port}"] = {"ok": True, "latency_ms": _elapsed_ms(started)}
+        return {"ok": all(entry["ok"] for entry in hosts.values()), "hosts": hosts}
+
+    def probe(self) -> dict:
+        """Run every check now, store and return the result."""
+        with self._probe_lock:
+            if self._database_url is None:
+                database = self._check_database()
+                write_lock = self._check_write_lock(database["ok"])
+            else:
+                database = self._check_database_pg()
+                write_lock = self._check_write_lock_pg(database["ok"])
+            checks = {
+                "database": database,
+                "write_lock": write_lock,
+                "artifacts": self._check_artifacts(),
+                "upstream": self._check_upstream(),
+            }
+        if not all(checks[name]["ok"] for name in ("database", "write_lock", "artifacts")):
+            status = "unready"
+        elif not checks["upstream"]["ok"]:
+            status = "degraded"
+        else:
+            status = "ready"
+        result = {
+            "status": status,
+            "checked_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "checks": checks,
+        }
+        with self._lock:
+            self._result = result
+            self._finished = time.monotonic()
+        self._first.set()
+        if status != "ready":
+            logger.warning("readiness: %s: %s", status, {k: v for k, v in checks.items() if not v["ok"]})
+        return result
+
+    def _run(self) -> None:
+        while True:
+            try:
+                self.probe()
+            except Exception:  # noqa: BLE001 - keep probing; a stale result turns /ready red
+                logger.exception("readiness: probe failed")
+            time.sleep(self._ttl)
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._thread_pid == os.getpid():
+                return
+            self._thread_pid = os.getpid()
+            # A forked child must not serve its parent's result as its own.
+            self._result = None
+            self._first = threading.Event()
+        threading.Thread(target=self._run, name="readiness-prober", daemon=True).start()
+
+    def report(self, wait: float = 0.0) -> tuple[int, dict]:
+        """
+        (HTTP status, body) for /ready from the last stored result. Starts the
+        prober if needed and waits up to wait seconds for a first result.
+        """
+        if self._thread_pid != os.getpid():
+            self._start()
+        if wait > 0:
+            self._first.wait(wait)
+        with self._lock:
+            result = self._result
+            age = time.monotonic() - self._finished
+        if result is None:
+            return 503, {"status": "starting"}
+        body = {**result, "age_seconds": round(age, 3)}
+        if age > self.stale_after:
+            body["status"] = "stale"
+        return (200 if body["status"] in ("ready", "degraded") else 503), body
+
+    @property
+    def has_result(self) -> bool:
+        return self._result is not None and self._thread_pid == os.getpid()
+
+
+readiness = ReadinessProber(
+    READINESS_TTL_SECONDS,
+    READINESS_TIMEOUT_SECONDS,
+    DATABASE_PATH,
+    TFTP_ROOT,
+    READINESS_ARTIFACTS,
+    upstream_hosts((PXE_UBUNTU_ISO_URL, None if NOCLOUD_DIR else PXE_AUTOINSTALL_URL)),
+    database_url=None if IS_SQLITE else engine.url,
+)
@@ -0,0 +1,177 @@
+"""
+Rolling reinstalls: flagging 200 nodes for reinstall no longer sends 200
+installers to the image host at once.
+
+A node with reinstall set is queued until it is admitted. /boot asks admit()
+whether to serve the installer: a node whose install is already running is
+served at once; a queued one is admitted when a new install may start (inside
+REINSTALL_WINDOWS) and there is a free slot under REINSTALL_MAX_ACTIVE and,
+for nodes with an install_group, REINSTALL_MAX_ACTIVE_PER_GROUP. Admission
+stamps Node.install_started_at; every write of reinstall clears it, so an
+install finishes (its slot frees) when the installer or an operator clears
+the flag. One that has not finished after REINSTALL_TIMEOUT_MINUTES stops
+holding its slot and queues again on its next boot. Queued nodes get their
+local-disk script.
+
+The state lives in the nodes table, so the queue survives restarts and is
+shared by every worker and container. Slots are counted with range scans on
+ix_nodes_install_state / ix_nodes_install_group that only visit running
+installs, and admissions are serialised by bumping the reinstall_admissions
+counter first (the SQLite write lock, a row lock on PostgreSQL), so the caps
+hold across processes. With no cap and no window configured the scheduler is
+off and /boot serves the installer to every flagged node as before.
+"""
+
+import logging
+import re
+from datetime import datetime, timedelta
+
+from sqlalchemy import bindparam, func, select, update
+
+from app.change_feed import record_changes
+from app.config import (
+    REINSTALL_MAX_ACTIVE,
+    REINSTALL_MAX_ACTIVE_PER_GROUP,
+    REINSTALL_TIMEOUT_MINUTES,
+    REINSTALL_WINDOWS,
+    TIMEZONE,
+)
+from app.db import NODES_VERSION_KEY, bump_counter, engine
+from app.metrics import REINSTALL_ADMISSIONS
+from app.models import Node
+
+logger = logging.getLogger(__name__)
+
+# Names accepted for Node.install_group (same shape as boot profile names).
+GROUP_NAME_PATTERN = re.compile(r"^[A-Za-z0-9][A-Za-z0-9._-]{0,63}$")
+
+# app_config key bumped by every admission attempt that may start an install.
+ADMISSIONS_KEY = "reinstall_admissions"
+
+_NODE_STATE = select(Node.reinstall, Node.install_group, Node.install_started_at).where(
+    Node.mac == bindparam("b_mac")
+)
+_RUNNING = select(func.count()).where(Node.reinstall.is_(True), Node.install_started_at >= bindparam("b_cutoff"))
+_RUNNING_IN_GROUP = select(func.count()).where(
+    Node.install_group == bindparam("b_group"),
+    Node.install_started_at >= bindparam("b_cutoff"),
+    Node.reinstall.is_(True),
+)
+_START = (
+    update(Node)
+    .where(Node.mac == bindparam("b_mac"), Node.reinstall.is_(True))
+    .values(install_started_at=bindparam("b_now"))
+)
+
+
+class Rollout:
+    """Admission of flagged nodes to install: caps per fleet and per group, and weekly windows."""
+
+    def __init__(self, max_active: int, max_active_per_group: int, windows, timeout_minutes: float) -> None:
+        self.max_active = max_active
+        self.max_active_per_group = max_active_per_group
+        self.windows = windows
+        self.timeout = timedelta(minutes=timeout_minutes)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.max_active or self.max_active_per_group or self.windows)
+
+    def window_open(self, now: datetime) -> bool:
+        """True when a new install may start at now (always, without REINSTALL_WINDOWS)."""
+        if not self.windows:
+            return True
+        local = now.astimezone(TIMEZONE)
+        minute, weekday = local.hour * 60 + local.minute, local.weekday()
+        for weekdays, start, end in self.windows:
+            if start < end:
+                if weekday in weekdays and start <= minute < end:
+                    return True
+            elif (weekday in weekdays and minute >= start) or ((weekday - 1) % 7 in weekdays and minute < end):
+                return True
+        return False
+
+    def _running(self, started_at: datetime | None, now: datetime) -> bool:
+        return started_at is not None and started_at >= now - self.timeout
+
+    def _full(self, conn, group: str | None, cutoff: datetime) -> bool:
+        """True when the fleet cap or the cap of group leaves no free slot."""
+        if self.max_active and conn.execute(_RUNNING, {"b_cutoff": cutoff}).scalar() >= self.max_active:
+            return True
+        return bool(
+            self.max_active_per_group
+            and group is not None
+            and conn.execute(_RUNNING_IN_GROUP, {"b_group": group, "b_cutoff": cutoff}).scalar()
+            >= self.max_active_per_group
+        )
+
+    def admit(self, mac: str, now: datetime) -> bool:
+        """
+        Whether /boot should serve mac (flagged for reinstall) the installer
+        now, starting its install if there is room. Blocking: the caps are
+        checked on a read-only connection, and only a node that finds a free
+        slot takes the short write transaction that re-checks and claims it,
+        so queued nodes rebooting while the caps are full never write. The
+        ASGI mode runs it in the DB thread pool.
+        """
+        cutoff = now - self.timeout
+        with engine.connect() as conn:
+            state = conn.execute(_NODE_STATE, {"b_mac": mac}).one_or_none()
+            if state is None or not state.reinstall:
+                return False  # cleared since the decision was cached
+            if self._running(state.install_started_at, now):
+                REINSTALL_ADMISSIONS.inc("running")
+                return True
+            if not self.window_open(now):
+                REINSTALL_ADMISSIONS.inc("outside_window")
+                return False
+            full = self._full(conn, state.install_group, cutoff)
+        if full:
+            started = False
+        else:
+            with engine.begin() as conn:
+                bump_counter(conn, ADMISSIONS_KEY)
+                started = (
+                    not self._full(conn, state.install_group, cutoff)
+                    and conn.execute(_START, {"b_mac": mac, "b_now": now}).rowcount == 1
+                )
+                if started:
+                    bump_counter(conn, NODES_VERSION_KEY)
+                    record_changes(conn, [("updated", mac, {"install_started_at": now})], now)
+        REINSTALL_ADMISSIONS.inc("started" if started else "queued")
+        if started:
+            logger.info("rollout: started reinstall of mac=%s (group %s)", mac, state.install_group)
+        return started
+
+    def status(self, now: datetime) -> dict:
+        """Configuration, running installs and queue length per group, for GET /reinstalls."""
+        cutoff = now - self.timeout
+        with engine.connect() as conn:
+            running = conn.execute(
+                select(Node.mac, Node.install_group, Node.install_started_at)
+                .where(Node.reinstall.is_(True), Node.install_started_at >= cutoff)
+                .order_by(Node.install_started_at)
+            ).all()
+            queued = conn.execute(
+                select(Node.install_group, func.count())
+                .where(
+                    Node.reinstall.is_(True),
+                    (Node.install_started_at.is_(None)) | (Node.install_started_at < cutoff),
+                )
+                .group_by(Node.install_group)
+            ).all()
+        return {
+            "enabled": self.enabled,
+            "max_active": self.max_active,
+            "max_active_per_group": self.max_active_per_group,
+            "window_open": self.window_open(now),
+            "running": [
+                {"mac": mac, "install_group": group, "install_started_at": started.astimezone(TIMEZONE).isoformat()}
+                for mac, group, started in running
+            ],
+            "queued": sum(count for _, count in queued),
+            "queued_by_group": {group or "": count for group, count in queued},
+        }
+
+
+rollout = Rollout(REINSTALL_MAX_ACTIVE, REINSTALL_MAX_ACTIVE_PER_GROUP, REINSTALL_WINDOWS, REINSTALL_TIMEOUT_MINUTES)
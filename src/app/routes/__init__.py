@@ -1,25 +1,51 @@
 """
-Routes package: registers /chain, /boot, /nodes, /health on the Flask app.
+Routes package: registers /chain, /boot, /files, /nodes, /nodes/changes, /profiles, /boots,
+/reinstalls, /mirrors, /nocloud, /backup, /export, /restore, /metrics, /health (and the opt-in /debug) on the Flask app.
 
-Each route group lives in its own module (chain, boot, nodes, health). Shared
-helpers (MAC normalization, auth, iPXE scripts) are in common. Entry point is
+Each route group lives in its own module (chain, boot, files, nodes, changes, profiles,
+history, reinstalls, mirrors, nocloud, backup, metrics, health, debug). Shared helpers (MAC normalization, auth, iPXE scripts) are in common. Entry point is
 register_routes(app), used by the app factory.
 """
 
 from flask import Flask
 
+from app.config import PROFILING_ENABLED
+
 
 def register_routes(app: Flask) -> None:
     """
-    Register all HTTP routes on the given Flask app: /chain, /boot, /nodes, /health.
+    Register all HTTP routes on the given Flask app: /chain, /boot, /files,
+    /nodes, /nodes/changes, /profiles, /boots, /reinstalls, /mirrors, /nocloud, /backup, /export, /restore, /metrics, /health, and /debug when PROFILING_ENABLED is set.
     Each route module uses get_db() for one session per request where needed.
     """
+    from app.routes.backup import register_backup_routes
     from app.routes.boot import register_boot_route
+    from app.routes.changes import register_changes_route
     from app.routes.chain import register_chain_route
+    from app.routes.files import register_files_route
     from app.routes.health import register_health_route
+    from app.routes.history import register_history_routes
+    from app.routes.metrics import register_metrics_route
+    from app.routes.mirrors import register_mirrors_route
+    from app.routes.nocloud import register_nocloud_route
     from app.routes.nodes import register_nodes_routes
+    from app.routes.profiles import register_profiles_routes
+    from app.routes.reinstalls import register_reinstalls_route
 
     register_chain_route(app)
     register_boot_route(app)
+    register_files_route(app)
+    register_changes_route(app)
     register_nodes_routes(app)
+    register_profiles_routes(app)
+    register_history_routes(app)
+    register_reinstalls_route(app)
+    register_mirrors_route(app)
+    register_nocloud_route(app)
+    register_backup_routes(app)
+    register_metrics_route(app)
     register_health_route(app)
+    if PROFILING_ENABLED:
+        from app.routes.debug import register_debug_routes
+
+        register_debug_routes(app)
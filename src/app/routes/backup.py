@@ -0,0 +1,97 @@
+"""
+Backup routes (app.backup), admin-only like the rest of the admin API:
+GET /backup streams an online copy of the SQLite file, GET /export streams
+nodes, boot profiles and app_config as (gzipped) NDJSON or CSV, and
+POST /restore applies such an export and streams back its results.
+app.backup (csv, zlib, argparse, the sqlite3 backup API) is imported on first
+use, so workers that never serve these routes do not pay for it at startup.
+"""
+
+import json
+import os
+import tempfile
+from datetime import datetime, timezone
+
+from flask import Response, request, send_file, stream_with_context
+
+from app.routes.common import require_admin_auth
+
+_EXPORT_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def _stamp() -> str:
+    return datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+
+def register_backup_routes(app):
+    """Register GET /backup, GET /export and POST /restore on the Flask app."""
+
+    @app.route("/backup", methods=["GET"])
+    def backup():
+        """
+        Take an online backup (SQLite backup API in small steps) into a
+        temporary file and stream it as pxe-<timestamp>.db; the file is
+        removed once sent. 400 on PostgreSQL: use pg_dump (or GET /export).
+        """
+        err = require_admin_auth()
+        if err is not None:
+            return err[0], err[1]
+        from app.backup import BackupError, backup_sqlite
+
+        fd, path = tempfile.mkstemp(prefix="pxe-backup-", suffix=".db")
+        os.close(fd)
+        try:
+            backup_sqlite(path)
+            response = send_file(
+                path, mimetype="application/vnd.sqlite3", as_attachment=True, download_name=f"pxe-{_stamp()}.db"
+            )
+        except BackupError as exc:
+            os.unlink(path)
+            return {"error": str(exc)}, 400
+        except BaseException:
+            os.unlink(path)
+            raise
+        # Unlinked once sent; the open file handle keeps the data until then.
+        response.call_on_close(lambda: os.unlink(path))
+        return response
+
+    @app.route("/export", methods=["GET"])
+    def export():
+        """
+        Stream nodes, boot profiles and app_config from one snapshot.
+        format=ndjson (default) or csv; compress=gzip (default) or none.
+        """
+        err = require_admin_auth()
+        if err is not None:
+            return err[0], err[1]
+        fmt = request.args.get("format", "ndjson")
+        compress = request.args.get("compress", "gzip")
+        if fmt not in _EXPORT_TYPES or compress not in ("gzip", "none"):
+            return {"error": "format must be ndjson or csv, compress gzip or none"}, 400
+        from app.backup import export_chunks
+
+        gzip = compress == "gzip"
+        name = f"pxe-{_stamp()}.{fmt}" + (".gz" if gzip else "")
+        return Response(
+            stream_with_context(export_chunks(fmt, gzip)),
+            mimetype="application/gzip" if gzip else _EXPORT_TYPES[fmt],
+            headers={"Content-Disposition": f"attachment; filename={name}"},
+        )
+
+    @app.route("/restore", methods=["POST"])
+    def restore_export():
+        """
+        Apply an export (NDJSON, or CSV with Content-Type text/csv; gzip is
+        detected) as upserts. The body is read as a stream; the response is
+        NDJSON: one {"line", "ok": false, "error"} per rejected line, then
+        {"summary": {"app_config", "boot_profiles", "nodes", "skipped", "failed"}}.
+        """
+        err = require_admin_auth()
+        if err is not None:
+            return err[0], err[1]
+        from app.backup import iter_lines, restore
+
+        fmt = "csv" if request.mimetype == "text/csv" else "ndjson"
+        results = restore(iter_lines(request.stream.read), fmt)
+        body = stream_with_context(json.dumps(result) + "\n" for result in results)
+        return Response(body, mimetype="application/x-ndjson")
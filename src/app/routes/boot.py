@@ -1,6 +1,14 @@
 """
 /boot route: iPXE entrypoint per MAC. Normalizes MAC, upserts node (create with
 reinstall=False if new), updates last_seen, then returns reinstall or local-disk script.
+The installer script is rendered from the node's compiled boot profile
+(app.boot_profiles), so per-boot work is slot filling only.
+The reinstall/local-boot decision comes from app.boot_cache when cached, and
+last_seen goes through the app.last_seen write-behind buffer, so a known node
+costs neither a SELECT nor a commit. Each served script is also appended to
+the app.boot_journal batch. Requests over the app.admission limits get the
+retry script from routes/chain.py instead. A node flagged for reinstall gets
+the installer only once app.rollout admits it, its local-disk script until then.
 validate_local_boot_script() is exported for use by the nodes route when a
 caller sets a per-node local boot command via PUT /nodes/<mac>/local-boot.
 """
@@ -11,51 +19,83 @@ from datetime import datetime, timezone
 from urllib.parse import quote
 
 from flask import Response, request
-
-from app.config import (
-    PXE_AUTOINSTALL_URL,
-    PXE_UBUNTU_INITRD_URL,
-    PXE_UBUNTU_ISO_URL,
-    PXE_UBUNTU_KERNEL_URL,
-    PXE_UKI_URL,
-)
-from app.db import get_db
+from sqlalchemy import bindparam
+
+from app.admission import admission
+from app.boot_cache import BootDecision, boot_cache
+from app.boot_journal import boot_journal
+from app.boot_profiles import DEFAULT_PROFILE, CompiledProfile, boot_profiles
+from app.change_feed import record_changes
+from app.db import NODES_VERSION_KEY, bump_counter, dialect_insert, engine
+from app.last_seen import last_seen_buffer
+from app.metrics import BOOT_CACHE_MISSES, BOOT_SCRIPTS, NODES_CREATED
+from app.mirrors import mirrors
 from app.models import Node
+from app.rollout import rollout
+from app.routes.chain import ipxe_script_retry
 from app.routes.common import normalize_mac
+from app.templating import compile_template
 
 logger = logging.getLogger(__name__)
 
+# Cache-miss path of /boot as one atomic statement: insert the node if it is
+# new, otherwise stamp last_seen, and hand back what the script needs. Two
+# workers booting the same new MAC can no longer race on the unique index.
+# created_at is only set by the insert, so created_at == b_now means "new node".
+# Built once at import; SQLAlchemy caches its compiled form.
+_insert_seen = dialect_insert(Node).values(
+    mac=bindparam("b_mac"),
+    reinstall=False,
+    last_seen=bindparam("b_now"),
+    created_at=bindparam("b_now"),
+)
+_UPSERT_SEEN = _insert_seen.on_conflict_do_update(
+    index_elements=[Node.mac],
+    set_={"last_seen": _insert_seen.excluded.last_seen},
+).returning(Node.reinstall, Node.local_boot_script, Node.boot_profile, Node.created_at)
+
+
+def client_ip_from(forwarded: str | None, remote_addr: str | None) -> str:
+    """
+    Pick the client IP from an X-Forwarded-For value (first hop) when present,
+    otherwise the socket peer address. Shared by the Flask and ASGI handlers.
+    """
+    if forwarded:
+        return forwarded.split(",")[0].strip()
+    return remote_addr or ""
+
 
 def get_client_ip() -> str:
     """
     Derive client IP for the current request. Prefers first value in
     X-Forwarded-For when behind a proxy; otherwise request.remote_addr.
     """
-    forwarded = request.headers.get("X-Forwarded-For")
-    if forwarded:
-        return forwarded.split(",")[0].strip()
-    return request.remote_addr or ""
+    return client_ip_from(request.headers.get("X-Forwarded-For"), request.remote_addr)
 
 
-def resolve_url_template(template_url: str, mac: str, client_ip: str) -> str:
+def url_values(mac: str, client_ip: str) -> dict[str, str]:
     """
-    Substitute ${mac}, ${mac_hyphen}, and ${ip} in the template with URL-encoded values.
+    URL-encoded slot values for boot templates.
     ${mac} produces the canonical colon form (e.g. aa:bb:cc:dd:ee:ff, colons URL-encoded).
     ${mac_hyphen} produces hyphen-separated form (e.g. aa-bb-cc-dd-ee-ff) needed by
     pxe-image-host, whose nginx regex and file storage both expect hyphens, not colons.
-    Missing placeholders are left as-is.
     """
-    out = template_url
-    if "${mac}" in out:
-        out = out.replace("${mac}", quote(mac, safe=""))
-    if "${mac_hyphen}" in out:
-        out = out.replace("${mac_hyphen}", quote(mac.replace(":", "-"), safe=""))
-    if "${ip}" in out:
-        out = out.replace("${ip}", quote(client_ip, safe=""))
-    return out
+    return {
+        "mac": quote(mac, safe=""),
+        "mac_hyphen": quote(mac.replace(":", "-"), safe=""),
+        "ip": quote(client_ip, safe=""),
+    }
 
 
-def ipxe_script_reinstall(mac: str, client_ip: str) -> str:
+def resolve_url_template(template_url: str, mac: str, client_ip: str) -> str:
+    """
+    Substitute ${mac}, ${mac_hyphen}, and ${ip} in the template with URL-encoded
+    values (see url_values). Other placeholders are left as-is.
+    """
+    return compile_template(template_url).render(url_values(mac, client_ip))
+
+
+def ipxe_script_reinstall(mac: str, client_ip: str, profile: CompiledProfile = DEFAULT_PROFILE) -> str:
     """
     Build iPXE script that chains to a Unified Kernel Image (UKI) hosted on
     TFTP and passes the autoinstall cmdline as chain arguments.
@@ -94,21 +134,30 @@ def ipxe_script_reinstall(mac: str, client_ip: str) -> str:
 
     "imgfree" before chain clears any previously loaded image so systemd-stub
     doesn't trip on a stale EFI_LOAD_FILE2_PROTOCOL registration.
+
+    The URLs and any extra cmdline come from profile (the env-configured
+    default unless the node has a boot profile); all four are templates. When
+    mirrors are configured for the default ISO or autoinstall URL, app.mirrors
+    swaps in the best one for this boot (in-memory state only, no I/O).
     """
-    autoinstall_url = resolve_url_template(PXE_AUTOINSTALL_URL, mac, client_ip)
+    values = url_values(mac, client_ip)
+    iso_url = mirrors.choose("iso", profile.iso_url)
+    autoinstall_url = mirrors.choose("autoinstall", profile.autoinstall_url).render(values)
     if not autoinstall_url.endswith("/"):
         autoinstall_url += "/"
 
-    iso_param = f"url={PXE_UBUNTU_ISO_URL} " if PXE_UBUNTU_ISO_URL else ""
-    # PXE_UKI_URL defaults to tftp://${next-server}/uki.efi which iPXE resolves
-    # at runtime to whatever DHCP next-server the client received. Operators
-    # whose DHCP does not set siaddr override it via env var.
+    iso_param = f"url={iso_url.render(values)} " if iso_url else ""
+    extra = f"{profile.extra_cmdline.render(values)} " if profile.extra_cmdline else ""
+    # The default UKI URL is tftp://${next-server}/uki.efi; the template leaves
+    # ${next-server} alone and iPXE resolves it at runtime to whatever DHCP
+    # next-server the client received. Operators whose DHCP does not set
+    # siaddr override it via env var or per profile.
     return (
         "#!ipxe\n"
         "imgfree\n"
-        f"chain --replace --autofree {PXE_UKI_URL} "
+        f"chain --replace --autofree {profile.uki_url.render(values)} "
         f"{iso_param}netboot=url ip=dhcp cloud-config-url=/dev/null "
-        f"autoinstall ds=nocloud-net;s={autoinstall_url}\n"
+        f"{extra}autoinstall ds=nocloud-net;s={autoinstall_url}\n"
     )
 
 
@@ -183,10 +232,64 @@ def ipxe_script_local_disk(local_boot_script: str | None) -> str:
     return f"#!ipxe\n{cmd}\n"
 
 
+def load_boot_decision(mac: str, now: datetime) -> BootDecision:
+    """
+    Cache-miss path of /boot: run the upsert (and the nodes version bump and
+    change feed entry in the same transaction), cache the result, and return
+    the decision.
+    Blocking (one DB transaction); the ASGI mode runs it in a thread pool.
+    """
+    epoch = boot_cache.epoch
+    with engine.begin() as conn:
+        reinstall, local_boot_script, profile, created_at = conn.execute(
+            _UPSERT_SEEN, {"b_mac": mac, "b_now": now}
+        ).one()
+        bump_counter(conn, NODES_VERSION_KEY)
+        if created_at == now:
+            record_changes(conn, [("created", mac, {"reinstall": reinstall, "last_seen": now})], now)
+        else:
+            record_changes(conn, [("seen", mac, {"last_seen": now})], now)
+    BOOT_CACHE_MISSES.inc()
+    if created_at == now:
+        NODES_CREATED.inc()
+        logger.info("Created node mac=%s", mac)
+    decision = (reinstall, local_boot_script, profile)
+    boot_cache.put(mac, decision, epoch)
+    return decision
+
+
+def admit_reinstall(mac: str, decision: BootDecision, now: datetime) -> BootDecision:
+    """
+    Apply the rolling reinstall scheduler to a decision that says reinstall:
+    unchanged when mac may install now, the local-disk decision while it is
+    queued. Only call it when rollout.enabled. Blocking, like load_boot_decision().
+    """
+    if rollout.admit(mac, now):
+        return decision
+    return (False, decision[1], decision[2])
+
+
+def ipxe_script_for(mac: str, decision: BootDecision, client_ip: str) -> str:
+    """
+    Render the /boot response body for a decision: installer or local disk.
+    Counts it in the metrics and appends it to the boot journal (in memory).
+    """
+    reinstall, local_boot_script, profile = decision
+    if reinstall:
+        BOOT_SCRIPTS.inc("reinstall")
+        boot_journal.record(mac, client_ip, "reinstall")
+        return ipxe_script_reinstall(mac, client_ip, boot_profiles.get(profile))
+    BOOT_SCRIPTS.inc("local_disk")
+    boot_journal.record(mac, client_ip, "local_disk")
+    return ipxe_script_local_disk(local_boot_script)
+
+
 def register_boot_route(app):
     """
     Register GET /boot on the Flask app. Expects ?mac=...; returns 400 if invalid.
-    Uses one DB session per request to upsert node and choose script.
+    The DB is touched only on a boot cache miss, with a single upsert on a
+    plain connection; last_seen for cached nodes is written behind. Shed
+    requests (app.admission) get the retry script without touching either.
     """
 
     @app.route("/boot", methods=["GET"])
@@ -197,23 +300,18 @@ def register_boot_route(app):
             logger.warning("boot called with missing or invalid mac: %s", raw_mac)
             return Response("Invalid or missing mac\n", status=400, mimetype="text/plain")
 
-        db = next(get_db())
+        if not admission.admit("/boot", mac):
+            return Response(ipxe_script_retry(request.args.get("retry")), status=200, mimetype="text/plain")
         try:
-            node = db.query(Node).filter(Node.mac == mac).first()
-            if node is None:
-                node = Node(mac=mac, reinstall=False)
-                db.add(node)
-                db.commit()
-                db.refresh(node)
-                logger.info("Created node mac=%s", mac)
-            node.last_seen = datetime.now(timezone.utc)
-            db.commit()
-
-            if node.reinstall:
-                client_ip = get_client_ip()
-                body = ipxe_script_reinstall(mac, client_ip)
+            decision = boot_cache.get(mac)
+            now = datetime.now(timezone.utc)
+            if decision is None:
+                decision = load_boot_decision(mac, now)
             else:
-                body = ipxe_script_local_disk(node.local_boot_script)
-            return Response(body, status=200, mimetype="text/plain")
+                last_seen_buffer.record(mac, now)
+            if decision[0] and rollout.enabled:
+                decision = admit_reinstall(mac, decision, now)
+            body = ipxe_script_for(mac, decision, get_client_ip())
         finally:
-            db.close()
+            admission.release()
+        return Response(body, status=200, mimetype="text/plain")
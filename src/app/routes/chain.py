@@ -2,38 +2,66 @@
 /chain route: bootstrap iPXE script that chains to /boot?mac=${mac} with
 local-disk fallback. Set DHCP boot filename to this URL, e.g. http://pxe-pilot/chain or
 http://pxe-pilot:8000/chain .
+
+The same script, with a sleep in front, is the retry script that admission
+control (app.admission) answers with when /chain or /boot is overloaded.
 """
 
-from flask import Response
+from flask import Response, request
 
+from app.admission import MAX_ATTEMPT, admission, retry_attempt
 from app.config import PXE_BASE_URL
 
 
-def ipxe_script_chain_with_fallback(boot_base_url: str) -> str:
+def ipxe_script_chain_with_fallback(boot_base_url: str, retry_after: int | None = None, attempt: int = 0) -> str:
     """
     Bootstrap iPXE script: chain to /boot?mac=${mac}; on error, fall back to
     booting from local disk. Intended as the DHCP filename so clients still
     boot when the server is down.
+
+    Retry form: with retry_after the client first sleeps that many seconds,
+    and a non-zero attempt is passed on as &retry=<attempt> so the next
+    back-off can grow.
     """
     boot_url = boot_base_url.rstrip("/") + "/boot"
+    retry = f"&retry={attempt}" if attempt else ""
+    wait = f"echo Boot server busy, retrying in {retry_after}s\nsleep {retry_after}\n" if retry_after else ""
     # Fallback: exit so BIOS/firmware continues with next device in boot order.
     return (
         "#!ipxe\n"
-        f"chain {boot_url}?mac=${{mac}} || goto fallback\n"
+        f"{wait}"
+        f"chain {boot_url}?mac=${{mac}}{retry} || goto fallback\n"
         ":fallback\n"
         "echo Boot server unavailable, continuing with next boot device configured in BIOS\n"
         "exit\n"
     )
 
 
+def ipxe_script_retry(raw_retry: str | None) -> str:
+    """
+    Script for a request shed by admission control: sleep for the back-off of
+    this attempt (the retry= query value, absent on the first try), then chain
+    /boot again with the attempt counted up.
+    """
+    attempt = retry_attempt(raw_retry)
+    return ipxe_script_chain_with_fallback(
+        PXE_BASE_URL.rstrip("/"), admission.backoff(attempt), min(attempt + 1, MAX_ATTEMPT)
+    )
+
+
 def register_chain_route(app):
     """
     Register GET /chain on the Flask app. Returns plain-text iPXE script that
     tells the client to chain to /boot?mac=${mac}; on failure, boot local disk.
+    Over the in-flight limit it returns the retry script instead.
     """
 
     @app.route("/chain", methods=["GET"])
     def chain():
-        base = PXE_BASE_URL.rstrip("/")
-        body = ipxe_script_chain_with_fallback(base)
+        if not admission.admit("/chain", None):
+            return Response(ipxe_script_retry(request.args.get("retry")), status=200, mimetype="text/plain")
+        try:
+            body = ipxe_script_chain_with_fallback(PXE_BASE_URL.rstrip("/"))
+        finally:
+            admission.release()
         return Response(body, status=200, mimetype="text/plain")
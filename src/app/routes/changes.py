@@ -0,0 +1,153 @@
+"""
+GET /nodes/changes: the node change feed (app.change_feed) for tooling that
+would otherwise poll GET /nodes. Admin-only when ADMIN_API_KEY is set.
+
+- Server-sent events when the client accepts text/event-stream (EventSource
+  does) or passes format=sse. Each change is one event with the change id as
+  its id, so a reconnecting EventSource resumes with Last-Event-ID. A stream
+  ends after CHANGE_FEED_MAX_SECONDS and the client reconnects on its own.
+- Long poll otherwise: ?after=<id> answers as soon as there are changes after
+  that id, or with an empty list after timeout= seconds (default and maximum
+  CHANGE_FEED_MAX_SECONDS). Without after it returns at once with the current
+  last_id to start from.
+
+The parsing helpers are shared with the native ASGI handler (asgi.py).
+"""
+
+import time
+
+from flask import Response, request
+from werkzeug.datastructures import MIMEAccept
+from werkzeug.http import parse_accept_header
+
+from app.change_feed import KEEPALIVE_SECONDS, change_feed, reset_event
+from app.config import CHANGE_FEED_MAX_SECONDS
+from app.routes.common import BadQuery, require_admin_auth
+
+CHANGES_ROUTE = "/nodes/changes"
+
+# Sent first on every stream: EventSource reconnects after this many milliseconds.
+SSE_PREAMBLE = b"retry: 1000\n\n"
+SSE_KEEPALIVE = b": keepalive\n\n"
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def parse_after(raw: str | None) -> int | None:
+    """Last-Event-ID / after value: a non-negative change id, or None when absent."""
+    if raw is None or not raw.strip():
+        return None
+    try:
+        after = int(raw)
+    except ValueError:
+        raise BadQuery("'after' (or Last-Event-ID) must be a change id") from None
+    if after < 0:
+        raise BadQuery("'after' (or Last-Event-ID) must be a change id")
+    return after
+
+
+def parse_timeout(raw: str | None) -> float:
+    """Long-poll wait in seconds, capped at CHANGE_FEED_MAX_SECONDS."""
+    if raw is None:
+        return CHANGE_FEED_MAX_SECONDS
+    try:
+        timeout = float(raw)
+    except ValueError:
+        raise BadQuery("'timeout' must be a number of seconds") from None
+    if not 0 <= timeout <= CHANGE_FEED_MAX_SECONDS:
+        raise BadQuery(f"'timeout' must be between 0 and {CHANGE_FEED_MAX_SECONDS:g}")
+    return timeout
+
+
+def wants_sse(accept: str | None, fmt: str | None) -> bool:
+    if fmt is not None:
+        return fmt == "sse"
+    best = parse_accept_header(accept, MIMEAccept).best_match(["application/json", "text/event-stream"])
+    return best == "text/event-stream"
+
+
+def poll_body(changes, after: int) -> dict:
+    """Long-poll response for catch_up()/wait() output; None means reset."""
+    if changes is None:
+        return {"changes": [], "last_id": change_feed.last_id, "reset": True}
+    return {"changes": [c.event for c in changes], "last_id": changes[-1].id if changes else after, "reset": False}
+
+
+def _stream(after: int | None):
+    """SSE body: backlog after the given id (or nothing when None), then live changes until the deadline."""
+    deadline = time.monotonic() + CHANGE_FEED_MAX_SECONDS
+    change_feed.subscribe()
+    try:
+        yield SSE_PREAMBLE
+        if after is None:
+            after = change_feed.last_id
+        changes = change_feed.catch_up(after)
+        while True:
+            if changes is None:
+                reset = reset_event(change_feed.last_id)
+                yield reset.sse
+                after, changes = reset.id, []
+            for change in changes:
+                yield change.sse
+                after = change.id
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            changes = change_feed.wait(after, min(KEEPALIVE_SECONDS, remaining))
+            if changes is None:
+                changes = change_feed.catch_up(after)
+            elif not changes and time.monotonic() < deadline:
+                yield SSE_KEEPALIVE
+    finally:
+        change_feed.unsubscribe()
+
+
+def _long_poll(after: int | None, timeout: float) -> dict:
+    change_feed.subscribe()
+    try:
+        if after is None:
+            return poll_body([], change_feed.last_id)
+        changes = change_feed.catch_up(after)
+        if changes == []:
+            changes = change_feed.wait(after, timeout)
+            if changes is None:
+                changes = change_feed.catch_up(after)
+        return poll_body(changes, after)
+    finally:
+        change_feed.unsubscribe()
+
+
+def register_changes_route(app):
+    """
+    Register GET /nodes/changes on the Flask app. In wsgi mode every open
+    stream or long poll holds a worker; SERVER_MODE=asgi serves them on the
+    event loop instead.
+    """
+
+    @app.route(CHANGES_ROUTE, methods=["GET"])
+    def node_changes():
+        """
+        Stream (SSE) or long-poll node changes. Each change is
+        {"id", "type", "mac", "at", "fields"}: type is created, seen, updated
+        or deleted, fields the changed columns. A "reset" event (SSE) or
+        "reset": true (long poll) means changes were missed - the id was
+        pruned or is unknown - so re-read GET /nodes and continue from its id.
+
+        Examples:
+          curl -N -H 'Accept: text/event-stream' /nodes/changes
+          /nodes/changes?after=1200&timeout=20
+        """
+        err = require_admin_auth()
+        if err is not None:
+            return err[0], err[1]
+        try:
+            after = parse_after(request.headers.get("Last-Event-ID") or request.args.get("after"))
+            timeout = parse_timeout(request.args.get("timeout"))
+        except BadQuery as exc:
+            return {"error": str(exc)}, 400
+        if wants_sse(request.headers.get("Accept"), request.args.get("format")):
+            return Response(_stream(after), mimetype="text/event-stream", headers=SSE_HEADERS)
+        response = Response(
+            app.json.dumps(_long_poll(after, timeout)).encode() + b"\n", mimetype="application/json"
+        )
+        response.headers["Cache-Control"] = "no-cache"
+        return response
@@ -1,21 +1,19 @@
 """
-Shared helpers used by more than one route: MAC normalization and admin auth.
+Shared helpers used by more than one route: MAC normalization, admin auth and
+query-parameter parsing.
 
-Used by boot and nodes (normalize_mac); nodes only (require_admin_auth). No
-route-specific logic (e.g. iPXE scripts) lives here.
+Used by boot and nodes (normalize_mac); the admin routes (require_admin_auth,
+BadQuery, parse_datetime). No route-specific logic (e.g. iPXE scripts) lives
+here.
 """
 
 import hmac
-import re
+from datetime import datetime
 
 from flask import request
 
 from app.config import ADMIN_API_KEY
-
-# Six groups of two hex digits; optional colon or hyphen between groups.
-MAC_PATTERN = re.compile(
-    r"^([0-9a-fA-F]{2})[-:]?([0-9a-fA-F]{2})[-:]?([0-9a-fA-F]{2})[-:]?([0-9a-fA-F]{2})[-:]?([0-9a-fA-F]{2})[-:]?([0-9a-fA-F]{2})$"
-)
+from app.macs import format_mac, parse_mac
 
 
 def normalize_mac(raw: str) -> str | None:
@@ -23,12 +21,8 @@ def normalize_mac(raw: str) -> str | None:
     Convert a MAC string to canonical form: lowercase hex with colons.
     Returns None if the input is not a valid 6-octet MAC (with or without separators).
     """
-    if not raw or not isinstance(raw, str):
-        return None
-    m = MAC_PATTERN.match(raw.strip())
-    if not m:
-        return None
-    return ":".join(g.lower() for g in m.groups())
+    value = parse_mac(raw)
+    return None if value is None else format_mac(value)
 
 
 def require_admin_auth() -> tuple[dict, int] | None:
@@ -37,12 +31,32 @@ def require_admin_auth() -> tuple[dict, int] | None:
     Authorization header. Returns (error_dict, status_code) on failure;
     None when key is unset or token matches (constant-time).
     """
+    return admin_auth_error(request.headers.get("Authorization"))
+
+
+def admin_auth_error(auth: str | None) -> tuple[dict, int] | None:
+    """require_admin_auth() for an Authorization header value (the ASGI handlers have no Flask request)."""
     if not ADMIN_API_KEY:
         return None
-    auth = request.headers.get("Authorization", "")
+    auth = auth or ""
     if not auth.startswith("Bearer "):
         return ({"error": "Missing or invalid Authorization header (expected Bearer token)"}, 401)
     token = auth[7:].strip()
     if not hmac.compare_digest(token, ADMIN_API_KEY):
         return ({"error": "Invalid API key"}, 401)
     return None
+
+
+class BadQuery(ValueError):
+    """A query parameter failed validation; the message is returned as a 400."""
+
+
+def parse_datetime(name: str, raw: str) -> datetime:
+    """Parse an ISO-8601 timestamp with an explicit offset (naive values are ambiguous)."""
+    try:
+        value = datetime.fromisoformat(raw.replace("Z", "+00:00"))
+    except ValueError:
+        raise BadQuery(f"'{name}' must be an ISO-8601 timestamp") from None
+    if value.tzinfo is None:
+        raise BadQuery(f"'{name}' must include a UTC offset (e.g. 2024-05-01T00:00:00Z)")
+    return value
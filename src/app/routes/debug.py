@@ -0,0 +1,207 @@
+"""
+/debug routes: opt-in live profiling (PROFILING_ENABLED), all admin-only when
+ADMIN_API_KEY is set. Registered only when enabled, so a default deployment
+has neither the routes nor the per-request hook.
+
+- POST /debug/sampler?seconds=&hz=   start a stack-sampling window (202; 409 if one runs)
+- GET  /debug/sampler                collapsed stacks of the current/last window
+- any request with "X-Profile: 1"    is run under cProfile (only when the same
+                                     request passes admin auth); the response
+                                     carries X-Profile-Id
+- GET  /debug/profiles[/<id>]        list captures / pstats report (?sort=&limit=&format=pstats)
+- GET  /debug/tracemalloc            tracing status
+- POST /debug/tracemalloc/start?frames=, POST /debug/tracemalloc/stop
+- POST /debug/tracemalloc/snapshot   take a snapshot, keep it as the diff baseline, return top sites
+- GET  /debug/tracemalloc/diff       compare a fresh snapshot with the baseline
+
+Everything is per worker process; responses carry X-Worker-Pid.
+"""
+
+import cProfile
+import os
+
+from flask import Flask, Response, g, request
+
+from app.profiling import (
+    MAX_SAMPLER_HZ,
+    MAX_SAMPLER_SECONDS,
+    diff_stats,
+    dump_profile,
+    memory,
+    render_profile,
+    request_profiles,
+    sampler,
+    top_stats,
+)
+from app.routes.common import BadQuery, require_admin_auth
+
+_SORT_KEYS = ("cumulative", "tottime", "ncalls", "pcalls", "filename", "name")
+_SNAPSHOT_KEYS = ("lineno", "filename", "traceback")
+
+
+def _number_arg(name: str, default: float, low: float, high: float, cast=float):
+    """Numeric query parameter within [low, high]. Raises BadQuery."""
+    raw = request.args.get(name)
+    if raw is None:
+        return cast(default)
+    try:
+        value = cast(raw)
+    except ValueError:
+        raise BadQuery(f"'{name}' must be a number") from None
+    if not low <= value <= high:
+        raise BadQuery(f"'{name}' must be between {low:g} and {high:g}")
+    return value
+
+
+def _choice_arg(name: str, choices: tuple[str, ...]) -> str:
+    """Query parameter that must be one of choices (default the first). Raises BadQuery."""
+    value = request.args.get(name, choices[0])
+    if value not in choices:
+        raise BadQuery(f"'{name}' must be one of {', '.join(choices)}")
+    return value
+
+
+def register_debug_routes(app: Flask) -> None:
+    """
+    Register the /debug profiling routes and the X-Profile request hook.
+    Each route checks admin auth; bad query parameters return 400.
+    """
+
+    @app.before_request
+    def _profile_start():
+        if request.headers.get("X-Profile") != "1" or require_admin_auth() is not None:
+            return
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:  # another profiler is already active on this thread
+            return
+        g.request_profile = profile
+
+    @app.after_request
+    def _profile_finish(response):
+        profile = g.pop("request_profile", None)
+        if profile is not None:
+            profile.disable()
+            response.headers["X-Profile-Id"] = request_profiles.add(f"{request.method} {request.full_path}", profile)
+        return response
+
+    @app.after_request
+    def _worker_pid(response):
+        if request.path.startswith("/debug/"):
+            response.headers["X-Worker-Pid"] = str(os.getpid())
+        return response
+
+    @app.route("/debug/sampler", methods=["POST"])
+    def debug_start_sampler():
+        err = require_admin_auth()
+        if err is not None:
+            return err[0], err[1]
+        try:
+            seconds = _number_arg("seconds", 30, 0.1, MAX_SAMPLER_SECONDS)
+            hz = _number_arg("hz", 100, 1, MAX_SAMPLER_HZ)
+        except BadQuery as exc:
+            return {"error": str(exc)}, 400
+        if not sampler.start(seconds, hz):
+            return {"error": "a sampling window is already running", "remaining_seconds": sampler.remaining()}, 409
+        return {"seconds": seconds, "hz": hz, "pid": os.getpid()}, 202
+
+    @app.route("/debug/sampler", methods=["GET"])
+    def debug_collect_sampler():
+        """
+        Collapsed stacks, heaviest first, one "thread;frame;...;frame count"
+        line per distinct stack. While the window is still open the partial
+        result is returned with X-Sampler-Running: 1.
+        """
+        err = require_admin_auth()
+        if err is not None:
+            return err[0], err[1]
+        if sampler.window is None:
+            return {"error": "no sampling window has been started in this worker"}, 404
+        response = Response(sampler.collapsed(), mimetype="text/plain")
+        response.headers["X-Sampler-Running"] = "1" if sampler.running else "0"
+        response.headers["X-Sampler-Samples"] = str(sampler.samples)
+        return response
+
+    @app.route("/debug/profiles", methods=["GET"])
+    def list_request_profiles():
+        err = require_admin_auth()
+        if err is not None:
+            return err[0], err[1]
+        return {"profiles": request_profiles.list()}
+
+    @app.route("/debug/profiles/<profile_id>", methods=["GET"])
+    def get_request_profile(profile_id: str):
+        err = require_admin_auth()
+        if err is not None:
+            return err[0], err[1]
+        entry = request_profiles.get(profile_id)
+        if entry is None:
+            return {"error": f"Unknown profile '{profile_id}'"}, 404
+        description, profile = entry
+        if request.args.get("format") == "pstats":
+            response = Response(dump_profile(profile), mimetype="application/octet-stream")
+            response.headers["Content-Disposition"] = f"attachment; filename={profile_id}.pstats"
+            return response
+        try:
+            sort = _choice_arg("sort", _SORT_KEYS)
+            limit = _number_arg("limit", 40, 1, 1000, int)
+        except BadQuery as exc:
+            return {"error": str(exc)}, 400
+        return Response(f"{description}\n{render_profile(profile, sort, limit)}", mimetype="text/plain")
+
+    @app.route("/debug/tracemalloc", methods=["GET"])
+    def tracemalloc_status():
+        err = require_admin_auth()
+        if err is not None:
+            return err[0], err[1]
+        return {**memory.status(), "baseline": memory.baseline is not None}
+
+    @app.route("/debug/tracemalloc/start", methods=["POST"])
+    def tracemalloc_start():
+        err = require_admin_auth()
+        if err is not None:
+            return err[0], err[1]
+        try:
+            frames = _number_arg("frames", 25, 1, 100, int)
+        except BadQuery as exc:
+            return {"error": str(exc)}, 400
+        memory.start(frames)
+        return memory.status()
+
+    @app.route("/debug/tracemalloc/stop", methods=["POST"])
+    def tracemalloc_stop():
+        err = require_admin_auth()
+        if err is not None:
+            return err[0], err[1]
+        memory.stop()
+        return memory.status()
+
+    @app.route("/debug/tracemalloc/snapshot", methods=["POST"])
+    def tracemalloc_snapshot():
+        err = require_admin_auth()
+        if err is not None:
+            return err[0], err[1]
+        if not memory.status()["tracing"]:
+            return {"error": "tracemalloc is not running; POST /debug/tracemalloc/start first"}, 409
+        try:
+            key = _choice_arg("key", _SNAPSHOT_KEYS)
+            limit = _number_arg("limit", 25, 1, 1000, int)
+        except BadQuery as exc:
+            return {"error": str(exc)}, 400
+        memory.baseline = memory.take()
+        return {**memory.status(), "top": top_stats(memory.baseline, key, limit)}
+
+    @app.route("/debug/tracemalloc/diff", methods=["GET"])
+    def tracemalloc_diff():
+        err = require_admin_auth()
+        if err is not None:
+            return err[0], err[1]
+        if memory.baseline is None:
+            return {"error": "no baseline; POST /debug/tracemalloc/snapshot first"}, 409
+        try:
+            key = _choice_arg("key", _SNAPSHOT_KEYS)
+            limit = _number_arg("limit", 25, 1, 1000, int)
+        except BadQuery as exc:
+            return {"error": str(exc)}, 400
+        return {**memory.status(), "diff": diff_stats(memory.take(), memory.baseline, key, limit)}
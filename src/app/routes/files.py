@@ -0,0 +1,27 @@
+"""
+/files/<name> route: the files under TFTP_ROOT over HTTP (see app.files), so
+iPXE can chain uki.efi and the iPXE binaries without TFTP. No auth: these are
+the same files TFTP hands to any client on the network.
+"""
+
+from flask import Flask, Response, request
+
+from app.files import open_file, wsgi_body
+
+
+def register_files_route(app: Flask):
+    """
+    Register GET (and HEAD) /files/<name> on the Flask app.
+    """
+
+    @app.route("/files/<path:name>", methods=["GET"])
+    def tftp_file(name: str):
+        served = open_file(name, request.headers.get)
+        if served.file is None:
+            return Response(served.body, status=served.status, headers=served.headers)
+        response = Response(
+            wsgi_body(request.environ, served), status=served.status, headers=served.headers, direct_passthrough=True
+        )
+        # An unstarted body (HEAD) never reaches its own close.
+        response.call_on_close(served.file.close)
+        return response
@@ -1,15 +1,27 @@
 """
-/health route: liveness/readiness probe. Returns simple JSON; no auth required.
+/health and /ready routes: liveness and readiness probes. Return simple JSON;
+no auth required.
 """
 
 from flask import Flask
 
+from app.config import READINESS_TIMEOUT_SECONDS
+from app.readiness import readiness
+
 
 def register_health_route(app: Flask):
     """
-    Register GET /health on the Flask app. Returns {"status": "OK"}.
+    Register GET /health (always {"status": "OK"} while the process serves
+    requests) and GET /ready (200 when ready or degraded, 503 otherwise; the
+    body is the readiness prober's last result, see app.readiness).
     """
 
     @app.route("/health", methods=["GET"])
     def health():
         return {"status": "OK"}
+
+    @app.route("/ready", methods=["GET"])
+    def ready():
+        # Only the first call in a process waits, for the prober's first result.
+        status, body = readiness.report(wait=READINESS_TIMEOUT_SECONDS)
+        return body, status
@@ -0,0 +1,116 @@
+"""
+Boot history routes, answered from the boot_rollups table maintained by
+app.boot_journal, so their cost depends on the number of buckets requested,
+not on the size of the raw journal.
+
+- GET /boots               fleet-wide boots per bucket (plus distinct nodes)
+- GET /nodes/<mac>/boots   one node's boots per bucket
+
+Both accept period=hour|day (default day) and since= / until= (ISO-8601 with
+offset; default the last 48 hours or 30 days). Buckets are UTC hours or days;
+buckets without boots are omitted. Admin auth like the rest of the admin API.
+
+Both are reads: boots still buffered in app.boot_journal are not flushed, so
+the current bucket lags by up to BOOT_JOURNAL_FLUSH_SECONDS.
+"""
+
+from datetime import datetime, timedelta, timezone
+
+from flask import request
+from sqlalchemy import case, func, select
+
+from app.boot_journal import PERIOD_SECONDS, bucket_start
+from app.config import TIMEZONE
+from app.db import engine
+from app.models import BootRollup
+from app.routes.common import BadQuery, normalize_mac, parse_datetime, require_admin_auth
+
+# Upper bound on buckets per response (e.g. 2000 hours is about 83 days).
+MAX_BUCKETS = 2000
+
+_DEFAULT_SPAN = {"hour": timedelta(hours=48), "day": timedelta(days=30)}
+
+_REINSTALL = func.sum(case((BootRollup.kind == "reinstall", BootRollup.count), else_=0))
+_LOCAL_DISK = func.sum(case((BootRollup.kind == "local_disk", BootRollup.count), else_=0))
+
+
+def _history_params(args) -> tuple[str, datetime, datetime]:
+    """Return (period, since, until) with since aligned to its bucket. Raises BadQuery."""
+    period = args.get("period", "day")
+    if period not in PERIOD_SECONDS:
+        raise BadQuery("'period' must be hour or day")
+    raw = args.get("until")
+    until = parse_datetime("until", raw) if raw is not None else datetime.now(timezone.utc)
+    raw = args.get("since")
+    since = parse_datetime("since", raw) if raw is not None else until - _DEFAULT_SPAN[period]
+    if since >= until:
+        raise BadQuery("'since' must be before 'until'")
+    if (until - since).total_seconds() / PERIOD_SECONDS[period] > MAX_BUCKETS:
+        raise BadQuery(f"at most {MAX_BUCKETS} {period} buckets per request")
+    return period, bucket_start(since.timestamp(), period), until
+
+
+def _buckets(period: str, since: datetime, until: datetime, *where, nodes: bool) -> list[dict]:
+    columns = [BootRollup.bucket, _REINSTALL, _LOCAL_DISK]
+    if nodes:
+        columns.append(func.count(func.distinct(BootRollup.mac)))
+    stmt = (
+        select(*columns)
+        .where(BootRollup.period == period, BootRollup.bucket >= since, BootRollup.bucket < until, *where)
+        .group_by(BootRollup.bucket)
+        .order_by(BootRollup.bucket)
+    )
+    with engine.connect() as conn:
+        rows = conn.execute(stmt).all()
+    buckets = []
+    for row in rows:
+        entry = {
+            "start": row[0].astimezone(TIMEZONE).isoformat(),
+            "reinstall": row[1],
+            "local_disk": row[2],
+            "total": row[1] + row[2],
+        }
+        if nodes:
+            entry["nodes"] = row[3]
+        buckets.append(entry)
+    return buckets
+
+
+def _history_body(period: str, since: datetime, until: datetime, buckets: list[dict]) -> dict:
+    return {
+        "period": period,
+        "since": since.astimezone(TIMEZONE).isoformat(),
+        "until": until.astimezone(TIMEZONE).isoformat(),
+        "totals": {key: sum(b[key] for b in buckets) for key in ("reinstall", "local_disk", "total")},
+        "buckets": buckets,
+    }
+
+
+def register_history_routes(app):
+    """Register GET /boots and GET /nodes/<mac>/boots."""
+
+    @app.route("/boots", methods=["GET"])
+    def fleet_boots():
+        err = require_admin_auth()
+        if err is not None:
+            return err[0], err[1]
+        try:
+            period, since, until = _history_params(request.args)
+        except BadQuery as exc:
+            return {"error": str(exc)}, 400
+        return _history_body(period, since, until, _buckets(period, since, until, nodes=True))
+
+    @app.route("/nodes/<path:mac_raw>/boots", methods=["GET"])
+    def node_boots(mac_raw: str):
+        err = require_admin_auth()
+        if err is not None:
+            return err[0], err[1]
+        mac = normalize_mac(mac_raw)
+        if not mac:
+            return {"error": "Invalid or missing mac"}, 400
+        try:
+            period, since, until = _history_params(request.args)
+        except BadQuery as exc:
+            return {"error": str(exc)}, 400
+        buckets = _buckets(period, since, until, BootRollup.mac == mac, nodes=False)
+        return {"mac": mac, **_history_body(period, since, until, buckets)}
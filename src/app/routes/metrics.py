@@ -0,0 +1,23 @@
+"""
+/metrics route: Prometheus text exposition of app.metrics, summed across all
+workers that share METRICS_DIR. Admin-only when ADMIN_API_KEY is set (configure
+the scraper with the same bearer token).
+"""
+
+from flask import Flask, Response
+
+from app.metrics import registry
+from app.routes.common import require_admin_auth
+
+
+def register_metrics_route(app: Flask):
+    """
+    Register GET /metrics on the Flask app.
+    """
+
+    @app.route("/metrics", methods=["GET"])
+    def metrics():
+        err = require_admin_auth()
+        if err is not None:
+            return err[0], err[1]
+        return Response(registry.render(), mimetype="text/plain", content_type="text/plain; version=0.0.4; charset=utf-8")
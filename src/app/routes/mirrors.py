@@ -0,0 +1,26 @@
+"""
+GET /mirrors: the ISO and autoinstall mirrors (app.mirrors) as this worker
+sees them - up or down, probe latency, errors and installs in flight. Admin
+auth like the rest of the admin API.
+"""
+
+from app.mirrors import mirrors
+from app.routes.common import require_admin_auth
+
+
+def register_mirrors_route(app):
+    """Register GET /mirrors on the Flask app."""
+
+    @app.route("/mirrors", methods=["GET"])
+    def mirror_status():
+        """
+        Return {"iso": [...], "autoinstall": [...]} for the artifacts that have
+        mirrors, each entry {"url", "up", "latency_ms", "consecutive_failures",
+        "errors", "last_error", "installs_in_flight"}, primary URL first.
+        State is per process, so with several workers it is one worker's view.
+        """
+        err = require_admin_auth()
+        if err is not None:
+            return err[0], err[1]
+        mirrors.start()
+        return mirrors.status()
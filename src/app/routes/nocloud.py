@@ -0,0 +1,45 @@
+"""
+/nocloud/<mac>/<document> route: the cloud-init NoCloud datasource for the
+installer (see app.nocloud), enabled by NOCLOUD_DIR. No auth, like /boot: the
+installer cannot send the admin key, and the node must already be known.
+"""
+
+from flask import Flask, Response, request
+from sqlalchemy import bindparam, select
+
+from app.db import engine
+from app.metrics import NOCLOUD_DOCUMENTS
+from app.models import Node
+from app.nocloud import DOCUMENTS, node_values, nocloud
+from app.routes.common import normalize_mac
+
+_NODE_FIELDS = select(Node.id, Node.boot_profile, Node.install_group).where(Node.mac == bindparam("b_mac"))
+
+
+def register_nocloud_route(app: Flask):
+    """Register GET (and HEAD) /nocloud/<mac>/<document> on the Flask app."""
+
+    @app.route("/nocloud/<mac>/<document>", methods=["GET"])
+    def nocloud_document(mac: str, document: str):
+        """
+        Render document (meta-data, user-data, vendor-data or network-config)
+        for mac. 404 for an unknown node or a document without a template;
+        304 when If-None-Match has the current ETag. 404 for everything
+        without NOCLOUD_DIR.
+        """
+        normalized = normalize_mac(mac)
+        if not nocloud.enabled or normalized is None or document not in DOCUMENTS:
+            return Response("Not found\n", status=404, mimetype="text/plain")
+        with engine.connect() as conn:
+            node = conn.execute(_NODE_FIELDS, {"b_mac": normalized}).one_or_none()
+        if node is None:
+            return Response("Unknown node\n", status=404, mimetype="text/plain")
+        rendered = nocloud.render(document, node_values(normalized, node.id, node.boot_profile, node.install_group))
+        if rendered is None:
+            return Response("Not found\n", status=404, mimetype="text/plain")
+        body, etag = rendered
+        headers = {"ETag": f'"{etag}"', "Cache-Control": "no-cache"}
+        if request.if_none_match.contains(etag):
+            NOCLOUD_DOCUMENTS.inc(document, "not_modified")
+            return Response(status=304, headers=headers)
+        return Response(body, mimetype="text/plain", headers=headers)
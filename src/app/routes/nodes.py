@@ -1,43 +1,473 @@
 """
 /nodes routes: list nodes (GET), set/clear reinstall (POST/DELETE), set/clear
-per-node local boot script (PUT/DELETE on .../local-boot-config). Admin-only when
+per-node local boot script (PUT/DELETE on .../local-boot-config), attach/detach
+a boot profile (PUT/DELETE on .../boot-profile), set/clear the rolling
+reinstall group (PUT/DELETE on .../install-group). Admin-only when
 ADMIN_API_KEY is set. MAC in path is normalized; node is created if missing.
+Every mutation bumps the boot generation and invalidates the /boot cache entry.
+
+GET /nodes is versioned: every write to the nodes table (here, in boot, in the
+last_seen flusher and in seed) bumps the nodes_version counter, which is the
+response's ETag. A poll with a matching If-None-Match is answered 304 from that
+one app_config row, and the serialized body is kept per version, so repeated
+polls of an unchanged fleet never load or serialize a Node.
+
+GET /nodes also takes filters (reinstall, seen_since, seen_before, mac_prefix,
+mac), keyset pagination on the unique mac index (limit, after) and an NDJSON
+mode (format=ndjson or Accept: application/x-ndjson) that streams rows from a
+server-side cursor in constant memory.
+
+POST /nodes/bulk applies a streamed NDJSON or CSV body of node operations in
+chunked executemany transactions and streams back one result per line.
 """
 
+import csv
+import json
 import logging
+import re
+from itertools import groupby
 
-from flask import request
+from flask import Response, current_app, request, stream_with_context
+from sqlalchemy import bindparam, delete, select
+from sqlalchemy.exc import SQLAlchemyError
 
-from app.db import get_db
-from app.models import Node
+from app.boot_cache import BOOT_GENERATION_KEY, boot_cache
+from app.change_feed import record_changes
+from app.db import NODES_VERSION_KEY, bump_counter, dialect_insert, engine, get_db, read_counter
+from app.macs import prefix_range
+from app.models import BootProfile, Node
+from app.rollout import GROUP_NAME_PATTERN
 from app.routes.boot import validate_local_boot_script
-from app.routes.common import normalize_mac, require_admin_auth
+from app.routes.common import BadQuery, normalize_mac, parse_datetime, require_admin_auth
 
 logger = logging.getLogger(__name__)
 
 
+def _upsert_field(column: str, **also):
+    """
+    Build "create the node or set one column" as a single INSERT ... ON
+    CONFLICT(mac) DO UPDATE statement with b_mac / b_value parameters; also
+    holds constant values written along with it on update. Unset columns
+    take their model defaults on insert (reinstall=False, created_at=now).
+    Built once at import so the compiled form is cached.
+    """
+    stmt = dialect_insert(Node).values({"mac": bindparam("b_mac"), column: bindparam("b_value")})
+    return stmt.on_conflict_do_update(index_elements=[Node.mac], set_={column: stmt.excluded[column], **also})
+
+
+# Setting or clearing reinstall (re)queues the node for app.rollout.
+_SET_REINSTALL = _upsert_field("reinstall", install_started_at=None)
+_SET_LOCAL_BOOT = _upsert_field("local_boot_script")
+_SET_BOOT_PROFILE = _upsert_field("boot_profile")
+_SET_INSTALL_GROUP = _upsert_field("install_group")
+# Node column each upsert writes, for its change feed entry.
+_FIELD_OF = {
+    _SET_REINSTALL: "reinstall",
+    _SET_LOCAL_BOOT: "local_boot_script",
+    _SET_BOOT_PROFILE: "boot_profile",
+    _SET_INSTALL_GROUP: "install_group",
+}
+_PROFILE_EXISTS = select(BootProfile.name).where(BootProfile.name == bindparam("b_name"))
+_DELETE_NODE = delete(Node).where(Node.mac == bindparam("b_mac"))
+
+# POST /nodes/bulk operations and the statement each one runs.
+_BULK_STATEMENTS = {
+    "set_reinstall": _SET_REINSTALL,
+    "clear_reinstall": _SET_REINSTALL,
+    "set_local_boot": _SET_LOCAL_BOOT,
+    "clear_local_boot": _SET_LOCAL_BOOT,
+    "set_boot_profile": _SET_BOOT_PROFILE,
+    "clear_boot_profile": _SET_BOOT_PROFILE,
+    "set_install_group": _SET_INSTALL_GROUP,
+    "clear_install_group": _SET_INSTALL_GROUP,
+    "delete": _DELETE_NODE,
+}
+# Operations per transaction; results are streamed back after each one.
+BULK_CHUNK = 1000
+
+
+def _change(stmt, params: dict) -> tuple[str, str, dict | None]:
+    """Change feed entry for one upsert or delete."""
+    if stmt is _DELETE_NODE:
+        return ("deleted", params["b_mac"], None)
+    return ("updated", params["b_mac"], {_FIELD_OF[stmt]: params["b_value"]})
+
+
+def _write_node(stmt, params: dict) -> None:
+    """
+    Run one node upsert plus the boot generation and nodes version bumps and
+    its change feed entry in a single transaction on a plain connection (no
+    ORM session, no refresh), then drop the MAC from this process's /boot cache.
+    """
+    with engine.begin() as conn:
+        conn.execute(stmt, params)
+        bump_counter(conn, BOOT_GENERATION_KEY)
+        bump_counter(conn, NODES_VERSION_KEY)
+        record_changes(conn, [_change(stmt, params)])
+    boot_cache.invalidate(params["b_mac"])
+
+
+class _ListingCache:
+    """
+    Serialized GET /nodes body for the most recent nodes_version seen by this
+    process. entry is replaced as a whole, so readers need no lock.
+    """
+
+    def __init__(self) -> None:
+        self.entry: tuple[int, bytes] | None = None
+
+    def clear(self) -> None:
+        self.entry = None
+
+
+# Upper bounds for one request; larger fleets page through with limit/after.
+MAX_PAGE_SIZE = 1000
+MAX_MAC_LIST = 1000
+NDJSON_BATCH = 500
+
+# Whole octets, then at most one partial one: aa, aa:b, aa:bb:, ...
+_MAC_PREFIX = re.compile(r"^(?=.)(?:[0-9a-f]{2}:){0,5}[0-9a-f]{0,2}$")
+_TRUE = {"1", "true", "yes"}
+_FALSE = {"0", "false", "no"}
+
+
+def _node_filters(args) -> list:
+    """
+    Translate GET /nodes query parameters into WHERE clauses:
+      reinstall=true|false         filter on the flag
+      seen_since=, seen_before=    last_seen range (ISO-8601 with offset; uses ix_nodes_last_seen)
+      mac_prefix=aa:bb             MACs starting with the prefix (a range scan on the mac index)
+      mac=...                      explicit MACs, repeated and/or comma separated
+    Raises BadQuery on invalid input.
+    """
+    clauses = []
+    raw = args.get("reinstall")
+    if raw is not None:
+        if raw.lower() not in _TRUE | _FALSE:
+            raise BadQuery("'reinstall' must be true or false")
+        clauses.append(Node.reinstall.is_(raw.lower() in _TRUE))
+    raw = args.get("seen_since")
+    if raw is not None:
+        clauses.append(Node.last_seen >= parse_datetime("seen_since", raw))
+    raw = args.get("seen_before")
+    if raw is not None:
+        clauses.append(Node.last_seen < parse_datetime("seen_before", raw))
+    raw = args.get("mac_prefix")
+    if raw is not None:
+        prefix = raw.strip().lower().replace("-", ":")
+        if not _MAC_PREFIX.match(prefix):
+            raise BadQuery("'mac_prefix' must be the leading part of a MAC, e.g. aa:bb:cc")
+        # MACs are integers, so a prefix (a vendor OUI, say) is an index range scan.
+        low, high = prefix_range(prefix.replace(":", ""))
+        clauses.append(Node.mac >= low)
+        clauses.append(Node.mac < high)
+    raw_macs = [part for value in args.getlist("mac") for part in value.split(",") if part.strip()]
+    if raw_macs:
+        if len(raw_macs) > MAX_MAC_LIST:
+            raise BadQuery(f"at most {MAX_MAC_LIST} 'mac' values per request")
+        macs = [normalize_mac(m) for m in raw_macs]
+        if None in macs:
+            raise BadQuery("invalid MAC in 'mac'")
+        clauses.append(Node.mac.in_(macs))
+    return clauses
+
+
+def _page_params(args) -> tuple[int | None, str | None]:
+    """Return (limit, after) for keyset pagination; limit None means unpaginated."""
+    limit = None
+    raw = args.get("limit")
+    if raw is not None:
+        try:
+            limit = int(raw)
+        except ValueError:
+            raise BadQuery("'limit' must be an integer") from None
+        if not 1 <= limit <= MAX_PAGE_SIZE:
+            raise BadQuery(f"'limit' must be between 1 and {MAX_PAGE_SIZE}")
+    after = None
+    raw = args.get("after")
+    if raw is not None:
+        after = normalize_mac(raw)
+        if after is None:
+            raise BadQuery("'after' must be a MAC (the 'next' value of the previous page)")
+    return limit, after
+
+
+def _wants_ndjson() -> bool:
+    if request.args.get("format") == "ndjson":
+        return True
+    return request.accept_mimetypes.best_match(["application/json", "application/x-ndjson"]) == "application/x-ndjson"
+
+
+def _page_body(stmt, limit: int | None) -> bytes:
+    """
+    Run a filtered query; with a limit, fetch one extra row to decide whether
+    there is a next page and return its cursor as "next".
+    """
+    db = next(get_db())
+    try:
+        if limit is None:
+            nodes = db.scalars(stmt).all()
+            return current_app.json.dumps({"nodes": [n.to_dict() for n in nodes]}).encode() + b"\n"
+        nodes = db.scalars(stmt.limit(limit + 1)).all()
+        more = len(nodes) > limit
+        nodes = nodes[:limit]
+        page = {"nodes": [n.to_dict() for n in nodes], "next": nodes[-1].mac if more else None}
+        return current_app.json.dumps(page).encode() + b"\n"
+    finally:
+        db.close()
+
+
+def _ndjson_rows(stmt):
+    """
+    Yield one JSON line per node, NDJSON_BATCH rows per chunk, from a
+    server-side cursor; the session lives exactly as long as the stream.
+    """
+    db = next(get_db())
+    try:
+        rows = db.scalars(stmt.execution_options(yield_per=NDJSON_BATCH))
+        for batch in rows.partitions():
+            yield "".join(json.dumps(n.to_dict()) + "\n" for n in batch)
+    finally:
+        db.close()
+
+
+class _BadLine(ValueError):
+    """One POST /nodes/bulk line failed validation; the message goes into its result."""
+
+
+def _bulk_params(op, fields: dict, profiles: set[str]) -> dict:
+    """
+    Validate one bulk operation and return its statement parameters. Uses the
+    same checks as the single-node endpoints. Raises _BadLine.
+    """
+    if op not in _BULK_STATEMENTS:
+        raise _BadLine(f"unknown op {op!r}; expected one of {', '.join(_BULK_STATEMENTS)}")
+    mac = normalize_mac(fields.get("mac"))
+    if not mac:
+        raise _BadLine("invalid or missing mac")
+    if op == "delete":
+        return {"b_mac": mac}
+    value = None
+    if op in ("set_reinstall", "clear_reinstall"):
+        value = op == "set_reinstall"
+    elif op == "set_local_boot":
+        script = fields.get("script")
+        if not isinstance(script, str) or not validate_local_boot_script(script.strip()):
+            raise _BadLine("invalid local boot script (see PUT /nodes/<mac>/local-boot-config)")
+        value = script.strip()
+    elif op == "set_boot_profile":
+        value = fields.get("profile")
+        if value not in profiles:
+            raise _BadLine(f"unknown profile {value!r}")
+    elif op == "set_install_group":
+        value = fields.get("group")
+        if not isinstance(value, str) or not GROUP_NAME_PATTERN.match(value):
+            raise _BadLine("invalid group (see PUT /nodes/<mac>/install-group)")
+    return {"b_mac": mac, "b_value": value}
+
+
+def _ndjson_ops(stream):
+    """Yield (line_number, fields) per non-blank NDJSON line; fields is an error string when unparsable."""
+    for number, raw in enumerate(stream, 1):
+        if not raw.strip():
+            continue
+        try:
+            fields = json.loads(raw)
+        except ValueError:
+            yield number, "line is not valid JSON"
+            continue
+        yield number, fields if isinstance(fields, dict) else "line must be a JSON object"
+
+
+def _csv_ops(stream):
+    """
+    Yield (line_number, fields) per CSV row of op,mac[,value]; value is the
+    script, profile or group name. A leading op,mac,... header row is skipped.
+    """
+    reader = csv.reader(raw.decode("utf-8", errors="replace") for raw in stream)
+    for row in reader:
+        if not row or not "".join(row).strip():
+            continue
+        if reader.line_num == 1 and [c.strip().lower() for c in row[:2]] == ["op", "mac"]:
+            continue
+        value = row[2].strip() if len(row) > 2 else None
+        yield reader.line_num, {"op": row[0].strip(), "mac": row[1] if len(row) > 1 else None,
+                                "script": value, "profile": value, "group": value}
+
+
+def _apply_bulk_chunk(chunk: list) -> list[dict]:
+    """
+    Apply the valid operations of one chunk in a single transaction, one
+    executemany per run of consecutive operations sharing a statement (so
+    line order is preserved), plus one bump of each counter. Returns the
+    chunk's results in line order; a failed transaction fails its lines.
+    """
+    valid = [entry for entry in chunk if entry["ok"]]
+    if valid:
+        try:
+            changes = []
+            with engine.begin() as conn:
+                for stmt, run in groupby(valid, key=lambda entry: _BULK_STATEMENTS[entry["op"]]):
+                    params = [entry.pop("params") for entry in run]
+                    conn.execute(stmt, params)
+                    changes += [_change(stmt, p) for p in params]
+                bump_counter(conn, BOOT_GENERATION_KEY)
+                bump_counter(conn, NODES_VERSION_KEY)
+                record_changes(conn, changes)
+        except SQLAlchemyError as exc:
+            logger.warning("bulk: chunk of %d operations failed: %s", len(valid), exc)
+            for entry in valid:
+                entry.pop("params", None)
+                entry.update(ok=False, error="database error; chunk rolled back")
+        else:
+            boot_cache.invalidate_many(entry["mac"] for entry in valid)
+    return chunk
+
+
+def _bulk_results(ops, profiles: set[str]):
+    """Validate, apply in BULK_CHUNK transactions, and yield NDJSON results plus a summary line."""
+    ok = failed = 0
+    chunk: list[dict] = []
+
+    def emit():
+        nonlocal ok, failed
+        results = _apply_bulk_chunk(chunk)
+        passed = sum(1 for entry in results if entry["ok"])
+        ok += passed
+        failed += len(results) - passed
+        return "".join(json.dumps(entry) + "\n" for entry in results)
+
+    for number, fields in ops:
+        entry = {"line": number}
+        if isinstance(fields, str):
+            entry.update(ok=False, error=fields)
+        else:
+            op = fields.get("op")
+            entry.update(op=op, mac=normalize_mac(fields.get("mac")))
+            try:
+                entry["params"] = _bulk_params(op, fields, profiles)
+                entry["ok"] = True
+            except _BadLine as exc:
+                entry.update(ok=False, error=str(exc))
+        chunk.append(entry)
+        if len(chunk) >= BULK_CHUNK:
+            yield emit()
+            chunk = []
+    if chunk:
+        yield emit()
+    logger.info("bulk: applied %d operations, %d failed", ok, failed)
+    yield json.dumps({"summary": {"ok": ok, "failed": failed}}) + "\n"
+
+
+_listing = _ListingCache()
+# Tables recreated underneath us (tests, restore) reset the counter; the boot
+# cache notices the same event, so drop the listing along with it.
+boot_cache.add_reset_listener(_listing.clear)
+
+
+def _listing_body(version: int) -> bytes:
+    """Return the JSON body for version, serializing the fleet only on a version change."""
+    entry = _listing.entry
+    if entry is not None and entry[0] == version:
+        return entry[1]
+    db = next(get_db())
+    try:
+        nodes = db.query(Node).order_by(Node.mac).all()
+        body = current_app.json.dumps({"nodes": [n.to_dict() for n in nodes]}).encode() + b"\n"
+    finally:
+        db.close()
+    _listing.entry = (version, body)
+    return body
+
+
 def register_nodes_routes(app):
     """
     Register GET /nodes, POST /nodes/<mac>/reinstall, DELETE /nodes/<mac>/reinstall,
-    PUT /nodes/<mac>/local-boot-config, DELETE /nodes/<mac>/local-boot-config.
-    Each handler checks admin auth and uses one DB session per request.
+    PUT /nodes/<mac>/local-boot-config, DELETE /nodes/<mac>/local-boot-config,
+    PUT /nodes/<mac>/boot-profile, DELETE /nodes/<mac>/boot-profile,
+    PUT /nodes/<mac>/install-group, DELETE /nodes/<mac>/install-group,
+    POST /nodes/bulk. Each handler checks admin auth; single-node mutations are one
+    upsert each via _write_node(), bulk ones are batched per chunk.
     """
 
     @app.route("/nodes", methods=["GET"])
     def list_nodes():
         """
-        Return JSON list of all known nodes (mac, reinstall, local_boot_script,
-        last_seen, created_at).
+        Return JSON list of known nodes (mac, reinstall, local_boot_script,
+        boot_profile, last_seen, created_at) ordered by MAC, with the nodes
+        version as ETag; 304 when If-None-Match already names it. Filters and
+        pagination are described in _node_filters() and _page_params(); a
+        paginated response adds "next", the cursor to pass as after=.
+
+        Examples:
+          /nodes?reinstall=true
+          /nodes?seen_before=2024-05-01T00:00:00Z&limit=500
+          /nodes?mac_prefix=3c:52:82&limit=500&after=3c:52:82:00:12:ff
+          /nodes?format=ndjson
+
+        A read only: buffered last_seen updates are left to the flusher
+        thread, so last_seen may lag by up to LAST_SEEN_FLUSH_SECONDS and a
+        poll never takes the write lock. The version is read before the
+        rows, so a body is never tagged newer than its contents.
         """
         err = require_admin_auth()
         if err is not None:
             return err[0], err[1]
-        db = next(get_db())
         try:
-            nodes = db.query(Node).order_by(Node.mac).all()
-            return {"nodes": [n.to_dict() for n in nodes]}
-        finally:
-            db.close()
+            clauses = _node_filters(request.args)
+            limit, after = _page_params(request.args)
+        except BadQuery as exc:
+            return {"error": str(exc)}, 400
+        if after is not None:
+            clauses.append(Node.mac > after)
+
+        with engine.connect() as conn:
+            version = read_counter(conn, NODES_VERSION_KEY)
+        etag = f"nodes-{version}"
+        ndjson = _wants_ndjson()
+        stmt = select(Node).where(*clauses).order_by(Node.mac)
+        if request.if_none_match.contains_weak(etag):
+            response = Response(status=304)
+        elif ndjson:
+            rows = _ndjson_rows(stmt if limit is None else stmt.limit(limit))
+            response = Response(rows, mimetype="application/x-ndjson")
+        elif not clauses and limit is None:
+            response = Response(_listing_body(version), mimetype="application/json")
+        else:
+            response = Response(_page_body(stmt, limit), mimetype="application/json")
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = "no-cache"
+        response.vary.add("Accept")
+        return response
+
+    @app.route("/nodes/bulk", methods=["POST"])
+    def bulk_nodes():
+        """
+        Apply many node operations in one request. The body is NDJSON (one
+        {"op": ..., "mac": ..., ...} object per line) or, with Content-Type
+        text/csv, rows of op,mac[,value]. Operations: set_reinstall,
+        clear_reinstall, set_local_boot (script), clear_local_boot,
+        set_boot_profile (profile), clear_boot_profile, set_install_group
+        (group), clear_install_group, delete.
+
+        The body is read as a stream and applied BULK_CHUNK operations per
+        transaction. The response is NDJSON: one {"line", "op", "mac", "ok"
+        [, "error"]} result per input line, then {"summary": {...}}. Invalid
+        lines are reported and skipped; they never block the rest.
+
+        Example:
+          {"op": "set_reinstall", "mac": "aa:bb:cc:dd:ee:ff"}
+          {"op": "set_local_boot", "mac": "aa:bb:cc:dd:ee:00", "script": "sanboot --no-describe --drive 0"}
+        """
+        err = require_admin_auth()
+        if err is not None:
+            return err[0], err[1]
+        with engine.connect() as conn:
+            profiles = set(conn.scalars(select(BootProfile.name)))
+        stream = request.stream
+        ops = _csv_ops(stream) if request.mimetype == "text/csv" else _ndjson_ops(stream)
+        body = stream_with_context(_bulk_results(ops, profiles))
+        return Response(body, mimetype="application/x-ndjson")
 
     @app.route("/nodes/<path:mac_raw>/reinstall", methods=["POST"])
     def set_reinstall(mac_raw: str):
@@ -52,20 +482,9 @@ def register_nodes_routes(app):
         if not mac:
             return {"error": "Invalid or missing mac"}, 400
 
-        db = next(get_db())
-        try:
-            node = db.query(Node).filter(Node.mac == mac).first()
-            if node is None:
-                node = Node(mac=mac, reinstall=True)
-                db.add(node)
-            else:
-                node.reinstall = True
-            db.commit()
-            db.refresh(node)
-            logger.info("Set reinstall=True for mac=%s", mac)
-            return {"mac": mac, "reinstall": True}
-        finally:
-            db.close()
+        _write_node(_SET_REINSTALL, {"b_mac": mac, "b_value": True})
+        logger.info("Set reinstall=True for mac=%s", mac)
+        return {"mac": mac, "reinstall": True}
 
     @app.route("/nodes/<path:mac_raw>/reinstall", methods=["DELETE"])
     def clear_reinstall(mac_raw: str):
@@ -80,20 +499,9 @@ def register_nodes_routes(app):
         if not mac:
             return {"error": "Invalid or missing mac"}, 400
 
-        db = next(get_db())
-        try:
-            node = db.query(Node).filter(Node.mac == mac).first()
-            if node is None:
-                node = Node(mac=mac, reinstall=False)
-                db.add(node)
-            else:
-                node.reinstall = False
-            db.commit()
-            db.refresh(node)
-            logger.info("Set reinstall=False for mac=%s", mac)
-            return {"mac": mac, "reinstall": False}
-        finally:
-            db.close()
+        _write_node(_SET_REINSTALL, {"b_mac": mac, "b_value": False})
+        logger.info("Set reinstall=False for mac=%s", mac)
+        return {"mac": mac, "reinstall": False}
 
     @app.route("/nodes/<path:mac_raw>/local-boot-config", methods=["PUT"])
     def set_local_boot(mac_raw: str):
@@ -132,20 +540,9 @@ def register_nodes_routes(app):
                 )
             }, 400
 
-        db = next(get_db())
-        try:
-            node = db.query(Node).filter(Node.mac == mac).first()
-            if node is None:
-                node = Node(mac=mac, reinstall=False, local_boot_script=script)
-                db.add(node)
-            else:
-                node.local_boot_script = script
-            db.commit()
-            db.refresh(node)
-            logger.info("Set local_boot_script=%r for mac=%s", script, mac)
-            return {"mac": mac, "local_boot_script": script}
-        finally:
-            db.close()
+        _write_node(_SET_LOCAL_BOOT, {"b_mac": mac, "b_value": script})
+        logger.info("Set local_boot_script=%r for mac=%s", script, mac)
+        return {"mac": mac, "local_boot_script": script}
 
     @app.route("/nodes/<path:mac_raw>/local-boot-config", methods=["DELETE"])
     def clear_local_boot(mac_raw: str):
@@ -160,17 +557,93 @@ def register_nodes_routes(app):
         if not mac:
             return {"error": "Invalid or missing mac"}, 400
 
-        db = next(get_db())
-        try:
-            node = db.query(Node).filter(Node.mac == mac).first()
-            if node is None:
-                node = Node(mac=mac, reinstall=False, local_boot_script=None)
-                db.add(node)
-            else:
-                node.local_boot_script = None
-            db.commit()
-            db.refresh(node)
-            logger.info("Cleared local_boot_script for mac=%s", mac)
-            return {"mac": mac, "local_boot_script": None}
-        finally:
-            db.close()
+        _write_node(_SET_LOCAL_BOOT, {"b_mac": mac, "b_value": None})
+        logger.info("Cleared local_boot_script for mac=%s", mac)
+        return {"mac": mac, "local_boot_script": None}
+
+    @app.route("/nodes/<path:mac_raw>/boot-profile", methods=["PUT"])
+    def set_boot_profile(mac_raw: str):
+        """
+        Attach a boot profile to the node. Body must be JSON with a "profile"
+        key naming an existing profile (see /profiles); returns 404 when it
+        does not exist. Creates the node if it does not exist.
+        """
+        err = require_admin_auth()
+        if err is not None:
+            return err[0], err[1]
+        mac = normalize_mac(mac_raw)
+        if not mac:
+            return {"error": "Invalid or missing mac"}, 400
+
+        body = request.get_json(silent=True)
+        if not body or not isinstance(body.get("profile"), str):
+            return {"error": "Request body must be JSON with a 'profile' string"}, 400
+        name = body["profile"]
+        with engine.connect() as conn:
+            if conn.execute(_PROFILE_EXISTS, {"b_name": name}).first() is None:
+                return {"error": f"Unknown profile '{name}'"}, 404
+
+        _write_node(_SET_BOOT_PROFILE, {"b_mac": mac, "b_value": name})
+        logger.info("Set boot_profile=%r for mac=%s", name, mac)
+        return {"mac": mac, "boot_profile": name}
+
+    @app.route("/nodes/<path:mac_raw>/boot-profile", methods=["DELETE"])
+    def clear_boot_profile(mac_raw: str):
+        """
+        Detach the node's boot profile; the installer script falls back to the
+        env-configured default. Creates the node if it does not exist.
+        """
+        err = require_admin_auth()
+        if err is not None:
+            return err[0], err[1]
+        mac = normalize_mac(mac_raw)
+        if not mac:
+            return {"error": "Invalid or missing mac"}, 400
+
+        _write_node(_SET_BOOT_PROFILE, {"b_mac": mac, "b_value": None})
+        logger.info("Cleared boot_profile for mac=%s", mac)
+        return {"mac": mac, "boot_profile": None}
+
+    @app.route("/nodes/<path:mac_raw>/install-group", methods=["PUT"])
+    def set_install_group(mac_raw: str):
+        """
+        Put the node in a rolling reinstall group: at most
+        REINSTALL_MAX_ACTIVE_PER_GROUP nodes of a group install at once (see
+        app.rollout). Body must be JSON with a "group" name (letters, digits,
+        ".", "_", "-"; up to 64). Creates the node if it does not exist.
+
+        Example:
+          {"group": "rack-12"}
+        """
+        err = require_admin_auth()
+        if err is not None:
+            return err[0], err[1]
+        mac = normalize_mac(mac_raw)
+        if not mac:
+            return {"error": "Invalid or missing mac"}, 400
+
+        body = request.get_json(silent=True)
+        group = body.get("group") if isinstance(body, dict) else None
+        if not isinstance(group, str) or not GROUP_NAME_PATTERN.match(group):
+            return {"error": "Request body must be JSON with a 'group' name (letters, digits, '.', '_', '-')"}, 400
+
+        _write_node(_SET_INSTALL_GROUP, {"b_mac": mac, "b_value": group})
+        logger.info("Set install_group=%r for mac=%s", group, mac)
+        return {"mac": mac, "install_group": group}
+
+    @app.route("/nodes/<path:mac_raw>/install-group", methods=["DELETE"])
+    def clear_install_group(mac_raw: str):
+        """
+        Take the node out of its reinstall group; only REINSTALL_MAX_ACTIVE
+        then applies to it. Creates the node if it does not exist.
+        """
+        err = require_admin_auth()
+        if err is not None:
+            return err[0], err[1]
+        mac = normalize_mac(mac_raw)
+        if not mac:
+            return {"error": "Invalid or missing mac"}, 400
+
+        _write_node(_SET_INSTALL_GROUP, {"b_mac": mac, "b_value": None})
+        logger.info("Cleared install_group for mac=%s", mac)
+        return {"mac": mac, "install_group": None}
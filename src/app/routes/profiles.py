@@ -0,0 +1,146 @@
+"""
+/profiles routes: list (GET), read (GET), create or replace (PUT) and delete
+(DELETE) named boot profiles. Admin-only when ADMIN_API_KEY is set. Nodes are
+attached to a profile via PUT /nodes/<mac>/boot-profile (see nodes).
+
+Every write bumps the boot generation in the same transaction so other workers
+recompile their profiles, and invalidates this process's registry at once.
+"""
+
+import logging
+from datetime import datetime, timezone
+
+from flask import request
+from sqlalchemy import bindparam, delete, update
+
+from app.boot_cache import BOOT_GENERATION_KEY, boot_cache
+from app.boot_profiles import (
+    DEFAULT_PROFILE,
+    PROFILE_FIELDS,
+    PROFILE_NAME_PATTERN,
+    boot_profiles,
+    validate_profile_field,
+)
+from app.change_feed import record_changes
+from app.db import NODES_VERSION_KEY, bump_counter, dialect_insert, engine, get_db
+from app.models import BootProfile, Node
+from app.routes.common import require_admin_auth
+
+logger = logging.getLogger(__name__)
+
+_insert_profile = dialect_insert(BootProfile).values(
+    name=bindparam("b_name"),
+    updated_at=bindparam("b_now"),
+    **{field: bindparam(f"b_{field}") for field in PROFILE_FIELDS},
+)
+_PUT_PROFILE = _insert_profile.on_conflict_do_update(
+    index_elements=[BootProfile.name],
+    set_={column: _insert_profile.excluded[column] for column in (*PROFILE_FIELDS, "updated_at")},
+)
+_DELETE_PROFILE = delete(BootProfile).where(BootProfile.name == bindparam("b_name"))
+_DETACH_NODES = (
+    update(Node).where(Node.boot_profile == bindparam("b_name")).values(boot_profile=None).returning(Node.mac)
+)
+
+
+def _default_profile_dict() -> dict:
+    """The env-configured default profile, in the same shape as BootProfile.to_dict()."""
+    return {
+        "name": None,
+        **{field: getattr(DEFAULT_PROFILE, field).source or None for field in PROFILE_FIELDS},
+    }
+
+
+def register_profiles_routes(app):
+    """
+    Register GET /profiles, GET /profiles/<name>, PUT /profiles/<name> and
+    DELETE /profiles/<name>. Each handler checks admin auth.
+    """
+
+    @app.route("/profiles", methods=["GET"])
+    def list_profiles():
+        """Return every stored profile plus the env-configured default."""
+        err = require_admin_auth()
+        if err is not None:
+            return err[0], err[1]
+        db = next(get_db())
+        try:
+            profiles = db.query(BootProfile).order_by(BootProfile.name).all()
+            return {"default": _default_profile_dict(), "profiles": [p.to_dict() for p in profiles]}
+        finally:
+            db.close()
+
+    @app.route("/profiles/<name>", methods=["GET"])
+    def get_profile(name: str):
+        """Return one stored profile, or 404."""
+        err = require_admin_auth()
+        if err is not None:
+            return err[0], err[1]
+        db = next(get_db())
+        try:
+            profile = db.get(BootProfile, name)
+            if profile is None:
+                return {"error": f"Unknown profile '{name}'"}, 404
+            return profile.to_dict()
+        finally:
+            db.close()
+
+    @app.route("/profiles/<name>", methods=["PUT"])
+    def put_profile(name: str):
+        """
+        Create or replace a profile. Body is a JSON object with any of
+        uki_url, iso_url, autoinstall_url, extra_cmdline; omitted or null
+        fields inherit the env default. Values may use ${mac}, ${mac_hyphen}
+        and ${ip}; they are validated before the write is accepted and compiled
+        when the registry next loads (any value that validates compiles:
+        unknown ${...} slots are kept verbatim for iPXE).
+
+        Example:
+          {"iso_url": "http://mirror/ubuntu-22.04.5-live-server-amd64.iso",
+           "autoinstall_url": "http://seed/jammy/${mac_hyphen}/"}
+        """
+        err = require_admin_auth()
+        if err is not None:
+            return err[0], err[1]
+        if not PROFILE_NAME_PATTERN.match(name):
+            return {"error": "Invalid profile name (letters, digits, '.', '_', '-'; at most 64)"}, 400
+        body = request.get_json(silent=True)
+        if not isinstance(body, dict):
+            return {"error": "Request body must be a JSON object"}, 400
+        unknown = sorted(set(body) - set(PROFILE_FIELDS))
+        if unknown:
+            return {"error": f"Unknown profile fields: {', '.join(unknown)}"}, 400
+        for field in PROFILE_FIELDS:
+            problem = validate_profile_field(field, body.get(field))
+            if problem:
+                return {"error": problem}, 400
+
+        params = {f"b_{field}": body.get(field) for field in PROFILE_FIELDS}
+        with engine.begin() as conn:
+            conn.execute(_PUT_PROFILE, {"b_name": name, "b_now": datetime.now(timezone.utc), **params})
+            bump_counter(conn, BOOT_GENERATION_KEY)
+        boot_profiles.invalidate()
+        logger.info("Stored boot profile %r", name)
+        return {"name": name, **{field: body.get(field) for field in PROFILE_FIELDS}}
+
+    @app.route("/profiles/<name>", methods=["DELETE"])
+    def delete_profile(name: str):
+        """
+        Delete a profile. Nodes that used it are detached and fall back to
+        the default profile.
+        """
+        err = require_admin_auth()
+        if err is not None:
+            return err[0], err[1]
+        with engine.begin() as conn:
+            if conn.execute(_DELETE_PROFILE, {"b_name": name}).rowcount == 0:
+                return {"error": f"Unknown profile '{name}'"}, 404
+            macs = conn.scalars(_DETACH_NODES, {"b_name": name}).all()
+            bump_counter(conn, BOOT_GENERATION_KEY)
+            if macs:
+                bump_counter(conn, NODES_VERSION_KEY)
+                record_changes(conn, [("updated", mac, {"boot_profile": None}) for mac in macs])
+        detached = len(macs)
+        boot_cache.clear()
+        logger.info("Deleted boot profile %r (%d nodes detached)", name, detached)
+        return {"name": name, "deleted": True, "nodes_detached": detached}
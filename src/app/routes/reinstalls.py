@@ -0,0 +1,27 @@
+"""
+GET /reinstalls: the rolling reinstall scheduler (app.rollout) at a glance -
+its caps, whether a new install may start now, the installs running and the
+nodes still queued per install group. Admin auth like the rest of the admin API.
+"""
+
+from datetime import datetime, timezone
+
+from app.rollout import rollout
+from app.routes.common import require_admin_auth
+
+
+def register_reinstalls_route(app):
+    """Register GET /reinstalls on the Flask app."""
+
+    @app.route("/reinstalls", methods=["GET"])
+    def reinstalls():
+        """
+        Return {"enabled", "max_active", "max_active_per_group",
+        "window_open", "running": [{"mac", "install_group",
+        "install_started_at"}], "queued", "queued_by_group"}. Running installs
+        are listed oldest first; ungrouped nodes are counted under "".
+        """
+        err = require_admin_auth()
+        if err is not None:
+            return err[0], err[1]
+        return rollout.status(datetime.now(timezone.utc))
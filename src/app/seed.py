@@ -13,6 +13,7 @@ YAML format (example /config/seed.yml):
       - mac: "3c:52:82:57:ac:ed"
         reinstall: false
         local_boot_script: "sanboot --no-describe --drive 0x80"
+        install_group: "rack-1"   # optional: rolling reinstall group (app.rollout)
       - mac: "40:b0:34:43:b5:e7"
         reinstall: false
         # local_boot_script omitted: defaults to null → "exit" at boot time
@@ -21,11 +22,12 @@ YAML format (example /config/seed.yml):
 import logging
 import os
 
-import yaml
-
+from app.boot_cache import BOOT_GENERATION_KEY, boot_cache
+from app.change_feed import record_changes
 from app.config import SEED_FILE
-from app.db import SessionLocal
+from app.db import NODES_VERSION_KEY, SessionLocal, bump_counter
 from app.models import AppConfig, Node
+from app.rollout import GROUP_NAME_PATTERN
 from app.routes.boot import validate_local_boot_script
 from app.routes.common import normalize_mac
 
@@ -48,24 +50,29 @@ def seed_db() -> None:
         logger.info("seed: SEED_FILE=%s not found; skipping seed", SEED_FILE)
         return
 
-    try:
-        with open(SEED_FILE, encoding="utf-8") as fh:
-            data = yaml.safe_load(fh)
-    except Exception as exc:
-        logger.warning("seed: failed to parse %s: %s", SEED_FILE, exc)
-        return
-
-    if not isinstance(data, dict) or not isinstance(data.get("nodes"), list):
-        logger.warning("seed: %s must contain a top-level 'nodes' list; skipping", SEED_FILE)
-        return
-
     db = SessionLocal()
     try:
+        # Checked before parsing: a seed that has already run costs one read.
         if db.query(AppConfig).filter(AppConfig.key == "is_seed_executed").first() is not None:
             logger.info("seed: already applied on a previous run; skipping")
             return
 
+        # Imported here: only the one process that applies the seed pays for PyYAML.
+        import yaml
+
+        try:
+            with open(SEED_FILE, encoding="utf-8") as fh:
+                data = yaml.safe_load(fh)
+        except Exception as exc:
+            logger.warning("seed: failed to parse %s: %s", SEED_FILE, exc)
+            return
+
+        if not isinstance(data, dict) or not isinstance(data.get("nodes"), list):
+            logger.warning("seed: %s must contain a top-level 'nodes' list; skipping", SEED_FILE)
+            return
+
         inserted = 0
+        created = []
         skipped_existing = 0
         skipped_invalid = 0
 
@@ -98,11 +105,25 @@ def seed_db() -> None:
                     )
                     skipped_invalid += 1
 
-            db.add(Node(mac=mac, reinstall=reinstall, local_boot_script=script))
+            group = entry.get("install_group")
+            if group is not None and not (isinstance(group, str) and GROUP_NAME_PATTERN.match(group)):
+                logger.warning("seed: invalid install_group %r for %s; leaving it unset", group, mac)
+                skipped_invalid += 1
+                group = None
+
+            db.add(Node(mac=mac, reinstall=reinstall, local_boot_script=script, install_group=group))
+            fields = {"reinstall": reinstall, "local_boot_script": script, "source": "seed"}
+            if group is not None:
+                fields["install_group"] = group
+            created.append(("created", mac, fields))
             inserted += 1
 
         db.add(AppConfig(key="is_seed_executed", value="1"))
+        bump_counter(db, BOOT_GENERATION_KEY)
+        bump_counter(db, NODES_VERSION_KEY)
+        record_changes(db, created)
         db.commit()
+        boot_cache.clear()
         logger.info(
             "seed: done - inserted %d, skipped %d existing, %d invalid entries",
             inserted,
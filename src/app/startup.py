@@ -0,0 +1,148 @@
+"""
+Startup: once-per-deployment database preparation and a phase timing report.
+
+Schema creation, migrations and the seed used to run in every worker of both
+containers sharing the volume, racing each other on the seed. prepare_database()
+now runs them under an exclusive flock on <DATABASE_PATH>.init.lock (next to
+the DB, so every container on the volume sees it), or a PostgreSQL advisory
+lock when DATABASE_URL is set (containers may then share no filesystem at
+all), and records a fingerprint of
+what it applied in app_config. The fingerprint covers the ORM schema (tables,
+columns, types, indexes - everything migrate_db() can add) and the seed file's
+path, size and mtime. A process that finds the current fingerprint skips all
+of it without taking the lock: one indexed read instead of DDL, PRAGMA
+table_info and a YAML parse.
+
+StartupTimer collects how long each startup phase took; create_app() logs it.
+"""
+
+import fcntl
+import hashlib
+import logging
+import os
+import time
+from contextlib import contextmanager
+
+from sqlalchemy import select, text
+from sqlalchemy.exc import OperationalError, ProgrammingError
+
+from app.config import DATABASE_PATH, SEED_FILE
+from app.db import IS_SQLITE, engine, init_db, migrate_db
+from app.models import AppConfig, Base
+from app.seed import seed_db
+
+logger = logging.getLogger(__name__)
+
+INIT_FINGERPRINT_KEY = "init_fingerprint"
+# pg_advisory_lock key for prepare_database() ("pxep" as a 32-bit integer).
+INIT_ADVISORY_LOCK = 0x70786570
+
+
+class StartupTimer:
+    """Named phase durations, reported as one log line."""
+
+    def __init__(self, started: float | None = None) -> None:
+        self._started = time.perf_counter() if started is None else started
+        self.phases: dict[str, float] = {}
+        self.notes: dict[str, str] = {}
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = time.perf_counter() - started
+
+    def since(self, name: str, epoch: float) -> None:
+        """Record phase name as the wall-clock time from epoch until now, counted in the total."""
+        seconds = max(time.time() - epoch, 0.0)
+        self.phases[name] = seconds
+        self._started = min(self._started, time.perf_counter() - seconds)
+
+    def report(self) -> str:
+        total = time.perf_counter() - self._started
+        parts = []
+        for name, seconds in self.phases.items():
+            note = f" ({self.notes[name]})" if name in self.notes else ""
+            parts.append(f"{name} {seconds * 1000:.1f}ms{note}")
+        return f"{', '.join(parts)}; total {total * 1000:.1f}ms (pid {os.getpid()})"
+
+
+def schema_fingerprint() -> str:
+    """Hash of the ORM schema plus the seed file's identity; changes whenever prepare work is due."""
+    digest = hashlib.sha256()
+    for table in Base.metadata.sorted_tables:
+        digest.update(f"table {table.name}\n".encode())
+        for column in table.columns:
+            digest.update(f"column {column.name} {column.type} {column.nullable}\n".encode())
+        for index in sorted(table.indexes, key=lambda i: i.name or ""):
+            digest.update(f"index {index.name} {[c.name for c in index.columns]}\n".encode())
+    if SEED_FILE:
+        try:
+            stat = os.stat(SEED_FILE)
+            digest.update(f"seed {SEED_FILE} {stat.st_size} {stat.st_mtime_ns}\n".encode())
+        except OSError:
+            digest.update(f"seed {SEED_FILE} missing\n".encode())
+    return digest.hexdigest()
+
+
+def _applied_fingerprint() -> str | None:
+    """Fingerprint recorded by the last successful prepare, or None (including on a fresh DB)."""
+    try:
+        with engine.connect() as conn:
+            return conn.execute(select(AppConfig.value).where(AppConfig.key == INIT_FINGERPRINT_KEY)).scalar()
+    except (OperationalError, ProgrammingError):  # no app_config table yet
+        return None
+
+
+def _record_fingerprint(fingerprint: str) -> None:
+    with engine.begin() as conn:
+        conn.execute(AppConfig.__table__.delete().where(AppConfig.key == INIT_FINGERPRINT_KEY))
+        conn.execute(AppConfig.__table__.insert().values(key=INIT_FINGERPRINT_KEY, value=fingerprint))
+
+
+@contextmanager
+def init_lock(path: str = f"{DATABASE_PATH}.init.lock"):
+    """
+    Exclusive advisory lock shared by every process and container using the
+    same database: a flock next to the SQLite file, or a session-level
+    pg_advisory_lock. Blocks until the holder releases it (or exits).
+    """
+    if not IS_SQLITE:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": INIT_ADVISORY_LOCK})
+            conn.commit()
+            try:
+                yield
+            finally:
+                conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": INIT_ADVISORY_LOCK})
+                conn.commit()
+        return
+    with open(path, "a") as fh:
+        fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+def prepare_database() -> bool:
+    """
+    Create tables, migrate and seed unless this exact schema and seed have
+    already been applied to the database. Returns True when the work ran here,
+    False when another process (or an earlier start) had done it.
+    """
+    fingerprint = schema_fingerprint()
+    if _applied_fingerprint() == fingerprint:
+        return False
+    with init_lock():
+        # Another process may have finished while we waited for the lock.
+        if _applied_fingerprint() == fingerprint:
+            return False
+        init_db()
+        migrate_db()
+        seed_db()
+        _record_fingerprint(fingerprint)
+    logger.info("startup: database schema and seed applied (fingerprint %s)", fingerprint[:12])
+    return True
@@ -0,0 +1,63 @@
+"""
+Compiled ${name} templates.
+
+A template string is parsed once into alternating literal text and slot names,
+so rendering is a single join with no scanning. Slots whose name is not in the
+supplied values are emitted unchanged, which keeps iPXE's own runtime variables
+such as ${next-server} intact in URLs that also use ${mac}.
+
+compile_template() memoizes by source string, so callers holding env-derived or
+DB-derived templates pay the parse once per distinct template per process.
+"""
+
+import re
+from functools import lru_cache
+from typing import Mapping
+
+# iPXE setting names may contain hyphens and dots (e.g. ${next-server}, ${net0.dhcp/mac}).
+_SLOT = re.compile(r"\$\{([A-Za-z0-9_.:/-]+)\}")
+
+
+class CompiledTemplate:
+    """
+    Immutable parsed template. head is the text before the first slot; slots
+    is a tuple of (name, verbatim, following_literal) triples.
+    """
+
+    __slots__ = ("source", "head", "slots")
+
+    def __init__(self, source: str) -> None:
+        self.source = source
+        pieces = _SLOT.split(source)
+        # split() with one group yields [lit, name, lit, name, ..., lit]
+        self.head = pieces[0]
+        self.slots = tuple(
+            (pieces[i], "${" + pieces[i] + "}", pieces[i + 1]) for i in range(1, len(pieces), 2)
+        )
+
+    @property
+    def names(self) -> frozenset[str]:
+        """Slot names used by this template."""
+        return frozenset(name for name, _, _ in self.slots)
+
+    def render(self, values: Mapping[str, str]) -> str:
+        """Fill slots from values; unknown slots are left as written."""
+        if not self.slots:
+            return self.head
+        out = [self.head]
+        for name, verbatim, literal in self.slots:
+            out.append(values.get(name, verbatim))
+            out.append(literal)
+        return "".join(out)
+
+    def __bool__(self) -> bool:
+        return bool(self.source)
+
+    def __repr__(self) -> str:
+        return f"CompiledTemplate({self.source!r})"
+
+
+@lru_cache(maxsize=1024)
+def compile_template(source: str) -> CompiledTemplate:
+    """Parse source once; repeated calls with the same string return the same object."""
+    return CompiledTemplate(source)
@@ -0,0 +1,403 @@
+"""
+Built-in asyncio TFTP server: python -m app.tftp (PXE_TFTP_SERVER=builtin in
+docker/entrypoint.sh, instead of dnsmasq).
+
+Read-only RFC 1350 with option negotiation (RFC 2347):
+- blksize (RFC 2348): blocks up to TFTP_MAX_BLKSIZE instead of 512 bytes.
+- windowsize (RFC 7440): up to TFTP_MAX_WINDOWSIZE blocks per ACK instead of
+  lock-step, which is what makes a large uki.efi fast when many machines
+  boot at once.
+- tsize and timeout (RFC 2349).
+Only octet mode: PXE firmware and iPXE never ask for netascii, and files are
+sent byte for byte, so a netascii request is refused with "Illegal TFTP
+operation" rather than answered with untranslated line endings.
+
+Files under TFTP_ROOT are served from read-only memory maps shared by every
+concurrent transfer; TFTP_PRELOAD (the iPXE binaries and the UKI) are mapped at
+startup, anything else on first request. A file replaced on disk (new mtime or
+size) is mapped again; replace files by rename, not by rewriting in place.
+boot.ipxe and autoexec.ipxe are not read from disk: they are generated from
+PXE_BASE_URL, so the entrypoint no longer writes them.
+
+Each transfer runs on its own ephemeral UDP port (the TFTP transfer ID) as
+one asyncio task, so one slow or vanished client never holds up the rest.
+Every transfer is logged with its size, duration and throughput, and counted
+in the pxe_tftp_* metrics (merged into /metrics through METRICS_DIR).
+"""
+
+import asyncio
+import logging
+import mmap
+import os
+import signal
+import socket
+import struct
+import time
+
+from app.config import (
+    PXE_BASE_URL,
+    TFTP_BIND,
+    TFTP_MAX_BLKSIZE,
+    TFTP_MAX_WINDOWSIZE,
+    TFTP_PORT,
+    TFTP_PRELOAD,
+    TFTP_RETRIES,
+    TFTP_ROOT,
+    TFTP_TIMEOUT_SECONDS,
+)
+from app.metrics import TFTP_BYTES, TFTP_SECONDS, TFTP_TRANSFERS
+
+logger = logging.getLogger(__name__)
+
+RRQ, WRQ, DATA, ACK, ERROR, OACK = 1, 2, 3, 4, 5, 6
+ERR_NOT_DEFINED, ERR_NOT_FOUND, ERR_ACCESS, ERR_ILLEGAL, ERR_UNKNOWN_TID = 0, 1, 2, 4, 5
+
+MIN_BLKSIZE, MAX_BLKSIZE = 8, 65464
+DEFAULT_BLKSIZE = 512
+
+# Stage-2 scripts generated per request; both chain to the HTTP app (see README).
+GENERATED = ("boot.ipxe", "autoexec.ipxe")
+
+
+def chain_script(base_url: str) -> bytes:
+    """boot.ipxe / autoexec.ipxe: hand the client over to <base_url>/chain."""
+    return f"#!ipxe\nchain {base_url.rstrip('/')}/chain\n".encode()
+
+
+def error_packet(code: int, message: str) -> bytes:
+    return struct.pack("!HH", ERROR, code) + message.encode("ascii", "replace") + b"\0"
+
+
+def parse_request(packet: bytes) -> tuple[int, str, str, dict[str, str]]:
+    """
+    (opcode, filename, mode, options) of an RRQ/WRQ. Option names are
+    lower-cased; raises ValueError for anything malformed.
+    """
+    if len(packet) < 4:
+        raise ValueError("short packet")
+    opcode = struct.unpack("!H", packet[:2])[0]
+    if opcode not in (RRQ, WRQ):
+        raise ValueError(f"unexpected opcode {opcode}")
+    fields = packet[2:].split(b"\0")
+    if len(fields) < 3 or fields[-1] != b"":
+        raise ValueError("unterminated request")
+    fields = [field.decode("ascii") for field in fields[:-1]]
+    filename, mode, rest = fields[0], fields[1].lower(), fields[2:]
+    if not filename:
+        raise ValueError("empty filename")
+    if mode != "octet":
+        raise ValueError(f"unsupported mode {mode!r}")
+    options = {rest[i].lower(): rest[i + 1] for i in range(0, len(rest) - 1, 2)}
+    return opcode, filename, mode, options
+
+
+def negotiate(options: dict[str, str], size: int, max_blksize: int, max_window: int,
+              default_timeout: float) -> tuple[dict[str, str], int, int, float]:
+    """
+    Accept what the server supports, capped by its limits. Returns
+    (acknowledged options for the OACK, blksize, windowsize, timeout). Options
+    with invalid values are ignored, as RFC 2347 allows.
+    """
+    accepted: dict[str, str] = {}
+    blksize, window, timeout = DEFAULT_BLKSIZE, 1, default_timeout
+    if "blksize" in options:
+        try:
+            requested = int(options["blksize"])
+        except ValueError:
+            requested = 0
+        if MIN_BLKSIZE <= requested <= MAX_BLKSIZE:
+            blksize = min(requested, max_blksize)
+            accepted["blksize"] = str(blksize)
+    if "windowsize" in options:
+        try:
+            requested = int(options["windowsize"])
+        except ValueError:
+            requested = 0
+        if 1 <= requested <= 65535:
+            window = min(requested, max_window)
+            accepted["windowsize"] = str(window)
+    if "timeout" in options:
+        try:
+            requested = int(options["timeout"])
+        except ValueError:
+            requested = 0
+        if 1 <= requested <= 255:
+            timeout = float(requested)
+            accepted["timeout"] = str(requested)
+    if "tsize" in options:
+        accepted["tsize"] = str(size)
+    return accepted, blksize, window, timeout
+
+
+class FileCache:
+    """Read-only memory maps of files under root, keyed by path and refreshed on (size, mtime) change."""
+
+    def __init__(self, root: str) -> None:
+        self.root = os.path.realpath(root)
+        self._maps: dict[str, tuple[tuple[int, int], memoryview]] = {}
+
+    def resolve(self, name: str) -> str | None:
+        """Absolute path of name inside root, or None when it escapes root."""
+        path = os.path.realpath(os.path.join(self.root, name.replace("\\", "/").lstrip("/")))
+        return path if path.startswith(self.root + os.sep) else None
+
+    def get(self, path: str) -> memoryview:
+        """Contents of path; raises OSError (e.g. FileNotFoundError) like open()."""
+        stat = os.stat(path)
+        key = (stat.st_size, stat.st_mtime_ns)
+        cached = self._maps.get(path)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        with open(path, "rb") as fh:
+            data = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) if stat.st_size else b""
+        view = memoryview(data)
+        self._maps[path] = (key, view)
+        return view
+
+    def preload(self, names) -> None:
+        for name in names:
+            path = self.resolve(name)
+            try:
+                if path is not None:
+                    size = len(self.get(path))
+                    logger.info("tftp: mapped %s (%d bytes)", name, size)
+            except OSError as exc:
+                logger.warning("tftp: cannot preload %s: %s", name, exc)
+
+
+class _Aborted(Exception):
+    """The client sent an ERROR packet."""
+
+
+class _TimedOut(Exception):
+    """The client stopped acknowledging."""
+
+
+class _Transfer(asyncio.DatagramProtocol):
+    """Packets from the one peer of a transfer, queued for the sending task."""
+
+    def __init__(self, peer) -> None:
+        self.peer = peer
+        self.queue: asyncio.Queue[bytes] = asyncio.Queue()
+        self.transport: asyncio.DatagramTransport | None = None
+
+    def connection_made(self, transport) -> None:
+        self.transport = transport
+
+    def datagram_received(self, data: bytes, addr) -> None:
+        if addr[:2] != self.peer[:2]:
+            self.transport.sendto(error_packet(ERR_UNKNOWN_TID, "Unknown transfer ID"), addr)
+            return
+        self.queue.put_nowait(data)
+
+    def error_received(self, exc) -> None:
+        pass  # ICMP errors; the transfer times out if the client is really gone
+
+    def send(self, packet) -> None:
+        self.transport.sendto(packet, self.peer)
+
+    async def next_ack(self, timeout: float) -> int | None:
+        """Block number of the next ACK, or None after timeout. Raises _Aborted on ERROR."""
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            try:
+                packet = await asyncio.wait_for(self.queue.get(), remaining)
+            except asyncio.TimeoutError:
+                return None
+            if len(packet) < 4:
+                continue
+            opcode, number = struct.unpack("!HH", packet[:4])
+            if opcode == ACK:
+                return number
+            if opcode == ERROR:
+                raise _Aborted(packet[4:].rstrip(b"\0").decode("ascii", "replace") or f"code {number}")
+
+
+async def send_file(proto: _Transfer, data, blksize: int, window: int, timeout: float, retries: int,
+                    oack: bytes | None) -> None:
+    """
+    Send data as DATA blocks, window blocks per round trip. Block numbers wrap
+    at 65536; the last block is shorter than blksize (possibly empty). An ACK
+    for a block inside the outstanding window slides the window to just after
+    it (RFC 7440); duplicate ACKs are ignored and only a timeout resends, which
+    avoids the Sorcerer's Apprentice duplicate-send spiral.
+    """
+    if oack is not None:
+        for _ in range(retries + 1):
+            proto.send(oack)
+            if await proto.next_ack(timeout) == 0:
+                break
+        else:
+            raise _TimedOut("no ACK for OACK")
+    last = len(data) // blksize + 1  # absolute number of the final (short) block
+    base = 1
+    attempts = 0
+    while base <= last:
+        end = min(base + window, last + 1)
+        for number in range(base, end):
+            offset = (number - 1) * blksize
+            proto.send(struct.pack("!HH", DATA, number & 0xFFFF) + data[offset:offset + blksize])
+        while True:
+            acked = await proto.next_ack(timeout)
+            if acked is None:
+                attempts += 1
+                if attempts > retries:
+                    raise _TimedOut(f"no ACK after block {base - 1}")
+                break  # resend the window
+            advance = (acked - (base - 1)) & 0xFFFF
+            if 0 < advance <= end - base:
+                base += advance
+                attempts = 0
+                break
+
+
+class TFTPServer:
+    """Listens for read requests and runs each transfer as its own task."""
+
+    def __init__(self, root: str, base_url: str, host: str = "0.0.0.0", port: int = 69,
+                 max_blksize: int = MAX_BLKSIZE, max_window: int = 64, timeout: float = 1.0,
+                 retries: int = 5, preload=()) -> None:
+        self._files = FileCache(root)
+        self._script = chain_script(base_url)
+        self._host = host
+        self._port = port
+        self._max_blksize = max_blksize
+        self._max_window = max_window
+        self._timeout = timeout
+        self._retries = retries
+        self._preload = tuple(preload)
+        self._tasks: set[asyncio.Task] = set()
+        self._transport: asyncio.DatagramTransport | None = None
+
+    async def start(self) -> tuple[str, int]:
+        """Map the preload files and bind the listener; returns the bound address."""
+        self._files.preload(self._preload)
+        loop = asyncio.get_running_loop()
+        server = self
+
+        class _Listener(asyncio.DatagramProtocol):
+            def datagram_received(self, data, addr):
+                task = loop.create_task(server._serve(data, addr))
+                server._tasks.add(task)
+                task.add_done_callback(server._tasks.discard)
+
+        self._transport, _ = await loop.create_datagram_endpoint(
+            _Listener, local_addr=(self._host, self._port), family=socket.AF_INET
+        )
+        address = self._transport.get_extra_info("sockname")[:2]
+        logger.info("tftp: serving %s on %s:%d", self._files.root, *address)
+        return address
+
+    async def close(self) -> None:
+        """Stop listening and cancel the transfers in flight."""
+        if self._transport is not None:
+            self._transport.close()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def _label(self, name: str) -> str:
+        """Metrics label: hot files by name, everything else as "other" (bounded label set)."""
+        return name if name in GENERATED or name in self._preload else "other"
+
+    def _open(self, name: str):
+        """(data, error packet): generated scripts, else the mapped file."""
+        if name in GENERATED:
+            return self._script, None
+        path = self._files.resolve(name)
+        if path is None:
+            return None, error_packet(ERR_ACCESS, "Access violation")
+        try:
+            return self._files.get(path), None
+        except (FileNotFoundError, IsADirectoryError, NotADirectoryError):
+            return None, error_packet(ERR_NOT_FOUND, "File not found")
+        except OSError as exc:
+            return None, error_packet(ERR_ACCESS, str(exc))
+
+    async def _serve(self, packet: bytes, addr) -> None:
+        loop = asyncio.get_running_loop()
+        transport, proto = await loop.create_datagram_endpoint(
+            lambda: _Transfer(addr), local_addr=(self._host, 0), family=socket.AF_INET
+        )
+        name, label, result = "?", "other", "error"
+        try:
+            try:
+                opcode, name, _mode, options = parse_request(packet)
+            except (ValueError, UnicodeDecodeError) as exc:
+                proto.send(error_packet(ERR_ILLEGAL, f"Illegal TFTP operation: {exc}"))
+                return
+            name = name.replace("\\", "/").lstrip("/")
+            label = self._label(name)
+            if opcode == WRQ:
+                proto.send(error_packet(ERR_ACCESS, "Read-only server"))
+                return
+            data, error = self._open(name)
+            if error is not None:
+                logger.info("tftp: %s requested %s: %s", addr[0], name, error[4:-1].decode())
+                proto.send(error)
+                result = "not_found" if error[3] == ERR_NOT_FOUND else "error"
+                return
+            accepted, blksize, window, timeout = negotiate(
+                options, len(data), self._max_blksize, self._max_window, self._timeout
+            )
+            oack = None
+            if accepted:
+                oack = struct.pack("!H", OACK) + b"".join(
+                    f"{key}\0{value}\0".encode() for key, value in accepted.items()
+                )
+            started = time.perf_counter()
+            try:
+                await send_file(proto, data, blksize, window, timeout, self._retries, oack)
+            except _Aborted as exc:
+                # e.g. Secure Boot rejecting the binary right after download
+                logger.info("tftp: %s aborted %s: %s", addr[0], name, exc)
+                result = "aborted"
+                return
+            except _TimedOut as exc:
+                logger.warning("tftp: %s timed out on %s: %s", addr[0], name, exc)
+                result = "timeout"
+                return
+            elapsed = time.perf_counter() - started
+            result = "ok"
+            TFTP_BYTES.inc(label, amount=len(data))
+            TFTP_SECONDS.observe(elapsed, label)
+            logger.info(
+                "tftp: sent %s to %s: %d bytes in %.3fs (%.2f MB/s, blksize %d, windowsize %d)",
+                name, addr[0], len(data), elapsed, len(data) / max(elapsed, 1e-9) / 1e6, blksize, window,
+            )
+        finally:
+            TFTP_TRANSFERS.inc(label, result)
+            transport.close()
+
+
+async def _serve_forever(server: TFTPServer) -> None:
+    await server.start()
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, stop.set)
+    await stop.wait()
+    await server.close()
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    server = TFTPServer(
+        TFTP_ROOT,
+        PXE_BASE_URL,
+        host=TFTP_BIND,
+        port=TFTP_PORT,
+        max_blksize=TFTP_MAX_BLKSIZE,
+        max_window=TFTP_MAX_WINDOWSIZE,
+        timeout=TFTP_TIMEOUT_SECONDS,
+        retries=TFTP_RETRIES,
+        preload=TFTP_PRELOAD,
+    )
+    asyncio.run(_serve_forever(server))
+
+
+if __name__ == "__main__":
+    main()
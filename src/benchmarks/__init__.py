@@ -0,0 +1 @@
+# Load tests and latency benchmarks. Not collected by pytest; run as modules (see CONTRIBUTING.md).
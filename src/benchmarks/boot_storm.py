@@ -0,0 +1,350 @@
+"""
+Boot-storm load test and latency benchmark.
+
+Builds a synthetic fleet of N MACs in a throwaway database, starts gunicorn
+(or uvicorn with --mode asgi) on it locally, and replays what a rack power
+cycle looks like: every simulated client fetches /chain and then
+/boot?mac=..., while an admin thread churns
+POST/DELETE /nodes/<mac>/reinstall. Reports throughput, p50/p95/p99 latency
+per route, SQLite write-lock waits (timed by a probe that takes the write lock
+alongside the server) and peak server RSS, and writes everything as JSON.
+
+Usage (from src/):
+
+    python -m benchmarks.boot_storm --nodes 5000 --concurrency 50 --duration 30 \\
+        --output bench-3.1.0.json
+    python -m benchmarks.boot_storm --baseline bench-3.0.0.json --tolerance 0.2
+
+With --baseline the run exits 1 when throughput drops, or any route's p99
+grows, by more than --tolerance relative to the baseline file.
+"""
+
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+SRC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# Required app settings; the benchmark never contacts these hosts.
+_DEFAULT_ENV = {
+    "PXE_UBUNTU_KERNEL_URL": "http://bench.invalid/vmlinuz",
+    "PXE_UBUNTU_INITRD_URL": "http://bench.invalid/initrd",
+    "PXE_AUTOINSTALL_URL": "http://bench.invalid/autoinstall/${mac}",
+    "PXE_BASE_URL": "http://bench.invalid",
+}
+
+
+def percentile(sorted_values: list[float], pct: float) -> float | None:
+    """Nearest-rank percentile of an ascending list; None when empty."""
+    if not sorted_values:
+        return None
+    rank = max(1, round(pct / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(latencies: list[float], errors: int) -> dict:
+    """Count, error count, and latency percentiles (milliseconds) for one route."""
+    values = sorted(latencies)
+    ms = lambda v: round(v * 1000, 3) if v is not None else None  # noqa: E731
+    return {
+        "count": len(values),
+        "errors": errors,
+        "p50_ms": ms(percentile(values, 50)),
+        "p95_ms": ms(percentile(values, 95)),
+        "p99_ms": ms(percentile(values, 99)),
+        "max_ms": ms(values[-1] if values else None),
+    }
+
+
+def fleet_macs(count: int) -> list[str]:
+    """Deterministic locally-administered MACs 02:00:xx:xx:xx:xx."""
+    return [":".join(["02", "00"] + [f"{(i >> s) & 0xFF:02x}" for s in (24, 16, 8, 0)]) for i in range(count)]
+
+
+def build_fleet(macs: list[str], reinstall_fraction: float) -> None:
+    """Create the schema and insert the fleet through the app's own models."""
+    from app.db import engine, init_db
+    from app.models import Node
+
+    init_db()
+    now = datetime.now(timezone.utc)
+    rng = random.Random(0)
+    rows = [
+        {"mac": mac, "reinstall": rng.random() < reinstall_fraction, "created_at": now}
+        for mac in macs
+    ]
+    with engine.begin() as conn:
+        conn.execute(Node.__table__.insert(), rows)
+    engine.dispose()
+
+
+class Recorder:
+    """Thread-safe per-route latency and error collection."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.latencies: dict[str, list[float]] = {}
+        self.errors: dict[str, int] = {}
+
+    def add(self, route: str, seconds: float, ok: bool) -> None:
+        with self._lock:
+            self.latencies.setdefault(route, [])
+            self.errors.setdefault(route, 0)
+            if ok:
+                self.latencies[route].append(seconds)
+            else:
+                self.errors[route] += 1
+
+
+def request(port: int, method: str, path: str, headers: dict) -> tuple[float, bool]:
+    """One request on a fresh connection (as iPXE does); returns (seconds, ok)."""
+    start = time.perf_counter()
+    try:
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        conn.request(method, path, headers=headers)
+        resp = conn.getresponse()
+        resp.read()
+        conn.close()
+        return time.perf_counter() - start, resp.status == 200
+    except OSError:
+        return time.perf_counter() - start, False
+
+
+def client_loop(port: int, macs: list[str], deadline: float, rec: Recorder, seed: int) -> None:
+    """One simulated PXE client slot: /chain then /boot for random fleet members."""
+    rng = random.Random(seed)
+    while time.monotonic() < deadline:
+        mac = rng.choice(macs)
+        rec.add("/chain", *request(port, "GET", "/chain", {}))
+        rec.add("/boot", *request(port, "GET", f"/boot?mac={mac}", {}))
+
+
+def churn_loop(port: int, macs: list[str], deadline: float, rec: Recorder, rate: float, headers: dict) -> None:
+    """Admin flag churn: alternate POST/DELETE reinstall at about rate ops/s."""
+    if rate <= 0:
+        return
+    rng = random.Random(1)
+    interval = 1.0 / rate
+    while time.monotonic() < deadline:
+        mac = rng.choice(macs)
+        method = "POST" if rng.random() < 0.5 else "DELETE"
+        rec.add("/nodes/<mac>/reinstall", *request(port, method, f"/nodes/{mac}/reinstall", headers))
+        time.sleep(interval)
+
+
+def lock_probe_loop(db_path: str, deadline: float, waits: list[float]) -> None:
+    """
+    Every 50 ms, time how long it takes to acquire SQLite's write lock
+    (BEGIN IMMEDIATE) on the server's DB file. Long waits mean the server's
+    writers are contending for the lock.
+    """
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    try:
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            conn.execute("BEGIN IMMEDIATE")
+            waits.append(time.perf_counter() - start)
+            conn.execute("ROLLBACK")
+            time.sleep(0.05)
+    finally:
+        conn.close()
+
+
+def process_tree_rss_kib(root_pid: int) -> int | None:
+    """Sum of VmRSS over root_pid and its children (Linux /proc); None elsewhere."""
+    def rss(pid: int) -> int:
+        try:
+            with open(f"/proc/{pid}/status", encoding="ascii") as fh:
+                for line in fh:
+                    if line.startswith("VmRSS:"):
+                        return int(line.split()[1])
+        except OSError:
+            pass
+        return 0
+
+    if not os.path.exists(f"/proc/{root_pid}"):
+        return None
+    total = rss(root_pid)
+    try:
+        with open(f"/proc/{root_pid}/task/{root_pid}/children", encoding="ascii") as fh:
+            total += sum(rss(int(pid)) for pid in fh.read().split())
+    except OSError:
+        pass
+    return total
+
+
+def rss_loop(pid: int, deadline: float, samples: list[int]) -> None:
+    """Sample server RSS twice a second."""
+    while time.monotonic() < deadline:
+        value = process_tree_rss_kib(pid)
+        if value is not None:
+            samples.append(value)
+        time.sleep(0.5)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def server_command(mode: str, port: int, workers: int, extra_args: list[str]) -> list[str]:
+    """gunicorn (gthread WSGI) or uvicorn (ASGI) command line, as docker/entrypoint.sh runs them."""
+    if mode == "asgi":
+        return [sys.executable, "-m", "uvicorn", "--host", "127.0.0.1", "--port", str(port),
+                "--workers", str(workers), "--no-access-log", *extra_args, "app.asgi:app"]
+    threads = os.environ.get("WEB_THREADS", "32")
+    return [sys.executable, "-m", "gunicorn", "-b", f"127.0.0.1:{port}", "-w", str(workers),
+            "--worker-class", "gthread", "--threads", threads, *extra_args, "app:app"]
+
+
+def start_server(mode: str, port: int, workers: int, env: dict, extra_args: list[str]) -> subprocess.Popen:
+    """Start the server and wait until /health answers."""
+    proc = subprocess.Popen(
+        server_command(mode, port, workers, extra_args),
+        cwd=SRC_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"server exited with {proc.returncode} during startup")
+        _, ok = request(port, "GET", "/health", {})
+        if ok:
+            return proc
+        time.sleep(0.1)
+    proc.terminate()
+    raise RuntimeError("server did not become healthy within 30s")
+
+
+def run(args: argparse.Namespace) -> dict:
+    """Execute one benchmark run and return the result document."""
+    workdir = tempfile.mkdtemp(prefix="pxe-bench-")
+    db_path = os.path.join(workdir, "pxe.db")
+    env = {**_DEFAULT_ENV, **os.environ, "DATABASE_PATH": db_path, "PYTHONPATH": SRC_DIR, "SERVER_MODE": args.mode}
+    env.pop("SEED_FILE", None)
+    os.environ.update({k: v for k, v in env.items() if k in _DEFAULT_ENV or k == "DATABASE_PATH"})
+    headers = {"Authorization": f"Bearer {env['ADMIN_API_KEY']}"} if env.get("ADMIN_API_KEY") else {}
+
+    macs = fleet_macs(args.nodes)
+    build_fleet(macs, args.reinstall_fraction)
+
+    port = args.port or free_port()
+    server = start_server(args.mode, port, args.workers, env, args.server_arg)
+    rec = Recorder()
+    lock_waits: list[float] = []
+    rss_samples: list[int] = []
+    try:
+        started = time.monotonic()
+        deadline = started + args.duration
+        threads = [
+            threading.Thread(target=client_loop, args=(port, macs, deadline, rec, i))
+            for i in range(args.concurrency)
+        ]
+        threads.append(threading.Thread(target=churn_loop, args=(port, macs, deadline, rec, args.churn_rate, headers)))
+        threads.append(threading.Thread(target=lock_probe_loop, args=(db_path, deadline, lock_waits)))
+        threads.append(threading.Thread(target=rss_loop, args=(server.pid, deadline, rss_samples)))
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.monotonic() - started
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+    routes = {route: summarize(rec.latencies[route], rec.errors[route]) for route in sorted(rec.latencies)}
+    total = sum(r["count"] for r in routes.values())
+    waits = sorted(lock_waits)
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "sqlite": sqlite3.sqlite_version,
+            "nodes": args.nodes,
+            "concurrency": args.concurrency,
+            "mode": args.mode,
+            "workers": args.workers,
+            "duration_s": round(elapsed, 3),
+            "churn_rate": args.churn_rate,
+            "reinstall_fraction": args.reinstall_fraction,
+            "server_args": args.server_arg,
+        },
+        "throughput_rps": round(total / elapsed, 1) if elapsed else 0.0,
+        "boot_rps": round(routes.get("/boot", {}).get("count", 0) / elapsed, 1) if elapsed else 0.0,
+        "routes": routes,
+        "sqlite_lock_waits": {
+            "probes": len(waits),
+            "over_1ms": sum(1 for w in waits if w > 0.001),
+            "p99_ms": round(percentile(waits, 99) * 1000, 3) if waits else None,
+            "max_ms": round(waits[-1] * 1000, 3) if waits else None,
+        },
+        "rss_kib_max": max(rss_samples) if rss_samples else None,
+    }
+
+
+def compare(result: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Return human-readable regressions of result against baseline."""
+    problems = []
+    base_rps = baseline.get("throughput_rps") or 0
+    if base_rps and result["throughput_rps"] < base_rps * (1 - tolerance):
+        problems.append(f"throughput {result['throughput_rps']} rps < baseline {base_rps} rps")
+    for route, base in baseline.get("routes", {}).items():
+        cur = result["routes"].get(route)
+        if not cur or base.get("p99_ms") is None or cur.get("p99_ms") is None:
+            continue
+        if cur["p99_ms"] > base["p99_ms"] * (1 + tolerance):
+            problems.append(f"{route} p99 {cur['p99_ms']} ms > baseline {base['p99_ms']} ms")
+    return problems
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="PXE Pilot boot-storm benchmark")
+    parser.add_argument("--nodes", type=int, default=5000, help="synthetic fleet size")
+    parser.add_argument("--concurrency", type=int, default=50, help="simultaneous PXE clients")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds to run")
+    parser.add_argument("--mode", choices=("wsgi", "asgi"), default="wsgi", help="SERVER_MODE to benchmark")
+    parser.add_argument("--workers", type=int, default=1, help="server worker processes")
+    parser.add_argument("--churn-rate", type=float, default=5.0, help="admin reinstall toggles per second")
+    parser.add_argument("--reinstall-fraction", type=float, default=0.05, help="share of fleet flagged at start")
+    parser.add_argument("--port", type=int, default=0, help="bind port (default: any free port)")
+    parser.add_argument("--server-arg", action="append", default=[], help="extra gunicorn/uvicorn argument (repeatable)")
+    parser.add_argument("--output", help="write JSON results here")
+    parser.add_argument("--baseline", help="JSON from an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    result = run(args)
+    text = json.dumps(result, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fh:
+            fh.write(text + "\n")
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as fh:
+            problems = compare(result, json.load(fh), args.tolerance)
+        for problem in problems:
+            print(f"REGRESSION: {problem}", file=sys.stderr)
+        return 1 if problems else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
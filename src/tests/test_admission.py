@@ -0,0 +1,94 @@
+"""
+Tests for admission control on /chain and /boot: the per-MAC token bucket and
+the in-flight limit answer with the retry script (and count it), the retry
+script's format and back-off bounds, and shedding in the native ASGI handler.
+"""
+
+import json
+
+import pytest
+
+from app.admission import Admission, admission, inflight_limit, retry_attempt
+from app.routes.chain import ipxe_script_chain_with_fallback
+
+pytestmark = pytest.mark.usefixtures("fresh_registry")
+
+MAC = "aa:bb:cc:dd:ee:01"
+
+
+def test_mac_bucket_sheds_with_a_growing_retry(client, monkeypatch, metric_value):
+    monkeypatch.setattr(admission, "_mac_burst", 2.0)
+    monkeypatch.setattr(admission, "_mac_rate", 0.001)
+    for _ in range(2):
+        assert "sleep" not in client.get(f"/boot?mac={MAC}").get_data(as_text=True)
+
+    resp = client.get(f"/boot?mac={MAC}")
+    assert resp.status_code == 200
+    body = resp.get_data(as_text=True)
+    assert "\nsleep " in body
+    assert "/boot?mac=${mac}&retry=1 || goto fallback\n" in body
+    assert "&retry=3 " in client.get(f"/boot?mac={MAC}&retry=2").get_data(as_text=True)
+    # Other clients are unaffected.
+    assert "sleep" not in client.get("/boot?mac=aa:bb:cc:dd:ee:02").get_data(as_text=True)
+
+    text = client.get("/metrics").get_data(as_text=True)
+    assert metric_value(text, 'pxe_admission_shed_total{route="/boot",reason="mac_rate"}') == 2
+
+
+def test_inflight_limit_sheds_chain_and_boot(client, monkeypatch, metric_value):
+    monkeypatch.setattr(admission, "_max_inflight", 1)
+    assert admission.admit("/boot", None)  # a request in progress
+    try:
+        assert "sleep" in client.get("/chain").get_data(as_text=True)
+        assert "sleep" in client.get(f"/boot?mac={MAC}").get_data(as_text=True)
+        assert client.get("/nodes").get_json()["nodes"] == []  # shed before the database
+    finally:
+        admission.release()
+    assert "sleep" not in client.get("/chain").get_data(as_text=True)
+    assert admission.inflight == 0
+
+    text = client.get("/metrics").get_data(as_text=True)
+    assert metric_value(text, 'pxe_admission_shed_total{route="/chain",reason="inflight"}') == 1
+    assert metric_value(text, 'pxe_admission_shed_total{route="/boot",reason="inflight"}') == 1
+
+
+def test_retry_script_and_backoff():
+    assert ipxe_script_chain_with_fallback("http://pxe:8000/", 7, 2) == (
+        "#!ipxe\n"
+        "echo Boot server busy, retrying in 7s\n"
+        "sleep 7\n"
+        "chain http://pxe:8000/boot?mac=${mac}&retry=2 || goto fallback\n"
+        ":fallback\n"
+        "echo Boot server unavailable, continuing with next boot device configured in BIOS\n"
+        "exit\n"
+    )
+    limits = Admission(0, 0, 1, 2, 30)
+    for attempt, low, high in [(0, 1, 2), (2, 4, 8), (3, 8, 16), (10, 15, 30)]:
+        delays = {limits.backoff(attempt) for _ in range(200)}
+        assert low <= min(delays) and max(delays) <= high
+    assert [retry_attempt(raw) for raw in (None, "", "x", "-3", "4", "999")] == [0, 0, 0, 0, 4, 16]
+
+
+def test_wsgi_limit_leaves_a_thread_to_shed():
+    """Under gunicorn threads the limit stays below the thread count; asgi and 0 (off) are unchanged."""
+    assert inflight_limit(256, "WSGI", 32) == 31
+    assert inflight_limit(8, "WSGI", 32) == 8
+    assert inflight_limit(256, "WSGI", 1) == 1
+    assert inflight_limit(0, "WSGI", 32) == 0
+    assert inflight_limit(256, "ASGI", 32) == 256
+
+
+def test_asgi_native_sheds_before_the_database(monkeypatch, asgi_call):
+    monkeypatch.setattr(admission, "_max_inflight", 1)
+    assert admission.admit("/boot", None)
+    try:
+        status, _, body = asgi_call("GET", "/boot", f"mac={MAC}&retry=1")
+        assert status == 200 and b"&retry=2 " in body and b"sleep" in body
+        status, _, body = asgi_call("GET", "/chain")
+        assert status == 200 and b"sleep" in body
+    finally:
+        admission.release()
+    assert json.loads(asgi_call("GET", "/nodes")[2])["nodes"] == []
+    status, _, body = asgi_call("GET", "/boot", f"mac={MAC}")
+    assert status == 200 and b"sleep" not in body
+    assert admission.inflight == 0
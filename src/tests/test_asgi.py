@@ -0,0 +1,156 @@
+"""
+Tests for the ASGI serving mode (app.asgi): native /health, /chain and /boot
+handlers, the WSGI bridge to the Flask admin routes (streamed request bodies,
+the write() callable), write-through recording kept off the loop, and many
+concurrent boots on one event loop. Drives the ASGI callable directly; no server is started.
+"""
+
+import asyncio
+import json
+import threading
+
+import pytest
+from sqlalchemy import select
+
+from app.boot_journal import boot_journal
+from app.db import engine
+from app.last_seen import last_seen_buffer
+from app.models import Node
+
+
+def test_health_native(asgi_call):
+    status, headers, body = asgi_call("GET", "/health")
+    assert status == 200
+    assert headers["content-type"] == "application/json"
+    assert json.loads(body) == {"status": "OK"}
+
+
+def test_chain_native(asgi_call):
+    status, headers, body = asgi_call("GET", "/chain")
+    assert status == 200
+    assert headers["content-type"].startswith("text/plain")
+    assert b"/boot?mac=${mac}" in body
+
+
+def test_boot_invalid_mac_returns_400(asgi_call):
+    status, _, body = asgi_call("GET", "/boot", "mac=nope")
+    assert status == 400
+    assert b"mac" in body
+
+
+def test_boot_creates_node_then_serves_from_cache(asgi_call):
+    """First boot inserts the node (off-loop); the admin flag flip is visible on the next boot."""
+    status, _, body = asgi_call("GET", "/boot", "mac=aa-bb-cc-dd-ee-ff")
+    assert status == 200
+    assert body == b"#!ipxe\nexit\n"
+
+    status, _, _ = asgi_call("POST", "/nodes/aa:bb:cc:dd:ee:ff/reinstall")
+    assert status == 200
+    _, _, body = asgi_call("GET", "/boot", "mac=aa:bb:cc:dd:ee:ff")
+    assert b"uki.efi" in body
+
+
+def test_admin_routes_via_wsgi_bridge(asgi_call):
+    """Non-boot paths reach Flask with method, JSON body and headers intact."""
+    status, _, body = asgi_call(
+        "PUT",
+        "/nodes/aa:bb:cc:dd:ee:ff/local-boot-config",
+        body=json.dumps({"script": "sanboot --no-describe --drive 0"}).encode(),
+        headers={"Content-Type": "application/json"},
+    )
+    assert status == 200, body
+    status, headers, body = asgi_call("GET", "/nodes")
+    assert status == 200
+    assert headers["content-type"] == "application/json"
+    assert json.loads(body)["nodes"][0]["local_boot_script"] == "sanboot --no-describe --drive 0"
+
+
+def test_admin_auth_via_wsgi_bridge(monkeypatch, asgi_call):
+    monkeypatch.setattr("app.routes.common.ADMIN_API_KEY", "secret")
+    assert asgi_call("GET", "/nodes")[0] == 401
+    assert asgi_call("GET", "/nodes", headers={"Authorization": "Bearer secret"})[0] == 200
+
+
+def test_many_concurrent_boots_on_one_loop(monkeypatch, asgi_request, asgi_call):
+    """Hundreds of boots in flight at once all succeed and create one row per MAC."""
+    monkeypatch.setattr("app.admission.admission._max_inflight", 0)  # shedding: test_admission
+    macs = [f"02:00:00:00:{i // 256:02x}:{i % 256:02x}" for i in range(300)]
+
+    async def storm():
+        return await asyncio.gather(*(asgi_request("GET", "/boot", f"mac={mac}") for mac in macs + macs))
+
+    results = asyncio.run(storm())
+    assert all(status == 200 for status, _, _ in results)
+    _, _, body = asgi_call("GET", "/nodes")
+    assert len(json.loads(body)["nodes"]) == len(macs)
+
+
+def test_request_body_is_streamed_to_flask(monkeypatch, asgi_request):
+    """A bulk upload is applied while the client is still sending it, not after it was buffered."""
+    monkeypatch.setattr("app.routes.nodes.BULK_CHUNK", 1)
+    lines = [json.dumps({"op": "set_reinstall", "mac": f"aa:bb:cc:dd:ee:{i:02x}", "value": True}) + "\n"
+             for i in range(2)]
+    applied_before_last = []
+
+    def exists(mac):
+        with engine.connect() as conn:
+            return conn.execute(select(Node.id).where(Node.mac == mac)).first() is not None
+
+    async def receive():
+        if not applied_before_last:
+            applied_before_last.append(None)
+            return {"type": "http.request", "body": lines[0].encode(), "more_body": True}
+        if len(applied_before_last) == 1:
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + 5
+            while not await loop.run_in_executor(None, exists, "aa:bb:cc:dd:ee:00") and loop.time() < deadline:
+                await asyncio.sleep(0.01)
+            applied_before_last[0] = await loop.run_in_executor(None, exists, "aa:bb:cc:dd:ee:00")
+            applied_before_last.append(None)
+            return {"type": "http.request", "body": lines[1].encode(), "more_body": False}
+        await asyncio.Event().wait()  # no disconnect while the response streams
+
+    status, _, body = asyncio.run(asgi_request("POST", "/nodes/bulk", headers={"Content-Type": "application/x-ndjson"},
+                                               receive=receive))
+    assert status == 200, body
+    assert applied_before_last[0] is True
+    assert json.loads(body.splitlines()[-1])["summary"]["ok"] == 2
+
+
+def test_wsgi_write_callable(monkeypatch, asgi_call):
+    """Data passed to start_response's write() goes out before the returned iterable."""
+    def legacy(environ, start_response):
+        write = start_response("200 OK", [("Content-Type", "text/plain")])
+        write(b"written ")
+        return [b"returned"]
+
+    monkeypatch.setattr("app.asgi.flask_app", legacy)
+    assert asgi_call("GET", "/legacy") == (200, {"content-type": "text/plain"}, b"written returned")
+
+
+def test_write_through_recording_runs_off_the_loop(monkeypatch, asgi_call):
+    """With flush intervals of 0, last_seen and the boot journal commit on the DB pool, not the loop."""
+    asgi_call("GET", "/boot", "mac=aa:bb:cc:dd:ee:ff")  # create; the next boot is a cache hit
+    threads = []
+    for buffer in (last_seen_buffer, boot_journal):
+        monkeypatch.setattr(buffer, "_interval", 0)
+        monkeypatch.setattr(buffer, "flush", lambda: threads.append(threading.current_thread().name))
+    assert asgi_call("GET", "/boot", "mac=aa:bb:cc:dd:ee:ff")[0] == 200
+    assert len(threads) == 2 and all(name.startswith("asgi-db") for name in threads)
+
+
+@pytest.mark.parametrize("path", ["/missing", "/health/extra"])
+def test_unknown_paths_fall_through_to_flask(path, asgi_call):
+    assert asgi_call("GET", path)[0] == 404
+
+
+@pytest.mark.sqlite_only
+def test_ready_native(monkeypatch, tmp_path, asgi_call):
+    from app.config import DATABASE_PATH
+    from app.readiness import ReadinessProber
+
+    prober = ReadinessProber(3600.0, 0.2, DATABASE_PATH, str(tmp_path), (), [])
+    monkeypatch.setattr("app.asgi.readiness", prober)
+    status, headers, body = asgi_call("GET", "/ready")
+    assert status == 200
+    assert json.loads(body)["status"] == "ready"
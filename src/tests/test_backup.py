@@ -0,0 +1,143 @@
+"""
+Tests for backup, export and restore (app.backup): the online SQLite backup
+(GET /backup, restarts under concurrent writes), streaming export in NDJSON
+and CSV, gzipped or not, restoring it into an emptied database, rejected lines
+and live counters, and the command line.
+"""
+
+import gzip
+import json
+import sqlite3
+import time
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import delete
+
+from app import backup as backup_module
+from app.backup import backup_sqlite, main
+from app.boot_cache import boot_cache
+from app.db import NODES_VERSION_KEY, engine, read_counter
+from app.macs import format_mac, parse_mac
+from app.models import BootProfile, Node
+
+MACS = [f"aa:bb:cc:dd:ee:{i:02x}" for i in range(3)]
+
+
+def _fleet(client) -> list[dict]:
+    client.put("/profiles/jammy", json={"iso_url": "http://image-host/jammy.iso", "extra_cmdline": "console=ttyS0"})
+    for mac in MACS:
+        client.get(f"/boot?mac={mac}")
+    client.post(f"/nodes/{MACS[0]}/reinstall")
+    client.put(f"/nodes/{MACS[1]}/boot-profile", json={"profile": "jammy"})
+    client.put(f"/nodes/{MACS[1]}/install-group", json={"group": "rack-a"})
+    client.put(f"/nodes/{MACS[2]}/local-boot-config", json={"script": "sanboot --no-describe --drive 0x80"})
+    return client.get("/nodes").get_json()["nodes"]
+
+
+def _empty_database() -> None:
+    with engine.begin() as conn:
+        conn.execute(delete(Node))
+        conn.execute(delete(BootProfile))
+    boot_cache.clear()
+
+
+def _results(resp) -> list[dict]:
+    return [json.loads(line) for line in resp.get_data(as_text=True).splitlines()]
+
+
+@pytest.mark.sqlite_only
+def test_backup_endpoint_returns_a_copy(client, tmp_path):
+    nodes = _fleet(client)
+    resp = client.get("/backup")
+    assert resp.status_code == 200 and resp.headers["Content-Disposition"].startswith("attachment; filename=pxe-")
+    path = tmp_path / "copy.db"
+    path.write_bytes(resp.get_data())
+    with sqlite3.connect(path) as copy:
+        assert sorted(format_mac(mac) for (mac,) in copy.execute("SELECT mac FROM nodes")) == [n["mac"] for n in nodes]
+
+
+@pytest.mark.sqlite_only
+def test_backup_restarts_when_written_to(client, tmp_path, external_write, monkeypatch):
+    _fleet(client)
+    written = []
+
+    def sleep(_seconds):  # a /boot writer getting in between two steps
+        mac = f"aa:bb:cc:dd:ff:{len(written):02x}"
+        external_write("INSERT INTO nodes (mac, reinstall, created_at) VALUES (:mac, 0, '2024-01-01 00:00:00')",
+                       {"mac": parse_mac(mac)})
+        written.append(mac)
+
+    monkeypatch.setattr(backup_module, "time", SimpleNamespace(sleep=sleep, perf_counter=time.perf_counter))
+    result = backup_sqlite(str(tmp_path / "copy.db"), pages=1, pause=0.01)
+    assert result["restarts"] == 3  # then finished in a single step
+    with sqlite3.connect(tmp_path / "copy.db") as copy:
+        macs = {format_mac(mac) for (mac,) in copy.execute("SELECT mac FROM nodes")}
+    assert set(written) <= macs and set(MACS) <= macs
+    assert not (tmp_path / "copy.db.partial").exists()
+
+
+def test_export_and_restore_round_trip(client):
+    nodes = _fleet(client)
+    resp = client.get("/export")
+    assert resp.mimetype == "application/gzip"
+    body = gzip.decompress(resp.get_data())
+    records = [json.loads(line) for line in body.splitlines()]
+    tables = [record["table"] for record in records]
+    assert tables == sorted(tables, key=["app_config", "boot_profiles", "nodes"].index)
+    assert [r["mac"] for r in records if r["table"] == "nodes"] == MACS
+
+    _empty_database()
+    version = read_counter(engine.connect(), NODES_VERSION_KEY)
+    results = _results(client.post("/restore", data=gzip.compress(body)))
+    summary = results[-1]["summary"]
+    assert summary["nodes"] == 3 and summary["boot_profiles"] == 1 and summary["failed"] == 0
+    assert summary["skipped"] >= 1  # nodes_version and boot_generation stay the live ones
+    assert client.get("/nodes").get_json()["nodes"] == nodes
+    assert read_counter(engine.connect(), NODES_VERSION_KEY) > version
+    assert client.get("/profiles/jammy").get_json()["extra_cmdline"] == "console=ttyS0"
+    assert "imgfree" in client.get(f"/boot?mac={MACS[0]}").get_data(as_text=True)
+
+
+def test_csv_round_trip(client):
+    nodes = _fleet(client)
+    resp = client.get("/export?format=csv&compress=none")
+    assert resp.mimetype == "text/csv"
+    text = resp.get_data(as_text=True)
+    assert text.startswith("table,key,value,name,")
+    assert f"nodes,,,,,,,,,{MACS[0]},true," in text
+
+    _empty_database()
+    results = _results(client.post("/restore", data=text, content_type="text/csv"))
+    assert results[-1]["summary"]["nodes"] == 3 and results[-1]["summary"]["failed"] == 0
+    assert client.get("/nodes").get_json()["nodes"] == nodes
+
+
+def test_restore_reports_bad_lines(client):
+    client.get(f"/boot?mac={MACS[0]}")
+    version = read_counter(engine.connect(), NODES_VERSION_KEY)
+    lines = [
+        "not json",
+        json.dumps({"table": "events"}),
+        json.dumps({"table": "nodes", "mac": "nope"}),
+        json.dumps({"table": "nodes", "mac": MACS[1], "boot_profile": "missing"}),
+        json.dumps({"table": "nodes", "mac": MACS[1], "last_seen": "2024-05-01T00:00:00"}),
+        json.dumps({"table": "app_config", "key": NODES_VERSION_KEY, "value": "1"}),
+        json.dumps({"table": "nodes", "mac": MACS[2], "reinstall": True}),
+    ]
+    results = _results(client.post("/restore", data="\n".join(lines)))
+    assert [r["line"] for r in results[:-1]] == [1, 2, 3, 4, 5]
+    assert results[-1]["summary"] == {"app_config": 0, "boot_profiles": 0, "nodes": 1, "skipped": 1, "failed": 5}
+    assert read_counter(engine.connect(), NODES_VERSION_KEY) == version + 1
+    assert client.get(f"/nodes?mac={MACS[2]}").get_json()["nodes"][0]["reinstall"] is True
+
+
+def test_command_line(client, tmp_path, capsys):
+    nodes = _fleet(client)
+    path = str(tmp_path / "export.csv.gz")
+    assert main(["export", path]) == 0
+    assert gzip.open(path, "rt").readline().startswith("table,")
+    _empty_database()
+    assert main(["restore", path]) == 0
+    assert json.loads(capsys.readouterr().out.splitlines()[-1])["summary"]["nodes"] == 3
+    assert client.get("/nodes").get_json()["nodes"] == nodes
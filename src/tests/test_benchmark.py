@@ -0,0 +1,58 @@
+"""
+Smoke test for the boot-storm benchmark (benchmarks/boot_storm.py): a tiny run
+against a real gunicorn produces a complete JSON report, and the baseline
+comparison flags regressions. Runs in a subprocess so the benchmark's own
+database never touches the test DB.
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from benchmarks.boot_storm import compare, percentile
+
+
+def test_percentile_nearest_rank():
+    """Nearest-rank percentiles on a small sorted list."""
+    values = [float(v) for v in range(1, 101)]
+    assert percentile(values, 50) == 50.0
+    assert percentile(values, 99) == 99.0
+    assert percentile([], 99) is None
+
+
+def test_compare_flags_regressions():
+    """Throughput drops and p99 growth beyond tolerance are reported."""
+    baseline = {"throughput_rps": 1000, "routes": {"/boot": {"p99_ms": 10.0}}}
+    ok = {"throughput_rps": 950, "routes": {"/boot": {"p99_ms": 11.0}}}
+    bad = {"throughput_rps": 500, "routes": {"/boot": {"p99_ms": 30.0}}}
+    assert compare(ok, baseline, 0.2) == []
+    assert len(compare(bad, baseline, 0.2)) == 2
+
+
+@pytest.mark.sqlite_only
+def test_small_run_writes_report(tmp_path):
+    """A one-second run with a 20-node fleet serves boots without errors."""
+    src_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+    env = os.environ.copy()
+    env.pop("DATABASE_PATH", None)
+    env["PYTHONPATH"] = src_dir
+    out = tmp_path / "bench.json"
+    result = subprocess.run(
+        [sys.executable, "-m", "benchmarks.boot_storm", "--nodes", "20", "--concurrency", "2",
+         "--duration", "1", "--churn-rate", "2", "--output", str(out)],
+        cwd=src_dir,
+        env=env,
+        capture_output=True,
+        text=True,
+        timeout=120,
+    )
+    assert result.returncode == 0, result.stderr
+    report = json.loads(out.read_text())
+    assert report["meta"]["nodes"] == 20
+    assert report["routes"]["/boot"]["count"] > 0
+    assert report["routes"]["/boot"]["errors"] == 0
+    assert report["routes"]["/chain"]["p99_ms"] is not None
+    assert report["sqlite_lock_waits"]["probes"] > 0
@@ -0,0 +1,72 @@
+"""
+Tests for the /boot decision cache: hits skip the nodes table, local writes
+invalidate immediately, and writes from another connection (standing in for
+another worker or container) are picked up through the generation counter.
+"""
+
+import pytest
+
+from app.boot_cache import boot_cache
+from app.macs import parse_mac
+
+
+@pytest.fixture
+def poll_every_request(monkeypatch):
+    """Poll for other processes' writes on every lookup so tests need not sleep."""
+    monkeypatch.setattr(boot_cache, "_poll_seconds", 0.0)
+
+
+def test_boot_populates_cache(client):
+    """First /boot for a MAC stores its decision in the cache."""
+    mac = "aa:bb:cc:dd:ee:ff"
+    assert boot_cache.get(mac) is None
+    client.get("/boot", query_string={"mac": mac})
+    assert boot_cache.get(mac) == (False, None, None)
+
+
+def test_cache_hit_does_not_read_nodes_table(client, poll_every_request, external_write):
+    """An unannounced change to the row is not seen while the generation is unchanged."""
+    mac = "aa:bb:cc:dd:ee:ff"
+    client.get("/boot", query_string={"mac": mac})
+    external_write("UPDATE nodes SET reinstall = :on WHERE mac = :mac", {"on": True, "mac": parse_mac(mac)}, bump=False)
+    body = client.get("/boot", query_string={"mac": mac}).get_data(as_text=True)
+    assert "uki.efi" not in body
+
+
+def test_external_write_with_generation_bump_is_seen(client, poll_every_request, external_write):
+    """Another process flipping reinstall and bumping the generation invalidates the cache."""
+    mac = "aa:bb:cc:dd:ee:ff"
+    client.get("/boot", query_string={"mac": mac})
+    external_write("UPDATE nodes SET reinstall = :on WHERE mac = :mac", {"on": True, "mac": parse_mac(mac)})
+    body = client.get("/boot", query_string={"mac": mac}).get_data(as_text=True)
+    assert "uki.efi" in body
+
+
+def test_local_write_invalidates_immediately(client, monkeypatch):
+    """Admin writes in this process are visible on the next /boot even with a long poll interval."""
+    monkeypatch.setattr(boot_cache, "_poll_seconds", 3600.0)
+    mac = "aa:bb:cc:dd:ee:ff"
+    client.get("/boot", query_string={"mac": mac})
+    client.post(f"/nodes/{mac}/reinstall")
+    assert "uki.efi" in client.get("/boot", query_string={"mac": mac}).get_data(as_text=True)
+    client.put(f"/nodes/{mac}/local-boot-config", json={"script": "sanboot --no-describe --drive 0"})
+    client.delete(f"/nodes/{mac}/reinstall")
+    assert "sanboot" in client.get("/boot", query_string={"mac": mac}).get_data(as_text=True)
+
+
+def test_warm_loads_existing_nodes(client):
+    """warm() preloads every node so the first boot after startup is a hit."""
+    mac = "11:22:33:44:55:66"
+    client.post(f"/nodes/{mac}/reinstall")
+    boot_cache.clear()
+    boot_cache.warm()
+    assert boot_cache.get(mac) == (True, None, None)
+
+
+def test_put_after_invalidation_is_dropped():
+    """A decision read before an invalidation is not cached (stale-read race)."""
+    mac = "aa:bb:cc:dd:ee:ff"
+    epoch = boot_cache.epoch
+    boot_cache.invalidate(mac)
+    boot_cache.put(mac, (True, None, None), epoch)
+    assert boot_cache.get(mac) is None
@@ -0,0 +1,133 @@
+"""
+Tests for the boot event journal: batched writes of raw events and rollups,
+history endpoints reading the rollups, chunked retention, retry on failure.
+"""
+
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import func, select
+
+from app import boot_journal as journal_module
+from app.boot_journal import BootJournal, boot_journal
+from app.db import engine
+from app.models import BootEvent, BootRollup
+
+MAC = "aa:bb:cc:dd:ee:ff"
+
+
+def _count(model, *where) -> int:
+    with engine.connect() as conn:
+        return conn.execute(select(func.count()).select_from(model).where(*where)).scalar()
+
+
+def test_boots_are_buffered_then_written_with_rollups(client):
+    client.get("/boot", query_string={"mac": MAC}, headers={"X-Forwarded-For": "10.0.0.7"})
+    client.get("/boot", query_string={"mac": MAC})
+    client.post(f"/nodes/{MAC}/reinstall")
+    client.get("/boot", query_string={"mac": MAC})
+    assert boot_journal.pending() == 3
+    assert _count(BootEvent) == 0
+
+    assert boot_journal.flush() == 3
+    with engine.connect() as conn:
+        events = conn.execute(select(BootEvent.kind, BootEvent.client_ip).order_by(BootEvent.id)).all()
+        rollups = conn.execute(select(BootRollup.period, BootRollup.kind, BootRollup.count)).all()
+    assert [tuple(e) for e in events] == [
+        ("local_disk", "10.0.0.7"), ("local_disk", "127.0.0.1"), ("reinstall", "127.0.0.1")
+    ]
+    assert sorted(rollups) == [("day", "local_disk", 2), ("day", "reinstall", 1),
+                               ("hour", "local_disk", 2), ("hour", "reinstall", 1)]
+
+
+def test_batch_writes_one_rollup_row_per_bucket():
+    for i in range(500):
+        boot_journal.record(f"02:00:00:00:00:0{i % 5}", "10.0.0.1", "local_disk")
+    assert boot_journal.flush() == 500
+    assert _count(BootEvent) == 500
+    assert _count(BootRollup) <= 5 * 2 * 2  # macs x periods x (at most two buckets across a boundary)
+    with engine.connect() as conn:
+        total = conn.execute(select(func.sum(BootRollup.count)).where(BootRollup.period == "day")).scalar()
+    assert total == 500
+
+
+def test_node_history(client):
+    for _ in range(3):
+        client.get("/boot", query_string={"mac": MAC})
+    client.get("/boot", query_string={"mac": "11:22:33:44:55:66"})
+    boot_journal.flush()
+    r = client.get(f"/nodes/{MAC.replace(':', '-')}/boots", query_string={"period": "hour"})
+    assert r.status_code == 200
+    body = r.get_json()
+    assert body["mac"] == MAC
+    assert body["period"] == "hour"
+    assert body["totals"] == {"reinstall": 0, "local_disk": 3, "total": 3}
+    assert len(body["buckets"]) == 1
+    assert body["buckets"][0]["total"] == 3
+
+
+def test_fleet_history_counts_distinct_nodes(client):
+    for mac in (MAC, MAC, "11:22:33:44:55:66"):
+        client.get("/boot", query_string={"mac": mac})
+    boot_journal.flush()
+    body = client.get("/boots").get_json()
+    assert body["period"] == "day"
+    assert body["totals"]["total"] == 3
+    assert body["buckets"][-1]["nodes"] == 2
+
+
+def test_history_does_not_flush(client):
+    """History is a read: buffered boots wait for the flusher."""
+    client.get("/boot", query_string={"mac": MAC})
+    assert client.get("/boots").get_json()["buckets"] == []
+    assert client.get(f"/nodes/{MAC}/boots").get_json()["buckets"] == []
+    assert boot_journal.pending() == 1
+
+
+def test_history_range_and_validation(client):
+    client.get("/boot", query_string={"mac": MAC})
+    past = {"since": "2020-01-01T00:00:00Z", "until": "2020-01-02T00:00:00Z"}
+    assert client.get("/boots", query_string=past).get_json()["buckets"] == []
+    assert client.get("/boots", query_string={"period": "week"}).status_code == 400
+    assert client.get("/boots", query_string={"since": "2020-01-01"}).status_code == 400
+    assert client.get("/boots", query_string={"period": "hour", **past, "until": "2021-01-01T00:00:00Z"}).status_code == 400
+    assert client.get("/nodes/nope/boots").status_code == 400
+
+
+def test_history_requires_admin_auth(client, monkeypatch):
+    monkeypatch.setattr("app.routes.common.ADMIN_API_KEY", "secret")
+    assert client.get("/boots").status_code == 401
+    assert client.get(f"/nodes/{MAC}/boots").status_code == 401
+
+
+def test_prune_deletes_in_chunks(monkeypatch):
+    monkeypatch.setattr(journal_module, "PRUNE_CHUNK", 3)
+    monkeypatch.setattr(journal_module, "_PRUNE_PAUSE", 0)
+    now = datetime.now(timezone.utc)
+    old, recent = now - timedelta(days=40), now - timedelta(days=1)
+    with engine.begin() as conn:
+        conn.execute(journal_module._INSERT_EVENTS, [
+            {"mac": MAC, "client_ip": None, "kind": "local_disk", "booted_at": when}
+            for when in [old] * 10 + [recent] * 2
+        ])
+        conn.execute(journal_module._UPSERT_ROLLUP, [
+            {"b_period": period, "b_bucket": when, "b_mac": MAC, "b_kind": "local_disk", "b_count": 1}
+            for period in ("hour", "day") for when in (now - timedelta(days=100), recent)
+        ])
+    journal = BootJournal(3600, 100, events_days=30, hourly_days=90)
+    assert journal.prune(now) == 11
+    assert _count(BootEvent) == 2
+    assert _count(BootRollup, BootRollup.period == "hour") == 1
+    assert _count(BootRollup, BootRollup.period == "day") == 2
+
+
+def test_failed_flush_keeps_events_for_retry():
+    journal = BootJournal(3600, 100, 0, 0)
+    journal.record(MAC, None, "local_disk")
+    BootEvent.__table__.drop(engine)
+    try:
+        assert journal.flush() == 0
+        assert journal.pending() == 1
+    finally:
+        BootEvent.__table__.create(engine)
+    assert journal.flush() == 1
+    assert _count(BootEvent) == 1
@@ -0,0 +1,99 @@
+"""
+Tests for POST /nodes/bulk: NDJSON and CSV bodies, per-line results, chunked
+transactions, cache invalidation, and a whole-fleet change in one request.
+"""
+
+import json
+import time
+
+from app.boot_cache import boot_cache
+from app.routes import nodes as nodes_routes
+
+MAC = "aa:bb:cc:dd:ee:ff"
+
+
+def _ndjson(*ops) -> str:
+    return "".join(json.dumps(op) + "\n" for op in ops)
+
+
+def _results(response) -> list[dict]:
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+def _node(client, mac):
+    return next(n for n in client.get("/nodes").get_json()["nodes"] if n["mac"] == mac)
+
+
+def test_bulk_ndjson_applies_operations_in_order(client):
+    client.put("/profiles/jammy", json={"iso_url": "http://mirror/jammy.iso"})
+    body = _ndjson(
+        {"op": "set_reinstall", "mac": MAC},
+        {"op": "set_local_boot", "mac": MAC, "script": "sanboot --no-describe --drive 0"},
+        {"op": "set_boot_profile", "mac": MAC, "profile": "jammy"},
+        {"op": "set_reinstall", "mac": "11:22:33:44:55:66"},
+        {"op": "delete", "mac": "11:22:33:44:55:66"},
+    )
+    r = client.post("/nodes/bulk", data=body, content_type="application/x-ndjson")
+    assert r.status_code == 200
+    assert r.mimetype == "application/x-ndjson"
+    results = _results(r)
+    assert [entry["ok"] for entry in results[:-1]] == [True] * 5
+    assert results[-1] == {"summary": {"ok": 5, "failed": 0}}
+    node = _node(client, MAC)
+    assert node["reinstall"] is True
+    assert node["local_boot_script"] == "sanboot --no-describe --drive 0"
+    assert node["boot_profile"] == "jammy"
+    assert [n["mac"] for n in client.get("/nodes").get_json()["nodes"]] == [MAC]
+
+
+def test_bulk_reports_invalid_lines_and_applies_the_rest(client):
+    body = "\n".join([
+        json.dumps({"op": "set_reinstall", "mac": "nope"}),
+        "not json",
+        json.dumps({"op": "set_local_boot", "mac": MAC, "script": "shell"}),
+        json.dumps({"op": "explode", "mac": MAC}),
+        json.dumps({"op": "set_boot_profile", "mac": MAC, "profile": "missing"}),
+        "",
+        json.dumps({"op": "set_reinstall", "mac": MAC}),
+    ])
+    results = _results(client.post("/nodes/bulk", data=body))
+    assert [(entry["line"], entry["ok"]) for entry in results[:-1]] == [
+        (1, False), (2, False), (3, False), (4, False), (5, False), (7, True)
+    ]
+    assert all("error" in entry for entry in results[:5])
+    assert results[-1]["summary"] == {"ok": 1, "failed": 5}
+    assert _node(client, MAC)["reinstall"] is True
+
+
+def test_bulk_csv_with_header(client):
+    body = "op,mac,value\nset_reinstall,aa-bb-cc-dd-ee-ff\nset_local_boot,aa:bb:cc:dd:ee:ff,exit\n"
+    results = _results(client.post("/nodes/bulk", data=body, content_type="text/csv"))
+    assert [entry["line"] for entry in results[:-1]] == [2, 3]
+    assert results[-1]["summary"] == {"ok": 2, "failed": 0}
+    assert _node(client, MAC)["local_boot_script"] == "exit"
+
+
+def test_bulk_invalidates_boot_cache(client, monkeypatch):
+    monkeypatch.setattr(boot_cache, "_poll_seconds", 3600.0)
+    client.get("/boot", query_string={"mac": MAC})
+    client.post("/nodes/bulk", data=_ndjson({"op": "set_reinstall", "mac": MAC}))
+    assert "uki.efi" in client.get("/boot", query_string={"mac": MAC}).get_data(as_text=True)
+
+
+def test_bulk_whole_fleet_in_chunks(client, monkeypatch):
+    """A 5000-node change spans several chunks and completes quickly in one request."""
+    monkeypatch.setattr(nodes_routes, "BULK_CHUNK", 1000)
+    macs = [f"02:00:00:00:{i // 256:02x}:{i % 256:02x}" for i in range(5000)]
+    body = _ndjson(*({"op": "set_reinstall", "mac": mac} for mac in macs))
+    started = time.perf_counter()
+    r = client.post("/nodes/bulk", data=body)
+    results = _results(r)
+    elapsed = time.perf_counter() - started
+    assert results[-1]["summary"] == {"ok": 5000, "failed": 0}
+    assert elapsed < 5.0
+    assert len(client.get("/nodes?reinstall=true").get_json()["nodes"]) == 5000
+
+
+def test_bulk_requires_admin_auth(client, monkeypatch):
+    monkeypatch.setattr("app.routes.common.ADMIN_API_KEY", "secret")
+    assert client.post("/nodes/bulk", data=_ndjson({"op": "set_reinstall", "mac": MAC})).status_code == 401
@@ -0,0 +1,194 @@
+"""
+Tests for the node change feed: every node write path emits an entry, long
+polls wake on a write, SSE frames with resumable ids, resuming from the
+table once the in-memory backlog has moved on, resets for pruned or unknown
+ids, auth, and the native ASGI handler.
+"""
+
+import asyncio
+import json
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from app.change_feed import ChangeFeed, change_feed
+from app.last_seen import last_seen_buffer
+from app.routes.nodes import _SET_REINSTALL, _write_node
+from tests.test_seed import _write_seed
+
+MAC = "aa:bb:cc:dd:ee:01"
+
+
+def _poll(client, after, timeout=0):
+    resp = client.get(f"/nodes/changes?after={after}&timeout={timeout}")
+    assert resp.status_code == 200
+    return resp.get_json()
+
+
+def test_without_after_returns_the_current_id(client):
+    client.post(f"/nodes/{MAC}/reinstall")
+    body = client.get("/nodes/changes").get_json()
+    assert body["changes"] == [] and body["reset"] is False
+    assert body["last_id"] >= 1
+
+
+def test_every_write_path_emits_a_change(client, monkeypatch):
+    start = client.get("/nodes/changes").get_json()["last_id"]
+    client.get(f"/boot?mac={MAC}")
+    client.get(f"/boot?mac={MAC}")  # cache hit: last_seen goes through the buffer
+    last_seen_buffer.flush()
+    client.post(f"/nodes/{MAC}/reinstall")
+    client.put(f"/nodes/{MAC}/local-boot-config", json={"script": "exit"})
+    client.put("/profiles/jammy", json={"iso_url": "http://mirror/jammy.iso"})
+    client.put(f"/nodes/{MAC}/boot-profile", json={"profile": "jammy"})
+    client.delete("/profiles/jammy")
+    client.post("/nodes/bulk", data=json.dumps({"op": "delete", "mac": MAC}) + "\n")
+    monkeypatch.setattr("app.seed.SEED_FILE", _write_seed("nodes:\n  - mac: 'aa:bb:cc:dd:ee:02'\n"))
+    from app.seed import seed_db
+
+    seed_db()
+
+    body = _poll(client, start)
+    changes = body["changes"]
+    assert [(c["type"], c["mac"]) for c in changes] == [
+        ("created", MAC),
+        ("seen", MAC),
+        ("updated", MAC),
+        ("updated", MAC),
+        ("updated", MAC),
+        ("updated", MAC),
+        ("deleted", MAC),
+        ("created", "aa:bb:cc:dd:ee:02"),
+    ]
+    assert changes[0]["fields"]["reinstall"] is False
+    assert [c["fields"] for c in changes[2:6]] == [
+        {"reinstall": True},
+        {"local_boot_script": "exit"},
+        {"boot_profile": "jammy"},
+        {"boot_profile": None},
+    ]
+    assert changes[-1]["fields"]["source"] == "seed"
+    ids = [c["id"] for c in changes]
+    assert ids == sorted(ids) and body["last_id"] == ids[-1]
+
+
+def test_flush_skips_rows_it_did_not_update(client):
+    """A buffered boot of a node deleted meanwhile, or an older timestamp, is neither a change nor a new version."""
+    client.get(f"/boot?mac={MAC}")
+    client.get(f"/boot?mac={MAC}")  # buffered
+    client.post("/nodes/bulk", data=json.dumps({"op": "delete", "mac": MAC}) + "\n")
+    start = client.get("/nodes/changes").get_json()["last_id"]
+    etag = client.get("/nodes").headers["ETag"]
+    assert last_seen_buffer.flush() == 0
+    client.get(f"/boot?mac={MAC}")  # created again, last_seen now
+    last_seen_buffer.record(MAC, datetime.now(timezone.utc) - timedelta(hours=1))
+    assert last_seen_buffer.flush() == 0
+    assert [c["type"] for c in _poll(client, start)["changes"]] == ["created"]
+    assert client.get("/nodes").headers["ETag"] != etag  # the create, not the flushes
+
+    client.get(f"/boot?mac={MAC}")
+    etag = client.get("/nodes").headers["ETag"]
+    last_seen_buffer.discard()
+    last_seen_buffer.record(MAC, datetime.now(timezone.utc) - timedelta(hours=1))
+    last_seen_buffer.flush()
+    assert client.get("/nodes").headers["ETag"] == etag
+
+
+def test_long_poll_wakes_on_a_write(client, monkeypatch):
+    monkeypatch.setattr(change_feed, "_interval", 0.05)
+    start = client.get("/nodes/changes").get_json()["last_id"]
+    # Another thread stands in for another worker: the app's write path, no request context.
+    writer = threading.Timer(0.2, _write_node, (_SET_REINSTALL, {"b_mac": MAC, "b_value": True}))
+    started = time.monotonic()
+    writer.start()
+    body = _poll(client, start, timeout=10)
+    writer.join()
+    assert time.monotonic() - started < 5
+    assert [c["type"] for c in body["changes"]] == ["updated"]
+
+
+def test_sse_stream_resumes_from_last_event_id(client, monkeypatch):
+    monkeypatch.setattr("app.routes.changes.CHANGE_FEED_MAX_SECONDS", 0.3)
+    client.post(f"/nodes/{MAC}/reinstall")
+    first = client.get("/nodes/changes").get_json()["last_id"]
+    client.delete(f"/nodes/{MAC}/reinstall")
+
+    resp = client.get("/nodes/changes", headers={"Accept": "text/event-stream", "Last-Event-ID": str(first)})
+    assert resp.status_code == 200
+    assert resp.mimetype == "text/event-stream"
+    frames = resp.get_data(as_text=True).split("\n\n")
+    assert frames[0] == "retry: 1000"
+    event = frames[1].splitlines()
+    assert event[:2] == [f"id: {first + 1}", "event: updated"]
+    assert json.loads(event[2][len("data: "):])["fields"] == {"reinstall": False}
+
+
+def test_backlog_beyond_the_ring_is_read_from_the_table(client):
+    feed = ChangeFeed(3600.0, 2, 0)
+    feed.subscribe()
+    try:
+        for i in range(5):
+            client.post(f"/nodes/aa:bb:cc:dd:ee:{i:02x}/reinstall")
+        assert feed.poll() == 5
+        assert feed.since(0) is None
+        assert [c.id for c in feed.since(3)] == [4, 5]
+        assert [c.id for c in feed.catch_up(0)] == [1, 2, 3, 4, 5]
+    finally:
+        feed.unsubscribe()
+
+
+def test_pruned_or_unknown_ids_reset(client):
+    client.post(f"/nodes/{MAC}/reinstall")
+    client.delete(f"/nodes/{MAC}/reinstall")
+    assert change_feed.prune() == 0  # within the 24 h retention
+    assert ChangeFeed(3600.0, 10, 1).prune(datetime.now(timezone.utc) + timedelta(hours=2)) == 2
+    client.post(f"/nodes/{MAC}/reinstall")
+
+    body = _poll(client, 1)
+    assert body["reset"] is True and body["changes"] == []
+    assert body["last_id"] == 3
+    assert _poll(client, 99)["reset"] is True
+    assert _poll(client, 3)["reset"] is False
+
+
+def test_bad_after_and_auth(client, monkeypatch):
+    assert client.get("/nodes/changes?after=abc").status_code == 400
+    assert client.get("/nodes/changes?after=0&timeout=3600").status_code == 400
+    monkeypatch.setattr("app.routes.common.ADMIN_API_KEY", "secret")
+    assert client.get("/nodes/changes").status_code == 401
+    assert client.get("/nodes/changes", headers={"Authorization": "Bearer secret"}).status_code == 200
+
+
+def test_asgi_native_long_poll_and_stream(client, monkeypatch, asgi_call):
+    client.post(f"/nodes/{MAC}/reinstall")
+    status, _, body = asgi_call("GET", "/nodes/changes", query="after=0&timeout=0")
+    assert status == 200
+    assert [c["type"] for c in json.loads(body)["changes"]] == ["updated"]
+
+    async def stream():
+        scope = {
+            "type": "http", "method": "GET", "path": "/nodes/changes", "query_string": b"after=0",
+            "headers": [(b"accept", b"text/event-stream")],
+        }
+        sent = []
+        disconnect = asyncio.Event()
+
+        async def receive():
+            await disconnect.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            sent.append(message)
+            if b"event: updated" in message.get("body", b""):
+                disconnect.set()
+
+        from app.asgi import app as asgi_app
+
+        await asyncio.wait_for(asgi_app(scope, receive, send), 5)
+        return sent
+
+    sent = asyncio.run(stream())
+    assert sent[0]["status"] == 200
+    assert (b"content-type", b"text/event-stream") in sent[0]["headers"]
+    assert sent[1]["body"] == b"retry: 1000\n\n"
+    assert sent[2]["body"].startswith(b"id: 1\nevent: updated\n")
@@ -59,3 +59,10 @@ def test_fails_when_required_var_missing_emits_fatal_message():
     code, stderr = _run_config_import({"PXE_UBUNTU_KERNEL_URL": ""})
     assert code == 1
     assert "Fatal" in stderr or "required" in stderr.lower()
+
+
+def test_fails_when_DATABASE_URL_is_not_postgresql():
+    """A DATABASE_URL for another backend is rejected rather than silently ignored."""
+    code, stderr = _run_config_import({"DATABASE_URL": "mysql://pxe@db/pxe"})
+    assert code == 1
+    assert "DATABASE_URL" in stderr
@@ -0,0 +1,114 @@
+"""
+Tests for /files/<name>: full downloads, conditional requests, byte ranges
+(with If-Range), HEAD, traversal, the native ASGI handler and the
+PXE_UKI_HTTP default for the reinstall script.
+"""
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+
+PAYLOAD = bytes(range(256)) * 1024  # 256 KiB: several CHUNK_SIZE reads with the fixture below
+
+
+@pytest.fixture
+def tftp_root(tmp_path, monkeypatch):
+    (tmp_path / "uki.efi").write_bytes(PAYLOAD)
+    monkeypatch.setattr("app.files.TFTP_ROOT", str(tmp_path))
+    monkeypatch.setattr("app.files.CHUNK_SIZE", 64 * 1024)
+    return tmp_path
+
+
+def test_full_download_with_validators(client, tftp_root):
+    resp = client.get("/files/uki.efi")
+    assert resp.status_code == 200
+    assert resp.data == PAYLOAD
+    assert resp.headers["Content-Length"] == str(len(PAYLOAD))
+    assert resp.headers["Accept-Ranges"] == "bytes"
+    assert resp.headers["Content-Type"] == "application/octet-stream"
+    etag = resp.headers["ETag"]
+    assert etag.startswith('"') and resp.headers["Last-Modified"]
+
+    assert client.get("/files/uki.efi", headers={"If-None-Match": etag}).status_code == 304
+    last_modified = resp.headers["Last-Modified"]
+    assert client.get("/files/uki.efi", headers={"If-Modified-Since": last_modified}).status_code == 304
+
+
+def test_head_has_length_but_no_body(client, tftp_root):
+    resp = client.head("/files/uki.efi")
+    assert resp.status_code == 200
+    assert resp.headers["Content-Length"] == str(len(PAYLOAD))
+    assert resp.data == b""
+
+
+def test_ranges(client, tftp_root):
+    resp = client.get("/files/uki.efi", headers={"Range": "bytes=100-199"})
+    assert resp.status_code == 206
+    assert resp.data == PAYLOAD[100:200]
+    assert resp.headers["Content-Range"] == f"bytes 100-199/{len(PAYLOAD)}"
+    assert resp.headers["Content-Length"] == "100"
+
+    resp = client.get("/files/uki.efi", headers={"Range": "bytes=-10"})
+    assert resp.status_code == 206 and resp.data == PAYLOAD[-10:]
+
+    resp = client.get("/files/uki.efi", headers={"Range": f"bytes={len(PAYLOAD)}-"})
+    assert resp.status_code == 416
+    assert resp.headers["Content-Range"] == f"bytes */{len(PAYLOAD)}"
+
+    # Multiple ranges: the whole file instead of multipart/byteranges.
+    resp = client.get("/files/uki.efi", headers={"Range": "bytes=0-1,5-6"})
+    assert resp.status_code == 200 and resp.data == PAYLOAD
+
+
+def test_if_range(client, tftp_root):
+    etag = client.head("/files/uki.efi").headers["ETag"]
+    resp = client.get("/files/uki.efi", headers={"Range": "bytes=0-9", "If-Range": etag})
+    assert resp.status_code == 206 and resp.data == PAYLOAD[:10]
+
+    (tftp_root / "uki.efi").write_bytes(b"replaced")
+    resp = client.get("/files/uki.efi", headers={"Range": "bytes=0-9", "If-Range": etag})
+    assert resp.status_code == 200 and resp.data == b"replaced"
+
+
+def test_missing_and_traversal(client, tftp_root):
+    (tftp_root.parent / "secret").write_bytes(b"no")
+    (tftp_root / "sub").mkdir()
+    assert client.get("/files/nope.efi").status_code == 404
+    assert client.get("/files/../secret").status_code == 404
+    assert client.get("/files/sub").status_code == 404
+
+
+def test_asgi_native_files(tftp_root, asgi_call):
+    status, headers, body = asgi_call("GET", "/files/uki.efi", headers={"Range": "bytes=70000-"})
+    assert status == 206
+    assert body == PAYLOAD[70000:]
+    assert headers["content-length"] == str(len(PAYLOAD) - 70000)
+
+    status, headers, body = asgi_call("HEAD", "/files/uki.efi")
+    assert status == 200 and body == b"" and headers["content-length"] == str(len(PAYLOAD))
+
+    status, _, _ = asgi_call("GET", "/files/nope.efi")
+    assert status == 404
+
+
+def _uki_url(env_override) -> str:
+    """PXE_UKI_URL as config computes it in a fresh interpreter with the given env."""
+    env = os.environ.copy()
+    env.update(env_override)
+    src_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+    env.setdefault("PYTHONPATH", src_dir)
+    result = subprocess.run(
+        [sys.executable, "-c", "from app.config import PXE_UKI_URL; print(PXE_UKI_URL)"],
+        env=env, capture_output=True, text=True, cwd=src_dir, check=True,
+    )
+    return result.stdout.strip()
+
+
+def test_uki_http_default():
+    base = {"PXE_BASE_URL": "http://pxe-pilot:8000/", "PXE_UKI_URL": ""}
+    assert _uki_url(base) == "tftp://${next-server}/uki.efi"
+    assert _uki_url({**base, "PXE_UKI_HTTP": "1"}) == "http://pxe-pilot:8000/files/uki.efi"
+    assert _uki_url({**base, "PXE_UKI_HTTP": "1", "PXE_UKI_URL": "http://mirror/uki.efi"}) == "http://mirror/uki.efi"
@@ -4,6 +4,7 @@ Unit tests for route helpers: MAC normalization and URL templating (${mac}, ${ip
 
 import pytest
 
+from app.macs import format_mac, parse_mac
 from app.routes.boot import resolve_url_template
 from app.routes.common import normalize_mac
 
@@ -32,6 +33,17 @@ def test_normalize_mac_invalid_returns_none():
     assert normalize_mac(None) is None
 
 
+def test_parse_and_format_mac():
+    """MACs parse to their 48-bit value, whatever the separators, and format back canonically."""
+    value = 0xAABBCCDDEEFF
+    for raw in ("aa:bb:cc:dd:ee:ff", "AA-BB-CC-DD-EE-FF", "aabbccddeeff", " aa:bb:cc:dd:ee:ff\n", "aa:bbcc-dd:ee-ff"):
+        assert parse_mac(raw) == value
+    for raw in ("aa:bb:cc:dd:ee:f:", "aa::bb:cc:dd:eeff", "0xaabbccddee", "aa_bbccddeeff", "aa:bb:cc:dd:ee:fff"):
+        assert parse_mac(raw) is None, raw
+    assert format_mac(value) == "aa:bb:cc:dd:ee:ff"
+    assert format_mac(1) == "00:00:00:00:00:01"
+
+
 def test_resolve_url_template_replaces_mac_and_ip():
     """Template placeholders ${mac} and ${ip} are replaced and URL-encoded."""
     url = "http://pxe-pilot/?mac=${mac}&ip=${ip}"
@@ -0,0 +1,97 @@
+"""
+Tests for the last_seen write-behind buffer: coalescing per MAC, batched
+flush, GET /nodes leaving the buffer alone, size-triggered flush, retry after failure.
+"""
+
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import text
+
+from app.db import SessionLocal, engine
+from app.last_seen import LastSeenBuffer, last_seen_buffer
+from app.models import Node
+
+
+def _stored_last_seen(mac: str):
+    db = SessionLocal()
+    try:
+        return db.query(Node.last_seen).filter(Node.mac == mac).scalar()
+    finally:
+        db.close()
+
+
+def test_new_node_gets_last_seen_on_insert(client):
+    """First boot inserts the node with last_seen already set; nothing is buffered."""
+    client.get("/boot", query_string={"mac": "aa:bb:cc:dd:ee:ff"})
+    assert _stored_last_seen("aa:bb:cc:dd:ee:ff") is not None
+    assert last_seen_buffer.pending() == 0
+
+
+def test_repeat_boots_are_buffered_and_coalesced(client):
+    """Later boots of a known node are buffered, one entry per MAC, until flushed."""
+    mac = "aa:bb:cc:dd:ee:ff"
+    client.get("/boot", query_string={"mac": mac})
+    first = _stored_last_seen(mac)
+    for _ in range(3):
+        client.get("/boot", query_string={"mac": mac})
+    assert last_seen_buffer.pending() == 1
+    assert _stored_last_seen(mac) == first
+
+    assert last_seen_buffer.flush() == 1
+    assert _stored_last_seen(mac) > first
+    assert last_seen_buffer.pending() == 0
+
+
+def test_list_nodes_does_not_flush(client):
+    """GET /nodes is a read: buffered boots wait for the flusher and a conditional poll still gets 304."""
+    mac = "aa:bb:cc:dd:ee:ff"
+    client.get("/boot", query_string={"mac": mac})
+    first = client.get("/nodes")
+    time.sleep(0.01)
+    client.get("/boot", query_string={"mac": mac})
+    assert client.get("/nodes", headers={"If-None-Match": first.headers["ETag"]}).status_code == 304
+    assert client.get("/nodes").get_json() == first.get_json()
+    assert last_seen_buffer.pending() == 1
+
+    last_seen_buffer.flush()
+    after = client.get("/nodes").get_json()["nodes"][0]["last_seen"]
+    assert after > first.get_json()["nodes"][0]["last_seen"]
+
+
+def test_full_buffer_wakes_flusher(client):
+    """Reaching max_size triggers a flush without waiting for the interval."""
+    buf = LastSeenBuffer(interval=3600, max_size=2)
+    client.post("/nodes/aa:bb:cc:dd:ee:01/reinstall")
+    client.post("/nodes/aa:bb:cc:dd:ee:02/reinstall")
+    now = datetime.now(timezone.utc)
+    buf.record("aa:bb:cc:dd:ee:01", now)
+    buf.record("aa:bb:cc:dd:ee:02", now)
+    deadline = time.monotonic() + 5
+    while buf.pending() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert buf.pending() == 0
+    assert _stored_last_seen("aa:bb:cc:dd:ee:02") == now
+
+
+def test_failed_flush_keeps_newest_timestamp():
+    """A failed write re-queues the batch without clobbering newer records."""
+    buf = LastSeenBuffer(interval=3600, max_size=1000)
+    old = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    buf._pending["aa:bb:cc:dd:ee:ff"] = old
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE nodes"))
+    assert buf.flush() == 0
+    assert buf.pending() == 1
+    assert buf._pending["aa:bb:cc:dd:ee:ff"] == old
+
+
+def test_zero_interval_writes_through(client):
+    """interval=0 keeps the old synchronous behaviour."""
+    mac = "aa:bb:cc:dd:ee:ff"
+    client.get("/boot", query_string={"mac": mac})
+    buf = LastSeenBuffer(interval=0, max_size=1000)
+    later = datetime.now(timezone.utc) + timedelta(minutes=5)
+    buf.record(mac, later)
+    assert buf.pending() == 0
+    assert _stored_last_seen(mac) == later
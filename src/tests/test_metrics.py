@@ -0,0 +1,80 @@
+"""
+Tests for GET /metrics: exposition format, boot/DB/HTTP series, and the
+multi-worker merge through METRICS_DIR snapshots.
+"""
+
+import json
+import os
+
+import pytest
+
+from app.metrics import registry
+
+pytestmark = pytest.mark.usefixtures("fresh_registry")
+
+
+def test_boot_metrics(client, metric_value):
+    client.get("/boot", query_string={"mac": "aa:bb:cc:dd:ee:ff"})
+    client.get("/boot", query_string={"mac": "aa:bb:cc:dd:ee:ff"})
+    client.post("/nodes/aa:bb:cc:dd:ee:ff/reinstall")
+    client.get("/boot", query_string={"mac": "aa:bb:cc:dd:ee:ff"})
+    r = client.get("/metrics")
+    assert r.status_code == 200
+    assert r.content_type.startswith("text/plain; version=0.0.4")
+    text = r.get_data(as_text=True)
+    assert metric_value(text, "pxe_nodes_created_total") == 1
+    assert metric_value(text, 'pxe_boot_scripts_total{kind="local_disk"}') == 2
+    assert metric_value(text, 'pxe_boot_scripts_total{kind="reinstall"}') == 1
+    assert metric_value(text, 'pxe_http_requests_total{route="/boot",method="GET",status="200"}') == 3
+    assert metric_value(text, 'pxe_http_request_duration_seconds_count{route="/boot"}') == 3
+    assert metric_value(text, 'pxe_http_request_duration_seconds_bucket{route="/boot",le="+Inf"}') == 3
+    assert metric_value(text, 'pxe_http_requests_total{route="/nodes/<path:mac_raw>/reinstall",method="POST",status="200"}') == 1
+    assert metric_value(text, 'pxe_db_query_duration_seconds_count{statement="INSERT"}') >= 2
+    assert "# TYPE pxe_db_query_duration_seconds histogram" in text
+    assert metric_value(text, f'process_resident_memory_bytes{{pid="{os.getpid()}"}}') > 0
+
+
+def test_unmatched_routes_share_one_label(client, metric_value):
+    client.get("/nope/1")
+    client.get("/nope/2")
+    text = client.get("/metrics").get_data(as_text=True)
+    assert metric_value(text, 'pxe_http_requests_total{route="unmatched",method="GET",status="404"}') == 2
+
+
+def test_snapshots_of_other_workers_are_summed(client, fresh_registry, metric_value):
+    """Counters from live and exited workers add up; gauges only come from live ones."""
+    client.get("/boot", query_string={"mac": "aa:bb:cc:dd:ee:ff"})
+    live, dead = os.getppid(), 2**22 + 12345
+    for pid in (live, dead):
+        (fresh_registry / f"{pid}.json").write_text(json.dumps({
+            "pid": pid,
+            "values": [["pxe_nodes_created", [], 2.0], ["pxe_boot_scripts", ["local_disk"], 5.0]],
+            "gauges": [["process_resident_memory_bytes", 1024.0]],
+        }))
+    text = client.get("/metrics").get_data(as_text=True)
+    assert metric_value(text, "pxe_nodes_created_total") == 5
+    assert metric_value(text, 'pxe_boot_scripts_total{kind="local_disk"}') == 11
+    assert metric_value(text, f'process_resident_memory_bytes{{pid="{live}"}}') == 1024
+    assert f'pid="{dead}"' not in text
+
+
+def test_forked_worker_counts_once(client, fresh_registry, metric_value):
+    """A forked child starts from zero and publishes its own snapshot."""
+    client.get("/boot", query_string={"mac": "aa:bb:cc:dd:ee:ff"})
+    pid = os.fork()
+    if pid == 0:
+        try:
+            client.get("/boot", query_string={"mac": "11:22:33:44:55:66"})
+            registry.write_snapshot()
+        finally:
+            os._exit(0)
+    os.waitpid(pid, 0)
+    text = client.get("/metrics").get_data(as_text=True)
+    assert metric_value(text, "pxe_nodes_created_total") == 2
+    assert metric_value(text, 'pxe_boot_scripts_total{kind="local_disk"}') == 2
+
+
+def test_metrics_requires_admin_auth(client, monkeypatch):
+    monkeypatch.setattr("app.routes.common.ADMIN_API_KEY", "secret")
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer secret"}).status_code == 200
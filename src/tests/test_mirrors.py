@@ -0,0 +1,126 @@
+"""
+Tests for mirror selection (app.mirrors) against stand-in HTTP servers on
+localhost: probing (latency, failures, templated URLs probed at their origin),
+weighted least-load choice and its fallbacks, and the /boot installer script
+and GET /mirrors with mirrors configured.
+"""
+
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app.boot_profiles import DEFAULT_PROFILE
+from app.mirrors import MirrorSet, Mirrors, mirrors
+from app.templating import compile_template
+
+pytestmark = pytest.mark.usefixtures("fresh_registry")
+
+MAC = "aa:bb:cc:dd:ee:01"
+
+
+def _server(delay: float = 0.0, status: int = 200):
+    """Start a server answering every HEAD with status after delay; return its base URL and the server."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_HEAD(self):
+            time.sleep(delay)
+            self.send_response(status)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}", server
+
+
+@pytest.fixture
+def servers():
+    started = {"fast": _server(), "slow": _server(delay=0.2), "missing": _server(delay=0.1, status=404)}
+    dead = _server()
+    dead[1].shutdown()
+    dead[1].server_close()
+    yield {"dead": dead[0], **{name: url for name, (url, _) in started.items()}}
+    for _, server in started.values():
+        server.shutdown()
+        server.server_close()
+
+
+def _status(mirror_set: MirrorSet) -> dict:
+    return {entry["url"]: entry for entry in mirror_set.status()}
+
+
+def test_probe_tracks_latency_and_failures(servers):
+    fast, slow = f"{servers['fast']}/ubuntu.iso", f"{servers['slow']}/ubuntu.iso"
+    dead, missing = f"{servers['dead']}/ubuntu.iso", f"{servers['missing']}/ubuntu.iso"
+    templated = f"{servers['missing']}/seeds/${{mac}}/"  # probed at its origin, where 404 will do
+    mirror_set = MirrorSet("iso", compile_template(fast), [slow, dead, missing, templated], 2, 900)
+    prober = Mirrors([mirror_set], 10, 1)
+
+    prober.probe()
+    status = _status(mirror_set)
+    assert status[dead]["up"] and status[dead]["consecutive_failures"] == 1  # one failure is not enough
+    prober.probe()
+    status = _status(mirror_set)
+    assert status[fast]["up"] and status[slow]["up"] and status[templated]["up"]
+    assert status[fast]["latency_ms"] < status[slow]["latency_ms"]
+    assert not status[dead]["up"] and status[dead]["errors"] == 2
+    assert not status[missing]["up"] and status[missing]["last_error"] == "HTTP 404"
+    assert mirror_set.choose(mirror_set.primary).source == fast
+
+
+def test_weighted_least_load(monkeypatch):
+    a, b, c = "http://a/ubuntu.iso", "http://b/ubuntu.iso", "http://c/ubuntu.iso"
+    mirror_set = MirrorSet("iso", compile_template(a), [b, c], 2, 900)
+    first, second, third = mirror_set.mirrors
+    mirror_set.record(first, 10.0, None)
+    mirror_set.record(second, 30.0, None)
+    for _ in range(2):
+        mirror_set.record(third, None, "timed out")
+
+    # a takes installs until its load makes it as slow as b; c is down.
+    picks = [mirror_set.choose(mirror_set.primary).source for _ in range(8)]
+    assert picks == [a, a, a, b, a, a, a, b]
+    assert [entry["installs_in_flight"] for entry in mirror_set.status()] == [6, 2, 0]
+
+    own = compile_template("http://profile-host/own.iso")
+    assert mirror_set.choose(own) is own  # a profile's own URL is left alone
+
+    for mirror in (first, second):
+        for _ in range(2):
+            mirror_set.record(mirror, None, "refused")
+    assert mirror_set.choose(mirror_set.primary).source == a  # all down: the primary
+
+    expiring = MirrorSet("iso", compile_template(a), [b], 2, 0)
+    expiring.record(expiring.mirrors[1], 20.0, None)
+    expiring.record(expiring.mirrors[0], 10.0, None)
+    assert {expiring.choose(expiring.primary).source for _ in range(5)} == {a}  # installs already over
+
+
+def test_boot_picks_a_mirror(client, servers, monkeypatch, metric_value):
+    seed = f"{servers['fast']}/seeds/${{mac}}/"
+    mirror_set = MirrorSet("autoinstall", DEFAULT_PROFILE.autoinstall_url, [seed], 2, 900)
+    monkeypatch.setitem(mirrors.sets, "autoinstall", mirror_set)
+    monkeypatch.setattr(mirrors, "_thread_pid", os.getpid())  # probed by hand below
+    monkeypatch.setattr(mirrors, "_timeout", 0.5)
+    for _ in range(2):
+        mirrors.probe()  # the primary (http://pxe-pilot/...) does not resolve here
+
+    client.post(f"/nodes/{MAC}/reinstall")
+    body = client.get(f"/boot?mac={MAC}").get_data(as_text=True)
+    assert f"ds=nocloud-net;s={servers['fast']}/seeds/{MAC.replace(':', '%3A')}/\n" in body
+
+    status = client.get("/mirrors").get_json()
+    assert list(status) == ["autoinstall"]
+    assert [entry["up"] for entry in status["autoinstall"]] == [False, True]
+    assert status["autoinstall"][1]["installs_in_flight"] == 1
+
+    text = client.get("/metrics").get_data(as_text=True)
+    host = servers["fast"].removeprefix("http://")
+    assert metric_value(text, f'pxe_mirror_selections_total{{artifact="autoinstall",mirror="{host}"}}') == 1
+    assert metric_value(text, 'pxe_mirror_probe_failures_total{artifact="autoinstall",mirror="pxe-pilot"}') == 2
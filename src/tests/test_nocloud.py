@@ -0,0 +1,92 @@
+"""
+Tests for the in-app NoCloud datasource (/nocloud/<mac>/<document>): rendering
+with node fields, built-in defaults, per-profile templates, ETag/304, the
+rendered-document cache and its invalidation by template or node changes.
+"""
+
+import pytest
+
+from app.nocloud import nocloud
+
+pytestmark = pytest.mark.usefixtures("fresh_registry")
+
+MAC = "aa:bb:cc:dd:ee:01"
+
+USER_DATA = """#cloud-config
+autoinstall:
+  identity:
+    hostname: node-${mac_hex}
+  late-commands:
+    - curtin in-target -- sh -c 'echo ${HOME} ${install_group}'
+"""
+
+
+@pytest.fixture
+def templates(tmp_path, monkeypatch):
+    (tmp_path / "user-data").write_text(USER_DATA)
+    monkeypatch.setattr(nocloud, "root", str(tmp_path))
+    monkeypatch.setattr(nocloud, "_reload_seconds", 0)
+    nocloud.reset()
+    yield tmp_path
+    nocloud.reset()
+
+
+def test_renders_node_documents(client, templates):
+    client.get(f"/boot?mac={MAC}")  # creates the node
+    client.put(f"/nodes/{MAC}/install-group", json={"group": "rack-a"})
+
+    resp = client.get(f"/nocloud/{MAC.replace(':', '%3A')}/user-data")
+    assert resp.status_code == 200
+    body = resp.get_data(as_text=True)
+    assert "hostname: node-aabbccddee01\n" in body
+    assert "echo ${HOME} rack-a'" in body  # unknown slots are left for the shell
+
+    assert client.get(f"/nocloud/{MAC}/meta-data").get_data(as_text=True) == "instance-id: pxe-aabbccddee01\n"
+    vendor = client.get("/nocloud/aa-bb-cc-dd-ee-01/vendor-data")
+    assert vendor.status_code == 200 and vendor.get_data() == b""
+    assert client.get(f"/nocloud/{MAC}/network-config").status_code == 404
+    assert client.get(f"/nocloud/{MAC}/other").status_code == 404
+    assert client.get("/nocloud/aa:bb:cc:dd:ee:02/user-data").status_code == 404  # unknown node
+
+
+def test_etag_and_cache(client, templates, metric_value):
+    client.get(f"/boot?mac={MAC}")
+    first = client.get(f"/nocloud/{MAC}/user-data")
+    etag = first.headers["ETag"]
+    again = client.get(f"/nocloud/{MAC}/user-data", headers={"If-None-Match": etag})
+    assert again.status_code == 304 and again.get_data() == b""
+
+    # A node change misses the cache and changes the ETag.
+    client.put(f"/nodes/{MAC}/install-group", json={"group": "rack-b"})
+    changed = client.get(f"/nocloud/{MAC}/user-data", headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and "rack-b" in changed.get_data(as_text=True)
+
+    text = client.get("/metrics").get_data(as_text=True)
+    series = 'pxe_nocloud_documents_total{document="user-data",result="%s"}'
+    assert metric_value(text, series % "miss") == 2
+    assert metric_value(text, series % "hit") == 1
+    assert metric_value(text, series % "not_modified") == 1
+
+
+def test_profile_templates_and_reload(client, templates):
+    (templates / "jammy").mkdir()
+    (templates / "jammy" / "user-data").write_text("#cloud-config\n# jammy ${mac}\n")
+    client.get(f"/boot?mac={MAC}")
+    assert client.put("/profiles/jammy", json={"iso_url": "http://image-host/jammy.iso"}).status_code in (200, 201)
+    before = client.get(f"/nocloud/{MAC}/user-data")
+    assert "node-aabbccddee01" in before.get_data(as_text=True)
+
+    client.put(f"/nodes/{MAC}/boot-profile", json={"profile": "jammy"})
+    assert client.get(f"/nocloud/{MAC}/user-data").get_data(as_text=True) == f"#cloud-config\n# jammy {MAC}\n"
+    assert "pxe-aabbccddee01" in client.get(f"/nocloud/{MAC}/meta-data").get_data(as_text=True)  # falls back
+
+    client.delete(f"/nodes/{MAC}/boot-profile")
+    (templates / "user-data").write_text("#cloud-config\n# edited\n")
+    after = client.get(f"/nocloud/{MAC}/user-data", headers={"If-None-Match": before.headers["ETag"]})
+    assert after.status_code == 200 and after.get_data(as_text=True) == "#cloud-config\n# edited\n"
+
+
+def test_disabled_without_nocloud_dir(client):
+    client.get(f"/boot?mac={MAC}")
+    assert not nocloud.enabled
+    assert client.get(f"/nocloud/{MAC}/user-data").status_code == 404
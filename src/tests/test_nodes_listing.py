@@ -0,0 +1,117 @@
+"""
+Tests for GET /nodes query features: keyset pagination, server-side filters
+and the NDJSON streaming mode.
+"""
+
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import text, update
+
+from app.db import engine
+from app.macs import prefix_range
+from app.models import Node
+
+MACS = [f"02:00:00:00:{i // 16:02x}:{i % 16:02x}" for i in range(25)]
+
+
+@pytest.fixture
+def fleet(client):
+    """25 nodes; every fifth one flagged for reinstall."""
+    for i, mac in enumerate(MACS):
+        if i % 5 == 0:
+            client.post(f"/nodes/{mac}/reinstall")
+        else:
+            client.delete(f"/nodes/{mac}/reinstall")
+    return client
+
+
+def _macs(response) -> list[str]:
+    return [n["mac"] for n in response.get_json()["nodes"]]
+
+
+def test_keyset_pagination_walks_every_node_once(fleet):
+    seen, after = [], None
+    while True:
+        query = {"limit": 10, **({"after": after} if after else {})}
+        page = fleet.get("/nodes", query_string=query).get_json()
+        seen += [n["mac"] for n in page["nodes"]]
+        after = page["next"]
+        if after is None:
+            break
+    assert seen == sorted(MACS)
+
+
+def test_filter_reinstall(fleet):
+    assert _macs(fleet.get("/nodes?reinstall=true")) == MACS[::5]
+    assert len(_macs(fleet.get("/nodes?reinstall=false"))) == 20
+
+
+def test_filter_mac_prefix_and_list(fleet):
+    assert _macs(fleet.get("/nodes?mac_prefix=02:00:00:00:01")) == MACS[16:]
+    assert _macs(fleet.get("/nodes?mac_prefix=02-00-00-00-00-0")) == MACS[:16]
+    wanted = [MACS[3], MACS[7], MACS[20]]
+    r = fleet.get(f"/nodes?mac={wanted[0]}&mac={wanted[1].replace(':', '-')},{wanted[2]}")
+    assert _macs(r) == wanted
+
+
+def test_filter_last_seen_range(fleet):
+    now = datetime.now(timezone.utc)
+    old = now - timedelta(days=30)
+    with engine.begin() as conn:
+        conn.execute(update(Node).where(Node.mac.in_(MACS[:5])).values(last_seen=old))
+        conn.execute(update(Node).where(Node.mac.in_(MACS[5:10])).values(last_seen=now))
+    cutoff = (now - timedelta(days=1)).isoformat()
+    assert _macs(fleet.get("/nodes", query_string={"seen_before": cutoff})) == MACS[:5]
+    assert _macs(fleet.get("/nodes", query_string={"seen_since": cutoff})) == MACS[5:10]
+
+
+def test_last_seen_filter_uses_index():
+    with engine.connect() as conn:
+        plan = conn.execute(text("EXPLAIN QUERY PLAN SELECT mac FROM nodes WHERE last_seen < '2024-01-01'")).all()
+    assert any("ix_nodes_last_seen" in row[-1] for row in plan)
+
+
+def test_mac_prefix_uses_mac_index(fleet):
+    """A prefix is an integer range over the MAC index, a vendor OUI included."""
+    assert prefix_range("020000") == (0x020000000000, 0x020001000000)
+    assert _macs(fleet.get("/nodes?mac_prefix=02:00:00")) == MACS
+    assert _macs(fleet.get("/nodes?mac_prefix=02:00:01")) == []
+    with engine.connect() as conn:
+        plan = conn.execute(
+            text("EXPLAIN QUERY PLAN SELECT mac FROM nodes WHERE mac >= :low AND mac < :high"),
+            dict(zip(("low", "high"), prefix_range("020000"))),
+        ).all()
+    assert any("ix_nodes_mac" in row[-1] for row in plan)
+
+
+@pytest.mark.parametrize(
+    "query",
+    ["reinstall=maybe", "seen_since=yesterday", "seen_since=2024-01-01T00:00:00", "mac_prefix=zz", "mac_prefix=02::",
+     "mac=nope", "limit=0", "limit=x", "after=nope"],
+)
+def test_invalid_query_returns_400(client, query):
+    r = client.get(f"/nodes?{query}")
+    assert r.status_code == 400
+    assert "error" in r.get_json()
+
+
+def test_ndjson_streams_one_node_per_line(fleet):
+    r = fleet.get("/nodes?format=ndjson")
+    assert r.status_code == 200
+    assert r.mimetype == "application/x-ndjson"
+    lines = r.get_data(as_text=True).splitlines()
+    assert [json.loads(line)["mac"] for line in lines] == sorted(MACS)
+
+
+def test_ndjson_via_accept_header_with_filters(fleet):
+    r = fleet.get("/nodes?reinstall=true", headers={"Accept": "application/x-ndjson"})
+    assert r.mimetype == "application/x-ndjson"
+    assert [json.loads(line)["mac"] for line in r.get_data(as_text=True).splitlines()] == MACS[::5]
+    assert "Accept" in r.headers["Vary"]
+
+
+def test_filtered_listing_honours_etag(fleet):
+    etag = fleet.get("/nodes?reinstall=true").headers["ETag"]
+    assert fleet.get("/nodes?reinstall=true", headers={"If-None-Match": etag}).status_code == 304
@@ -0,0 +1,124 @@
+"""
+Tests for boot profiles: compiled templates, the /profiles admin API, per-node
+assignment via /nodes/<mac>/boot-profile, and the installer script rendered
+from a node's profile.
+"""
+
+import pytest
+
+from app.boot_cache import boot_cache
+from app.boot_profiles import boot_profiles
+from app.templating import compile_template
+
+MAC = "aa:bb:cc:dd:ee:ff"
+JAMMY = {
+    "iso_url": "http://mirror/jammy.iso",
+    "autoinstall_url": "http://seed/jammy/${mac_hyphen}",
+    "extra_cmdline": "console=ttyS0,115200 hw=${mac_hyphen}",
+}
+
+
+def test_compiled_template_fills_known_slots_only():
+    """Known slots are filled; unknown ones such as iPXE's ${next-server} are kept."""
+    template = compile_template("tftp://${next-server}/${mac}/x?ip=${ip}")
+    assert template.names == {"next-server", "mac", "ip"}
+    assert template.render({"mac": "m", "ip": "1.2.3.4"}) == "tftp://${next-server}/m/x?ip=1.2.3.4"
+    assert compile_template("plain").render({}) == "plain"
+
+
+def test_compile_template_is_memoized():
+    assert compile_template("http://x/${mac}") is compile_template("http://x/${mac}")
+
+
+def test_put_and_get_profile(client):
+    r = client.put("/profiles/jammy", json=JAMMY)
+    assert r.status_code == 200
+    assert r.get_json()["iso_url"] == JAMMY["iso_url"]
+    body = client.get("/profiles/jammy").get_json()
+    assert body["autoinstall_url"] == JAMMY["autoinstall_url"]
+    assert body["uki_url"] is None
+    listing = client.get("/profiles").get_json()
+    assert [p["name"] for p in listing["profiles"]] == ["jammy"]
+    assert listing["default"]["autoinstall_url"] == "http://pxe-pilot/autoinstall"
+    assert client.get("/profiles/missing").status_code == 404
+
+
+@pytest.mark.parametrize(
+    "name, body",
+    [
+        ("bad name", {}),
+        ("ok", {"iso_url": "http://x/a.iso\nshell"}),
+        ("ok", {"uki_url": "http://x/a b.efi"}),
+        ("ok", {"extra_cmdline": "quiet || shell"}),
+        ("ok", {"extra_cmdline": 5}),
+        ("ok", {"kernel": "http://x"}),
+        ("ok", []),
+    ],
+)
+def test_put_profile_rejects_invalid_input(client, name, body):
+    assert client.put(f"/profiles/{name}", json=body).status_code == 400
+
+
+def test_node_with_profile_gets_profile_script(client):
+    """Profile fields replace the defaults; null fields (uki_url here) inherit them."""
+    client.put("/profiles/jammy", json=JAMMY)
+    r = client.put(f"/nodes/{MAC}/boot-profile", json={"profile": "jammy"})
+    assert r.get_json() == {"mac": MAC, "boot_profile": "jammy"}
+    client.post(f"/nodes/{MAC}/reinstall")
+    body = client.get("/boot", query_string={"mac": MAC}).get_data(as_text=True)
+    assert "chain --replace --autofree tftp://${next-server}/uki.efi url=http://mirror/jammy.iso " in body
+    assert "console=ttyS0,115200 hw=aa-bb-cc-dd-ee-ff autoinstall" in body
+    assert "ds=nocloud-net;s=http://seed/jammy/aa-bb-cc-dd-ee-ff/" in body
+
+    client.post("/nodes/11:22:33:44:55:66/reinstall")
+    other = client.get("/boot", query_string={"mac": "11:22:33:44:55:66"}).get_data(as_text=True)
+    assert "jammy" not in other and "s=http://pxe-pilot/autoinstall/" in other
+
+
+def test_profile_update_applies_to_next_boot(client):
+    client.put("/profiles/jammy", json=JAMMY)
+    client.put(f"/nodes/{MAC}/boot-profile", json={"profile": "jammy"})
+    client.post(f"/nodes/{MAC}/reinstall")
+    client.get("/boot", query_string={"mac": MAC})
+    client.put("/profiles/jammy", json={**JAMMY, "iso_url": "http://mirror/jammy-2.iso"})
+    body = client.get("/boot", query_string={"mac": MAC}).get_data(as_text=True)
+    assert "url=http://mirror/jammy-2.iso " in body
+
+
+def test_assign_unknown_profile_is_404(client):
+    assert client.put(f"/nodes/{MAC}/boot-profile", json={"profile": "nope"}).status_code == 404
+    assert client.put(f"/nodes/{MAC}/boot-profile", json={}).status_code == 400
+
+
+def test_delete_profile_detaches_nodes(client):
+    client.put("/profiles/jammy", json=JAMMY)
+    client.put(f"/nodes/{MAC}/boot-profile", json={"profile": "jammy"})
+    client.post(f"/nodes/{MAC}/reinstall")
+    r = client.delete("/profiles/jammy")
+    assert r.get_json()["nodes_detached"] == 1
+    assert client.delete("/profiles/jammy").status_code == 404
+    assert client.get("/nodes").get_json()["nodes"][0]["boot_profile"] is None
+    body = client.get("/boot", query_string={"mac": MAC}).get_data(as_text=True)
+    assert "jammy" not in body
+
+
+def test_clear_boot_profile(client):
+    client.put("/profiles/jammy", json=JAMMY)
+    client.put(f"/nodes/{MAC}/boot-profile", json={"profile": "jammy"})
+    assert client.delete(f"/nodes/{MAC}/boot-profile").get_json() == {"mac": MAC, "boot_profile": None}
+    client.post(f"/nodes/{MAC}/reinstall")
+    assert "jammy" not in client.get("/boot", query_string={"mac": MAC}).get_data(as_text=True)
+
+
+def test_external_profile_change_recompiles(client, monkeypatch, external_write):
+    """A profile edited by another worker is recompiled once the generation bump is polled."""
+    monkeypatch.setattr(boot_cache, "_poll_seconds", 0.0)
+    client.put("/profiles/jammy", json=JAMMY)
+    client.put(f"/nodes/{MAC}/boot-profile", json={"profile": "jammy"})
+    client.post(f"/nodes/{MAC}/reinstall")
+    client.get("/boot", query_string={"mac": MAC})
+    assert not boot_profiles.stale
+
+    external_write("UPDATE boot_profiles SET iso_url = 'http://mirror/other.iso' WHERE name = 'jammy'")
+    body = client.get("/boot", query_string={"mac": MAC}).get_data(as_text=True)
+    assert "url=http://mirror/other.iso " in body
@@ -0,0 +1,106 @@
+"""
+Tests for the opt-in /debug profiling routes: stack sampler windows,
+per-request cProfile via X-Profile, tracemalloc snapshots and diffs.
+"""
+
+import marshal
+import time
+
+import pytest
+
+from app import create_app
+from app.profiling import memory, sampler
+
+MAC = "aa:bb:cc:dd:ee:ff"
+
+
+@pytest.fixture
+def debug_client(monkeypatch):
+    """Client for an app built with PROFILING_ENABLED set."""
+    monkeypatch.setattr("app.routes.PROFILING_ENABLED", True)
+    app = create_app()
+    app.config["TESTING"] = True
+    with app.test_client() as c:
+        yield c
+    memory.stop()
+
+
+def _wait_for_sampler():
+    deadline = time.monotonic() + 5.0
+    while sampler.running and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_debug_routes_absent_by_default(client):
+    assert client.post("/debug/sampler").status_code == 404
+    r = client.get("/boot", query_string={"mac": MAC}, headers={"X-Profile": "1"})
+    assert "X-Profile-Id" not in r.headers
+
+
+def test_sampler_window_returns_collapsed_stacks(debug_client):
+    _wait_for_sampler()
+    r = debug_client.post("/debug/sampler", query_string={"seconds": "0.3", "hz": "200"})
+    assert r.status_code == 202
+    assert r.headers["X-Worker-Pid"]
+    assert debug_client.post("/debug/sampler", query_string={"seconds": "1"}).status_code == 409
+    _wait_for_sampler()
+    r = debug_client.get("/debug/sampler")
+    assert r.status_code == 200
+    assert r.headers["X-Sampler-Running"] == "0"
+    assert int(r.headers["X-Sampler-Samples"]) > 0
+    stacks = dict(line.rsplit(" ", 1) for line in r.get_data(as_text=True).splitlines())
+    assert any(stack.startswith("MainThread;") for stack in stacks)
+    assert all(int(count) > 0 for count in stacks.values())
+
+
+def test_sampler_rejects_bad_window(debug_client):
+    assert debug_client.post("/debug/sampler", query_string={"seconds": "9999"}).status_code == 400
+    assert debug_client.post("/debug/sampler", query_string={"hz": "fast"}).status_code == 400
+
+
+def test_request_profile_via_header(debug_client):
+    r = debug_client.get("/boot", query_string={"mac": MAC}, headers={"X-Profile": "1"})
+    assert r.status_code == 200
+    profile_id = r.headers["X-Profile-Id"]
+    listed = debug_client.get("/debug/profiles").get_json()["profiles"]
+    assert listed[0]["id"] == profile_id
+    assert listed[0]["request"].startswith("GET /boot?mac=")
+    report = debug_client.get(f"/debug/profiles/{profile_id}", query_string={"sort": "tottime", "limit": "5"})
+    assert "function calls" in report.get_data(as_text=True)
+    stats = marshal.loads(debug_client.get(f"/debug/profiles/{profile_id}?format=pstats").data)
+    assert any(func[2] == "boot" for func in stats)
+    assert debug_client.get("/debug/profiles/0-0").status_code == 404
+    bad = debug_client.get(f"/debug/profiles/{profile_id}", query_string={"sort": "size"})
+    assert bad.status_code == 400 and "sort" in bad.get_json()["error"]
+
+
+def test_profile_header_needs_admin_auth(debug_client, monkeypatch):
+    monkeypatch.setattr("app.routes.common.ADMIN_API_KEY", "secret")
+    r = debug_client.get("/boot", query_string={"mac": MAC}, headers={"X-Profile": "1"})
+    assert r.status_code == 200
+    assert "X-Profile-Id" not in r.headers
+    r = debug_client.get(
+        "/boot", query_string={"mac": MAC}, headers={"X-Profile": "1", "Authorization": "Bearer secret"}
+    )
+    assert "X-Profile-Id" in r.headers
+    assert debug_client.get("/debug/profiles").status_code == 401
+    assert debug_client.post("/debug/tracemalloc/start").status_code == 401
+
+
+def test_tracemalloc_snapshot_and_diff(debug_client):
+    assert debug_client.get("/debug/tracemalloc/diff").status_code == 409
+    assert debug_client.post("/debug/tracemalloc/snapshot").status_code == 409
+    assert debug_client.post("/debug/tracemalloc/start", query_string={"frames": "0"}).status_code == 400
+    r = debug_client.post("/debug/tracemalloc/start", query_string={"frames": "5"})
+    assert r.get_json()["tracing"] is True
+    r = debug_client.post("/debug/tracemalloc/snapshot", query_string={"limit": "3"})
+    assert r.status_code == 200
+    assert len(r.get_json()["top"]) <= 3
+    keep = [bytearray(1024) for _ in range(200)]
+    r = debug_client.get("/debug/tracemalloc/diff", query_string={"key": "lineno", "limit": "10"})
+    assert r.status_code == 200
+    diff = r.get_json()["diff"]
+    assert any("test_profiling.py" in entry["site"] and entry["size_diff_bytes"] > 0 for entry in diff)
+    assert debug_client.get("/debug/tracemalloc").get_json()["baseline"] is True
+    del keep
+    assert debug_client.post("/debug/tracemalloc/stop").get_json()["tracing"] is False
@@ -0,0 +1,128 @@
+"""
+Tests for GET /ready and the background readiness prober: DB, write lock,
+TFTP artifacts, upstream hosts, and serving cached results.
+"""
+
+import socket
+import sqlite3
+import time
+
+import pytest
+
+from app.config import DATABASE_PATH
+from app.readiness import ReadinessProber, upstream_hosts
+
+
+def _prober(tmp_path, **overrides) -> ReadinessProber:
+    (tmp_path / "ipxe.efi").write_bytes(b"x")
+    args = {
+        "ttl": 3600.0,
+        "timeout": 0.2,
+        "database_path": DATABASE_PATH,
+        "tftp_root": str(tmp_path),
+        "artifacts": ("ipxe.efi",),
+        "upstream": [],
+    }
+    args.update(overrides)
+    return ReadinessProber(**args)
+
+
+@pytest.fixture
+def use_prober(monkeypatch):
+    """Serve /ready from the given prober."""
+    def use(prober):
+        monkeypatch.setattr("app.routes.health.readiness", prober)
+        return prober
+    return use
+
+
+def _closed_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.mark.sqlite_only
+def test_ready(client, use_prober, tmp_path):
+    use_prober(_prober(tmp_path))
+    r = client.get("/ready")
+    assert r.status_code == 200
+    body = r.get_json()
+    assert body["status"] == "ready"
+    assert set(body["checks"]) == {"database", "write_lock", "artifacts", "upstream"}
+    assert body["checks"]["database"]["latency_ms"] >= 0
+    assert body["checks"]["write_lock"]["ok"] is True
+
+
+@pytest.mark.sqlite_only
+def test_missing_artifact_is_unready(client, use_prober, tmp_path):
+    use_prober(_prober(tmp_path, artifacts=("ipxe.efi", "uki.efi")))
+    r = client.get("/ready")
+    assert r.status_code == 503
+    assert r.get_json()["checks"]["artifacts"]["missing"] == ["uki.efi"]
+
+
+@pytest.mark.sqlite_only
+def test_missing_database_is_unready_and_not_created(tmp_path):
+    path = tmp_path / "gone.db"
+    status, body = _prober(tmp_path, database_path=str(path)).report(wait=5)
+    assert status == 503
+    assert body["checks"]["database"]["ok"] is False
+    assert body["checks"]["write_lock"]["ok"] is False
+    assert not path.exists()
+
+
+@pytest.mark.sqlite_only
+def test_held_write_lock_is_unready(tmp_path):
+    holder = sqlite3.connect(DATABASE_PATH, isolation_level=None)
+    holder.execute("BEGIN IMMEDIATE")
+    try:
+        body = _prober(tmp_path).probe()
+    finally:
+        holder.execute("ROLLBACK")
+        holder.close()
+    assert body["status"] == "unready"
+    assert body["checks"]["database"]["ok"] is True
+    assert "locked" in body["checks"]["write_lock"]["error"]
+
+
+@pytest.mark.sqlite_only
+def test_unreachable_upstream_is_degraded(client, use_prober, tmp_path):
+    use_prober(_prober(tmp_path, upstream=[("127.0.0.1", _closed_port())]))
+    r = client.get("/ready")
+    assert r.status_code == 200
+    body = r.get_json()
+    assert body["status"] == "degraded"
+    assert body["checks"]["upstream"]["ok"] is False
+
+
+@pytest.mark.sqlite_only
+def test_polls_are_served_from_the_last_result(client, use_prober, tmp_path):
+    prober = use_prober(_prober(tmp_path))
+    first = client.get("/ready").get_json()["checked_at"]
+    finished = prober._finished
+    for _ in range(20):
+        assert client.get("/ready").get_json()["checked_at"] == first
+    assert prober._finished == finished
+
+
+@pytest.mark.sqlite_only
+def test_stale_result_is_unready(tmp_path):
+    prober = _prober(tmp_path)
+    assert prober.report(wait=5)[0] == 200
+    prober._finished = time.monotonic() - prober.stale_after - 1
+    status, body = prober.report()
+    assert status == 503
+    assert body["status"] == "stale"
+
+
+def test_upstream_hosts():
+    assert upstream_hosts([
+        "http://mirror/ubuntu.iso",
+        "https://mirror/autoinstall/${mac}",
+        "http://mirror:8080/x",
+        "http://mirror/other.iso",
+        "tftp://${next-server}/uki.efi",
+        "http://${next-server}/uki.efi",
+        "",
+    ]) == [("mirror", 80), ("mirror", 443), ("mirror", 8080)]
@@ -0,0 +1,144 @@
+"""
+Tests for rolling reinstalls: the fleet and per-group caps, slots freed by
+clearing reinstall or by the timeout, maintenance windows (and parsing
+REINSTALL_WINDOWS), GET /reinstalls, the install-group endpoints and bulk
+operations, and the native ASGI /boot path.
+"""
+
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app import config
+from app.db import engine, read_counter
+from app.rollout import ADMISSIONS_KEY, rollout
+
+MACS = [f"aa:bb:cc:dd:ee:{i:02x}" for i in range(4)]
+
+
+def _installs(client, mac: str) -> bool:
+    """Boot mac; True when it got the installer rather than its local-disk script."""
+    return "imgfree" in client.get(f"/boot?mac={mac}").get_data(as_text=True)
+
+
+def _windows(monkeypatch, value: str):
+    monkeypatch.setenv("REINSTALL_WINDOWS", value)
+    return config._get_windows("REINSTALL_WINDOWS")
+
+
+def test_scheduler_off_by_default(client):
+    assert not rollout.enabled
+    for mac in MACS:
+        client.post(f"/nodes/{mac}/reinstall")
+    assert all(_installs(client, mac) for mac in MACS)
+
+
+def test_fleet_cap_queues_until_a_slot_frees(client, monkeypatch):
+    monkeypatch.setattr(rollout, "max_active", 2)
+    for mac in MACS[:3]:
+        client.post(f"/nodes/{mac}/reinstall")
+    assert [_installs(client, mac) for mac in MACS[:3]] == [True, True, False]
+    assert _installs(client, MACS[0])  # running installs keep the installer across reboots
+
+    status = client.get("/reinstalls").get_json()
+    assert [r["mac"] for r in status["running"]] == MACS[:2]
+    assert status["queued"] == 1 and status["window_open"] is True
+
+    client.delete(f"/nodes/{MACS[0]}/reinstall")  # install finished
+    assert _installs(client, MACS[2])
+    assert not _installs(client, MACS[0])
+    nodes = {n["mac"]: n for n in client.get("/nodes").get_json()["nodes"]}
+    assert nodes[MACS[0]]["install_started_at"] is None
+    assert nodes[MACS[2]]["install_started_at"] is not None
+
+
+def test_queued_boots_do_not_write_while_full(client, monkeypatch):
+    """A queued node rebooting while the cap is full is refused on a read; only a free slot takes the write lock."""
+    monkeypatch.setattr(rollout, "max_active", 1)
+    for mac in MACS[:2]:
+        client.post(f"/nodes/{mac}/reinstall")
+    assert _installs(client, MACS[0])
+    with engine.connect() as conn:
+        before = read_counter(conn, ADMISSIONS_KEY)
+    assert not any(_installs(client, MACS[1]) for _ in range(3))
+    with engine.connect() as conn:
+        assert read_counter(conn, ADMISSIONS_KEY) == before
+
+    client.delete(f"/nodes/{MACS[0]}/reinstall")
+    assert _installs(client, MACS[1])
+    with engine.connect() as conn:
+        assert read_counter(conn, ADMISSIONS_KEY) == before + 1
+
+
+def test_group_cap(client, monkeypatch):
+    monkeypatch.setattr(rollout, "max_active_per_group", 1)
+    for mac, group in zip(MACS, ["rack-a", "rack-a", "rack-b"]):
+        assert client.put(f"/nodes/{mac}/install-group", json={"group": group}).status_code == 200
+    for mac in MACS:
+        client.post(f"/nodes/{mac}/reinstall")
+    # MACS[3] has no group: only the fleet cap (off here) applies to it.
+    assert [_installs(client, mac) for mac in MACS] == [True, False, True, True]
+    assert client.get("/reinstalls").get_json()["queued_by_group"] == {"rack-a": 1}
+
+    assert client.put(f"/nodes/{MACS[0]}/install-group", json={"group": "../x"}).status_code == 400
+    assert client.delete(f"/nodes/{MACS[1]}/install-group").get_json()["install_group"] is None
+    assert _installs(client, MACS[1])
+
+
+def test_stale_install_frees_its_slot(client, monkeypatch):
+    monkeypatch.setattr(rollout, "max_active", 1)
+    for mac in MACS[:2]:
+        client.post(f"/nodes/{mac}/reinstall")
+    long_ago = datetime.now(timezone.utc) - rollout.timeout - timedelta(minutes=1)
+    assert rollout.admit(MACS[0], long_ago)
+    assert _installs(client, MACS[1])
+    assert not _installs(client, MACS[0])  # timed out: queued again behind MACS[1]
+
+
+def test_windows(client, monkeypatch):
+    windows = _windows(monkeypatch, "Mon-Fri 22:00-06:00, Sat 10:00-12:00")
+    monkeypatch.setattr(rollout, "windows", windows)
+    at = lambda day, hour: datetime(2024, 7, day, hour, 30, tzinfo=timezone.utc)  # 2024-07-01 is a Monday
+    assert rollout.window_open(at(1, 23)) and rollout.window_open(at(2, 5))
+    assert not rollout.window_open(at(1, 5))  # Sunday night is not in Mon-Fri
+    assert rollout.window_open(at(6, 3))  # Friday's window runs into Saturday
+    assert rollout.window_open(at(6, 11)) and not rollout.window_open(at(7, 11))
+
+    client.post(f"/nodes/{MACS[0]}/reinstall")
+    assert not rollout.admit(MACS[0], at(6, 9))
+    assert rollout.admit(MACS[0], at(6, 11))
+    assert rollout.admit(MACS[0], at(6, 12))  # already running when the window closed
+
+
+@pytest.mark.parametrize("value", ["Mon 25:00-06:00", "Someday 01:00-02:00", "01:00", "02:00-02:00"])
+def test_bad_windows_exit(monkeypatch, value):
+    with pytest.raises(SystemExit):
+        _windows(monkeypatch, value)
+
+
+def test_bulk_groups_and_requeue(client, monkeypatch):
+    monkeypatch.setattr(rollout, "max_active", 1)
+    body = "".join(
+        json.dumps(op) + "\n"
+        for op in [
+            {"op": "set_install_group", "mac": MACS[0], "group": "rack-a"},
+            {"op": "set_install_group", "mac": MACS[1], "group": "bad group"},
+            {"op": "set_reinstall", "mac": MACS[0]},
+        ]
+    )
+    results = [json.loads(line) for line in client.post("/nodes/bulk", data=body).get_data(as_text=True).splitlines()]
+    assert [r.get("ok") for r in results[:3]] == [True, False, True]
+    assert _installs(client, MACS[0])
+    # Flagging it again puts it back in the queue and frees its slot.
+    client.post(f"/nodes/{MACS[0]}/reinstall")
+    client.post(f"/nodes/{MACS[1]}/reinstall")
+    assert _installs(client, MACS[1]) and not _installs(client, MACS[0])
+
+
+def test_asgi_native_boot_is_scheduled(client, monkeypatch, asgi_call):
+    monkeypatch.setattr(rollout, "max_active", 1)
+    for mac in MACS[:2]:
+        client.post(f"/nodes/{mac}/reinstall")
+    bodies = [asgi_call("GET", "/boot", f"mac={mac}")[2] for mac in MACS[:2]]
+    assert [b"imgfree" in body for body in bodies] == [True, False]
@@ -9,6 +9,8 @@ from zoneinfo import ZoneInfo
 import pytest
 from sqlalchemy.exc import StatementError
 
+from app.last_seen import last_seen_buffer
+
 
 def test_health_returns_ok(client):
     """GET /health returns 200 and status OK."""
@@ -405,3 +407,97 @@ def test_admin_auth_required_for_local_boot(client, monkeypatch):
     r3 = client.put(f"/nodes/{mac}/local-boot-config", json={"script": "exit"},
                     headers={"Authorization": "Bearer secret"})
     assert r3.status_code == 200
+
+
+def test_boot_concurrent_first_contact_creates_one_node(client):
+    """
+    Many workers seeing the same new MAC at once must all get a script and
+    leave exactly one row (single-statement upsert, no unique-index race).
+    """
+    import threading
+
+    from app.boot_cache import boot_cache
+
+    app = client.application
+    mac = "aa:bb:cc:dd:ee:ff"
+    statuses = []
+
+    def hit():
+        boot_cache.invalidate(mac)
+        with app.test_client() as c:
+            statuses.append(c.get("/boot", query_string={"mac": mac}).status_code)
+
+    threads = [threading.Thread(target=hit) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert statuses == [200] * 8
+    assert len(client.get("/nodes").get_json()["nodes"]) == 1
+
+
+def test_admin_write_preserves_other_fields(client):
+    """Upserting one column leaves the other per-node fields untouched."""
+    mac = "aa:bb:cc:dd:ee:ff"
+    client.put(f"/nodes/{mac}/local-boot-config", json={"script": "sanboot --no-describe --drive 0"})
+    client.post(f"/nodes/{mac}/reinstall")
+    client.delete(f"/nodes/{mac}/reinstall")
+    node = client.get("/nodes").get_json()["nodes"][0]
+    assert node["reinstall"] is False
+    assert node["local_boot_script"] == "sanboot --no-describe --drive 0"
+    assert node["created_at"] is not None
+
+
+def test_nodes_etag_and_conditional_get(client):
+    """GET /nodes carries an ETag; If-None-Match with it yields an empty 304 until a write."""
+    client.get("/boot", query_string={"mac": "aa:bb:cc:dd:ee:ff"})
+    r = client.get("/nodes")
+    etag = r.headers["ETag"]
+    assert r.status_code == 200 and etag
+
+    r = client.get("/nodes", headers={"If-None-Match": etag})
+    assert r.status_code == 304
+    assert r.get_data() == b""
+    assert r.headers["ETag"] == etag
+
+    client.post("/nodes/aa:bb:cc:dd:ee:ff/reinstall")
+    r = client.get("/nodes", headers={"If-None-Match": etag})
+    assert r.status_code == 200
+    assert r.headers["ETag"] != etag
+    assert r.get_json()["nodes"][0]["reinstall"] is True
+
+
+def test_nodes_etag_changes_on_boot_and_last_seen(client):
+    """New nodes from /boot and buffered last_seen writes both move the version."""
+    etag0 = client.get("/nodes").headers["ETag"]
+    client.get("/boot", query_string={"mac": "aa:bb:cc:dd:ee:ff"})
+    etag1 = client.get("/nodes").headers["ETag"]
+    assert etag1 != etag0
+    client.get("/boot", query_string={"mac": "aa:bb:cc:dd:ee:ff"})  # cache hit, buffered last_seen
+    assert client.get("/nodes").headers["ETag"] == etag1  # a poll does not flush
+    last_seen_buffer.flush()
+    etag2 = client.get("/nodes").headers["ETag"]
+    assert etag2 != etag1
+
+
+def test_nodes_unchanged_poll_skips_nodes_table(client):
+    """Conditional and repeated polls of an unchanged fleet never query the nodes table."""
+    from sqlalchemy import event
+
+    from app.db import engine
+
+    client.get("/boot", query_string={"mac": "aa:bb:cc:dd:ee:ff"})
+    first = client.get("/nodes")
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        assert client.get("/nodes", headers={"If-None-Match": first.headers["ETag"]}).status_code == 304
+        again = client.get("/nodes")
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    assert again.get_data() == first.get_data()
+    assert statements and not any("FROM nodes" in s for s in statements)
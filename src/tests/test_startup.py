@@ -0,0 +1,138 @@
+"""
+Tests for startup: once-per-deployment database preparation under the init
+lock, migration of a database with text MACs, fork safety of the engine pool,
+and the startup timing report.
+"""
+
+import logging
+import os
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import inspect, select, text
+
+from app import create_app
+from app.db import engine, migrate_db
+from app.models import Node
+from app.startup import init_lock, prepare_database
+
+
+def test_prepare_runs_once_per_schema_and_seed(monkeypatch, tmp_path):
+    assert prepare_database() is True
+    assert prepare_database() is False
+    seed = tmp_path / "seed.yml"
+    seed.write_text("nodes:\n  - mac: 'aa:bb:cc:dd:ee:ff'\n")
+    monkeypatch.setattr("app.startup.SEED_FILE", str(seed))
+    monkeypatch.setattr("app.seed.SEED_FILE", str(seed))
+    assert prepare_database() is True
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT count(*) FROM nodes")).scalar() == 1
+    assert prepare_database() is False
+
+
+def test_prepare_waits_for_the_init_lock():
+    """A second process (here a thread) blocks until the lock holder is done, then finds the work done."""
+    results = []
+    with init_lock():
+        worker = threading.Thread(target=lambda: results.append(prepare_database()))
+        worker.start()
+        worker.join(0.3)
+        assert worker.is_alive()
+        assert results == []
+    worker.join(5)
+    assert results == [True]
+
+
+@pytest.mark.sqlite_only
+def test_migrate_converts_text_macs_online(caplog, monkeypatch, external_write):
+    """
+    A nodes table from before integer MACs is copied batch by batch while an
+    old-version writer keeps writing text MACs: its updates, inserts and
+    deletes all land, ids and indexes survive, bad MACs go.
+    """
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE nodes"))
+        conn.execute(text(
+            "CREATE TABLE nodes (id INTEGER PRIMARY KEY, mac VARCHAR(17) NOT NULL, reinstall BOOLEAN NOT NULL,"
+            " local_boot_script TEXT, last_seen DATETIME, created_at DATETIME NOT NULL)"
+        ))
+        conn.execute(text("CREATE UNIQUE INDEX ix_nodes_mac ON nodes (mac)"))
+        conn.execute(text("CREATE INDEX ix_nodes_last_seen ON nodes (last_seen)"))
+    insert = ("INSERT INTO nodes (id, mac, reinstall, created_at)"
+              " VALUES (:id, :mac, :on, '2024-01-01 00:00:00.000000')")
+    for row in ({"id": 7, "mac": "aa:bb:cc:dd:ee:01", "on": True}, {"id": 9, "mac": "aa:bb:cc:dd:ee:02", "on": False},
+                {"id": 11, "mac": "bogus", "on": False}):
+        external_write(insert, row, bump=False)
+
+    old_writer = [  # one write between each pair of batches
+        ("UPDATE nodes SET reinstall = 0 WHERE id = 7", None),
+        (insert, {"id": 20, "mac": "aa:bb:cc:dd:ee:03", "on": True}),
+        ("DELETE FROM nodes WHERE id = 9", None),
+    ]
+
+    def sleep(_seconds):
+        if old_writer:
+            external_write(*old_writer.pop(0), bump=False)
+
+    monkeypatch.setattr("app.db._MAC_MIGRATE_CHUNK", 1)
+    monkeypatch.setattr("app.db.time", SimpleNamespace(sleep=sleep, perf_counter=time.perf_counter))
+    with caplog.at_level(logging.INFO, logger="app.db"):
+        migrate_db()
+    assert old_writer == []
+    assert "dropped 1 nodes with an invalid mac" in caplog.text
+    assert "converted to integers (2 rows)" in caplog.text
+
+    with engine.connect() as conn:
+        columns = {c["name"]: c for c in inspect(conn).get_columns("nodes")}
+        assert str(columns["mac"]["type"]) == "BIGINT" and "install_group" in columns
+        assert {i["name"] for i in inspect(conn).get_indexes("nodes")} >= {"ix_nodes_mac", "ix_nodes_last_seen"}
+        assert conn.execute(text("SELECT mac FROM nodes WHERE id = 7")).scalar() == 0xAABBCCDDEE01
+        assert set(inspect(conn).get_table_names()).isdisjoint({"nodes_mac_int", "nodes_mac_dirty"})
+        assert conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'trigger'")).all() == []
+        rows = conn.execute(select(Node.id, Node.mac, Node.reinstall).order_by(Node.mac)).all()
+    assert [tuple(r) for r in rows] == [(7, "aa:bb:cc:dd:ee:01", False), (20, "aa:bb:cc:dd:ee:03", True)]
+
+    # A writer still on the old version stores text; reads keep working.
+    external_write(insert, {"id": 21, "mac": "AA-BB-CC-DD-EE-04", "on": False}, bump=False)
+    with engine.connect() as conn:
+        assert conn.execute(select(Node.mac).where(Node.id == 21)).scalar() == "aa:bb:cc:dd:ee:04"
+    migrate_db()  # now a no-op
+
+
+def test_forked_worker_gets_its_own_connections():
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+    assert engine.pool.checkedin() >= 1
+    pid = os.fork()
+    if pid == 0:
+        code = 1
+        try:
+            if engine.pool.checkedin() == 0:
+                with engine.connect() as conn:
+                    conn.execute(text("SELECT count(*) FROM nodes"))
+                code = 0
+        finally:
+            os._exit(code)
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
+
+
+def test_create_app_logs_startup_report(caplog):
+    with caplog.at_level(logging.INFO, logger="app"):
+        app = create_app()
+    assert set(app.config["STARTUP_TIMINGS"]) == {"database", "boot_cache", "routes"}
+    report = next(r.getMessage() for r in caplog.records if "total" in r.getMessage())
+    assert report.startswith("startup: database ")
+
+
+def test_startup_report_counts_imports_from_the_entrypoint(monkeypatch, caplog):
+    monkeypatch.setattr("app.STARTUP_STARTED_AT", time.time() - 0.25)
+    with caplog.at_level(logging.INFO, logger="app"):
+        app = create_app()
+    timings = app.config["STARTUP_TIMINGS"]
+    assert list(timings)[0] == "imports" and timings["imports"] >= 0.25
+    report = next(r.getMessage() for r in caplog.records if "total" in r.getMessage())
+    assert report.startswith("startup: imports ")
+    assert float(report.split("total ")[1].split("ms")[0]) >= 250
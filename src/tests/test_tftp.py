@@ -0,0 +1,153 @@
+"""
+Tests for the built-in TFTP server: generated scripts, option negotiation
+(blksize, windowsize, tsize), errors, retransmission and block-number wraparound.
+"""
+
+import asyncio
+import socket
+import struct
+import threading
+
+import pytest
+
+from app.tftp import ACK, DATA, ERROR, OACK, RRQ, WRQ, TFTPServer, chain_script, negotiate, send_file
+
+
+@pytest.fixture
+def tftp(tmp_path):
+    """Start a server on an ephemeral localhost port in a background loop; yields (address, root)."""
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    server = TFTPServer(str(tmp_path), "http://pxe-pilot/", host="127.0.0.1", port=0,
+                        max_blksize=1024, max_window=4, timeout=0.2, retries=2, preload=("ipxe.efi",))
+    address = asyncio.run_coroutine_threadsafe(server.start(), loop).result(5)
+    yield address, tmp_path
+    asyncio.run_coroutine_threadsafe(server.close(), loop).result(5)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(5)
+
+
+def _request(filename: str, opcode: int = RRQ, **options) -> bytes:
+    packet = struct.pack("!H", opcode) + filename.encode() + b"\0octet\0"
+    for key, value in options.items():
+        packet += f"{key}\0{value}\0".encode()
+    return packet
+
+
+def _client() -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.settimeout(2)
+    return sock
+
+
+def _download(address, filename: str, **options) -> tuple[bytes, dict, int]:
+    """Fetch a file, acknowledging every block; returns (data, oack options, DATA packets received)."""
+    with _client() as sock:
+        sock.sendto(_request(filename, **options), address)
+        packet, peer = sock.recvfrom(70000)
+        oack = {}
+        blksize, window = 512, 1
+        if struct.unpack("!H", packet[:2])[0] == OACK:
+            fields = packet[2:].split(b"\0")[:-1]
+            oack = {fields[i].decode(): fields[i + 1].decode() for i in range(0, len(fields), 2)}
+            blksize = int(oack.get("blksize", 512))
+            window = int(oack.get("windowsize", 1))
+            sock.sendto(struct.pack("!HH", ACK, 0), peer)
+            packet, peer = sock.recvfrom(70000)
+        data, expected, received = b"", 1, 0
+        while True:
+            opcode, number = struct.unpack("!HH", packet[:4])
+            assert opcode == DATA, packet
+            received += 1
+            assert number == expected & 0xFFFF
+            data += packet[4:]
+            expected += 1
+            last = len(packet) - 4 < blksize
+            if last or received % window == 0:
+                sock.sendto(struct.pack("!HH", ACK, number), peer)
+            if last:
+                return data, oack, received
+            packet, peer = sock.recvfrom(70000)
+
+
+def test_generated_boot_script_without_options(tftp):
+    address, root = tftp
+    data, oack, _ = _download(address, "boot.ipxe")
+    assert data == chain_script("http://pxe-pilot/") == b"#!ipxe\nchain http://pxe-pilot/chain\n"
+    assert oack == {}
+    assert not (root / "boot.ipxe").exists()
+
+
+def test_negotiated_transfer(tftp):
+    address, root = tftp
+    payload = bytes(range(256)) * 40  # 10240 bytes: exactly 10 blocks of 1024, plus an empty final block
+    (root / "ipxe.efi").write_bytes(payload)
+    data, oack, received = _download(address, "ipxe.efi", blksize=4096, windowsize=8, tsize=0)
+    assert data == payload
+    assert oack == {"blksize": "1024", "windowsize": "4", "tsize": str(len(payload))}
+    assert received == 11
+
+
+def test_errors(tftp):
+    address, root = tftp
+    (root.parent / "secret").write_bytes(b"no")
+    with _client() as sock:
+        for packet, code in (
+            (_request("missing.efi"), 1),
+            (_request("../secret"), 2),
+            (_request("boot.ipxe", opcode=WRQ), 2),
+            (b"\x00\x01nul-terminated-never", 4),
+            (_request("boot.ipxe").replace(b"octet", b"netascii"), 4),
+        ):
+            sock.sendto(packet, address)
+            reply, _ = sock.recvfrom(1024)
+            assert struct.unpack("!HH", reply[:4]) == (ERROR, code), reply
+
+
+def test_window_is_resent_after_timeout(tftp):
+    address, root = tftp
+    (root / "ipxe.efi").write_bytes(b"x" * 700)
+    with _client() as sock:
+        sock.sendto(_request("ipxe.efi"), address)
+        first, peer = sock.recvfrom(1024)
+        again, _ = sock.recvfrom(1024)  # not acknowledged: the server resends block 1
+        assert first == again and struct.unpack("!HH", first[:4]) == (DATA, 1)
+        sock.sendto(struct.pack("!HH", ACK, 1), peer)
+        last, _ = sock.recvfrom(1024)
+        assert struct.unpack("!HH", last[:4]) == (DATA, 2) and len(last) - 4 == 188
+        sock.sendto(struct.pack("!HH", ACK, 2), peer)
+
+
+def test_negotiate_caps_and_ignores_invalid_values():
+    accepted, blksize, window, timeout = negotiate(
+        {"blksize": "1", "windowsize": "abc", "timeout": "3", "tsize": "0"}, 99, 1468, 16, 1.0
+    )
+    assert accepted == {"timeout": "3", "tsize": "99"}
+    assert (blksize, window, timeout) == (512, 1, 3.0)
+    assert negotiate({"blksize": "65464", "windowsize": "500"}, 0, 1468, 16, 1.0)[1:3] == (1468, 16)
+
+
+class _LoopbackClient:
+    """In-memory peer for send_file that acknowledges every window."""
+
+    def __init__(self, window: int) -> None:
+        self.window = window
+        self.blocks: list[int] = []
+        self._acks: asyncio.Queue = asyncio.Queue()
+
+    def send(self, packet) -> None:
+        number = struct.unpack("!HH", bytes(packet[:4]))[1]
+        self.blocks.append(number)
+        if len(self.blocks) % self.window == 0 or len(packet) - 4 < 8:
+            self._acks.put_nowait(number)
+
+    async def next_ack(self, timeout: float):
+        return await self._acks.get()
+
+
+def test_block_numbers_wrap_around():
+    peer = _LoopbackClient(window=16)
+    asyncio.run(send_file(peer, b"\xab" * (8 * 70000), 8, 16, 1.0, 0, None))
+    assert len(peer.blocks) == 70001
+    assert peer.blocks[65534:65537] == [65535, 0, 1]